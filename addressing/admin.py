@@ -1,4 +1,24 @@
 from django.contrib import admin
+from .models import Subnet, VMAddress, VMAddressSync
 
-# Esta app no tiene modelos propios.
-# Los vCenters se gestionan desde settings.admin (VCenterCredential)
+
+@admin.register(VMAddress)
+class VMAddressAdmin(admin.ModelAdmin):
+    list_display = ['vm_name', 'hostname', 'ip_primary', 'mac_primary', 'network_primary', 'power_state', 'vcenter', 'synced_at']
+    list_filter = ['vcenter', 'power_state']
+    search_fields = ['vm_name', 'hostname', 'ip_primary', 'mac_primary']
+    readonly_fields = ['synced_at']
+
+
+@admin.register(VMAddressSync)
+class VMAddressSyncAdmin(admin.ModelAdmin):
+    list_display = ['vcenter', 'synced_at', 'vm_count', 'duration_seconds', 'error']
+    readonly_fields = ['synced_at', 'vm_count', 'duration_seconds', 'error']
+
+
+@admin.register(Subnet)
+class SubnetAdmin(admin.ModelAdmin):
+    list_display = ['name', 'cidr', 'network', 'gateway', 'sweep', 'used_count', 'last_seeded_at']
+    list_filter = ['network', 'sweep']
+    search_fields = ['name', 'cidr', 'network']
+    readonly_fields = ['used_count', 'last_seeded_at', 'last_swept_at']
@@ -0,0 +1,273 @@
+"""
+Persisted VM address catalog (VMAddress / VMAddressEntry).
+
+sync_vcenter_addresses() mirrors the addresses of every VM of a vCenter
+into the database. The VM properties come from an AddressTracker kept on
+the pooled vCenter session (see deploy.vcenter_index): the first sync reads
+all VMs with paged RetrievePropertiesEx calls, later syncs only receive
+what changed since the previous one. Only VMs whose data changed are
+written.
+
+The VM list, its filters and the CSV export are indexed queries on the
+catalog:
+
+    from addressing.catalog import search_addresses, vcenter_networks
+
+    vms = search_addresses(cred, '10.0.1.', 'ip', vlan='VLAN-100')
+    vlans = vcenter_networks(cred)
+
+Searches match the beginning of an IP, a MAC (any separator) or a
+hostname, so they use the indexes on VMAddressEntry.value and
+VMAddress.hostname.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from pyVmomi import vim
+
+from deploy.vcenter_index import PropertyTracker, get_session_tracker
+from deploy.vcenter_pool import credential_session
+
+from .models import VMAddress, VMAddressEntry, VMAddressSync
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_FIELDS = [
+    'vm_name', 'hostname', 'guest_os', 'power_state', 'ips', 'macs', 'networks',
+    'ip_primary', 'mac_primary', 'network_primary',
+]
+
+
+def normalize_mac(value):
+    """'00:50:56:AB-CD.EF' -> '005056abcdef'"""
+    return ''.join(ch for ch in (value or '').lower() if ch not in ':-. ')
+
+
+def address_record(props):
+    """
+    Addresses of one VM from its tracked properties
+
+    Args:
+        props: {property path: value} of a VirtualMachine (AddressTracker.properties)
+
+    Returns:
+        dict with the VMAddress fields, or None when the VM has no IP nor MAC
+    """
+    vm_name = props.get('name') or 'Unknown'
+    ips = []
+    macs = []
+    networks = []
+
+    for nic in props.get('guest.net') or []:
+        if nic.macAddress:
+            macs.append(nic.macAddress)
+        if nic.network and nic.network not in networks:
+            networks.append(nic.network)
+        for ip in nic.ipAddress or []:
+            # Filtrar IPs locales y IPv6 link-local
+            if not ip.startswith('fe80') and not ip.startswith('169.254'):
+                ips.append(ip)
+
+    # Sin información del guest, MACs desde la configuración de hardware
+    if not macs:
+        for device in props.get('config.hardware.device') or []:
+            if isinstance(device, vim.vm.device.VirtualEthernetCard) and getattr(device, 'macAddress', None):
+                macs.append(device.macAddress)
+
+    if not ips and not macs:
+        return None
+
+    return {
+        'vm_name': vm_name,
+        'hostname': props.get('guest.hostName') or vm_name,
+        'guest_os': props.get('config.guestFullName') or '',
+        'power_state': str(props.get('runtime.powerState') or ''),
+        'ips': ips,
+        'macs': macs,
+        'networks': networks,
+        'ip_primary': ips[0] if ips else '',
+        'mac_primary': macs[0] if macs else '',
+        'network_primary': networks[0] if networks else 'Unknown',
+    }
+
+
+class AddressTracker(PropertyTracker):
+    """
+    Address records of every VM of one vCenter session, updated as the
+    PropertyCollector reports changes.
+    """
+
+    properties = {
+        vim.VirtualMachine: [
+            'name', 'config.guestFullName', 'runtime.powerState',
+            'guest.net', 'guest.hostName', 'config.hardware.device',
+        ],
+    }
+    log_prefix = '[VM-ADDRESSES]'
+
+    def reset(self):
+        super().reset()
+        self.records = {}       # moref id -> address_record()
+
+    def on_change(self, moid, props):
+        try:
+            record = address_record(props)
+        except Exception as e:
+            logger.warning(f"{self.log_prefix} Error reading addresses of VM {moid}: {e}")
+            record = None
+        if record is None:
+            self.records.pop(moid, None)
+        else:
+            self.records[moid] = record
+
+    def on_remove(self, moid, props):
+        self.records.pop(moid, None)
+
+
+def _entries(record):
+    """(kind, value) pairs indexed for one VM"""
+    values = []
+    for kind, items in (
+        (VMAddressEntry.KIND_IP, [ip.lower() for ip in record['ips']]),
+        (VMAddressEntry.KIND_MAC, [normalize_mac(mac) for mac in record['macs']]),
+        (VMAddressEntry.KIND_NETWORK, record['networks']),
+    ):
+        for value in dict.fromkeys(items):
+            if value:
+                values.append((kind, value[:255]))
+    return values
+
+
+def _store_records(cred, records, now):
+    """
+    Write the differences between `records` and the catalog of `cred`
+
+    Returns:
+        dict with 'created', 'updated' and 'deleted' VM counts
+    """
+    with transaction.atomic():
+        # Serializa syncs simultáneos del mismo vCenter (beat + manual)
+        VMAddressSync.objects.select_for_update().get_or_create(vcenter=cred)
+
+        existing = {row.vm_moid: row for row in VMAddress.objects.filter(vcenter=cred)}
+        created = []
+        updated = []
+        for moid, record in records.items():
+            row = existing.get(moid)
+            if row is None:
+                created.append(VMAddress(vcenter=cred, vm_moid=moid, synced_at=now, **record))
+            elif any(getattr(row, field) != record[field] for field in ADDRESS_FIELDS):
+                for field in ADDRESS_FIELDS:
+                    setattr(row, field, record[field])
+                row.synced_at = now
+                updated.append(row)
+        stale = [row.pk for moid, row in existing.items() if moid not in records]
+
+        if stale:
+            VMAddress.objects.filter(pk__in=stale).delete()
+        if updated:
+            VMAddress.objects.bulk_update(updated, ADDRESS_FIELDS + ['synced_at'], batch_size=500)
+            VMAddressEntry.objects.filter(address__in=[row.pk for row in updated]).delete()
+        if created:
+            VMAddress.objects.bulk_create(created, batch_size=500)
+
+        changed = {row.vm_moid for row in updated} | {row.vm_moid for row in created}
+        if changed:
+            # bulk_create no devuelve las claves en todos los backends (MySQL)
+            ids = dict(VMAddress.objects.filter(vcenter=cred, vm_moid__in=changed).values_list('vm_moid', 'id'))
+            VMAddressEntry.objects.bulk_create([
+                VMAddressEntry(address_id=ids[moid], vcenter=cred, kind=kind, value=value)
+                for moid in changed
+                for kind, value in _entries(records[moid])
+            ], batch_size=1000)
+
+    return {'created': len(created), 'updated': len(updated), 'deleted': len(stale)}
+
+
+def sync_vcenter_addresses(cred):
+    """
+    Bring the VM address catalog of a vCenter up to date
+
+    Args:
+        cred: VCenterCredential
+
+    Returns:
+        dict with 'vms' (VMs with addresses) and 'created', 'updated', 'deleted' counts
+    """
+    start = time.monotonic()
+    try:
+        with credential_session(cred) as si:
+            tracker = get_session_tracker(si, 'addresses', AddressTracker)
+            if tracker is None:
+                tracker = AddressTracker(si).build()
+                try:
+                    records = dict(tracker.records)
+                finally:
+                    tracker.close()
+            else:
+                tracker.refresh(force=True)
+                records = dict(tracker.records)
+    except Exception as e:
+        VMAddressSync.objects.update_or_create(vcenter=cred, defaults={'error': str(e)})
+        raise
+
+    now = timezone.now()
+    counts = _store_records(cred, records, now)
+    counts['vms'] = len(records)
+    duration = time.monotonic() - start
+    VMAddressSync.objects.update_or_create(vcenter=cred, defaults={
+        'synced_at': now,
+        'vm_count': len(records),
+        'duration_seconds': duration,
+        'error': '',
+    })
+    logger.info(f"[VM-ADDRESSES] {cred.host}: {len(records)} VMs, {counts['created']} new, "
+                f"{counts['updated']} changed, {counts['deleted']} removed in {duration:.1f}s")
+    return counts
+
+
+def search_addresses(cred, query='', search_field='all', vlan=''):
+    """
+    Catalog rows of a vCenter matching a search and a network
+
+    Args:
+        cred: VCenterCredential
+        query: Beginning of an IP, MAC or hostname ('' = all VMs)
+        search_field: 'ip', 'mac', 'hostname' or 'all'
+        vlan: Exact network name ('' = any)
+
+    Returns:
+        QuerySet of VMAddress ordered by VM name
+    """
+    vms = VMAddress.objects.filter(vcenter=cred)
+    entries = VMAddressEntry.objects.filter(vcenter=cred)
+
+    if vlan:
+        vms = vms.filter(pk__in=entries.filter(kind=VMAddressEntry.KIND_NETWORK, value=vlan).values('address_id'))
+
+    query = (query or '').strip()
+    if query:
+        condition = Q(pk__in=[])
+        if search_field in ('ip', 'all'):
+            condition |= Q(pk__in=entries.filter(
+                kind=VMAddressEntry.KIND_IP, value__startswith=query.lower()).values('address_id'))
+        mac = normalize_mac(query)
+        if mac and search_field in ('mac', 'all'):
+            condition |= Q(pk__in=entries.filter(
+                kind=VMAddressEntry.KIND_MAC, value__startswith=mac).values('address_id'))
+        if search_field in ('hostname', 'all'):
+            condition |= Q(hostname__istartswith=query)
+        vms = vms.filter(condition)
+
+    return vms.order_by('vm_name', 'id')
+
+
+def vcenter_networks(cred):
+    """Sorted names of the networks seen on the VMs of a vCenter"""
+    return list(
+        VMAddressEntry.objects.filter(vcenter=cred, kind=VMAddressEntry.KIND_NETWORK)
+        .exclude(value='Unknown').order_by('value').values_list('value', flat=True).distinct()
+    )
@@ -0,0 +1,435 @@
+"""
+Free-IP allocation for deployments, per Subnet.
+
+Each subnet has a bitmap in Redis, with one bit per address (1 = in use).
+The bitmap is built by seed_pool() from:
+
+    - network, broadcast and gateway addresses, and Subnet.excluded
+    - Host.ip of active inventory hosts
+    - guest IPs in the VM address catalog (addressing.catalog)
+    - IPs of deployments still pending or running
+    - optionally, a parallel ICMP/TCP/ARP sweep of the unused addresses
+
+allocate_ips() takes the next free bits with BITPOS in one Lua script, so
+it costs one round-trip for the whole batch and never hands the same
+address out twice. Handed-out addresses are short-lived reservations:
+they free themselves after IP_RESERVATION_TTL seconds unless
+confirm_ips() is called once the deployment has started. The beat task
+refresh_ip_pools reseeds the bitmaps and keeps live reservations.
+
+    from addressing.ip_allocator import allocate_ips, confirm_ips, subnet_for
+
+    subnet = subnet_for('VLAN10')
+    ips = allocate_ips(subnet, 3, owner=f'user-{user.pk}')
+    ...
+    confirm_ips(subnet, ips)
+"""
+import ipaddress
+import logging
+import socket
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Subnet, VMAddressEntry
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY = 'diaken:ip-pool:{pk}:{part}'
+
+# Libera las reservas vencidas (común a todos los scripts)
+EXPIRE_LUA = """
+local function drop_expired(reserved, owners, now)
+    local offsets = redis.call('ZRANGEBYSCORE', reserved, '-inf', now)
+    for _, offset in ipairs(offsets) do
+        redis.call('HDEL', owners, offset)
+    end
+    redis.call('ZREMRANGEBYSCORE', reserved, '-inf', now)
+    return offsets
+end
+
+local function expire(bits, reserved, owners, now)
+    for _, offset in ipairs(drop_expired(reserved, owners, now)) do
+        redis.call('SETBIT', bits, tonumber(offset), 0)
+    end
+end
+"""
+
+# KEYS: bits, reserved, owners  ARGV: now, expires, count, size, owner
+ALLOCATE_SCRIPT = EXPIRE_LUA + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+expire(KEYS[1], KEYS[2], KEYS[3], tonumber(ARGV[1]))
+local count = tonumber(ARGV[3])
+local size = tonumber(ARGV[4])
+local found = {}
+for i = 1, count do
+    local offset = redis.call('BITPOS', KEYS[1], 0)
+    if offset < 0 or offset >= size then
+        break
+    end
+    redis.call('SETBIT', KEYS[1], offset, 1)
+    found[#found + 1] = offset
+end
+if #found < count then
+    for _, offset in ipairs(found) do
+        redis.call('SETBIT', KEYS[1], offset, 0)
+    end
+    return {}
+end
+for _, offset in ipairs(found) do
+    redis.call('ZADD', KEYS[2], ARGV[2], offset)
+    redis.call('HSET', KEYS[3], offset, ARGV[5])
+end
+return found
+"""
+
+# KEYS: bits, reserved, owners  ARGV: now, expires, offset, owner
+RESERVE_SCRIPT = EXPIRE_LUA + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+expire(KEYS[1], KEYS[2], KEYS[3], tonumber(ARGV[1]))
+local offset = tonumber(ARGV[3])
+if redis.call('GETBIT', KEYS[1], offset) == 1 then
+    -- Solo el mismo dueño puede renovar su reserva
+    if redis.call('HGET', KEYS[3], ARGV[3]) ~= ARGV[4] then
+        return 0
+    end
+end
+redis.call('SETBIT', KEYS[1], offset, 1)
+redis.call('ZADD', KEYS[2], ARGV[2], offset)
+redis.call('HSET', KEYS[3], offset, ARGV[4])
+return 1
+"""
+
+# KEYS: bits, reserved, owners  ARGV: release (0/1), offsets...
+FINISH_SCRIPT = """
+for i = 2, #ARGV do
+    if redis.call('ZREM', KEYS[2], ARGV[i]) == 1 and ARGV[1] == '1' then
+        redis.call('SETBIT', KEYS[1], tonumber(ARGV[i]), 0)
+    end
+    redis.call('HDEL', KEYS[3], ARGV[i])
+end
+return 1
+"""
+
+# KEYS: bits, reserved, owners, tmp  ARGV: now, bitmap
+# Las reservas vencidas solo se borran del zset: el bitmap nuevo ya marca lo que
+# sigue en uso según la base de datos y no se le quita ningún bit
+SEED_SCRIPT = EXPIRE_LUA + """
+redis.call('SET', KEYS[4], ARGV[2])
+drop_expired(KEYS[2], KEYS[3], tonumber(ARGV[1]))
+for _, offset in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+    redis.call('SETBIT', KEYS[4], tonumber(offset), 1)
+end
+redis.call('RENAME', KEYS[4], KEYS[1])
+return redis.call('BITCOUNT', KEYS[1])
+"""
+
+
+class AllocationError(Exception):
+    """No address could be allocated or reserved"""
+
+
+def _keys(subnet):
+    return [POOL_KEY.format(pk=subnet.pk, part=part) for part in ('bits', 'reserved', 'owners')]
+
+
+def _redis():
+    from history.stream import get_redis_client
+
+    return get_redis_client()
+
+
+def _reservation_ttl(ttl):
+    return ttl or getattr(settings, 'IP_RESERVATION_TTL', 900)
+
+
+def _offset(subnet, ip):
+    network = subnet.ip_network()
+    address = ipaddress.ip_address(ip)
+    if address not in network:
+        raise AllocationError(f'{ip} is not in subnet {subnet.cidr}')
+    return int(address) - int(network.network_address)
+
+
+def _ip_prefix(network):
+    """Text prefix shared by every address of an IPv4 network ('10.0.10.' for a /24)"""
+    octets = network.prefixlen // 8
+    return '.'.join(str(network.network_address).split('.')[:octets]) + '.' if octets else ''
+
+
+def subnet_for(network=None, ip=None):
+    """
+    Subnet of a vCenter network and/or containing an IP
+
+    Returns:
+        Subnet or None
+    """
+    subnets = Subnet.objects.all()
+    if network:
+        subnets = subnets.filter(network=network)
+    if ip is None:
+        return subnets.first()
+    address = ipaddress.ip_address(ip)
+    for subnet in subnets:
+        if address in subnet.ip_network():
+            return subnet
+    return None
+
+
+def used_addresses(subnet):
+    """
+    Addresses of `subnet` known to be in use, from the database
+
+    Returns:
+        dict ip (IPv4Address) -> where it was seen
+    """
+    from history.models import DeploymentHistory
+    from inventory.models import Host
+
+    network = subnet.ip_network()
+    prefix = _ip_prefix(network)
+    used = {}
+
+    def add(values, source):
+        for value in values:
+            try:
+                address = ipaddress.ip_address(value)
+            except ValueError:
+                continue
+            if address in network:
+                used.setdefault(address, source)
+
+    add(Host.objects.filter(active=True, ip__startswith=prefix).values_list('ip', flat=True), 'inventory')
+    add(VMAddressEntry.objects.filter(kind=VMAddressEntry.KIND_IP, value__startswith=prefix)
+        .values_list('value', flat=True), 'vcenter')
+    add(DeploymentHistory.objects.filter(status__in=['pending', 'running'], ip_address__startswith=prefix)
+        .values_list('ip_address', flat=True), 'deployment')
+    return used
+
+
+def _probe(ip, ports, timeout):
+    """True when `ip` answers a ping or a TCP connection (accepted or refused)"""
+    for port in ports:
+        try:
+            with socket.create_connection((ip, port), timeout=timeout):
+                return True
+        except ConnectionRefusedError:
+            return True
+        except OSError:
+            continue
+    try:
+        result = subprocess.run(
+            ['ping', '-c', '1', '-W', str(max(int(timeout), 1)), ip],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout + 2,
+        )
+        return result.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def _arp_neighbours():
+    """IPs with a complete entry in the kernel ARP table (directly attached subnets only)"""
+    found = set()
+    try:
+        with open('/proc/net/arp') as arp_table:
+            next(arp_table, None)
+            for line in arp_table:
+                fields = line.split()
+                # flags 0x2 = entrada completa
+                if len(fields) >= 4 and fields[2] != '0x0' and fields[3] != '00:00:00:00:00:00':
+                    found.add(fields[0])
+    except OSError:
+        pass
+    return found
+
+
+def sweep_addresses(ips, ports=None, timeout=None, workers=None):
+    """
+    Probe addresses in parallel with TCP connects, ping and the ARP table
+
+    Returns:
+        set of the IPs (str) that answered
+    """
+    ips = [str(ip) for ip in ips]
+    if not ips:
+        return set()
+    ports = ports or getattr(settings, 'IP_SWEEP_PORTS', [22, 3389, 5985, 443, 80])
+    timeout = timeout or getattr(settings, 'IP_SWEEP_TIMEOUT', 1.0)
+    workers = min(workers or getattr(settings, 'IP_SWEEP_WORKERS', 64), len(ips))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ip-sweep') as executor:
+        answered = {ip for ip, alive in zip(ips, executor.map(lambda ip: _probe(ip, ports, timeout), ips)) if alive}
+    # Las sondas anteriores llenan la tabla ARP también para hosts con firewall
+    answered |= set(ips) & _arp_neighbours()
+    return answered
+
+
+def seed_pool(subnet, sweep=None):
+    """
+    Rebuild the bitmap of a subnet, keeping live reservations
+
+    Args:
+        subnet: Subnet
+        sweep: Probe the unused addresses (default: subnet.sweep)
+
+    Returns:
+        dict with 'size', 'used' (bits set after seeding) and 'swept' (addresses that answered the sweep)
+    """
+    network = subnet.ip_network()
+    size = network.num_addresses
+    base = int(network.network_address)
+
+    used = set(used_addresses(subnet))
+    used |= subnet.excluded_ips()
+    used |= {network.network_address, network.broadcast_address, ipaddress.ip_address(subnet.gateway_ip())}
+
+    swept = set()
+    sweep = subnet.sweep if sweep is None else sweep
+    if sweep:
+        max_hosts = getattr(settings, 'IP_SWEEP_MAX_HOSTS', 1024)
+        candidates = [ip for ip in network.hosts() if ip not in used][:max_hosts]
+        swept = sweep_addresses(candidates)
+        used |= {ipaddress.ip_address(ip) for ip in swept}
+
+    # Bits de relleno del último byte marcados como usados
+    used = {int(ip) for ip in used}
+    bitmap = bytearray(b'\xff' * ((size + 7) // 8))
+    for offset in range(size):
+        if base + offset not in used:
+            bitmap[offset // 8] &= ~(0x80 >> (offset % 8))
+
+    keys = _keys(subnet)
+    used_count = _redis().eval(SEED_SCRIPT, 4, *keys, keys[0] + ':tmp', time.time(), bytes(bitmap))
+    used_count -= len(bitmap) * 8 - size
+
+    now = timezone.now()
+    subnet.last_seeded_at = now
+    subnet.used_count = used_count
+    fields = ['last_seeded_at', 'used_count']
+    if sweep:
+        subnet.last_swept_at = now
+        fields.append('last_swept_at')
+    subnet.save(update_fields=fields)
+
+    logger.info(f'[IP-POOL] {subnet.cidr}: {used_count}/{size} addresses in use'
+                + (f', {len(swept)} found by the sweep' if sweep else ''))
+    return {'size': size, 'used': used_count, 'swept': len(swept)}
+
+
+def allocate_ips(subnet, count=1, owner='', ttl=None):
+    """
+    Reserve the next `count` free addresses of a subnet
+
+    Args:
+        owner: Reservation holder (reserve_ip() by the same owner renews it)
+        ttl: Seconds before an unconfirmed reservation is freed
+
+    Returns:
+        list of IPs (str)
+
+    Raises:
+        AllocationError: not enough free addresses
+    """
+    network = subnet.ip_network()
+    keys = _keys(subnet)
+    args = [time.time(), time.time() + _reservation_ttl(ttl), count, network.num_addresses, owner]
+    client = _redis()
+    offsets = client.eval(ALLOCATE_SCRIPT, 3, *keys, *args)
+    if offsets is None:
+        # Primera vez: construir el bitmap
+        seed_pool(subnet, sweep=False)
+        offsets = client.eval(ALLOCATE_SCRIPT, 3, *keys, *args)
+    if not offsets:
+        raise AllocationError(f'Not enough free addresses in {subnet.cidr} for {count} VM(s)')
+    ips = [str(network.network_address + int(offset)) for offset in offsets]
+    logger.info(f'[IP-POOL] {subnet.cidr}: reserved {", ".join(ips)} for {owner or "-"}')
+    return ips
+
+
+def reserve_ip(subnet, ip, owner='', ttl=None):
+    """
+    Reserve a specific address of a subnet
+
+    Returns:
+        bool: False when the address is in use or reserved by another owner
+    """
+    keys = _keys(subnet)
+    args = [time.time(), time.time() + _reservation_ttl(ttl), _offset(subnet, ip), owner]
+    client = _redis()
+    result = client.eval(RESERVE_SCRIPT, 3, *keys, *args)
+    if result == -1:
+        seed_pool(subnet, sweep=False)
+        result = client.eval(RESERVE_SCRIPT, 3, *keys, *args)
+    return result == 1
+
+
+def _finish(subnet, ips, release):
+    if not ips:
+        return
+    try:
+        offsets = [_offset(subnet, ip) for ip in ips]
+        _redis().eval(FINISH_SCRIPT, 3, *_keys(subnet), 1 if release else 0, *offsets)
+    except Exception as e:
+        logger.warning(f'[IP-POOL] Could not {"release" if release else "confirm"} {ips} in {subnet.cidr}: {e}')
+
+
+def confirm_ips(subnet, ips):
+    """Keep reserved addresses as used (deployment started); never raises"""
+    _finish(subnet, ips, release=False)
+
+
+def release_ips(subnet, ips):
+    """Give back reserved addresses that won't be used; never raises"""
+    _finish(subnet, ips, release=True)
+
+
+def find_conflict(ip):
+    """
+    Known user of an address outside the inventory: a VM in vCenter (address
+    catalog) or a deployment in progress
+
+    Returns:
+        str describing the conflict, or None
+    """
+    from history.models import DeploymentHistory
+
+    entry = (VMAddressEntry.objects.filter(kind=VMAddressEntry.KIND_IP, value=ip)
+             .select_related('address', 'vcenter').first())
+    if entry:
+        return f'IP {ip} is in use by VM {entry.address.vm_name} in vCenter {entry.vcenter.name}'
+    deployment = DeploymentHistory.objects.filter(status__in=['pending', 'running'], ip_address=ip).only('hostname').first()
+    if deployment:
+        return f'IP {ip} is being deployed for {deployment.hostname}'
+    return None
+
+
+def hold_ip(ip, network=None, owner=''):
+    """
+    Reserve a typed-in address in the pool of its subnet
+
+    Returns:
+        Subnet holding the reservation, or None (no subnet defined or pool unavailable)
+
+    Raises:
+        AllocationError: the address is already allocated
+    """
+    subnet = subnet_for(network, ip) or subnet_for(None, ip)
+    if subnet is None:
+        return None
+    try:
+        reserved = reserve_ip(subnet, ip, owner)
+    except AllocationError:
+        raise
+    except Exception as e:
+        logger.warning(f'[IP-POOL] Pool of {subnet.cidr} unavailable, {ip} not reserved: {e}')
+        return None
+    if not reserved:
+        raise AllocationError(f'IP {ip} is already allocated in subnet {subnet.cidr}')
+    return subnet
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('settings', '0012_alter_deploymentcredential_password_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VMAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vm_moid', models.CharField(help_text='Managed object id of the VM in vCenter', max_length=64)),
+                ('vm_name', models.CharField(max_length=255)),
+                ('hostname', models.CharField(blank=True, max_length=255)),
+                ('guest_os', models.CharField(blank=True, max_length=255)),
+                ('power_state', models.CharField(blank=True, max_length=20)),
+                ('ips', models.JSONField(blank=True, default=list)),
+                ('macs', models.JSONField(blank=True, default=list)),
+                ('networks', models.JSONField(blank=True, default=list)),
+                ('ip_primary', models.CharField(blank=True, max_length=64)),
+                ('mac_primary', models.CharField(blank=True, max_length=17)),
+                ('network_primary', models.CharField(blank=True, default='Unknown', max_length=255)),
+                ('synced_at', models.DateTimeField(help_text='Last time this VM was written by a catalog sync')),
+                ('vcenter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vm_addresses', to='settings.vcentercredential')),
+            ],
+            options={
+                'verbose_name': 'VM Address',
+                'verbose_name_plural': 'VM Addresses',
+                'ordering': ['vm_name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VMAddressEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ip', 'IP Address'), ('mac', 'MAC Address'), ('network', 'Network')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='addressing.vmaddress')),
+                ('vcenter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='settings.vcentercredential')),
+            ],
+            options={
+                'verbose_name': 'VM Address Entry',
+                'verbose_name_plural': 'VM Address Entries',
+            },
+        ),
+        migrations.CreateModel(
+            name='VMAddressSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('vm_count', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('vcenter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='vm_address_sync', to='settings.vcentercredential')),
+            ],
+            options={
+                'verbose_name': 'VM Address Sync',
+                'verbose_name_plural': 'VM Address Syncs',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='vmaddress',
+            index=models.Index(fields=['vcenter', 'vm_name'], name='vm_address_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vmaddress',
+            index=models.Index(fields=['vcenter', 'hostname'], name='vm_address_hostname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vmaddress',
+            index=models.Index(fields=['hostname'], name='vm_address_hostname_all_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vmaddress',
+            constraint=models.UniqueConstraint(fields=('vcenter', 'vm_moid'), name='unique_vm_address_moid'),
+        ),
+        migrations.AddIndex(
+            model_name='vmaddressentry',
+            index=models.Index(fields=['vcenter', 'kind', 'value'], name='vm_address_entry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vmaddressentry',
+            index=models.Index(fields=['kind', 'value'], name='vm_address_entry_all_idx'),
+        ),
+    ]
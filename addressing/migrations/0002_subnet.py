@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addressing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subnet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('network', models.CharField(db_index=True, help_text='vCenter network (port group) the subnet is used on', max_length=255)),
+                ('cidr', models.CharField(help_text='e.g. 10.0.10.0/24 (IPv4, /16 to /30)', max_length=18, unique=True)),
+                ('gateway', models.GenericIPAddressField(blank=True, help_text='Default: first address of the subnet', null=True, protocol='IPv4')),
+                ('excluded', models.TextField(blank=True, help_text='Addresses never allocated: IPs or ranges (10.0.10.1-10.0.10.20), comma or line separated')),
+                ('sweep', models.BooleanField(default=False, help_text='Probe unused addresses (ICMP/TCP/ARP) when refreshing the pool')),
+                ('description', models.TextField(blank=True)),
+                ('last_seeded_at', models.DateTimeField(blank=True, null=True)),
+                ('last_swept_at', models.DateTimeField(blank=True, null=True)),
+                ('used_count', models.PositiveIntegerField(default=0, help_text='Addresses in use at the last refresh')),
+            ],
+            options={
+                'verbose_name': 'Subnet',
+                'verbose_name_plural': 'Subnets',
+                'ordering': ['network', 'cidr'],
+            },
+        ),
+    ]
@@ -1,5 +1,156 @@
+import ipaddress
+
+from django.core.exceptions import ValidationError
 from django.db import models
 
-# Esta app no requiere modelos propios.
-# Usa VCenterCredential de la app settings para obtener configuración de vCenters.
-# Los datos de VMs se consultan en tiempo real desde vCenter, no se almacenan en BD.
+
+class VMAddress(models.Model):
+    """
+    Catalog entry of one VM: addresses, networks and power state as last
+    synced from vCenter (see addressing.catalog). The VM list and the CSV
+    export read this table instead of walking vCenter on every request.
+    """
+    vcenter = models.ForeignKey('settings.VCenterCredential', on_delete=models.CASCADE, related_name='vm_addresses')
+    vm_moid = models.CharField(max_length=64, help_text='Managed object id of the VM in vCenter')
+    vm_name = models.CharField(max_length=255)
+    hostname = models.CharField(max_length=255, blank=True)
+    guest_os = models.CharField(max_length=255, blank=True)
+    power_state = models.CharField(max_length=20, blank=True)
+
+    # Listas completas para mostrar; las búsquedas usan VMAddressEntry
+    ips = models.JSONField(default=list, blank=True)
+    macs = models.JSONField(default=list, blank=True)
+    networks = models.JSONField(default=list, blank=True)
+    ip_primary = models.CharField(max_length=64, blank=True)
+    mac_primary = models.CharField(max_length=17, blank=True)
+    network_primary = models.CharField(max_length=255, blank=True, default='Unknown')
+
+    synced_at = models.DateTimeField(help_text='Last time this VM was written by a catalog sync')
+
+    class Meta:
+        ordering = ['vm_name']
+        verbose_name = 'VM Address'
+        verbose_name_plural = 'VM Addresses'
+        constraints = [
+            models.UniqueConstraint(fields=['vcenter', 'vm_moid'], name='unique_vm_address_moid'),
+        ]
+        indexes = [
+            models.Index(fields=['vcenter', 'vm_name'], name='vm_address_name_idx'),
+            models.Index(fields=['vcenter', 'hostname'], name='vm_address_hostname_idx'),
+            models.Index(fields=['hostname'], name='vm_address_hostname_all_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vm_name} ({self.ip_primary or self.mac_primary})"
+
+
+class VMAddressEntry(models.Model):
+    """
+    One searchable value of a VM: an IP, a normalized MAC (lowercase hex
+    without separators) or a network name.
+    """
+    KIND_IP = 'ip'
+    KIND_MAC = 'mac'
+    KIND_NETWORK = 'network'
+    KIND_CHOICES = [
+        (KIND_IP, 'IP Address'),
+        (KIND_MAC, 'MAC Address'),
+        (KIND_NETWORK, 'Network'),
+    ]
+
+    address = models.ForeignKey(VMAddress, on_delete=models.CASCADE, related_name='entries')
+    vcenter = models.ForeignKey('settings.VCenterCredential', on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        verbose_name = 'VM Address Entry'
+        verbose_name_plural = 'VM Address Entries'
+        indexes = [
+            models.Index(fields=['vcenter', 'kind', 'value'], name='vm_address_entry_idx'),
+            models.Index(fields=['kind', 'value'], name='vm_address_entry_all_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.value}"
+
+
+class VMAddressSync(models.Model):
+    """Outcome of the last catalog sync of a vCenter"""
+    vcenter = models.OneToOneField('settings.VCenterCredential', on_delete=models.CASCADE, related_name='vm_address_sync')
+    synced_at = models.DateTimeField(null=True, blank=True)
+    vm_count = models.PositiveIntegerField(default=0)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'VM Address Sync'
+        verbose_name_plural = 'VM Address Syncs'
+
+    def __str__(self):
+        return f"{self.vcenter} - {self.synced_at}"
+
+
+class Subnet(models.Model):
+    """
+    IPv4 subnet used on a vCenter network. Free addresses are handed out by
+    addressing.ip_allocator from a bitmap of the subnet kept in Redis.
+    """
+    name = models.CharField(max_length=100)
+    network = models.CharField(max_length=255, db_index=True, help_text='vCenter network (port group) the subnet is used on')
+    cidr = models.CharField(max_length=18, unique=True, help_text='e.g. 10.0.10.0/24 (IPv4, /16 to /30)')
+    gateway = models.GenericIPAddressField(protocol='IPv4', null=True, blank=True, help_text='Default: first address of the subnet')
+    excluded = models.TextField(blank=True, help_text='Addresses never allocated: IPs or ranges (10.0.10.1-10.0.10.20), comma or line separated')
+    sweep = models.BooleanField(default=False, help_text='Probe unused addresses (ICMP/TCP/ARP) when refreshing the pool')
+    description = models.TextField(blank=True)
+
+    last_seeded_at = models.DateTimeField(null=True, blank=True)
+    last_swept_at = models.DateTimeField(null=True, blank=True)
+    used_count = models.PositiveIntegerField(default=0, help_text='Addresses in use at the last refresh')
+
+    class Meta:
+        ordering = ['network', 'cidr']
+        verbose_name = 'Subnet'
+        verbose_name_plural = 'Subnets'
+
+    def __str__(self):
+        return f"{self.name} ({self.cidr})"
+
+    def ip_network(self):
+        return ipaddress.ip_network(self.cidr, strict=False)
+
+    def gateway_ip(self):
+        """Configured gateway, or the first host address"""
+        return self.gateway or str(self.ip_network().network_address + 1)
+
+    def excluded_ips(self):
+        """Set of the excluded addresses (inside the subnet)"""
+        network = self.ip_network()
+        found = set()
+        for item in self.excluded.replace('\n', ',').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            first, _, last = item.partition('-')
+            start = ipaddress.ip_address(first.strip())
+            end = ipaddress.ip_address(last.strip()) if last else start
+            # Solo la parte del rango dentro de la subred
+            low = max(int(start), int(network.network_address))
+            high = min(int(end), int(network.broadcast_address))
+            found.update(ipaddress.ip_address(value) for value in range(low, high + 1))
+        return found
+
+    def clean(self):
+        try:
+            network = self.ip_network()
+        except ValueError as e:
+            raise ValidationError({'cidr': str(e)})
+        if network.version != 4 or not 16 <= network.prefixlen <= 30:
+            raise ValidationError({'cidr': 'Only IPv4 subnets from /16 to /30 are supported'})
+        self.cidr = str(network)
+        if self.gateway and ipaddress.ip_address(self.gateway) not in network:
+            raise ValidationError({'gateway': f'Gateway is not in {network}'})
+        try:
+            self.excluded_ips()
+        except ValueError as e:
+            raise ValidationError({'excluded': str(e)})
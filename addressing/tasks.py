@@ -0,0 +1,56 @@
+"""
+Celery tasks for the VM address catalog and the IP pools
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='addressing.sync_vm_addresses', ignore_result=True)
+def sync_vm_addresses(vcenter_id):
+    """
+    Sync the VM address catalog of one vCenter (see addressing/catalog.py).
+
+    Args:
+        vcenter_id: VCenterCredential ID
+    """
+    from settings.models import VCenterCredential
+    from addressing.catalog import sync_vcenter_addresses
+
+    cred = VCenterCredential.objects.filter(pk=vcenter_id).first()
+    if not cred:
+        logger.warning(f'[VM-ADDRESSES] vCenter credential {vcenter_id} not found')
+        return
+
+    try:
+        sync_vcenter_addresses(cred)
+    except Exception as e:
+        logger.error(f'[VM-ADDRESSES] Failed to sync VM addresses of {cred.host}: {e}')
+
+
+@shared_task(name='addressing.sync_all_vm_addresses', ignore_result=True)
+def sync_all_vm_addresses():
+    """
+    Periodic (celery beat) sync of the VM address catalog of every vCenter.
+    """
+    from settings.models import VCenterCredential
+
+    for vcenter_id in VCenterCredential.objects.values_list('pk', flat=True):
+        sync_vm_addresses.delay(vcenter_id)
+
+
+@shared_task(name='addressing.refresh_ip_pools', ignore_result=True)
+def refresh_ip_pools():
+    """
+    Periodic (celery beat) reseed of the IP pool of every subnet, sweeping
+    the ones with `sweep` enabled (see addressing/ip_allocator.py).
+    """
+    from addressing.models import Subnet
+    from addressing.ip_allocator import seed_pool
+
+    for subnet in Subnet.objects.all():
+        try:
+            seed_pool(subnet)
+        except Exception as e:
+            logger.error(f'[IP-POOL] Failed to refresh pool of {subnet.cidr}: {e}')
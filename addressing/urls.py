@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.vm_list, name='vm_list'),
     path('export/', views.export_csv, name='vm_export_csv'),
+    path('sync/', views.sync_catalog, name='vm_catalog_sync'),
+    path('next-free-ip/', views.next_free_ip, name='next_free_ip'),
 ]
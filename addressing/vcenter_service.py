@@ -3,10 +3,7 @@ Servicio para conectar a vCenter y obtener información de VMs.
 Usa PyVmomi para interactuar con la API de vCenter.
 """
 
-from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim
-import ssl
-import atexit
 import logging
 from typing import List, Dict, Optional
 
@@ -35,37 +32,31 @@ class VCenterService:
         self.si = None
     
     def connect(self):
-        """Establece conexión con vCenter"""
+        """Obtiene una sesión de vCenter del pool compartido"""
+        from deploy.vcenter_pool import vcenter_pool
         try:
-            # Crear contexto SSL
-            if self.disable_ssl_verification:
-                context = ssl._create_unverified_context()
-            else:
-                context = ssl.create_default_context()
-            
-            # Conectar a vCenter
-            self.si = SmartConnect(
-                host=self.host,
-                user=self.user,
-                pwd=self.pwd,
-                port=self.port,
-                sslContext=context
-            )
-            
-            # Registrar desconexión al salir
-            atexit.register(Disconnect, self.si)
-            
+            self.si = vcenter_pool.acquire(self.host, self.user, self.pwd, self.port)
             return True
         except Exception as e:
             raise Exception(f"Error al conectar a vCenter {self.host}: {str(e)}")
     
     def disconnect(self):
-        """Desconecta de vCenter"""
+        """Devuelve la sesión al pool"""
+        from deploy.vcenter_pool import vcenter_pool
         if self.si:
             try:
-                Disconnect(self.si)
-            except:
+                vcenter_pool.release(self.si)
+            except Exception:
                 pass
+            self.si = None
+    
+    def __enter__(self):
+        self.connect()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+        return False
     
     def get_all_vms(self) -> List[Dict]:
         """
@@ -1,20 +1,56 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
 from django.core.paginator import Paginator
 from django.contrib import messages
+from django.http import JsonResponse
+from django.conf import settings
+from django.views.decorators.http import require_POST
+from history.export import export_context, selected_columns, stream_csv
 from settings.models import VCenterCredential
-from .vcenter_service import VCenterService
-import csv
+from .catalog import search_addresses, sync_vcenter_addresses, vcenter_networks
+from .models import VMAddressSync
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Columnas del export CSV: (clave, cabecera, valor)
+VM_EXPORT_COLUMNS = [
+    ('vm_name', 'VM Name', lambda vm: vm.vm_name),
+    ('hostname', 'Hostname', lambda vm: vm.hostname),
+    ('ip', 'IP Address', lambda vm: vm.ip_primary),
+    ('mac', 'MAC Address', lambda vm: vm.mac_primary),
+    ('network', 'VLAN/Network', lambda vm: vm.network_primary or 'Unknown'),
+    ('os', 'Operating System', lambda vm: vm.guest_os),
+    ('power_state', 'Power State', lambda vm: vm.power_state),
+    # IPs, MACs y VLANs adicionales (después de la primera)
+    ('additional_ips', 'Additional IPs', lambda vm: ', '.join(vm.ips[1:])),
+    ('additional_macs', 'Additional MACs', lambda vm: ', '.join(vm.macs[1:])),
+    ('additional_vlans', 'Additional VLANs', lambda vm: ', '.join(vm.networks[1:])),
+]
+
+
+def _ensure_catalog(request, vcenter):
+    """
+    Sync a vCenter that was never synced before listing it (later syncs run
+    in celery beat). Returns the VMAddressSync of the vCenter or None.
+    """
+    sync = VMAddressSync.objects.filter(vcenter=vcenter).first()
+    if sync is None or sync.synced_at is None:
+        try:
+            sync_vcenter_addresses(vcenter)
+        except Exception as e:
+            error_message = f"Error al conectar a vCenter: {str(e)}"
+            logger.error(error_message)
+            messages.error(request, error_message)
+        sync = VMAddressSync.objects.filter(vcenter=vcenter).first()
+    return sync
+
 
 @login_required
 def vm_list(request):
     """
-    Vista principal para listar VMs desde vCenter.
+    Vista principal para listar VMs del catálogo de direcciones.
     Permite seleccionar vCenter, buscar y paginar resultados.
     """
     # Obtener todos los vCenters disponibles
@@ -30,52 +66,19 @@ def vm_list(request):
     vms = []
     all_vlans = []
     selected_vcenter = None
+    catalog_sync = None
     error_message = None
     
-    # Si se seleccionó un vCenter, obtener las VMs
+    # Si se seleccionó un vCenter, consultar su catálogo
     if vcenter_id:
         try:
             selected_vcenter = VCenterCredential.objects.get(id=vcenter_id)
+            catalog_sync = _ensure_catalog(request, selected_vcenter)
+            if catalog_sync and catalog_sync.error:
+                error_message = catalog_sync.error
             
-            # Conectar a vCenter y obtener VMs
-            service = VCenterService(
-                host=selected_vcenter.host,
-                port=443,  # Puerto por defecto
-                user=selected_vcenter.user,
-                pwd=selected_vcenter.get_password(),
-                disable_ssl_verification=not selected_vcenter.ssl_verify
-            )
-            
-            try:
-                service.connect()
-                
-                # Buscar o listar todas
-                if search_query:
-                    vms = service.search_vms(search_query, search_field)
-                else:
-                    vms = service.get_all_vms()
-                
-                logger.info(f"Retrieved {len(vms)} VMs from vCenter {selected_vcenter.name}")
-                
-                # Extraer todas las VLANs únicas
-                vlans_set = set()
-                for vm in vms:
-                    for network in vm.get('networks', []):
-                        if network and network != 'Unknown':
-                            vlans_set.add(network)
-                all_vlans = sorted(list(vlans_set))
-                
-                # Filtrar por VLAN si se seleccionó una
-                if vlan_filter:
-                    vms = [vm for vm in vms if vlan_filter in vm.get('networks', [])]
-                    logger.info(f"Filtered to {len(vms)} VMs in VLAN {vlan_filter}")
-                
-            except Exception as e:
-                error_message = f"Error al conectar a vCenter: {str(e)}"
-                logger.error(error_message)
-                messages.error(request, error_message)
-            finally:
-                service.disconnect()
+            vms = search_addresses(selected_vcenter, search_query, search_field, vlan_filter)
+            all_vlans = vcenter_networks(selected_vcenter)
                 
         except VCenterCredential.DoesNotExist:
             error_message = "vCenter no encontrado"
@@ -92,22 +95,54 @@ def vm_list(request):
     context = {
         'vcenters': vcenters,
         'selected_vcenter': selected_vcenter,
+        'catalog_sync': catalog_sync,
         'vms': page_obj,
         'all_vlans': all_vlans,
         'vlan_filter': vlan_filter,
         'search_query': search_query,
         'search_field': search_field,
-        'total_vms': len(vms),
+        'total_vms': paginator.count,
         'error_message': error_message,
+        **export_context(request, VM_EXPORT_COLUMNS, reverse('vm_export_csv')),
     }
     
     return render(request, 'addressing/vm_list.html', context)
 
 
+@login_required
+@require_POST
+def sync_catalog(request):
+    """
+    Encola la sincronización del catálogo de un vCenter.
+    """
+    from .tasks import sync_vm_addresses
+    
+    vcenter_id = request.POST.get('vcenter')
+    selected_vcenter = VCenterCredential.objects.filter(id=vcenter_id).first()
+    if not selected_vcenter:
+        messages.error(request, "vCenter no encontrado")
+        return redirect('vm_list')
+    
+    try:
+        sync_vm_addresses.delay(selected_vcenter.pk)
+        messages.success(request, f"Sincronización de {selected_vcenter.name} en curso, recargue en unos segundos")
+    except Exception as e:
+        # Broker caído: sincronizar en la petición
+        logger.warning(f'Could not queue VM address sync for {selected_vcenter.host}: {e}')
+        try:
+            counts = sync_vcenter_addresses(selected_vcenter)
+            messages.success(request, f"{selected_vcenter.name} sincronizado: {counts['vms']} VMs")
+        except Exception as e:
+            messages.error(request, f"Error al conectar a vCenter: {str(e)}")
+    
+    return redirect(f"{reverse('vm_list')}?vcenter={selected_vcenter.pk}")
+
+
 @login_required
 def export_csv(request):
     """
-    Exporta la lista de VMs a CSV.
+    Exporta la lista de VMs del catálogo a CSV (en streaming).
+    Acepta los filtros del listado y `columns` (ver history/export.py).
     """
     vcenter_id = request.GET.get('vcenter')
     vlan_filter = request.GET.get('vlan', '').strip()
@@ -120,82 +155,12 @@ def export_csv(request):
     
     try:
         selected_vcenter = VCenterCredential.objects.get(id=vcenter_id)
+        _ensure_catalog(request, selected_vcenter)
         
-        # Conectar a vCenter y obtener VMs
-        service = VCenterService(
-            host=selected_vcenter.host,
-            port=443,
-            user=selected_vcenter.user,
-            pwd=selected_vcenter.get_password(),
-            disable_ssl_verification=not selected_vcenter.ssl_verify
-        )
-        
-        try:
-            service.connect()
-            
-            # Buscar o listar todas
-            if search_query:
-                vms = service.search_vms(search_query, search_field)
-            else:
-                vms = service.get_all_vms()
-            
-            # Filtrar por VLAN si se seleccionó una
-            if vlan_filter:
-                vms = [vm for vm in vms if vlan_filter in vm.get('networks', [])]
-            
-            # Crear respuesta CSV
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="vms_{selected_vcenter.name}.csv"'
-            response.write('\ufeff')  # BOM para Excel UTF-8
-            
-            writer = csv.writer(response)
-            
-            # Encabezados
-            writer.writerow([
-                'VM Name',
-                'Hostname',
-                'IP Address',
-                'MAC Address',
-                'VLAN/Network',
-                'Operating System',
-                'Power State',
-                'Additional IPs',
-                'Additional MACs',
-                'Additional VLANs'
-            ])
-            
-            # Datos
-            for vm in vms:
-                # IPs adicionales (después de la primera)
-                additional_ips = ', '.join(vm.get('ips', [])[1:]) if len(vm.get('ips', [])) > 1 else ''
-                # MACs adicionales (después de la primera)
-                additional_macs = ', '.join(vm.get('macs', [])[1:]) if len(vm.get('macs', [])) > 1 else ''
-                # VLANs adicionales (después de la primera)
-                additional_vlans = ', '.join(vm.get('networks', [])[1:]) if len(vm.get('networks', [])) > 1 else ''
-                
-                writer.writerow([
-                    vm.get('vm_name', ''),
-                    vm.get('hostname', ''),
-                    vm.get('ip_primary', ''),
-                    vm.get('mac_primary', ''),
-                    vm.get('network_primary', 'Unknown'),
-                    vm.get('os', ''),
-                    vm.get('power_state', ''),
-                    additional_ips,
-                    additional_macs,
-                    additional_vlans
-                ])
-            
-            logger.info(f"Exported {len(vms)} VMs to CSV from vCenter {selected_vcenter.name}")
-            return response
-            
-        except Exception as e:
-            error_message = f"Error al obtener VMs: {str(e)}"
-            logger.error(error_message)
-            messages.error(request, error_message)
-            return redirect('vm_list')
-        finally:
-            service.disconnect()
+        vms = search_addresses(selected_vcenter, search_query, search_field, vlan_filter)
+        columns = selected_columns(request, VM_EXPORT_COLUMNS)
+        logger.info(f"Exporting VMs to CSV from vCenter {selected_vcenter.name}")
+        return stream_csv(f"vms_{selected_vcenter.name}.csv", columns, vms)
             
     except VCenterCredential.DoesNotExist:
         messages.error(request, "vCenter no encontrado")
@@ -204,3 +169,34 @@ def export_csv(request):
         logger.error(f"Error en exportación CSV: {str(e)}")
         messages.error(request, f"Error al exportar: {str(e)}")
         return redirect('vm_list')
+
+
+@login_required
+@require_POST
+def next_free_ip(request):
+    """
+    Reserva la siguiente IP libre de la subred de una red de vCenter (JSON).
+    La reserva expira en IP_RESERVATION_TTL segundos si no se despliega.
+    """
+    from .ip_allocator import AllocationError, allocate_ips, subnet_for
+    
+    network = request.POST.get('network', '').strip()
+    subnet = subnet_for(network) if network else None
+    if not subnet:
+        return JsonResponse({'success': False, 'error': f'No subnet defined for network {network or "-"}'}, status=404)
+    
+    try:
+        ip = allocate_ips(subnet, 1, owner=f'user-{request.user.pk}')[0]
+    except AllocationError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    except Exception as e:
+        logger.error(f'[IP-POOL] Could not allocate an IP in {subnet.cidr}: {e}')
+        return JsonResponse({'success': False, 'error': f'IP pool unavailable: {e}'}, status=503)
+    
+    return JsonResponse({
+        'success': True,
+        'ip': ip,
+        'gateway': subnet.gateway_ip(),
+        'subnet': subnet.cidr,
+        'expires_in': getattr(settings, 'IP_RESERVATION_TTL', 900),
+    })
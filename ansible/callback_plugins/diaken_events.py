@@ -0,0 +1,125 @@
+# Diaken callback plugin: structured task results as JSON lines.
+#
+# Enabled by the Celery tasks and the scheduler through
+# ANSIBLE_CALLBACK_PLUGINS / ANSIBLE_CALLBACKS_ENABLED (see
+# history/ansible_events.py); the stdout callback is left untouched so the
+# human readable output keeps streaming as before.
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: diaken_events
+    type: aggregate
+    short_description: Write per-host task results as JSON lines for Diaken
+    description:
+      - Appends one JSON object per line to the file named by DIAKEN_EVENTS_FILE
+        for play/task starts, every host result and the final per-host stats.
+    requirements:
+      - enable in configuration (ANSIBLE_CALLBACKS_ENABLED=diaken_events)
+    options:
+      events_file:
+        description: File the events are appended to
+        env:
+          - name: DIAKEN_EVENTS_FILE
+'''
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+MAX_MESSAGE = 1000
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'diaken_events'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self._play = None
+        self._task_started = {}
+        self._host_started = {}
+        self._file = None
+        path = os.environ.get('DIAKEN_EVENTS_FILE')
+        if path:
+            self._file = open(path, 'a', buffering=1)
+
+    def _emit(self, event, **data):
+        if self._file is None:
+            return
+        data['event'] = event
+        data['ts'] = round(time.time(), 3)
+        self._file.write(json.dumps(data, default=str, separators=(',', ':')) + '\n')
+
+    @staticmethod
+    def _message(result):
+        res = result._result
+        message = res.get('msg') or res.get('stderr') or res.get('reason') or ''
+        if not isinstance(message, str):
+            message = json.dumps(message, default=str)
+        return message[-MAX_MESSAGE:]
+
+    def _result(self, result, status):
+        host = result._host.get_name()
+        task = result._task
+        now = time.time()
+        started = self._host_started.pop((host, task._uuid), None) or self._task_started.get(task._uuid, now)
+        self._emit(
+            'result',
+            play=self._play,
+            task=task.get_name(),
+            action=task.action,
+            host=host,
+            status=status,
+            changed=bool(result._result.get('changed', False)),
+            duration=round(now - started, 3),
+            msg=self._message(result) if status in ('failed', 'unreachable', 'ignored') else '',
+        )
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name()
+        self._emit('play_start', play=self._play)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_started[task._uuid] = time.time()
+        self._emit('task_start', play=self._play, task=task.get_name())
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.v2_playbook_on_task_start(task, False)
+
+    def v2_runner_on_start(self, host, task):
+        self._host_started[(host.get_name(), task._uuid)] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        self._result(result, 'changed' if result._result.get('changed', False) else 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._result(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_unreachable(self, result):
+        self._result(result, 'unreachable')
+
+    def v2_runner_on_skipped(self, result):
+        self._result(result, 'skipped')
+
+    def v2_playbook_on_stats(self, stats):
+        hosts = {}
+        for host in sorted(stats.processed.keys()):
+            summary = stats.summarize(host)
+            hosts[host] = {
+                'ok': summary.get('ok', 0),
+                'changed': summary.get('changed', 0),
+                'failures': summary.get('failures', 0),
+                'unreachable': summary.get('unreachable', 0),
+                'skipped': summary.get('skipped', 0),
+                'rescued': summary.get('rescued', 0),
+                'ignored': summary.get('ignored', 0),
+            }
+        self._emit('stats', hosts=hosts)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,30 @@
+"""
+Django management command to rebuild the dashboard's daily execution rollup.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard.stats import date_range, rebuild_days, set_coverage
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyExecutionStats rollup from the history tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Number of past days to rebuild (default: 365)',
+        )
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        first = yesterday - timedelta(days=max(1, options['days']) - 1)
+
+        self.stdout.write(f'Rebuilding execution stats from {first} to {yesterday}...')
+        rows = rebuild_days(date_range(first, yesterday))
+        set_coverage(first, yesterday)
+        self.stdout.write(self.style.SUCCESS(f'✅ Rollup rebuilt: {rows} rows'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyExecutionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Día local (TIME_ZONE) de la ejecución')),
+                ('source', models.CharField(choices=[('manual', 'Manual'), ('scheduled', 'Scheduled')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('playbook', models.CharField(blank=True, max_length=200)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Execution Stats',
+                'verbose_name_plural': 'Daily Execution Stats',
+                'indexes': [models.Index(fields=['date', 'status'], name='daily_exec_stats_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'source', 'status', 'playbook'), name='daily_exec_stats_unique')],
+            },
+        ),
+    ]
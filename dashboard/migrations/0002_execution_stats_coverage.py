@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_daily_execution_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionStatsCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_day', models.DateField()),
+                ('through_day', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Execution Stats Coverage',
+                'verbose_name_plural': 'Execution Stats Coverage',
+            },
+        ),
+    ]
@@ -1,3 +1,51 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyExecutionStats(models.Model):
+    """
+    Daily rollup of playbook executions (manual deployments and scheduled
+    tasks), maintained by the refresh_daily_execution_stats beat task so the
+    dashboard never scans the history tables for past days.
+    """
+    SOURCE_CHOICES = [
+        ('manual', 'Manual'),
+        ('scheduled', 'Scheduled'),
+    ]
+
+    date = models.DateField(help_text='Día local (TIME_ZONE) de la ejecución')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    status = models.CharField(max_length=20)
+    playbook = models.CharField(max_length=200, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Daily Execution Stats'
+        verbose_name_plural = 'Daily Execution Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'source', 'status', 'playbook'], name='daily_exec_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'status'], name='daily_exec_stats_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.source} {self.status} {self.playbook}: {self.count}"
+
+
+class ExecutionStatsCoverage(models.Model):
+    """
+    Days covered by the DailyExecutionStats rollup (a single row, pk=1).
+
+    Written only by the rollup refresh (beat task) and the rebuild command;
+    the dashboard counts any day outside it live.
+    """
+    first_day = models.DateField()
+    through_day = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Execution Stats Coverage'
+        verbose_name_plural = 'Execution Stats Coverage'
+
+    def __str__(self):
+        return f"{self.first_day} .. {self.through_day}"
@@ -0,0 +1,211 @@
+"""
+Execution statistics for the dashboard.
+
+Past days are read from the DailyExecutionStats rollup (one row per day,
+source, status and playbook); only the days after the rollup's coverage
+(normally just today) are counted live with GROUP BY queries on the history
+tables. The refresh_daily_execution_stats beat task recomputes the last
+DASHBOARD_STATS_REFRESH_DAYS closed days, because runs that cross midnight
+or get cleaned up as stuck change status after the day ended:
+
+    from dashboard.stats import execution_stats
+
+    stats = execution_stats(start_day, end_day)
+    stats['daily']['2025-01-31']    # {'success': 12, 'failed': 1}
+    stats['top_playbooks']          # [{'playbook': ..., 'count': ...}]
+
+Coverage ({'from': date, 'through': date}) is stored in the database
+(ExecutionStatsCoverage) and only moved by the beat task and the
+rebuild_execution_stats command; a dashboard request never rebuilds the
+rollup, it counts the days outside the coverage live, with one grouped
+query per history table.
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _sources():
+    """(source, model, date field, playbook field) of each history table"""
+    from history.models import DeploymentHistory
+    from scheduler.models import ScheduledTaskHistory
+
+    return (
+        ('manual', DeploymentHistory, 'created_at', 'playbook'),
+        ('scheduled', ScheduledTaskHistory, 'executed_at', 'playbook_name'),
+    )
+
+
+def day_bounds(day):
+    """Aware [start, end) datetimes of a local day"""
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    return start, datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+
+
+def date_range(first, last):
+    day = first
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def count_range(first, last):
+    """
+    Count the executions of the local days first .. last straight from the
+    history tables, one GROUP BY query per table
+
+    Returns:
+        list of (day, source, status, playbook, count)
+    """
+    start, _ = day_bounds(first)
+    _, end = day_bounds(last)
+    tz = timezone.get_current_timezone()
+    counts = []
+    for source, model, date_field, playbook_field in _sources():
+        rows = (
+            model.objects.filter(**{f'{date_field}__gte': start, f'{date_field}__lt': end})
+            .annotate(day=TruncDate(date_field, tzinfo=tz))
+            .values('day', 'status', playbook_field)
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        counts.extend(
+            (row['day'], source, row['status'], (row[playbook_field] or '')[:200], row['count'])
+            for row in rows
+        )
+    return counts
+
+
+def count_day(day):
+    """
+    Count the executions of one local day straight from the history tables
+
+    Returns:
+        list of (source, status, playbook, count)
+    """
+    return [(source, status, playbook, count) for _day, source, status, playbook, count in count_range(day, day)]
+
+
+def rebuild_days(days):
+    """Replace the rollup rows of the given days with fresh counts"""
+    from .models import DailyExecutionStats
+
+    days = list(days)
+    if not days:
+        return 0
+    rows = [
+        DailyExecutionStats(date=day, source=source, status=status, playbook=playbook, count=count)
+        for day in days
+        for source, status, playbook, count in count_day(day)
+    ]
+    with transaction.atomic():
+        DailyExecutionStats.objects.filter(date__in=days).delete()
+        DailyExecutionStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def get_coverage():
+    from .models import ExecutionStatsCoverage
+
+    coverage = ExecutionStatsCoverage.objects.filter(pk=1).first()
+    if coverage is None:
+        return None
+    return {'from': coverage.first_day, 'through': coverage.through_day}
+
+
+def set_coverage(first, through):
+    from .models import ExecutionStatsCoverage
+
+    ExecutionStatsCoverage.objects.update_or_create(pk=1, defaults={'first_day': first, 'through_day': through})
+
+
+def refresh_daily_stats(refresh_days=None, backfill_days=None):
+    """
+    Bring the rollup up to date through yesterday
+
+    Recomputes the last `refresh_days` closed days plus any gap since the
+    previous run; without coverage, backfills `backfill_days`.
+
+    Returns:
+        dict: {'from', 'through', 'days', 'rows'}
+    """
+    refresh_days = refresh_days or getattr(settings, 'DASHBOARD_STATS_REFRESH_DAYS', 3)
+    backfill_days = backfill_days or getattr(settings, 'DASHBOARD_STATS_BACKFILL_DAYS', 365)
+    yesterday = timezone.localdate() - timedelta(days=1)
+    coverage = get_coverage()
+
+    if coverage is None:
+        first = yesterday - timedelta(days=backfill_days - 1)
+        start = first
+    else:
+        first = coverage['from']
+        start = min(coverage['through'] + timedelta(days=1), yesterday - timedelta(days=refresh_days - 1))
+        start = max(start, first)
+
+    days = list(date_range(start, yesterday))
+    rows = rebuild_days(days)
+    set_coverage(first, yesterday)
+    logger.info(f'[DASHBOARD-STATS] Rollup refreshed for {len(days)} day(s) ({start} .. {yesterday}), {rows} rows')
+    return {'from': first, 'through': yesterday, 'days': len(days), 'rows': rows}
+
+
+def execution_stats(start_day, end_day):
+    """
+    Aggregated executions between two local days (both included)
+
+    Returns:
+        dict with 'daily' ({iso day: {'success', 'failed'}}, non-success
+        counted as failed as in the chart), 'total', 'success', 'failed'
+        (status == 'failed') and 'top_playbooks' (5 most executed)
+    """
+    from .models import DailyExecutionStats
+
+    coverage = get_coverage()
+    if coverage and coverage['from'] <= end_day and coverage['through'] >= start_day:
+        covered = (max(start_day, coverage['from']), min(end_day, coverage['through']))
+    else:
+        covered = None
+
+    daily = {day.isoformat(): {'success': 0, 'failed': 0} for day in date_range(start_day, end_day)}
+    status_totals = {}
+    playbooks = {}
+
+    def add(day_key, status, count):
+        daily[day_key]['success' if status == 'success' else 'failed'] += count
+        status_totals[status] = status_totals.get(status, 0) + count
+
+    if covered:
+        rollup = DailyExecutionStats.objects.filter(date__gte=covered[0], date__lte=covered[1])
+        for row in rollup.values('date', 'status').annotate(total=Sum('count')).order_by():
+            add(row['date'].isoformat(), row['status'], row['total'])
+        for row in rollup.exclude(playbook='').values('playbook').annotate(total=Sum('count')).order_by():
+            playbooks[row['playbook']] = row['total']
+        live = [(start_day, covered[0] - timedelta(days=1)), (covered[1] + timedelta(days=1), end_day)]
+    else:
+        live = [(start_day, end_day)]
+
+    # Días fuera del rollup (normalmente solo hoy): consultas agrupadas, sin reconstruir nada
+    for first, last in live:
+        if first > last:
+            continue
+        for day, source, status, playbook, count in count_range(first, last):
+            add(day.isoformat(), status, count)
+            if playbook:
+                playbooks[playbook] = playbooks.get(playbook, 0) + count
+
+    top = sorted(playbooks.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        'daily': daily,
+        'total': sum(status_totals.values()),
+        'success': status_totals.get('success', 0),
+        'failed': status_totals.get('failed', 0),
+        'top_playbooks': [{'playbook': name, 'count': count} for name, count in top],
+    }
@@ -0,0 +1,19 @@
+"""
+Celery tasks for the dashboard
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='dashboard.refresh_daily_execution_stats', ignore_result=True)
+def refresh_daily_execution_stats():
+    """
+    Periodic (celery beat) maintenance of the DailyExecutionStats rollup
+    (see dashboard/stats.py).
+    """
+    from dashboard.stats import refresh_daily_stats
+
+    result = refresh_daily_stats()
+    logger.info(f"[DASHBOARD-STATS] Rollup covers {result['from']} .. {result['through']}")
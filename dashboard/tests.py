@@ -1,3 +1,52 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from history.models import DeploymentHistory
+
+from .models import DailyExecutionStats, ExecutionStatsCoverage
+from .stats import execution_stats, get_coverage, refresh_daily_stats, set_coverage
+
+
+@mock.patch('history.stream.publish_output')
+class ExecutionStatsTests(TestCase):
+    """The dashboard reads the rollup but never rebuilds it"""
+
+    def test_without_coverage_counts_live_and_writes_nothing(self, publish_output):
+        today = timezone.localdate()
+        DeploymentHistory.objects.create(target='web01', target_type='VM', playbook='site.yml', status='success')
+        DeploymentHistory.objects.create(target='web02', target_type='VM', playbook='site.yml', status='failed')
+
+        stats = execution_stats(today - timedelta(days=29), today)
+
+        self.assertEqual(stats['total'], 2)
+        self.assertEqual(stats['daily'][today.isoformat()], {'success': 1, 'failed': 1})
+        self.assertFalse(DailyExecutionStats.objects.exists())
+        self.assertIsNone(get_coverage())
+
+    def test_rollup_plus_live_days_outside_coverage(self, publish_output):
+        today = timezone.localdate()
+        covered_day = today - timedelta(days=3)
+        set_coverage(covered_day, covered_day)
+        DailyExecutionStats.objects.create(date=covered_day, source='manual', status='success', playbook='site.yml', count=5)
+        DeploymentHistory.objects.create(target='web01', target_type='VM', playbook='site.yml', status='success')
+
+        stats = execution_stats(today - timedelta(days=6), today)
+
+        self.assertEqual(stats['total'], 6)
+        self.assertEqual(stats['daily'][covered_day.isoformat()]['success'], 5)
+        self.assertEqual(stats['daily'][today.isoformat()]['success'], 1)
+        self.assertEqual(DailyExecutionStats.objects.count(), 1)
+
+    def test_refresh_stores_coverage_in_database(self, publish_output):
+        yesterday = timezone.localdate() - timedelta(days=1)
+
+        result = refresh_daily_stats(refresh_days=3, backfill_days=10)
 
-# Create your tests here.
+        coverage = ExecutionStatsCoverage.objects.get(pk=1)
+        self.assertEqual(coverage.first_day, yesterday - timedelta(days=9))
+        self.assertEqual(coverage.through_day, yesterday)
+        self.assertEqual(result['days'], 10)
+        self.assertEqual(refresh_daily_stats(refresh_days=3, backfill_days=10)['days'], 3)
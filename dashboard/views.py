@@ -1,91 +1,80 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from inventory.models import Host, Group, Environment
 from playbooks.models import Playbook
 from settings.models import VCenterCredential
-from history.models import DeploymentHistory
-from scheduler.models import ScheduledTaskHistory
+from .stats import execution_stats
 import json
 
+CONTEXT_CACHE_KEY = 'dashboard:context:{days}'
+MAX_DAYS = 365
+
+
 @login_required
 def dashboard_home(request):
     """Main dashboard with statistics and charts"""
     
     # Get filter parameters
-    days = int(request.GET.get('days', 7))
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), MAX_DAYS)
+    except ValueError:
+        days = 7
+    
+    # El contexto completo se cachea unos segundos (igual para todos los usuarios)
+    cache_key = CONTEXT_CACHE_KEY.format(days=days)
+    context = cache.get(cache_key)
+    if context is None:
+        context = _dashboard_context(days)
+        cache.set(cache_key, context, getattr(settings, 'DASHBOARD_CACHE_TTL', 60))
+    
+    return render(request, 'dashboard/dashboard.html', context)
+
+
+def _dashboard_context(days):
     end_date = timezone.now()
     start_date = end_date - timedelta(days=days)
     
     # Section 1: Statistics Cards
     total_playbooks = Playbook.objects.count()
-    total_hosts = Host.objects.filter(active=True).count()
     total_vcenters = VCenterCredential.objects.count()
     total_environments = Environment.objects.filter(active=True).count()
     total_groups = Group.objects.filter(active=True).count()
     
-    # OS Distribution
-    redhat_count = Host.objects.filter(active=True, operating_system__icontains='redhat').count()
-    debian_count = Host.objects.filter(active=True, operating_system__icontains='debian').count()
-    ubuntu_count = Host.objects.filter(active=True, operating_system__icontains='ubuntu').count()
-    centos_count = Host.objects.filter(active=True, operating_system__icontains='centos').count()
-    windows_count = Host.objects.filter(active=True, operating_system__icontains='windows').count()
+    # OS Distribution (una sola consulta con agregados condicionales)
+    os_counts = Host.objects.filter(active=True).aggregate(
+        total=Count('id'),
+        redhat=Count('id', filter=Q(operating_system__icontains='redhat')),
+        debian=Count('id', filter=Q(operating_system__icontains='debian')),
+        ubuntu=Count('id', filter=Q(operating_system__icontains='ubuntu')),
+        centos=Count('id', filter=Q(operating_system__icontains='centos')),
+        windows=Count('id', filter=Q(operating_system__icontains='windows')),
+    )
+    total_hosts = os_counts['total']
+    redhat_count = os_counts['redhat']
+    debian_count = os_counts['debian']
+    ubuntu_count = os_counts['ubuntu']
+    centos_count = os_counts['centos']
+    windows_count = os_counts['windows']
     other_os_count = total_hosts - (redhat_count + debian_count + ubuntu_count + centos_count + windows_count)
     
     # Section 2: Execution Statistics (last N days)
-    # Include both manual executions and scheduled task executions
-    manual_executions = DeploymentHistory.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date
-    )
-    
-    scheduled_executions = ScheduledTaskHistory.objects.filter(
-        executed_at__gte=start_date,
-        executed_at__lte=end_date
-    )
-    
-    # Calculate totals
-    manual_total = manual_executions.count()
-    manual_success = manual_executions.filter(status='success').count()
-    manual_failed = manual_executions.filter(status='failed').count()
-    
-    scheduled_total = scheduled_executions.count()
-    scheduled_success = scheduled_executions.filter(status='success').count()
-    scheduled_failed = scheduled_executions.filter(status='failed').count()
-    
-    total_executions = manual_total + scheduled_total
-    successful_executions = manual_success + scheduled_success
-    failed_executions = manual_failed + scheduled_failed
+    # Manual executions and scheduled task executions, from the daily rollup
+    # (dashboard/stats.py) plus live counts for today
+    today = timezone.localdate()
+    stats = execution_stats(today - timedelta(days=days), today)
+    
+    total_executions = stats['total']
+    successful_executions = stats['success']
+    failed_executions = stats['failed']
     success_rate = round((successful_executions / total_executions * 100) if total_executions > 0 else 0, 1)
     
-    # Daily execution data for chart
-    daily_data = {}
-    current_date = start_date.date()
-    while current_date <= end_date.date():
-        daily_data[current_date.isoformat()] = {'success': 0, 'failed': 0}
-        current_date += timedelta(days=1)
-    
-    # Add manual executions to daily data
-    for execution in manual_executions:
-        date_key = execution.created_at.date().isoformat()
-        if date_key in daily_data:
-            if execution.status == 'success':
-                daily_data[date_key]['success'] += 1
-            else:
-                daily_data[date_key]['failed'] += 1
-    
-    # Add scheduled executions to daily data
-    for execution in scheduled_executions:
-        date_key = execution.executed_at.date().isoformat()
-        if date_key in daily_data:
-            if execution.status == 'success':
-                daily_data[date_key]['success'] += 1
-            else:
-                daily_data[date_key]['failed'] += 1
-    
     # Prepare chart data
+    daily_data = stats['daily']
     labels = sorted(daily_data.keys())
     success_data = [daily_data[date]['success'] for date in labels]
     failed_data = [daily_data[date]['failed'] for date in labels]
@@ -107,23 +96,8 @@ def dashboard_home(request):
         }
     ]
     
-    # Top playbooks - combine manual and scheduled executions
-    from collections import Counter
-    playbook_counts = Counter()
-    
-    # Count manual executions
-    for exec in manual_executions:
-        if exec.playbook:
-            playbook_counts[exec.playbook] += 1
-    
-    # Count scheduled executions
-    for exec in scheduled_executions:
-        if exec.playbook_name:
-            playbook_counts[exec.playbook_name] += 1
-    
-    # Get top 5 playbooks
-    top_playbooks = [{'playbook': name, 'count': count} 
-                     for name, count in playbook_counts.most_common(5)]
+    # Top 5 playbooks - manual and scheduled executions combined
+    top_playbooks = stats['top_playbooks']
     
     # OS Distribution data for pie chart
     os_data = {
@@ -216,4 +190,4 @@ def dashboard_home(request):
         'os_data_json': json.dumps(os_data),
     }
     
-    return render(request, 'dashboard/dashboard.html', context)
+    return context
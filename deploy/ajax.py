@@ -2,10 +2,10 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from settings.models import VCenterCredential
 from inventory.models import Group, Host
-import ssl
 import logging
-from pyVim.connect import SmartConnect, Disconnect
-from pyVmomi import vim
+from .vcenter_catalog import (
+    get_catalog, invalidate_catalog, catalog_clusters, catalog_resource_pools, catalog_folders
+)
 
 # Configure logger
 logger = logging.getLogger('deploy.ajax')
@@ -85,15 +85,7 @@ def get_datacenters(request):
     if not cred:
         return JsonResponse({'datacenters': []})
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        for entity in content.rootFolder.childEntity:
-            if hasattr(entity, 'vmFolder'):
-                dcs.append(entity.name)
-        Disconnect(si)
-        # Sort alphabetically
-        dcs.sort()
+        dcs = get_catalog(cred)['datacenters']
     except Exception as e:
         logger.error(f'Error getting datacenters from vCenter {cred.host}: {str(e)}')
     return JsonResponse({'datacenters': dcs})
@@ -118,20 +110,11 @@ def get_clusters(request):
     if not cred or not dc_name:
         return JsonResponse({'clusters': [], 'error': 'No credentials or datacenter provided'})
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        dc_name_norm = dc_name.strip().lower()
-        datacenter = next((entity for entity in content.rootFolder.childEntity if hasattr(entity, 'vmFolder') and entity.name.strip().lower() == dc_name_norm), None)
-        if datacenter:
-            for c in datacenter.hostFolder.childEntity:
-                if hasattr(c, 'resourcePool'):
-                    clusters.append(c.name)
-            # Sort alphabetically
-            clusters.sort()
+        dc_clusters = catalog_clusters(get_catalog(cred), dc_name)
+        if dc_clusters is not None:
+            clusters = dc_clusters
         else:
             error = f"Datacenter '{dc_name}' not found."
-        Disconnect(si)
     except Exception as e:
         error = str(e)
         logging.exception("Error in get_clusters")
@@ -156,22 +139,7 @@ def get_resource_pools(request):
     if not cred or not dc_name or not cluster_name:
         return JsonResponse({'resource_pools': []})
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        datacenter = next((entity for entity in content.rootFolder.childEntity if hasattr(entity, 'vmFolder') and entity.name.strip().lower() == dc_name.strip().lower()), None)
-        if datacenter:
-            cluster = None
-            cluster_name_norm = cluster_name.strip().lower()
-            for c in datacenter.hostFolder.childEntity:
-                if hasattr(c, 'resourcePool') and c.name.strip().lower() == cluster_name_norm:
-                    cluster = c
-                    break
-            if cluster:
-                resource_pools.append(cluster.resourcePool.name)
-                for rp in cluster.resourcePool.resourcePool:
-                    resource_pools.append(rp.name)
-        Disconnect(si)
+        resource_pools = catalog_resource_pools(get_catalog(cred), dc_name, cluster_name)
     except Exception as e:
         logger.error(f"Error in get_resource_pools: {e}")
     return JsonResponse({'resource_pools': list(set(resource_pools))})
@@ -192,18 +160,7 @@ def get_templates(request):
     if not cred:
         return JsonResponse({'templates': []})
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        viewType = [vim.VirtualMachine]
-        recursive = True
-        containerView = content.viewManager.CreateContainerView(content.rootFolder, viewType, recursive)
-        for vm in containerView.view:
-            if vm.config.template:
-                templates.append(vm.name)
-        Disconnect(si)
-        # Sort alphabetically
-        templates.sort()
+        templates = get_catalog(cred)['templates']
     except Exception as e:
         logger.error(f'Error getting templates from vCenter: {str(e)}')
     return JsonResponse({'templates': templates})
@@ -225,21 +182,14 @@ def get_datastores(request):
     if not cred:
         return JsonResponse({'datastores': []})
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        for ds in content.viewManager.CreateContainerView(content.rootFolder, [vim.Datastore], True).view:
-            datastores.append(ds.name)
-        Disconnect(si)
-        # Sort alphabetically
-        datastores.sort()
+        datastores = get_catalog(cred)['datastores']
     except Exception as e:
         logger.error(f'Error getting datastores from vCenter: {str(e)}')
     return JsonResponse({'datastores': datastores})
 
 @login_required
 def get_networks(request):
-    networks = set()  # Usar set para evitar duplicados
+    networks = []
     
     # Obtener vCenter ID del parámetro, o usar el primero por defecto
     vcenter_id = request.GET.get('vcenter_id')
@@ -254,15 +204,8 @@ def get_networks(request):
     if not cred:
         return JsonResponse({'networks': []})
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        # Agregar redes estándar y DVS (puede haber duplicados por nombre)
-        for net in content.viewManager.CreateContainerView(content.rootFolder, [vim.Network], True).view:
-            networks.add(net.name)  # set automáticamente elimina duplicados
-        Disconnect(si)
-        # Convertir a lista ordenada
-        networks = sorted(list(networks))
+        # Redes estándar y DVS, sin duplicados por nombre
+        networks = get_catalog(cred)['networks']
     except Exception as e:
         logger.error(f'Error getting networks from vCenter: {str(e)}')
         networks = []  # Retornar lista vacía en caso de error
@@ -290,38 +233,8 @@ def get_folders(request):
         return JsonResponse({'folders': []})
     
     try:
-        context = ssl._create_unverified_context()
-        si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-        content = si.RetrieveContent()
-        
-        # Find the specified datacenter
-        datacenter = None
-        for dc in content.rootFolder.childEntity:
-            if hasattr(dc, 'vmFolder') and dc.name == datacenter_name:
-                datacenter = dc
-                break
-        
-        if datacenter:
-            # Get all folders recursively
-            def get_folder_tree(folder, path=""):
-                for child in folder.childEntity:
-                    if isinstance(child, vim.Folder):
-                        folder_path = f"{path}/{child.name}" if path else child.name
-                        folders.append({
-                            'name': child.name,
-                            'path': folder_path
-                        })
-                        # Recursively get subfolders
-                        get_folder_tree(child, folder_path)
-            
-            # Start from vmFolder of the datacenter
-            get_folder_tree(datacenter.vmFolder)
-        
-        Disconnect(si)
-        
-        # Sort folders alphabetically by path
-        folders.sort(key=lambda x: x['path'].lower())
-        
+        # Folders sorted alphabetically by path
+        folders = catalog_folders(get_catalog(cred), datacenter_name)
     except Exception as e:
         import logging
         logging.error(f"Error getting folders: {e}")
@@ -330,6 +243,40 @@ def get_folders(request):
     return JsonResponse({'folders': folders})
 
 
+@login_required
+def refresh_catalog(request):
+    """
+    Invalidate the cached vCenter catalog and rebuild it in the background.
+    
+    Args:
+        vcenter_id: VCenterCredential ID (POST); all vCenters when omitted
+    
+    Returns:
+        JSON with the invalidated vCenter IDs
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    vcenter_id = request.POST.get('vcenter_id')
+    creds = VCenterCredential.objects.all()
+    if vcenter_id:
+        creds = creds.filter(pk=vcenter_id)
+    
+    from .tasks import refresh_vcenter_catalog
+    
+    refreshed = []
+    for cred in creds:
+        invalidate_catalog(cred.pk)
+        try:
+            refresh_vcenter_catalog.delay(cred.pk)
+        except Exception as e:
+            # Broker down: the next dropdown request rebuilds the catalog
+            logger.warning(f'Could not queue catalog refresh for {cred.host}: {e}')
+        refreshed.append(cred.pk)
+    
+    return JsonResponse({'success': True, 'vcenter_ids': refreshed})
+
+
 @login_required
 def get_task_progress(request, task_id):
     """
@@ -0,0 +1,144 @@
+"""
+Cluster-wide limits on concurrent VM clones.
+
+Cloning is storage heavy: a batch of 40 clones landing on the same
+datastore saturates it. Each clone task takes one slot on its datastore and
+one on its cluster before calling Clone; slots live in Redis sorted sets
+(member = task id, score = lease expiry) so a crashed worker's slot frees
+itself once the lease runs out.
+
+Fresh clones also boot on the template's static IP until the provisioning
+playbook applies their own address, so two clones of the same template
+powered on together would answer on the same IP. template_ip_lock() names
+a per (vCenter, template IP) lock taken before the power-on and released
+once the VM answers on its new IP, or once a failed VM has been powered
+off (deploy.tasks.leave_template_ip); it is held by the deployment, not by
+a task, because it spans the power-on and provisioning stages.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Take every slot or none, dropping expired leases first
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expires = tonumber(ARGV[2])
+local token = ARGV[3]
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    if redis.call('ZSCORE', key, token) == false and redis.call('ZCARD', key) >= tonumber(ARGV[3 + i]) then
+        return 0
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, expires, token)
+    redis.call('EXPIRE', key, math.ceil(expires - now))
+end
+return 1
+"""
+
+# Take the lock if it is free (or already ours), refreshing the lease
+TEMPLATE_IP_ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+TEMPLATE_IP_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def clone_slots(vcenter_id, datastore, cluster):
+    """Return [(redis key, limit)] for a clone on `datastore` in `cluster`"""
+    return [
+        (f'diaken:clone-slots:{vcenter_id}:datastore:{datastore}',
+         getattr(settings, 'DEPLOY_MAX_CLONES_PER_DATASTORE', 2)),
+        (f'diaken:clone-slots:{vcenter_id}:cluster:{cluster}',
+         getattr(settings, 'DEPLOY_MAX_CLONES_PER_CLUSTER', 4)),
+    ]
+
+
+def acquire_slots(slots, token, lease=None):
+    """
+    Try to take every slot for `token`
+
+    Args:
+        slots: [(key, limit)] as returned by clone_slots()
+        token: Unique holder id (the Celery task id)
+        lease: Seconds before an unreleased slot expires
+
+    Returns:
+        bool: True if all slots were taken
+    """
+    from history.stream import get_redis_client
+
+    lease = lease or getattr(settings, 'DEPLOY_CLONE_SLOT_LEASE', 3600)
+    now = time.time()
+    keys = [key for key, _ in slots]
+    limits = [limit for _, limit in slots]
+    client = get_redis_client()
+    return bool(client.eval(ACQUIRE_SCRIPT, len(keys), *keys, now, now + lease, token, *limits))
+
+
+def release_slots(slots, token):
+    """Give back slots taken with acquire_slots(); never raises"""
+    from history.stream import get_redis_client
+
+    try:
+        client = get_redis_client()
+        for key, _ in slots:
+            client.zrem(key, token)
+    except Exception as e:
+        logger.warning(f'[CLONE-SLOTS] Could not release slots for {token}: {e}')
+
+
+def template_ip_lock(vcenter_id, template_ip):
+    """Return the redis key serializing clones that boot on `template_ip`"""
+    return f'diaken:template-ip:{vcenter_id}:{template_ip}'
+
+
+def deployment_token(history_id):
+    """Holder id of the template IP lock for a deployment"""
+    return f'deployment-{history_id}'
+
+
+def acquire_template_ip(key, token, lease=None):
+    """
+    Try to take the template IP lock for `token`
+
+    Args:
+        key: Lock key as returned by template_ip_lock()
+        token: Holder id (see deployment_token())
+        lease: Seconds before an unreleased lock expires
+
+    Returns:
+        bool: True if the lock is held by `token`
+    """
+    from history.stream import get_redis_client
+
+    lease = lease or getattr(settings, 'DEPLOY_TEMPLATE_IP_LEASE', 1800)
+    client = get_redis_client()
+    return bool(client.eval(TEMPLATE_IP_ACQUIRE_SCRIPT, 1, key, token, lease))
+
+
+def release_template_ip(key, token):
+    """Release the template IP lock if `token` holds it; never raises"""
+    from history.stream import get_redis_client
+
+    if not key:
+        return
+    try:
+        if get_redis_client().eval(TEMPLATE_IP_RELEASE_SCRIPT, 1, key, token):
+            logger.info(f'[CLONE-SLOTS] Template IP lock {key} released by {token}')
+    except Exception as e:
+        logger.warning(f'[CLONE-SLOTS] Could not release template IP lock {key} for {token}: {e}')
@@ -14,6 +14,10 @@ def change_vm_network_govc(vcenter_host, vcenter_user, vcenter_password, vm_name
     """
     Change VM network using govc CLI
     
+    Deprecated: the provisioning tasks use
+    deploy.vcenter_network.change_vm_network_pooled(), which does the same
+    on a pooled session without forking govc.
+    
     Args:
         vcenter_host: vCenter hostname or IP
         vcenter_user: vCenter username
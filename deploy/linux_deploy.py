@@ -0,0 +1,85 @@
+"""
+Helpers shared by the single VM form (views.deploy_vm) and the bulk deploy
+API (views_bulk) to start a Linux VM deployment.
+"""
+import logging
+
+from history.models import DeploymentHistory
+from settings.models import GlobalSetting
+
+logger = logging.getLogger('deploy.linux_deploy')
+
+
+def get_template_ip(os_family):
+    """
+    Return (GlobalSetting key, template IP) used for the first SSH connection
+    to a fresh clone; the IP is None when the setting is missing.
+    """
+    template_ip_key = 'ubuntu_template_ip' if os_family == 'debian' else 'ip_template'
+    setting = GlobalSetting.objects.filter(key=template_ip_key).first()
+    return template_ip_key, setting.value if setting else None
+
+
+def start_linux_deployment(user, vcenter, clone_params, provision_params, environment, batch=None):
+    """
+    Create the DeploymentHistory record and dispatch the clone stage.
+
+    Args:
+        user: User starting the deployment
+        vcenter: VCenterCredential
+        clone_params: Parameters of clone_linux_vm_async (datacenter, cluster,
+                      resource_pool, datastore, network, template, hostname, folder_path)
+        provision_params: Parameters of provision_linux_vm_async
+        environment: Environment name recorded on the history
+        batch: Optional DeploymentBatch
+
+    Returns:
+        tuple: (DeploymentHistory, celery AsyncResult)
+
+    Raises:
+        Exception: the clone task could not be queued (the history is marked failed)
+    """
+    from django.utils import timezone
+    from deploy.tasks import clone_linux_vm_async
+
+    history_record = DeploymentHistory.objects.create(
+        user=user,
+        environment=environment,
+        target=clone_params['hostname'],
+        target_type='VM',
+        playbook='Basic Setup',
+        status='pending',
+        hostname=clone_params['hostname'],
+        ip_address=provision_params['new_ip'],
+        datacenter=clone_params['datacenter'],
+        cluster=clone_params['cluster'],
+        template=clone_params['template'],
+        batch=batch,
+    )
+
+    logger.info(f"DEPLOY: Dispatching async clone task for VM: {clone_params['hostname']} on vCenter: {vcenter.name}")
+
+    # Clone/reconfig run in Celery; the clone task then dispatches
+    # power_on_linux_vm_async, which waits for the template IP lock,
+    # powers the VM on and dispatches provision_linux_vm_async
+    try:
+        celery_task = clone_linux_vm_async.delay(
+            history_id=history_record.pk,
+            vcenter_id=vcenter.pk,
+            clone_params=clone_params,
+            provision_params=provision_params,
+        )
+    except Exception as e:
+        logger.error(f"DEPLOY: Could not dispatch clone task for {clone_params['hostname']}: {e}")
+        history_record.append_output(f"❌ Could not queue the deployment: {e}\n")
+        history_record.status = 'failed'
+        history_record.completed_at = timezone.now()
+        history_record.save()
+        raise
+
+    logger.info(f'DEPLOY: Celery task dispatched: {celery_task.id}')
+
+    history_record.celery_task_id = celery_task.id
+    history_record.status = 'running'
+    history_record.save()
+    return history_record, celery_task
@@ -2,7 +2,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from inventory.models import Host
 from settings.models import GlobalSetting
-from deploy.vcenter_snapshot import get_vcenter_connection, cleanup_old_snapshots, Disconnect
+from deploy.vcenter_snapshot import get_vcenter_connection, cleanup_old_snapshots, release_vcenter_connection
 import logging
 
 logger = logging.getLogger(__name__)
@@ -72,7 +72,7 @@ class Command(BaseCommand):
                     else:
                         self.stdout.write(f'    No expired snapshots found for {host.name}')
                 
-                Disconnect(si)
+                release_vcenter_connection(si)
                 
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Error processing vCenter {vcenter_server}: {e}'))
@@ -0,0 +1,290 @@
+"""
+SSH readiness probing for freshly cloned or rebooted VMs.
+
+Instead of sleeping a fixed time and polling connect_ex every 5 seconds,
+wait_for_ssh() retries with exponential backoff and only reports the host
+ready once sshd answers with its banner (an open port alone can be a
+half-started sshd or a firewall). When a ToolsHeartbeat is given, the
+VMware Tools guest heartbeat turning green wakes the prober right away
+instead of waiting out the current backoff delay.
+
+Probes are coroutines, so one worker can wait on many VMs at once:
+
+    from deploy.readiness import probe_ssh, probe_ssh_many
+
+    result = probe_ssh('10.0.0.15', timeout=120)
+    if result.ready:
+        print(f'SSH up after {result.elapsed:.1f}s')
+
+    results = probe_ssh_many(['10.0.0.21', '10.0.0.22', '10.0.0.23'])
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from pyVmomi import vim, vmodl
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeResult:
+    """Outcome of waiting for one host"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.ready = False
+        self.elapsed = 0.0      # seconds until ready (or until giving up)
+        self.attempts = 0
+        self.banner = None
+        self.error = None
+        self.heartbeat = None   # True/False once the tools heartbeat wait finished
+
+    def __repr__(self):
+        state = 'ready' if self.ready else 'not ready'
+        return f'<ProbeResult {self.host}:{self.port} {state} after {self.elapsed:.1f}s ({self.attempts} attempts)>'
+
+    def as_dict(self):
+        return {
+            'host': self.host,
+            'port': self.port,
+            'ready': self.ready,
+            'elapsed': round(self.elapsed, 1),
+            'attempts': self.attempts,
+            'banner': self.banner,
+            'error': self.error,
+            'heartbeat': self.heartbeat,
+        }
+
+
+class ToolsHeartbeat:
+    """
+    Blocking wait for a VM's guest heartbeat (guest.guestHeartbeatStatus) to
+    turn green, driven by WaitForUpdatesEx on a private PropertyCollector.
+
+    Runs in a worker thread next to the asyncio probes; cancel() makes it
+    return within `poll_seconds`. With `after_reboot`, a heartbeat that is
+    already green when the wait starts is ignored until it has dropped once.
+    """
+
+    def __init__(self, si, vm, after_reboot=False, poll_seconds=5):
+        self.si = si
+        self.vm = vm
+        self.after_reboot = after_reboot
+        self.poll_seconds = poll_seconds
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self, timeout):
+        """
+        Returns:
+            bool: True once the heartbeat is green, False on timeout/cancel
+        """
+        collector = self.si.content.propertyCollector.CreatePropertyCollector()
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=self.vm, skip=False)],
+            propSet=[vmodl.query.PropertyCollector.PropertySpec(
+                type=vim.VirtualMachine,
+                pathSet=['guest.guestHeartbeatStatus'],
+                all=False
+            )]
+        )
+        property_filter = collector.CreateFilter(filter_spec, partialUpdates=True)
+        deadline = time.monotonic() + timeout
+        version = ''
+        seen_down = not self.after_reboot
+
+        try:
+            while not self._cancelled.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                options = vmodl.query.PropertyCollector.WaitOptions(
+                    maxWaitSeconds=max(1, min(self.poll_seconds, int(remaining)))
+                )
+                update_set = collector.WaitForUpdatesEx(version, options)
+                if update_set is None:
+                    continue
+                version = update_set.version
+                for filter_update in update_set.filterSet or []:
+                    for object_update in filter_update.objectSet or []:
+                        for change in object_update.changeSet or []:
+                            if change.name != 'guest.guestHeartbeatStatus':
+                                continue
+                            if change.val != 'green':
+                                seen_down = True
+                            elif seen_down:
+                                return True
+            return False
+        finally:
+            try:
+                property_filter.Destroy()
+                collector.DestroyPropertyCollector()
+            except Exception:
+                pass
+
+
+async def check_ssh(host, port=22, timeout=5, banner=True):
+    """
+    Open one TCP connection and, if `banner`, read the SSH identification line
+
+    Returns:
+        str: The banner ('' when not read)
+
+    Raises:
+        OSError / asyncio.TimeoutError when the port is closed or silent,
+        ConnectionError when something other than sshd answers
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        if not banner:
+            return ''
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if not line.startswith(b'SSH-'):
+            raise ConnectionError(f'Unexpected banner from {host}:{port}: {line[:40]!r}')
+        return line.decode('ascii', errors='replace').strip()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def wait_for_ssh(host, port=22, timeout=120, initial_delay=1.0, max_delay=10.0, factor=2.0,
+                       connect_timeout=5, banner=True, heartbeat=None):
+    """
+    Probe `host` until sshd answers or `timeout` seconds have passed
+
+    Args:
+        host: IP or hostname
+        port: SSH port
+        timeout: Give up after this many seconds
+        initial_delay: First delay between attempts, in seconds
+        max_delay: Cap for the exponential backoff
+        factor: Backoff multiplier
+        connect_timeout: Per-attempt connect/banner timeout
+        banner: Require the SSH banner, not just an open port
+        heartbeat: Optional ToolsHeartbeat; when it turns green the next
+                   attempt happens immediately and the backoff restarts
+
+    Returns:
+        ProbeResult
+    """
+    result = ProbeResult(host, port)
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    deadline = start + timeout
+    wake = asyncio.Event()
+    heartbeat_future = None
+
+    if heartbeat is not None:
+        heartbeat_future = loop.run_in_executor(None, heartbeat.wait, timeout)
+
+        def heartbeat_done(future):
+            try:
+                result.heartbeat = future.result()
+            except Exception as e:
+                logger.warning(f'[READINESS] Tools heartbeat wait failed for {host}: {e}')
+                result.heartbeat = False
+            if result.heartbeat:
+                wake.set()
+
+        heartbeat_future.add_done_callback(heartbeat_done)
+
+    delay = initial_delay
+    try:
+        while True:
+            result.attempts += 1
+            remaining = deadline - time.monotonic()
+            try:
+                result.banner = await check_ssh(host, port, max(0.5, min(connect_timeout, remaining)), banner)
+                result.ready = True
+                break
+            except (OSError, asyncio.TimeoutError, ConnectionError) as e:
+                result.error = str(e) or e.__class__.__name__
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(wake.wait(), min(delay, remaining))
+            except asyncio.TimeoutError:
+                delay = min(delay * factor, max_delay)
+            else:
+                wake.clear()
+                delay = initial_delay
+                logger.info(f'[READINESS] Tools heartbeat green on {host}, probing SSH now')
+    finally:
+        result.elapsed = time.monotonic() - start
+        if heartbeat_future is not None and not heartbeat_future.done():
+            heartbeat.cancel()
+
+    if result.ready:
+        result.error = None
+        logger.info(f'[READINESS] ✓ SSH ready on {host}:{port} after {result.elapsed:.1f}s ({result.attempts} attempts)')
+    else:
+        logger.warning(f'[READINESS] SSH not ready on {host}:{port} after {result.elapsed:.1f}s: {result.error}')
+    return result
+
+
+async def wait_for_ssh_many(targets, **kwargs):
+    """
+    Probe several hosts concurrently
+
+    Args:
+        targets: Hosts, or dicts of wait_for_ssh() arguments with at least 'host'
+        **kwargs: Defaults applied to every target
+
+    Returns:
+        list of ProbeResult in the order of `targets`
+    """
+    probes = []
+    for target in targets:
+        params = dict(kwargs)
+        params.update(target if isinstance(target, dict) else {'host': target})
+        probes.append(wait_for_ssh(**params))
+    return await asyncio.gather(*probes)
+
+
+def probe_ssh(host, **kwargs):
+    """Synchronous wait_for_ssh() for Celery tasks"""
+    return asyncio.run(wait_for_ssh(host, **kwargs))
+
+
+def probe_ssh_many(targets, **kwargs):
+    """Synchronous wait_for_ssh_many() for Celery tasks"""
+    return asyncio.run(wait_for_ssh_many(targets, **kwargs))
+
+
+def probe_vm_ssh(host, vcenter_host, vcenter_user, vcenter_password, vm_name, after_reboot=False, **kwargs):
+    """
+    probe_ssh() using the guest heartbeat of `vm_name` as wake-up signal.
+    Falls back to plain SSH probing when vCenter or the VM can't be reached.
+
+    Returns:
+        ProbeResult
+    """
+    from .vcenter_pool import vcenter_pool
+    from .vcenter_index import find_vm
+
+    si = None
+    vm = None
+    try:
+        si = vcenter_pool.acquire(vcenter_host, vcenter_user, vcenter_password)
+        vm, _ = find_vm(si, vm_name)
+    except Exception as e:
+        logger.warning(f'[READINESS] Tools heartbeat unavailable for {vm_name}, probing SSH only: {e}')
+        if si is not None:
+            vcenter_pool.release(si, discard=True)
+            si = None
+
+    try:
+        heartbeat = ToolsHeartbeat(si, vm, after_reboot=after_reboot) if vm is not None else None
+        return probe_ssh(host, heartbeat=heartbeat, **kwargs)
+    finally:
+        if si is not None:
+            vcenter_pool.release(si)
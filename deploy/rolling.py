@@ -0,0 +1,298 @@
+"""
+Rolling execution of group playbooks.
+
+A group run with rolling options is split into batches (history
+ExecutionBatch rows) that run one after another, each as its own Celery
+task (deploy.tasks.execute_rollout_batch) with its own output stream and
+timeout, the way Ansible's `serial` / `max_fail_percentage` work:
+
+    batch_size            hosts per batch: "5" or a percentage of the group ("20%")
+    max_fail_percentage   stop when more than this % of the hosts of a batch failed
+    forks                 hosts run in parallel within a batch (--forks)
+
+Every batch task calls advance_rollout() when it ends: it queues the next
+batch or, once the failed hosts of that batch exceed the threshold, skips
+the remaining batches and closes the parent history as failed.
+
+The run itself is described by a plain dict (`spec`) passed from batch to
+batch:
+
+    {'group': 'target_group',                 # inventory group
+     'hosts': {'<host id>': '<inventory line>'},
+     'group_vars': ['group_name=web', ...],   # [group:vars] lines
+     'playbook': '/path/to/playbook.yml',
+     'args': ['--extra-vars', '{...}', '-v'],
+     'os_type': 'linux' | 'windows',
+     'target': {'type': 'group', 'name': 'web'},
+     'max_fail_percentage': 0, 'forks': 5}
+"""
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('deploy.rolling')
+
+ROLLING_VALUES = ('1', 'on', 'true')
+
+
+def default_forks():
+    return getattr(settings, 'ROLLING_DEFAULT_FORKS', 5)
+
+
+def batch_time_limits():
+    """
+    Celery (soft, hard) time limits for one batch task, derived from
+    ROLLING_BATCH_TIMEOUT so the playbook is always killed by the batch
+    timeout (and its result recorded) before Celery stops the task
+    """
+    timeout = getattr(settings, 'ROLLING_BATCH_TIMEOUT', 3600)
+    return timeout + 300, timeout + 600
+
+
+def parse_batch_size(value):
+    """
+    Normalize a batch size: a number of hosts or a percentage
+
+    Raises:
+        ValueError: not a positive number or a percentage from 1% to 100%
+    """
+    value = (value or '').strip().replace(' ', '')
+    percent = value.endswith('%')
+    try:
+        size = int(value[:-1] if percent else value)
+    except ValueError:
+        raise ValueError(f'Invalid batch size "{value}": use a number of hosts or a percentage (e.g. 5 or 20%)')
+    if size < 1 or (percent and size > 100):
+        raise ValueError('Batch size must be at least 1 host or a percentage from 1% to 100%')
+    return f'{size}%' if percent else str(size)
+
+
+def rolling_options(data):
+    """
+    Rolling options posted by the group execution forms
+
+    Args:
+        data: request.POST (rolling, rolling_batch_size, rolling_max_fail_percentage, rolling_forks)
+
+    Returns:
+        dict: {'batch_size', 'max_fail_percentage', 'forks'}, or None when rolling is off
+
+    Raises:
+        ValueError: invalid values
+    """
+    if (data.get('rolling') or '').lower() not in ROLLING_VALUES:
+        return None
+    batch_size = parse_batch_size(data.get('rolling_batch_size'))
+    try:
+        max_fail = int(data.get('rolling_max_fail_percentage') or 0)
+        forks = int(data.get('rolling_forks') or default_forks())
+    except ValueError:
+        raise ValueError('Max fail percentage and parallel hosts must be whole numbers')
+    if not 0 <= max_fail <= 100:
+        raise ValueError('Max fail percentage must be between 0 and 100')
+    max_forks = getattr(settings, 'ROLLING_MAX_FORKS', 50)
+    if not 1 <= forks <= max_forks:
+        raise ValueError(f'Parallel hosts must be between 1 and {max_forks}')
+    return {'batch_size': batch_size, 'max_fail_percentage': max_fail, 'forks': forks}
+
+
+def rolling_fields(data):
+    """
+    ScheduledTask field values for the rolling options of a form
+
+    Returns:
+        dict: keyword arguments for ScheduledTask (empty when rolling is off)
+
+    Raises:
+        ValueError: invalid values
+    """
+    options = rolling_options(data)
+    if options is None:
+        return {}
+    return {
+        'rolling_batch_size': options['batch_size'],
+        'rolling_max_fail_percentage': options['max_fail_percentage'],
+        'rolling_forks': options['forks'],
+    }
+
+
+def task_rolling_options(task):
+    """Rolling options of a ScheduledTask (None when it runs the whole group at once)"""
+    if not task.rolling_batch_size:
+        return None
+    return {
+        'batch_size': task.rolling_batch_size,
+        'max_fail_percentage': task.rolling_max_fail_percentage,
+        'forks': task.rolling_forks or default_forks(),
+    }
+
+
+def plan_batches(items, batch_size):
+    """
+    Split items into consecutive batches
+
+    A percentage is taken from the total and rounded down, with at least
+    one item per batch (same as Ansible's serial).
+    """
+    items = list(items)
+    if batch_size.endswith('%'):
+        size = max(1, len(items) * int(batch_size[:-1]) // 100)
+    else:
+        size = int(batch_size)
+    return [items[offset:offset + size] for offset in range(0, len(items), size)]
+
+
+def start_rollout(history, hosts, options, spec):
+    """
+    Create the batches of a rolling execution and queue the first one
+
+    Args:
+        history: parent DeploymentHistory or ScheduledTaskHistory (status 'running')
+        hosts: Host objects, in rollout order; each needs an entry in spec['hosts']
+        options: rolling options (see rolling_options())
+        spec: run description (see module docstring)
+
+    Returns:
+        int: number of batches
+
+    Raises:
+        Exception: the first batch could not be queued
+    """
+    from history.models import ExecutionBatch
+
+    owner = {history.output_chunk_field: history}
+    planned = plan_batches(hosts, options['batch_size'])
+    ExecutionBatch.objects.bulk_create([
+        ExecutionBatch(
+            index=index,
+            host_ids=[host.id for host in batch_hosts],
+            host_names=[host.name for host in batch_hosts],
+            **owner
+        )
+        for index, batch_hosts in enumerate(planned)
+    ])
+    spec = dict(spec, max_fail_percentage=options['max_fail_percentage'], forks=options['forks'])
+
+    history.append_output(
+        f"=== Rolling execution: {len(hosts)} hosts in {len(planned)} batches "
+        f"(batch size {options['batch_size']}, max fail {options['max_fail_percentage']}%, "
+        f"{options['forks']} parallel) ===\n"
+    )
+    logger.info(f'[ROLLING] {history._meta.label} {history.pk}: {len(hosts)} hosts in {len(planned)} batches')
+
+    try:
+        queue_batch(history.execution_batches.get(index=0), spec)
+    except Exception:
+        history.execution_batches.update(status='skipped')
+        raise
+    return len(planned)
+
+
+def queue_batch(batch, spec):
+    """Send one batch to Celery (keeps the scheduler lease alive while it waits)"""
+    from deploy.tasks import execute_rollout_batch
+    from history.models import DeploymentHistory, ExecutionBatch
+
+    soft_limit, hard_limit = batch_time_limits()
+    result = execute_rollout_batch.apply_async(
+        args=[batch.id, spec],
+        soft_time_limit=soft_limit,
+        time_limit=hard_limit,
+    )
+    ExecutionBatch.objects.filter(pk=batch.pk).update(celery_task_id=result.id)
+    if batch.deployment_id:
+        # La página de estado consulta la tarea Celery del lote en curso
+        DeploymentHistory.objects.filter(pk=batch.deployment_id).update(celery_task_id=result.id)
+    else:
+        from scheduler.leases import hand_off_lease
+        hand_off_lease([batch.scheduled_history.scheduled_task_id])
+    logger.info(f'[ROLLING] Batch {batch.id} (#{batch.index + 1}) queued: {result.id}')
+
+
+def advance_rollout(batch, spec):
+    """
+    Continue a rollout after one of its batches finished
+
+    Queues the next pending batch, or skips the rest when the hosts that
+    failed in `batch` exceed spec['max_fail_percentage'] of that batch, and
+    closes the parent history once nothing is left to run.
+    """
+    from history.models import ExecutionBatch
+
+    parent = batch.parent
+    parent.refresh_from_db()
+    batch.refresh_from_db()
+    batches = list(parent.execution_batches.all())
+    pending = [item for item in batches if item.status == 'pending']
+    # Como max_fail_percentage de Ansible: se mide sobre el lote que acaba de terminar
+    total = len(batch.host_ids)
+    failed = len(batch.failed_hosts)
+    percentage = failed * 100 / total if total else 0
+
+    if pending and parent.status != 'running':
+        # Cancelado o cerrado desde fuera: no seguir lanzando lotes
+        ExecutionBatch.objects.filter(pk__in=[item.pk for item in pending]).update(status='skipped')
+        logger.info(f'[ROLLING] {parent._meta.label} {parent.pk} is {parent.status}, {len(pending)} batches skipped')
+        return
+
+    if pending and percentage > spec['max_fail_percentage']:
+        ExecutionBatch.objects.filter(pk__in=[item.pk for item in pending]).update(status='skipped')
+        parent.append_output(
+            f"\n=== Rollout stopped: {failed}/{total} hosts of batch {batch.index + 1} failed ({percentage:.0f}% > "
+            f"{spec['max_fail_percentage']}%), {len(pending)} batches skipped ===\n"
+        )
+        logger.warning(f'[ROLLING] {parent._meta.label} {parent.pk} stopped after batch {batch.index + 1}: {failed}/{total} hosts of the batch failed')
+        finish_rollout(parent, spec)
+        return
+
+    if pending:
+        try:
+            queue_batch(pending[0], spec)
+            return
+        except Exception as e:
+            logger.error(f'[ROLLING] Could not queue batch {pending[0].id}: {e}')
+            ExecutionBatch.objects.filter(pk__in=[item.pk for item in pending]).update(status='skipped')
+            parent.append_output(f"\n=== Rollout stopped: could not queue batch {pending[0].index + 1}: {e} ===\n")
+
+    finish_rollout(parent, spec)
+
+
+def finish_rollout(parent, spec):
+    """Write the rollout summary, set the final status and notify"""
+    batches = list(parent.execution_batches.all())
+    failed_hosts = [host for batch in batches for host in batch.failed_hosts]
+    success = all(batch.status == 'success' for batch in batches)
+    now = timezone.now()
+
+    lines = ['\n=== Rollout summary ===']
+    for batch in batches:
+        failed = f" - failed: {', '.join(batch.failed_hosts)}" if batch.failed_hosts else ''
+        lines.append(f"Batch {batch.index + 1}/{len(batches)} [{batch.status}] {', '.join(batch.host_names)}{failed}")
+    parent.append_output('\n'.join(lines) + '\n')
+
+    parent.status = 'success' if success else 'failed'
+    if parent.output_chunk_field == 'deployment':
+        parent.completed_at = now
+        parent.save()
+        try:
+            from notifications.utils import send_playbook_notification
+            from django.contrib.auth.models import User
+            user = parent.user or User.objects.filter(is_superuser=True).first()
+            send_playbook_notification(parent, user, spec['target'], os_type=spec['os_type'])
+        except Exception as notif_error:
+            logger.warning(f'[ROLLING] Failed to send notification: {notif_error}')
+    else:
+        from scheduler.leases import release_lease
+        parent.execution_duration = int((now - parent.executed_at).total_seconds())
+        if not success:
+            parent.error_message = f"{len(failed_hosts)} hosts failed: {', '.join(failed_hosts)}" if failed_hosts else 'Rollout stopped'
+        parent.save()
+        release_lease(parent.scheduled_task_id)
+        try:
+            from notifications.utils import send_scheduled_task_notification
+            send_scheduled_task_notification(parent, parent.scheduled_task)
+        except Exception as notif_error:
+            logger.warning(f'[ROLLING] Failed to send notification: {notif_error}')
+
+    logger.info(f'[ROLLING] {parent._meta.label} {parent.pk} finished: {parent.status}, {len(failed_hosts)} failed hosts')
@@ -0,0 +1,147 @@
+"""
+Parallel script execution over SSH.
+
+Runs `sudo bash -s` on up to `forks` hosts at a time (like ansible --forks)
+from a thread pool. Each worker only drives its ssh subprocess and reports
+through a queue; the caller consumes the events in its own thread, so all
+database writes stay on the task's connection:
+
+    for event in run_script_parallel(hosts, script, forks=10, timeout=600):
+        if event is None:
+            ...                 # idle tick, flush buffered output
+        kind, index, payload = event
+
+Events are ('start', index, None), ('line', index, text) and
+('done', index, {'exit_code', 'timed_out', 'duration', 'error'}), where
+index is the position of the host in `hosts`.
+
+Connections use SSH ControlMaster sockets, so scripts run again on the same
+hosts within ControlPersist reuse the authenticated connection.
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def find_ssh():
+    """Return the path of the ssh client or raise"""
+    ssh_path = shutil.which('ssh')
+    if not ssh_path:
+        for path in ['/usr/bin/ssh', '/bin/ssh']:
+            if os.path.exists(path):
+                ssh_path = path
+                break
+    if not ssh_path:
+        raise Exception('ssh command not found')
+    return ssh_path
+
+
+def ssh_command(ssh_path, host_ip, user, key_path, control_dir, control_persist=60):
+    """Build the ssh command running a script read from stdin with sudo"""
+    return [
+        ssh_path,
+        '-i', key_path,
+        '-o', 'StrictHostKeyChecking=no',
+        '-o', 'UserKnownHostsFile=/dev/null',
+        '-o', 'BatchMode=yes',
+        '-o', 'ControlMaster=auto',
+        '-o', f'ControlPath={os.path.join(control_dir, "%C")}',
+        '-o', f'ControlPersist={control_persist}',
+        f'{user}@{host_ip}',
+        'sudo bash -s'
+    ]
+
+
+def _run_on_host(index, cmd, script_content, timeout, events):
+    events.put(('start', index, None))
+    start = time.monotonic()
+    timed_out = threading.Event()
+    process = None
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            try:
+                process.stdin.write(script_content)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            for line in process.stdout:
+                events.put(('line', index, line))
+            exit_code = process.wait()
+        finally:
+            timer.cancel()
+        events.put(('done', index, {
+            'exit_code': None if timed_out.is_set() else exit_code,
+            'timed_out': timed_out.is_set(),
+            'duration': time.monotonic() - start,
+            'error': f'Timeout after {timeout}s' if timed_out.is_set() else None,
+        }))
+    except Exception as e:
+        if process is not None and process.poll() is None:
+            process.kill()
+        events.put(('done', index, {
+            'exit_code': None,
+            'timed_out': False,
+            'duration': time.monotonic() - start,
+            'error': str(e),
+        }))
+
+
+def run_script_parallel(hosts, script_content, forks=10, timeout=600, control_dir='/tmp/diaken-ssh',
+                        control_persist=60, idle_tick=1.0):
+    """
+    Run a script on every host with at most `forks` concurrent ssh sessions
+
+    Args:
+        hosts: List of dicts with 'ip', 'ansible_user' and 'ssh_key'
+        script_content: Script piped to `sudo bash -s`
+        forks: Maximum concurrent hosts
+        timeout: Per-host timeout in seconds
+        control_dir: Directory for ControlMaster sockets
+        control_persist: Seconds a master connection outlives its last session
+        idle_tick: Yield None after this many seconds without events
+
+    Yields:
+        Event tuples (see module docstring) or None on idle ticks
+    """
+    ssh_path = find_ssh()
+    os.makedirs(control_dir, mode=0o700, exist_ok=True)
+    events = queue.Queue()
+    pending = len(hosts)
+
+    with ThreadPoolExecutor(max_workers=max(1, forks), thread_name_prefix='script-ssh') as pool:
+        for index, host in enumerate(hosts):
+            cmd = ssh_command(ssh_path, host['ip'], host['ansible_user'], host['ssh_key'],
+                              control_dir, control_persist)
+            pool.submit(_run_on_host, index, cmd, script_content, timeout, events)
+
+        while pending:
+            try:
+                event = events.get(timeout=idle_tick)
+            except queue.Empty:
+                yield None
+                continue
+            if event[0] == 'done':
+                pending -= 1
+            yield event
@@ -28,7 +28,10 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
         scheduled_task_history_id: ID of ScheduledTaskHistory record (for scheduled tasks, optional)
     """
     from history.models import DeploymentHistory
+    from history.output_store import OutputChunkWriter
+    from history.ansible_events import AnsibleEventRecorder, ansible_events_env
     from scheduler.models import ScheduledTaskHistory
+    from scheduler.leases import LeaseHeartbeat
     from django.conf import settings
     import subprocess
     import os
@@ -36,6 +39,7 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
     inventory_path = None
     history_record = None
     scheduled_history = None
+    recorder = None
     
     try:
         # Determine which history model to use
@@ -43,6 +47,8 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
             scheduled_history = ScheduledTaskHistory.objects.get(pk=scheduled_task_history_id)
             scheduled_history.status = 'running'
             scheduled_history.save()
+            # Keep the scheduler lease alive while the playbook runs; stops by itself when the history finishes
+            LeaseHeartbeat(scheduled_history.scheduled_task_id, history_id=scheduled_history.id).start()
             target_name = scheduled_history.target_name
             playbook_name = scheduled_history.playbook_name
         else:
@@ -98,6 +104,10 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
             'ANSIBLE_LOG_PATH': ansible_log_file
         })
         
+        # Structured per-host/per-task results from the diaken_events callback
+        recorder = AnsibleEventRecorder(scheduled_history or history_record)
+        env = ansible_events_env(env, recorder.path)
+        
         # Execute playbook with real-time output capture
         import select
         from threading import Timer
@@ -116,20 +126,13 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
         timer = Timer(timeout_seconds, lambda: process.kill())
         timer.start()
         
-        output_lines = []
+        output_writer = OutputChunkWriter(scheduled_history or history_record)
         try:
-            # Read output line by line in real-time
+            # Read output line by line in real-time, storing only new lines every 10 lines
             for line in iter(process.stdout.readline, ''):
                 if line:
-                    output_lines.append(line)
-                    # Update DB every 10 lines for performance
-                    if len(output_lines) % 10 == 0:
-                        if scheduled_history:
-                            scheduled_history.ansible_output = ''.join(output_lines)
-                            scheduled_history.save(update_fields=['ansible_output'])
-                        elif history_record:
-                            history_record.ansible_output = ''.join(output_lines)
-                            history_record.save(update_fields=['ansible_output'])
+                    output_writer.write(line)
+                    recorder.poll()
             
             # Wait for process to complete
             return_code = process.wait()
@@ -141,13 +144,16 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
             raise e
         
         # Final output update
-        output = ''.join(output_lines)
+        output_writer.flush()
+        recorder.finish()
         
         logger.info(f'[CELERY-{self.request.id}] Playbook execution completed with return code: {return_code}')
+        if recorder.recap is not None:
+            failed_hosts = [host for host, counts in recorder.recap.items() if counts['failures'] or counts['unreachable']]
+            logger.info(f'[CELERY-{self.request.id}] {recorder.results} task results recorded, failed hosts: {failed_hosts or "none"}')
         
         # Update history record
         if scheduled_history:
-            scheduled_history.ansible_output = output
             scheduled_history.status = 'success' if return_code == 0 else 'failed'
             scheduled_history.completed_at = timezone.now()
             # Calculate execution duration
@@ -155,7 +161,6 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
             scheduled_history.execution_duration = int(duration)
             scheduled_history.save()
         elif history_record:
-            history_record.ansible_output = output
             history_record.status = 'success' if return_code == 0 else 'failed'
             history_record.completed_at = timezone.now()
             history_record.save()
@@ -179,13 +184,13 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
         try:
             if scheduled_history:
                 scheduled_history.status = 'failed'
-                scheduled_history.ansible_output = "Error: Playbook execution timed out after 50 minutes"
+                scheduled_history.append_output("\nError: Playbook execution timed out after 50 minutes\n")
                 scheduled_history.error_message = "Timeout after 50 minutes"
                 scheduled_history.completed_at = timezone.now()
                 scheduled_history.save()
             elif history_record:
                 history_record.status = 'failed'
-                history_record.ansible_output = "Error: Playbook execution timed out after 50 minutes"
+                history_record.append_output("\nError: Playbook execution timed out after 50 minutes\n")
                 history_record.completed_at = timezone.now()
                 history_record.save()
         except:
@@ -195,16 +200,21 @@ def execute_playbook_async(self, history_id, inventory_content, execution_file,
         return {'status': 'error', 'message': 'Timeout after 50 minutes'}
     except Exception as e:
         logger.error(f'[CELERY-{self.request.id}] Error executing playbook: {str(e)}', exc_info=True)
+        if recorder:
+            try:
+                recorder.finish()
+            except Exception:
+                pass
         try:
             if scheduled_history:
                 scheduled_history.status = 'failed'
-                scheduled_history.ansible_output = f"Error: {str(e)}"
+                scheduled_history.append_output(f"\nError: {str(e)}\n")
                 scheduled_history.error_message = str(e)
                 scheduled_history.completed_at = timezone.now()
                 scheduled_history.save()
             elif history_record:
                 history_record.status = 'failed'
-                history_record.ansible_output = f"Error: {str(e)}"
+                history_record.append_output(f"\nError: {str(e)}\n")
                 history_record.completed_at = timezone.now()
                 history_record.save()
         except:
@@ -228,6 +238,7 @@ def execute_group_playbook_async(self, history_id, host_ids, playbook_id):
     from playbooks.models import Playbook
     from inventory.models import Host
     from settings.models import GlobalSetting
+    from history.ansible_events import AnsibleEventRecorder, ansible_events_env
     from django.conf import settings
     import subprocess
     import tempfile
@@ -291,13 +302,20 @@ def execute_group_playbook_async(self, history_id, host_ids, playbook_id):
             ansible_env['ANSIBLE_HOST_KEY_CHECKING'] = 'False'
             ansible_env['ANSIBLE_LOG_PATH'] = ansible_log_file
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=1800,  # 30 minutes
-                env=ansible_env
-            )
+            # Structured per-host/per-task results from the diaken_events callback
+            recorder = AnsibleEventRecorder(history_record)
+            ansible_env = ansible_events_env(ansible_env, recorder.path)
+            
+            try:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=1800,  # 30 minutes
+                    env=ansible_env
+                )
+            finally:
+                recorder.finish()
             
             # Combine output
             full_output = f"STDOUT:\n{result.stdout}\n\nSTDERR:\n{result.stderr}"
@@ -340,12 +358,16 @@ def execute_group_playbook_async(self, history_id, host_ids, playbook_id):
 @shared_task(
     bind=True,
     name='deploy.tasks.execute_script_async',
-    time_limit=900,  # 15 minutes hard limit
-    soft_time_limit=840  # 14 minutes soft limit
+    time_limit=3600,  # 1 hour hard limit (large groups)
+    soft_time_limit=3540  # 59 minutes soft limit
 )
 def execute_script_async(self, history_id, script_content, hosts_data, ansible_user, ssh_key_path):
     """
-    Execute a script on multiple hosts asynchronously with real-time output.
+    Execute a script on multiple hosts in parallel with real-time output.
+    
+    Hosts run through a pool of SCRIPT_EXECUTION_FORKS ssh sessions; output
+    lines are streamed as chunks prefixed with the host name and every host
+    gets a HostExecutionResult row (status, exit code, duration).
     
     Args:
         history_id: ID of the DeploymentHistory record
@@ -354,10 +376,10 @@ def execute_script_async(self, history_id, script_content, hosts_data, ansible_u
         ansible_user: Default SSH user
         ssh_key_path: Default SSH key path
     """
-    from history.models import DeploymentHistory
-    import subprocess
-    import os
-    import shutil
+    from history.models import DeploymentHistory, HostExecutionResult
+    from history.output_store import OutputChunkWriter
+    from django.conf import settings
+    from deploy.script_runner import run_script_parallel
     
     history_record = None
     
@@ -367,115 +389,137 @@ def execute_script_async(self, history_id, script_content, hosts_data, ansible_u
         history_record.celery_task_id = self.request.id
         history_record.save()
         
-        logger.info(f'[SCRIPT-ASYNC] Starting script execution on {len(hosts_data)} host(s)')
-        
-        # Build output
-        full_output = f"Script Execution\n"
-        full_output += f"Hosts: {len(hosts_data)}\n"
-        full_output += "="*60 + "\n\n"
-        
-        # Update initial output
-        history_record.output = full_output
-        history_record.save()
-        
-        all_success = True
-        
-        # Find ssh command
-        ssh_path = shutil.which('ssh')
-        if not ssh_path:
-            for path in ['/usr/bin/ssh', '/bin/ssh']:
-                if os.path.exists(path):
-                    ssh_path = path
-                    break
-        
-        if not ssh_path:
-            raise Exception('ssh command not found')
+        forks = getattr(settings, 'SCRIPT_EXECUTION_FORKS', 10)
+        host_timeout = getattr(settings, 'SCRIPT_HOST_TIMEOUT', 600)
+        logger.info(f'[SCRIPT-ASYNC] Starting script execution on {len(hosts_data)} host(s), forks={forks}')
+        
+        hosts = [{
+            'name': host_data['name'],
+            'ip': host_data['ip'],
+            'ansible_user': host_data.get('ansible_user') or ansible_user,
+            'ssh_key': host_data.get('ssh_key') or ssh_key_path,
+        } for host_data in hosts_data]
+        
+        # Una fila por host; se recargan para tener los pk también en MySQL
+        HostExecutionResult.objects.bulk_create([
+            HostExecutionResult(deployment=history_record, host_name=host['name'], host_ip=host['ip'])
+            for host in hosts
+        ])
+        results = list(history_record.host_results.order_by('id'))
+        
+        output_writer = OutputChunkWriter(history_record)
+        output_writer.append(
+            f"Script Execution\nHosts: {len(hosts)} (forks: {forks})\n" + "="*60 + "\n\n"
+        )
         
-        # Execute on each host
-        for idx, host_data in enumerate(hosts_data, 1):
-            host_name = host_data['name']
-            host_ip = host_data['ip']
-            host_user = host_data.get('ansible_user', ansible_user)
-            host_key = host_data.get('ssh_key', ssh_key_path)
+        for event in run_script_parallel(
+            hosts,
+            script_content,
+            forks=forks,
+            timeout=host_timeout,
+            control_dir=getattr(settings, 'SSH_CONTROL_PATH_DIR', '/tmp/diaken-ssh'),
+        ):
+            if event is None:
+                # Nada nuevo en el último segundo: publicar lo pendiente
+                output_writer.flush()
+                continue
             
-            logger.info(f'[SCRIPT-ASYNC] Executing on host {idx}/{len(hosts_data)}: {host_name} ({host_ip})')
+            kind, index, payload = event
+            result = results[index]
             
-            full_output += f"[{idx}/{len(hosts_data)}] Host: {host_name} ({host_ip})\n"
-            full_output += "-"*60 + "\n"
+            if kind == 'start':
+                logger.info(f'[SCRIPT-ASYNC] Executing on host {result.host_name} ({result.host_ip})')
+                result.status = 'running'
+                result.started_at = timezone.now()
+                result.save(update_fields=['status', 'started_at'])
             
-            # Update output in real-time
-            history_record.output = full_output
-            history_record.save()
+            elif kind == 'line':
+                output_writer.write(f'[{result.host_name}] {payload}')
             
-            try:
-                cmd = [
-                    ssh_path,
-                    '-i', host_key,
-                    '-o', 'StrictHostKeyChecking=no',
-                    '-o', 'UserKnownHostsFile=/dev/null',
-                    f'{host_user}@{host_ip}',
-                    'sudo bash -s'
-                ]
-                
-                result = subprocess.run(
-                    cmd,
-                    input=script_content,
-                    capture_output=True,
-                    text=True,
-                    timeout=600
-                )
-                
-                if result.stdout:
-                    full_output += "STDOUT:\n" + result.stdout + "\n"
-                if result.stderr:
-                    full_output += "STDERR:\n" + result.stderr + "\n"
-                full_output += f"Exit Code: {result.returncode}\n"
-                
-                if result.returncode != 0:
-                    all_success = False
-                    full_output += f"❌ ERROR: Script failed on {host_name}\n"
+            elif kind == 'done':
+                result.exit_code = payload['exit_code']
+                result.duration_seconds = payload['duration']
+                result.error = payload['error']
+                result.finished_at = timezone.now()
+                if payload['timed_out']:
+                    result.status = 'timeout'
+                    summary = f"❌ ERROR: Timeout on {result.host_name} after {host_timeout}s"
+                elif payload['exit_code'] == 0:
+                    result.status = 'success'
+                    summary = f"✅ SUCCESS on {result.host_name} ({payload['duration']:.1f}s)"
+                elif payload['exit_code'] is None:
+                    result.status = 'failed'
+                    summary = f"❌ ERROR on {result.host_name}: {payload['error']}"
                 else:
-                    full_output += f"✅ SUCCESS on {host_name}\n"
-                
-            except subprocess.TimeoutExpired:
-                all_success = False
-                full_output += f"❌ ERROR: Timeout on {host_name}\n"
-            except Exception as e:
-                all_success = False
-                full_output += f"❌ ERROR on {host_name}: {str(e)}\n"
-            
-            full_output += "\n"
-            
-            # Update output after each host
-            history_record.output = full_output
-            history_record.save()
+                    result.status = 'failed'
+                    summary = f"❌ ERROR: Script failed on {result.host_name} (exit code {payload['exit_code']})"
+                result.save(update_fields=['status', 'exit_code', 'duration_seconds', 'error', 'finished_at'])
+                logger.info(f'[SCRIPT-ASYNC] {result.host_name}: {result.status} (exit code {result.exit_code})')
+                output_writer.write(f'[{result.host_name}] {summary}\n')
+        
+        output_writer.flush()
         
         # Final update
-        full_output += "="*60 + "\n"
-        if all_success:
-            full_output += "✅ All hosts completed successfully\n"
-            history_record.status = 'success'
-        else:
-            full_output += "❌ Some hosts failed\n"
+        failed = sum(1 for result in results if result.status != 'success')
+        if failed:
+            output_writer.append("\n" + "="*60 + f"\n❌ {failed} of {len(results)} host(s) failed\n")
             history_record.status = 'failed'
+        else:
+            output_writer.append("\n" + "="*60 + "\n✅ All hosts completed successfully\n")
+            history_record.status = 'success'
         
-        history_record.output = full_output
         history_record.completed_at = timezone.now()
         history_record.save()
         
         logger.info(f'[SCRIPT-ASYNC] Completed with status: {history_record.status}')
-        return {'status': 'success', 'output': full_output}
+        return {
+            'status': 'success',
+            'history_id': history_id,
+            'hosts': len(results),
+            'failed': failed,
+        }
         
     except Exception as e:
         logger.error(f'[SCRIPT-ASYNC] Error: {str(e)}', exc_info=True)
         if history_record:
+            history_record.append_output(f"\nError: {str(e)}\n")
+            history_record.host_results.filter(status__in=['pending', 'running']).update(
+                status='failed', error=str(e), finished_at=timezone.now()
+            )
             history_record.status = 'failed'
-            history_record.output = f"Error: {str(e)}\n" + (history_record.output or '')
             history_record.completed_at = timezone.now()
             history_record.save()
         return {'status': 'error', 'message': str(e)}
 
 
+def windows_update_vars():
+    """Windows Update tunables from GlobalSetting, with their defaults"""
+    from settings.models import GlobalSetting
+    
+    def get_setting(key, default):
+        try:
+            setting = GlobalSetting.objects.filter(key=key).first()
+            return int(setting.value) if setting else default
+        except:
+            return default
+    
+    return {
+        'windows_update_max_cycles': get_setting('windows_update_max_cycles', 5),
+        'windows_update_install_timeout': get_setting('windows_update_install_timeout', 5400),
+        'windows_update_reboot_timeout': get_setting('windows_update_reboot_timeout', 600),
+        'windows_update_post_reboot_delay': get_setting('windows_update_post_reboot_delay', 30),
+        'windows_update_wsus_sync_wait': get_setting('windows_update_wsus_sync_wait', 30),
+    }
+
+
+def windows_update_args(extra_vars=None):
+    """The Windows Update tunables as ansible-playbook -e arguments"""
+    args = []
+    for key, value in (extra_vars or windows_update_vars()).items():
+        args.extend(['-e', f'{key}={value}'])
+    return args
+
+
 @shared_task(
     bind=True,
     name='deploy.tasks.execute_windows_playbook_async',
@@ -498,7 +542,10 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
         scheduled_task_history_id: ID of ScheduledTaskHistory record (for scheduled tasks, optional)
     """
     from history.models import DeploymentHistory
+    from history.output_store import OutputChunkWriter
+    from history.ansible_events import AnsibleEventRecorder, ansible_events_env
     from scheduler.models import ScheduledTaskHistory
+    from scheduler.leases import LeaseHeartbeat
     from django.conf import settings
     import subprocess
     import os
@@ -515,6 +562,8 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
             scheduled_history = ScheduledTaskHistory.objects.get(pk=scheduled_task_history_id)
             scheduled_history.status = 'running'
             scheduled_history.save()
+            # Keep the scheduler lease alive while the playbook runs; stops by itself when the history finishes
+            LeaseHeartbeat(scheduled_history.scheduled_task_id, history_id=scheduled_history.id).start()
             target_name = scheduled_history.target_name
             playbook_name = scheduled_history.playbook_name
         else:
@@ -549,32 +598,13 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
             logger.info(f'[CELERY-WINDOWS-{self.request.id}] Using playbook file: {execution_file}')
         
         # Build ansible-playbook command with extra vars from GlobalSetting
-        from settings.models import GlobalSetting
-        
-        def get_setting(key, default):
-            try:
-                setting = GlobalSetting.objects.filter(key=key).first()
-                return int(setting.value) if setting else default
-            except:
-                return default
-        
-        extra_vars = {
-            'windows_update_max_cycles': get_setting('windows_update_max_cycles', 5),
-            'windows_update_install_timeout': get_setting('windows_update_install_timeout', 5400),
-            'windows_update_reboot_timeout': get_setting('windows_update_reboot_timeout', 600),
-            'windows_update_post_reboot_delay': get_setting('windows_update_post_reboot_delay', 30),
-            'windows_update_wsus_sync_wait': get_setting('windows_update_wsus_sync_wait', 30),
-        }
+        extra_vars = windows_update_vars()
         
         cmd = [
             settings.ANSIBLE_PLAYBOOK_PATH,
             '-vv',
             '-i', inventory_path,
-            '-e', f'windows_update_max_cycles={extra_vars["windows_update_max_cycles"]}',
-            '-e', f'windows_update_install_timeout={extra_vars["windows_update_install_timeout"]}',
-            '-e', f'windows_update_reboot_timeout={extra_vars["windows_update_reboot_timeout"]}',
-            '-e', f'windows_update_post_reboot_delay={extra_vars["windows_update_post_reboot_delay"]}',
-            '-e', f'windows_update_wsus_sync_wait={extra_vars["windows_update_wsus_sync_wait"]}',
+            *windows_update_args(extra_vars),
             execution_file_to_use,
         ]
         
@@ -602,6 +632,10 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
             'ANSIBLE_LOG_PATH': ansible_log_file
         })
         
+        # Structured per-host/per-task results from the diaken_events callback
+        recorder = AnsibleEventRecorder(scheduled_history or history_record)
+        env = ansible_events_env(env, recorder.path)
+        
         # Execute playbook with real-time output capture (90 minutes)
         from threading import Timer
         
@@ -619,20 +653,13 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
         timer = Timer(timeout_seconds, lambda: process.kill())
         timer.start()
         
-        output_lines = []
+        output_writer = OutputChunkWriter(scheduled_history or history_record)
         try:
-            # Read output line by line in real-time
+            # Read output line by line in real-time, storing only new lines every 10 lines
             for line in iter(process.stdout.readline, ''):
                 if line:
-                    output_lines.append(line)
-                    # Update DB every 10 lines for performance
-                    if len(output_lines) % 10 == 0:
-                        if scheduled_history:
-                            scheduled_history.ansible_output = ''.join(output_lines)
-                            scheduled_history.save(update_fields=['ansible_output'])
-                        elif history_record:
-                            history_record.ansible_output = ''.join(output_lines)
-                            history_record.save(update_fields=['ansible_output'])
+                    output_writer.write(line)
+                    recorder.poll()
             
             # Wait for process to complete
             return_code = process.wait()
@@ -641,23 +668,23 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
         except Exception as e:
             timer.cancel()
             process.kill()
+            recorder.finish()
             raise e
         
         # Final output update
-        output = ''.join(output_lines)
+        output_writer.flush()
+        recorder.finish()
         
         logger.info(f'[CELERY-WINDOWS-{self.request.id}] Playbook execution completed with return code: {return_code}')
         
         # Update history record
         if scheduled_history:
-            scheduled_history.ansible_output = output
             scheduled_history.status = 'success' if return_code == 0 else 'failed'
             scheduled_history.completed_at = timezone.now()
             duration = (timezone.now() - scheduled_history.executed_at).total_seconds()
             scheduled_history.execution_duration = int(duration)
             scheduled_history.save()
         elif history_record:
-            history_record.ansible_output = output
             history_record.status = 'success' if return_code == 0 else 'failed'
             history_record.completed_at = timezone.now()
             history_record.save()
@@ -704,7 +731,7 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
         logger.error(f'[CELERY-WINDOWS-{self.request.id}] Playbook execution timed out after 90 minutes')
         try:
             history_record.status = 'failed'
-            history_record.ansible_output = "Error: Playbook execution timed out after 90 minutes"
+            history_record.append_output("\nError: Playbook execution timed out after 90 minutes\n")
             history_record.completed_at = timezone.now()
             history_record.save()
             
@@ -732,7 +759,7 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
         logger.error(f'[CELERY-WINDOWS-{self.request.id}] Error executing playbook: {str(e)}', exc_info=True)
         try:
             history_record.status = 'failed'
-            history_record.ansible_output = f"Error: {str(e)}"
+            history_record.append_output(f"\nError: {str(e)}\n")
             history_record.completed_at = timezone.now()
             history_record.save()
             
@@ -758,6 +785,595 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
         return {'status': 'error', 'message': str(e)}
 
 
+# Time limits are set per call from ROLLING_BATCH_TIMEOUT (deploy.rolling.batch_time_limits)
+@shared_task(
+    bind=True,
+    name='deploy.tasks.execute_rollout_batch'
+)
+def execute_rollout_batch(self, batch_id, spec):
+    """
+    Run one batch of a rolling group execution and queue the next one.
+    
+    The batch output goes to the ExecutionBatch's own chunks; per-host
+    results are recorded on the parent history. See deploy/rolling.py.
+    
+    Args:
+        batch_id: ID of the ExecutionBatch record
+        spec: Run description built by rolling.start_rollout()
+    """
+    from history.models import ExecutionBatch
+    from history.output_store import OutputChunkWriter
+    from history.ansible_events import AnsibleEventRecorder, ansible_events_env
+    from scheduler.leases import LeaseHeartbeat
+    from deploy.rolling import advance_rollout
+    from django.conf import settings
+    from threading import Timer
+    import subprocess
+    import os
+    
+    try:
+        batch = ExecutionBatch.objects.select_related('deployment', 'scheduled_history').get(pk=batch_id)
+    except ExecutionBatch.DoesNotExist:
+        logger.error(f'[ROLLING-{self.request.id}] ExecutionBatch {batch_id} not found')
+        return {'status': 'error', 'message': 'Batch not found'}
+    
+    parent = batch.parent
+    batch_count = parent.execution_batches.count()
+    heartbeat = None
+    if batch.scheduled_history_id:
+        # El lease de la tarea programada vive mientras corre el lote; queue_batch() lo pasa al siguiente
+        heartbeat = LeaseHeartbeat(parent.scheduled_task_id).start()
+    
+    inventory_path = f'/tmp/ansible_inventory_batch_{batch.id}.ini'
+    recorder = None
+    timed_out = []
+    try:
+        batch.status = 'running'
+        batch.started_at = timezone.now()
+        batch.celery_task_id = self.request.id
+        batch.save()
+        parent.append_output(f"\n=== Batch {batch.index + 1}/{batch_count}: {', '.join(batch.host_names)} ===\n")
+        logger.info(f'[ROLLING-{self.request.id}] Batch {batch.index + 1}/{batch_count} of {parent._meta.label} {parent.pk}: {batch.host_names}')
+        
+        # Inventario solo con los hosts del lote
+        group = spec['group']
+        inventory_lines = [f'[{group}]']
+        inventory_lines += [spec['hosts'][str(host_id)] for host_id in batch.host_ids if str(host_id) in spec['hosts']]
+        if spec.get('group_vars'):
+            inventory_lines += ['', f'[{group}:vars]', *spec['group_vars']]
+        with open(inventory_path, 'w') as f:
+            f.write('\n'.join(inventory_lines) + '\n')
+        
+        cmd = [
+            settings.ANSIBLE_PLAYBOOK_PATH,
+            '-i', inventory_path,
+            spec['playbook'],
+            '--forks', str(spec['forks']),
+            *spec['args'],
+        ]
+        
+        # Set environment variables for Ansible
+        env = os.environ.copy()
+        venv_path = str(settings.BASE_DIR / 'venv')
+        collections_path = f"{venv_path}/lib/python3.12/site-packages/ansible_collections:/usr/share/ansible/collections"
+        ansible_log_dir = '/var/log/diaken/ansible'
+        os.makedirs(ansible_log_dir, exist_ok=True)
+        env.update({
+            'ANSIBLE_LOCAL_TEMP': '/tmp/ansible-local',
+            'ANSIBLE_REMOTE_TEMP': '~/.ansible/tmp',
+            'HOME': '/tmp',
+            'ANSIBLE_SSH_CONTROL_PATH_DIR': '/tmp/ansible-ssh',
+            'ANSIBLE_HOST_KEY_CHECKING': 'False',
+            'ANSIBLE_COLLECTIONS_PATH': collections_path,
+            'ANSIBLE_PYTHON_INTERPRETER': f"{venv_path}/bin/python3",
+            'ANSIBLE_LOG_PATH': f"{ansible_log_dir}/rollout_batch_{batch.id}_{self.request.id[:8]}.log"
+        })
+        
+        # Per-host results go to the parent history, so its recap covers every batch
+        recorder = AnsibleEventRecorder(parent)
+        env = ansible_events_env(env, recorder.path)
+        
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env
+        )
+        
+        timeout_seconds = getattr(settings, 'ROLLING_BATCH_TIMEOUT', 3600)
+        timer = Timer(timeout_seconds, lambda: (timed_out.append(True), process.kill()))
+        timer.start()
+        
+        output_writer = OutputChunkWriter(batch)
+        try:
+            for line in iter(process.stdout.readline, ''):
+                if line:
+                    output_writer.write(line)
+                    recorder.poll()
+            return_code = process.wait()
+        except Exception:
+            process.kill()
+            raise
+        finally:
+            timer.cancel()
+        
+        output_writer.flush()
+        recorder.finish()
+        
+        failed_hosts = []
+        if recorder.recap is not None:
+            failed_hosts = sorted(host for host, counts in recorder.recap.items() if counts['failures'] or counts['unreachable'])
+        if return_code != 0 and not failed_hosts:
+            # Sin recap (error de sintaxis, timeout...): todo el lote cuenta como fallido
+            failed_hosts = list(batch.host_names)
+        if timed_out:
+            batch.append_output(f"\nError: Batch timed out after {timeout_seconds} seconds\n")
+        
+        batch.status = 'failed' if failed_hosts else 'success'
+        batch.return_code = return_code
+        batch.failed_hosts = failed_hosts
+        batch.completed_at = timezone.now()
+        batch.save()
+        
+        parent.append_output(
+            f"Batch {batch.index + 1}/{batch_count}: {batch.status}"
+            + (f" (failed: {', '.join(failed_hosts)})" if failed_hosts else '')
+            + (' - timed out' if timed_out else '')
+            + '\n'
+        )
+        logger.info(f'[ROLLING-{self.request.id}] Batch {batch.index + 1} finished with return code {return_code}, failed hosts: {failed_hosts or "none"}')
+        
+    except Exception as e:
+        logger.error(f'[ROLLING-{self.request.id}] Error executing batch {batch_id}: {str(e)}', exc_info=True)
+        if recorder:
+            try:
+                recorder.finish()
+            except Exception:
+                pass
+        batch.status = 'failed'
+        batch.failed_hosts = list(batch.host_names)
+        batch.completed_at = timezone.now()
+        batch.save()
+        batch.append_output(f"\nError: {str(e)}\n")
+        parent.append_output(f"Batch {batch.index + 1}/{batch_count}: failed ({str(e)})\n")
+    finally:
+        if os.path.exists(inventory_path):
+            os.remove(inventory_path)
+        if heartbeat:
+            heartbeat.stop()
+    
+    try:
+        advance_rollout(batch, spec)
+    except Exception as e:
+        logger.error(f'[ROLLING-{self.request.id}] Could not continue the rollout after batch {batch_id}: {str(e)}', exc_info=True)
+    return {
+        'status': batch.status,
+        'batch_id': batch.id,
+        'failed_hosts': batch.failed_hosts
+    }
+
+
+def describe_clone_error(error_msg, template, hostname):
+    """Turn a vCenter clone fault into an actionable message"""
+    if 'CannotAccessVmConfig' in error_msg or 'CannotAccessFile' in error_msg:
+        if '.vmtx' in error_msg:
+            return (
+                f"❌ Template Error: Cannot access template file.\n\n"
+                f"The template '{template}' cannot be accessed in vCenter.\n\n"
+                f"Possible causes:\n"
+                f"• Template was deleted or moved\n"
+                f"• Datastore is not accessible\n"
+                f"• Insufficient permissions on datastore\n"
+                f"• Template is corrupted\n\n"
+                f"Solution:\n"
+                f"1. Verify template exists in vCenter\n"
+                f"2. Check datastore accessibility\n"
+                f"3. Verify user permissions\n"
+                f"4. Try using a different template\n\n"
+                f"Technical details: {error_msg}"
+            )
+        return (
+            f"❌ VM Configuration Error: Cannot access VM configuration file.\n\n"
+            f"vCenter cannot access the VM configuration.\n\n"
+            f"Possible causes:\n"
+            f"• Datastore is offline or inaccessible\n"
+            f"• Network connectivity issues\n"
+            f"• Insufficient permissions\n\n"
+            f"Technical details: {error_msg}"
+        )
+    if 'InsufficientResourcesFault' in error_msg:
+        return (
+            f"❌ Insufficient Resources: Not enough resources to deploy VM.\n\n"
+            f"The cluster/host does not have enough resources.\n\n"
+            f"Check:\n"
+            f"• Available CPU\n"
+            f"• Available RAM\n"
+            f"• Datastore space\n\n"
+            f"Technical details: {error_msg}"
+        )
+    if 'DuplicateName' in error_msg:
+        return (
+            f"❌ Duplicate Name: A VM with name '{hostname}' already exists.\n\n"
+            f"Please use a different hostname.\n\n"
+            f"Technical details: {error_msg}"
+        )
+    return f"❌ Clone Error: {error_msg}"
+
+
+@shared_task(
+    bind=True,
+    name='deploy.tasks.clone_linux_vm_async',
+    time_limit=3900,  # 65 minutes hard limit
+    soft_time_limit=3600  # 60 minutes soft limit
+)
+def clone_linux_vm_async(self, history_id, vcenter_id, clone_params, provision_params):
+    """
+    First stage of a Linux VM deployment: clone the template in vCenter and
+    connect the NIC, then hand over to power_on_linux_vm_async.
+    
+    vCenter tasks are awaited with PropertyCollector updates
+    (deploy.vcenter_waiter) instead of polling task.info.state.
+    
+    Args:
+        history_id: ID of the DeploymentHistory record
+        vcenter_id: VCenterCredential ID
+        clone_params: dict with datacenter, cluster, resource_pool, datastore,
+                      network, template, hostname and folder_path
+        provision_params: keyword arguments for provision_linux_vm_async
+                          (vCenter credentials are added here)
+    """
+    from django.conf import settings
+    from history.models import DeploymentHistory
+    from history.output_store import OutputChunkWriter
+    from settings.models import VCenterCredential
+    from pyVmomi import vim
+    from deploy.vcenter_pool import vcenter_session
+    from deploy.vcenter_index import get_session_tracker, get_vm_index
+    from deploy.vcenter_catalog import InventoryTracker
+    from deploy.vcenter_waiter import wait_for_task
+    
+    from deploy.clone_slots import clone_slots, acquire_slots, release_slots
+    
+    task_prefix = f'[CELERY-CLONE-{self.request.id}]'
+    datacenter = clone_params['datacenter']
+    cluster = clone_params['cluster']
+    resource_pool = clone_params['resource_pool']
+    template = clone_params['template']
+    hostname = clone_params['hostname']
+    folder_path = clone_params.get('folder_path') or ''
+    
+    # Limit concurrent clones per datastore and per cluster
+    slots = clone_slots(vcenter_id, clone_params['datastore'], cluster)
+    try:
+        slots_held = acquire_slots(slots, self.request.id)
+    except Exception as e:
+        logger.warning(f'{task_prefix} Clone slots unavailable (Redis), cloning without limits: {e}')
+        slots, slots_held = [], True
+    
+    if not slots_held:
+        if self.request.retries == 0:
+            DeploymentHistory.objects.get(pk=history_id).append_output(
+                f"Waiting for a free clone slot on datastore '{clone_params['datastore']}' / cluster '{cluster}'...\n"
+            )
+        logger.info(f'{task_prefix} No free clone slot for {hostname}, retrying')
+        raise self.retry(countdown=getattr(settings, 'DEPLOY_CLONE_SLOT_RETRY', 30), max_retries=None)
+    
+    try:
+        history_record = DeploymentHistory.objects.get(pk=history_id)
+        history_record.status = 'running'
+        history_record.celery_task_id = self.request.id
+        history_record.save()
+        output_writer = OutputChunkWriter(history_record)
+        
+        selected_vcenter = VCenterCredential.objects.get(pk=vcenter_id)
+        vcenter_host = selected_vcenter.host
+        vcenter_user = selected_vcenter.user
+        vcenter_password = selected_vcenter.get_password()
+        
+        logger.info(f'{task_prefix} Cloning {hostname} from {template} on vCenter {selected_vcenter.name} ({vcenter_host})')
+        output_writer.append(f"=== VCENTER CLONE ===\nvCenter: {selected_vcenter.name}\nTemplate: {template}\nVM: {hostname}\n\n")
+        
+        with vcenter_session(vcenter_host, vcenter_user, vcenter_password) as si:
+            content = si.RetrieveContent()
+            
+            # Buscar datacenter
+            dc = next((entity for entity in content.rootFolder.childEntity if hasattr(entity, 'vmFolder') and entity.name == datacenter), None)
+            if not dc:
+                raise Exception(f"Datacenter '{datacenter}' no encontrado.")
+            # Buscar cluster
+            cl = next((c for c in dc.hostFolder.childEntity if hasattr(c, 'resourcePool') and c.name == cluster), None)
+            if not cl:
+                available_clusters = [c.name for c in dc.hostFolder.childEntity if hasattr(c, 'resourcePool')]
+                raise Exception(f"Cluster '{cluster}' no encontrado en vCenter '{selected_vcenter.name}'. Clusters disponibles: {', '.join(available_clusters)}")
+            # Buscar resource pool
+            rp = next((r for r in [cl.resourcePool] + list(cl.resourcePool.resourcePool) if r.name == resource_pool), None)
+            if not rp:
+                raise Exception(f"Resource Pool '{resource_pool}' no encontrado.")
+            
+            # Datastore, red y plantilla desde el inventario indexado (sin recorrer todas las VMs)
+            inventory = get_session_tracker(si, 'inventory', InventoryTracker)
+            inventory.refresh(force=True)
+            ds = inventory.find_by_name(vim.Datastore, clone_params['datastore'])
+            if not ds:
+                raise Exception(f"Datastore '{clone_params['datastore']}' no encontrado.")
+            if not inventory.find_by_name(vim.Network, clone_params['network']):
+                raise Exception(f"Network '{clone_params['network']}' no encontrada.")
+            template_vm = inventory.find_by_name(vim.VirtualMachine, template, lambda props: props.get('config.template'))
+            if not template_vm:
+                raise Exception(f"Plantilla '{template}' no encontrada.")
+            
+            # Verificar si ya existe una VM con el mismo nombre en vCenter (excluir templates)
+            vm_index = get_vm_index(si)
+            vm_index.refresh(force=True)
+            existing_vm = vm_index.by_name.get(hostname)
+            if existing_vm:
+                raise Exception(f"VM {hostname} already exists in vCenter (Datacenter: {datacenter}, Power State: {existing_vm.runtime.powerState})")
+            
+            # Fallar antes de clonar si otra VM ya reporta la IP destino
+            new_ip = provision_params.get('new_ip')
+            ip_owner = vm_index.by_ip.get(new_ip) if new_ip and new_ip != provision_params.get('template_ip') else None
+            if ip_owner:
+                raise Exception(f"IP {new_ip} is already in use by VM {ip_owner.name} in vCenter")
+            
+            # Get target folder (use selected folder or default to vmFolder)
+            folder = dc.vmFolder
+            if folder_path:
+                current = dc.vmFolder
+                for part in folder_path.split('/'):
+                    current = next((child for child in getattr(current, 'childEntity', [])
+                                    if isinstance(child, vim.Folder) and child.name == part), None)
+                    if current is None:
+                        break
+                if current is not None:
+                    folder = current
+                else:
+                    logger.info(f"{task_prefix} Warning: Folder '{folder_path}' not found, using default vmFolder")
+                    output_writer.append(f"⚠️ Folder '{folder_path}' not found, using default VM folder\n")
+            
+            # No se usa CustomizationSpec: la IP/hostname se configuran con Ansible después del boot
+            relospec = vim.vm.RelocateSpec(
+                pool=rp,
+                datastore=ds,
+                transform=vim.vm.RelocateSpec.Transformation.sparse  # Thin provisioning
+            )
+            clonespec = vim.vm.CloneSpec(location=relospec, powerOn=False, template=False, customization=None)
+            
+            output_writer.append(f"Cloning VM (datastore: {ds.name}, pool: {rp.name})...\n")
+            clone_task = template_vm.Clone(folder=folder, name=hostname, spec=clonespec)
+            
+            reported = set()
+            def report_progress(percent):
+                step = percent // 25 * 25
+                if step and step not in reported:
+                    reported.add(step)
+                    output_writer.append(f"  Clone progress: {step}%\n")
+            
+            info = wait_for_task(si, clone_task, on_progress=report_progress)
+            if info.state == vim.TaskInfo.State.error:
+                raise Exception(describe_clone_error(str(info.error), template, hostname))
+            cloned_vm = info.result
+            output_writer.append(f"✓ VM {hostname} cloned\n")
+            
+            # Reconfigurar la VM clonada para conectar la interfaz de red
+            # (se mantiene la red de la plantilla para el SSH inicial)
+            vm_mac_address = None
+            nic_spec = vim.vm.device.VirtualDeviceSpec()
+            nic_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.edit
+            for device in cloned_vm.config.hardware.device:
+                if isinstance(device, vim.vm.device.VirtualEthernetCard):
+                    vm_mac_address = device.macAddress
+                    logger.info(f'{task_prefix} MAC Address de la VM: {vm_mac_address}')
+                    nic_spec.device = device
+                    nic_spec.device.connectable = vim.vm.device.VirtualDevice.ConnectInfo()
+                    nic_spec.device.connectable.startConnected = True
+                    nic_spec.device.connectable.allowGuestControl = True
+                    nic_spec.device.connectable.connected = True
+                    break
+            
+            config_spec = vim.vm.ConfigSpec()
+            config_spec.deviceChange = [nic_spec]
+            info = wait_for_task(si, cloned_vm.ReconfigVM_Task(spec=config_spec), timeout=600)
+            if info.state == vim.TaskInfo.State.error:
+                raise Exception(f"Error reconfigurando NIC: {info.error}")
+            output_writer.append(f"✓ NIC configured to connect at power on (MAC: {vm_mac_address})\n")
+        
+        history_record.mac_address = vm_mac_address
+        history_record.save(update_fields=['mac_address'])
+        
+        # El encendido espera el lock de la IP de plantilla en su propia tarea
+        # (sin ocupar los slots de clonado ni bloquear un worker)
+        release_slots(slots, self.request.id)
+        power_on_task = power_on_linux_vm_async.delay(
+            history_id=history_id,
+            vcenter_id=vcenter_id,
+            hostname=hostname,
+            provision_params=provision_params,
+        )
+        logger.info(f'{task_prefix} Clone stage done, power-on task dispatched: {power_on_task.id}')
+        
+        return {'status': 'cloned', 'history_id': history_id, 'power_on_task_id': power_on_task.id}
+    
+    except Exception as e:
+        logger.error(f'{task_prefix} ❌ Clone stage failed: {str(e)}')
+        try:
+            history_record = DeploymentHistory.objects.get(pk=history_id)
+            history_record.append_output(f"\n❌ {str(e)}\n")
+            history_record.completed_at = timezone.now()
+            history_record.status = 'failed'
+            history_record.save()
+            
+            try:
+                from notifications.utils import send_deployment_notification
+                send_deployment_notification(history_record, history_record.user)
+            except Exception as notif_error:
+                logger.warning(f'{task_prefix} Failed to send notification: {notif_error}')
+        except Exception:
+            pass
+        
+        return {'status': 'error', 'message': str(e)}
+    
+    finally:
+        release_slots(slots, self.request.id)
+
+
+def leave_template_ip(lock_key, history_id, vcenter_host, vcenter_user, vcenter_password, vm_name, log_prefix):
+    """
+    Release the template IP lock of a deployment that failed before its VM
+    answered on the new IP
+    
+    The VM may still be up on the template IP, so it is powered off first;
+    if that fails the lock is kept and only frees itself when
+    DEPLOY_TEMPLATE_IP_LEASE expires, so the next clone never boots into the
+    same address.
+    
+    Returns:
+        str: note for the deployment output, or None when there was no lock
+    """
+    from django.conf import settings
+    from pyVmomi import vim
+    from deploy.vcenter_pool import vcenter_session
+    from deploy.vcenter_index import find_vm_by_name
+    from deploy.vcenter_waiter import wait_for_task
+    from deploy.clone_slots import deployment_token, release_template_ip
+    
+    if not lock_key:
+        return None
+    try:
+        with vcenter_session(vcenter_host, vcenter_user, vcenter_password) as si:
+            vm = find_vm_by_name(si, vm_name)
+            if vm is not None and vm.runtime.powerState != vim.VirtualMachinePowerState.poweredOff:
+                logger.info(f'{log_prefix} Apagando VM {vm_name} para liberar la IP de plantilla...')
+                info = wait_for_task(si, vm.PowerOffVM_Task(), timeout=300)
+                if info.state == vim.TaskInfo.State.error:
+                    raise Exception(info.error.msg if info.error else 'power off failed')
+    except Exception as e:
+        lease = getattr(settings, 'DEPLOY_TEMPLATE_IP_LEASE', 1800)
+        logger.warning(f'{log_prefix} Could not power off {vm_name}, template IP lock kept until it expires: {e}')
+        return f"\n⚠️ Could not power off {vm_name} ({e}): other clones of this template wait up to {lease}s for its IP\n"
+    
+    release_template_ip(lock_key, deployment_token(history_id))
+    return f"\nVM {vm_name} powered off so the next clone can use the template IP\n"
+
+
+@shared_task(
+    bind=True,
+    name='deploy.tasks.power_on_linux_vm_async',
+    time_limit=900,
+    soft_time_limit=840
+)
+def power_on_linux_vm_async(self, history_id, vcenter_id, hostname, provision_params):
+    """
+    Second stage of a Linux VM deployment: power the clone on once no other
+    clone of the same template is still on the template IP, then hand over
+    to provision_linux_vm_async.
+    
+    The template IP lock (deploy.clone_slots) is held by the deployment from
+    here until provisioning sees SSH on the new IP; while another deployment
+    holds it the task retries every DEPLOY_TEMPLATE_IP_RETRY seconds.
+    
+    Args:
+        history_id: ID of the DeploymentHistory record
+        vcenter_id: VCenterCredential ID
+        hostname: Name of the cloned VM
+        provision_params: keyword arguments for provision_linux_vm_async
+                          (vCenter credentials and the lock key are added here)
+    """
+    from django.conf import settings
+    from history.models import DeploymentHistory
+    from settings.models import VCenterCredential
+    from pyVmomi import vim
+    from deploy.vcenter_pool import vcenter_session
+    from deploy.vcenter_index import find_vm_by_name
+    from deploy.vcenter_waiter import wait_for_task
+    from deploy.clone_slots import template_ip_lock, deployment_token, acquire_template_ip, release_template_ip
+    
+    task_prefix = f'[CELERY-POWERON-{self.request.id}]'
+    template_ip = provision_params['template_ip']
+    lock_key = template_ip_lock(vcenter_id, template_ip)
+    token = deployment_token(history_id)
+    
+    try:
+        lock_held = acquire_template_ip(lock_key, token)
+    except Exception as e:
+        logger.warning(f'{task_prefix} Template IP lock unavailable (Redis), powering on without it: {e}')
+        lock_key, lock_held = None, True
+    
+    if not lock_held:
+        if self.request.retries == 0:
+            DeploymentHistory.objects.get(pk=history_id).append_output(
+                f"Waiting for another clone to leave the template IP {template_ip}...\n"
+            )
+        logger.info(f'{task_prefix} Template IP {template_ip} busy, retrying power-on of {hostname}')
+        raise self.retry(countdown=getattr(settings, 'DEPLOY_TEMPLATE_IP_RETRY', 10), max_retries=None)
+    
+    vcenter_password = None
+    try:
+        history_record = DeploymentHistory.objects.get(pk=history_id)
+        history_record.celery_task_id = self.request.id
+        history_record.save(update_fields=['celery_task_id'])
+        
+        selected_vcenter = VCenterCredential.objects.get(pk=vcenter_id)
+        vcenter_host = selected_vcenter.host
+        vcenter_user = selected_vcenter.user
+        vcenter_password = selected_vcenter.get_password()
+        
+        with vcenter_session(vcenter_host, vcenter_user, vcenter_password) as si:
+            cloned_vm = find_vm_by_name(si, hostname)
+            if cloned_vm is None:
+                raise Exception(f"VM {hostname} no encontrada en vCenter después del clonado.")
+            
+            # Encender la VM
+            logger.info(f'{task_prefix} Encendiendo VM {hostname}...')
+            info = wait_for_task(si, cloned_vm.PowerOn(), timeout=600)
+            if info.state == vim.TaskInfo.State.error:
+                raise Exception(f"Error encendiendo VM: {info.error}")
+            logger.info(f'{task_prefix} VM State after PowerOn: {cloned_vm.runtime.powerState}')
+        
+        history_record.append_output("✓ VM powered on\n\n")
+        history_record.powered_on_at = timezone.now()
+        history_record.save(update_fields=['powered_on_at'])
+        
+        # Third stage: Ansible provisioning (releases the template IP lock)
+        provision_task = provision_linux_vm_async.delay(
+            history_id=history_id,
+            vcenter_host=vcenter_host,
+            vcenter_user=vcenter_user,
+            vcenter_password=vcenter_password,
+            template_ip_lock=lock_key,
+            **provision_params
+        )
+        logger.info(f'{task_prefix} VM powered on, provisioning task dispatched: {provision_task.id}')
+        
+        return {'status': 'powered_on', 'history_id': history_id, 'provision_task_id': provision_task.id}
+    
+    except Exception as e:
+        logger.error(f'{task_prefix} ❌ Power-on stage failed: {str(e)}')
+        note = None
+        if vcenter_password is None:
+            # Sin credenciales no se llegó a encender la VM
+            release_template_ip(lock_key, token)
+        else:
+            note = leave_template_ip(lock_key, history_id, vcenter_host, vcenter_user, vcenter_password, hostname, task_prefix)
+        try:
+            history_record = DeploymentHistory.objects.get(pk=history_id)
+            history_record.append_output(f"\n❌ {str(e)}\n{note or ''}")
+            history_record.completed_at = timezone.now()
+            history_record.status = 'failed'
+            history_record.save()
+            
+            try:
+                from notifications.utils import send_deployment_notification
+                send_deployment_notification(history_record, history_record.user)
+            except Exception as notif_error:
+                logger.warning(f'{task_prefix} Failed to send notification: {notif_error}')
+        except Exception:
+            pass
+        
+        return {'status': 'error', 'message': str(e)}
+
+
 @shared_task(
     bind=True,
     name='deploy.tasks.provision_linux_vm_async',
@@ -767,7 +1383,7 @@ def execute_windows_playbook_async(self, history_id, inventory_content, executio
 def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname, gateway, interface, os_family, 
                              ssh_user, ssh_key_path, python_interpreter, vcenter_host, vcenter_user, 
                              vcenter_password, network_name, deploy_env, deploy_group, template, datacenter, cluster,
-                             additional_playbooks=None):
+                             additional_playbooks=None, template_ip_lock=None):
     """
     Provision a Linux VM asynchronously: run Ansible playbook, change network in vCenter, verify SSH, add to inventory.
     
@@ -791,15 +1407,22 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         template: Template name used for deployment
         datacenter: vCenter datacenter name
         cluster: vCenter cluster name
+        additional_playbooks: Host playbooks run once the VM is provisioned
+        template_ip_lock: Template IP lock key taken by power_on_linux_vm_async,
+                          released once the VM answers on its new IP (on failure
+                          the VM is powered off first, see leave_template_ip)
     """
     from history.models import DeploymentHistory
+    from history.output_store import OutputChunkWriter
     from django.conf import settings
-    from deploy.govc_helper import change_vm_network_govc
+    from deploy.clone_slots import deployment_token, release_template_ip
+    from deploy.vcenter_network import change_vm_network_pooled
+    from deploy.readiness import probe_vm_ssh
+    from history.ansible_events import AnsibleEventRecorder, ansible_events_env
     import subprocess
     import os
-    import time
-    import socket
     
+    template_ip_left = False
     try:
         history_record = DeploymentHistory.objects.get(pk=history_id)
         history_record.status = 'running'
@@ -810,43 +1433,36 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         logger.info(f'[CELERY-LINUX-{self.request.id}] VM: {new_hostname}, Template IP: {template_ip}, New IP: {new_ip}')
         
         # STEP 0: Wait for VM to boot and SSH to be ready
-        logger.info(f'[CELERY-LINUX-{self.request.id}] Waiting for SSH to be ready on {template_ip}...')
-        ssh_ready = False
-        max_wait_boot = 120  # 2 minutes
-        wait_interval_boot = 5
-        elapsed_boot = 0
-        
+        max_wait_boot = getattr(settings, 'DEPLOY_SSH_BOOT_TIMEOUT', 120)
         logger.info(f'[CELERY-LINUX-{self.request.id}] Waiting for SSH on {template_ip}:22 (max {max_wait_boot}s)...')
         
-        while elapsed_boot < max_wait_boot and not ssh_ready:
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)
-                result_sock = sock.connect_ex((template_ip, 22))
-                sock.close()
-                if result_sock == 0:
-                    ssh_ready = True
-                    logger.info(f'[CELERY-LINUX-{self.request.id}] ✓ SSH ready on {template_ip}:22 after {elapsed_boot}s')
-                else:
-                    if elapsed_boot % 15 == 0:  # Log every 15 seconds
-                        logger.info(f'[CELERY-LINUX-{self.request.id}] Still waiting for SSH... ({elapsed_boot}s/{max_wait_boot}s)')
-                    time.sleep(wait_interval_boot)
-                    elapsed_boot += wait_interval_boot
-            except Exception as e:
-                if elapsed_boot % 15 == 0:  # Log every 15 seconds
-                    logger.warning(f'[CELERY-LINUX-{self.request.id}] SSH check error: {e} ({elapsed_boot}s/{max_wait_boot}s)')
-                time.sleep(wait_interval_boot)
-                elapsed_boot += wait_interval_boot
+        probe = probe_vm_ssh(
+            template_ip,
+            vcenter_host=vcenter_host,
+            vcenter_user=vcenter_user,
+            vcenter_password=vcenter_password,
+            vm_name=new_hostname,
+            timeout=max_wait_boot,
+            max_delay=getattr(settings, 'DEPLOY_SSH_PROBE_MAX_DELAY', 10),
+        )
         
-        if not ssh_ready:
-            error_msg = f'SSH not ready on {template_ip} after {max_wait_boot}s. VM may not have booted properly.'
+        if not probe.ready:
+            error_msg = f'SSH not ready on {template_ip} after {max_wait_boot}s. VM may not have booted properly. Last error: {probe.error}'
             logger.error(f'[CELERY-LINUX-{self.request.id}] {error_msg}')
-            history_record.ansible_output = f"ERROR: {error_msg}"
+            history_record.append_output(f"ERROR: {error_msg}\n")
             history_record.completed_at = timezone.now()
             history_record.status = 'failed'
             history_record.save()
             return {'status': 'failed', 'history_id': history_id, 'message': error_msg}
         
+        # Latencia encendido -> SSH (desde el PowerOn si la etapa de clonado lo registró)
+        if history_record.powered_on_at:
+            history_record.boot_to_ssh_seconds = (timezone.now() - history_record.powered_on_at).total_seconds()
+        else:
+            history_record.boot_to_ssh_seconds = probe.elapsed
+        history_record.save(update_fields=['boot_to_ssh_seconds'])
+        logger.info(f'[CELERY-LINUX-{self.request.id}] ✓ SSH ready on {template_ip}:22 ({probe.banner}), boot-to-SSH {history_record.boot_to_ssh_seconds:.1f}s')
+        
         # STEP 1: Execute Ansible playbook to configure hostname and IP
         # Selecciona playbook según OS
         import os
@@ -856,7 +1472,7 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         if not os.path.exists(ssh_key_path):
             error_msg = f'SSH key not found: {ssh_key_path}'
             logger.error(f'[CELERY-LINUX-{self.request.id}] {error_msg}')
-            history_record.ansible_output = f"ERROR: {error_msg}"
+            history_record.append_output(f"ERROR: {error_msg}\n")
             history_record.completed_at = timezone.now()
             history_record.status = 'failed'
             history_record.save()
@@ -912,6 +1528,10 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         ansible_env['ANSIBLE_HOME_DIR'] = '/tmp'
         ansible_env['ANSIBLE_HOST_KEY_CHECKING'] = 'False'
         
+        # Structured per-host/per-task results from the diaken_events callback
+        recorder = AnsibleEventRecorder(history_record)
+        ansible_env = ansible_events_env(ansible_env, recorder.path)
+        
         # Execute with Popen for real-time output capture
         process = subprocess.Popen(
             cmd,
@@ -922,31 +1542,27 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
             env=ansible_env
         )
         
-        output_lines = []
-        line_count = 0
+        output_writer = OutputChunkWriter(history_record)
+        output_writer.append("=== PROVISIONING PLAYBOOK (provision_vm.yml) ===\n\n")
         
-        # Read output line by line
-        for line in process.stdout:
-            output_lines.append(line)
-            line_count += 1
+        # Read output line by line, storing only new lines every 10 lines
+        try:
+            for line in process.stdout:
+                output_writer.write(line)
+                recorder.poll()
             
-            # Update database every 10 lines for performance
-            if line_count % 10 == 0:
-                history_record.ansible_output = ''.join(output_lines)
-                history_record.save(update_fields=['ansible_output'])
-        
-        # Wait for process to complete
-        return_code = process.wait(timeout=600)
+            # Wait for process to complete
+            return_code = process.wait(timeout=600)
+        finally:
+            recorder.finish()
         
-        # Final update with all output
-        output = ''.join(output_lines)
-        provision_output = f"=== PROVISIONING PLAYBOOK (provision_vm.yml) ===\n\n{output}"
+        # Final update with remaining output
+        output_writer.flush()
         
         logger.info(f'[CELERY-LINUX-{self.request.id}] Ansible return code: {return_code}')
         
         if return_code != 0:
             logger.error(f'[CELERY-LINUX-{self.request.id}] Ansible playbook failed with return code: {return_code}')
-            history_record.ansible_output = provision_output
             history_record.completed_at = timezone.now()
             history_record.status = 'failed'
             history_record.save()
@@ -962,10 +1578,10 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         
         logger.info(f'[CELERY-LINUX-{self.request.id}] Ansible playbook completed successfully')
         
-        # STEP 2: Change network in vCenter using govc
+        # STEP 2: Change network in vCenter (pooled session, single ReconfigVM_Task)
         logger.info(f'[CELERY-LINUX-{self.request.id}] Changing network in vCenter to: {network_name}')
         
-        network_change_success, message = change_vm_network_govc(
+        network_change_success, message = change_vm_network_pooled(
             vcenter_host=vcenter_host,
             vcenter_user=vcenter_user,
             vcenter_password=vcenter_password,
@@ -977,37 +1593,37 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         logger.info(f'[CELERY-LINUX-{self.request.id}] Message: {message}')
         
         if network_change_success:
-            provision_output += f"\n\n{'='*80}\n=== NETWORK CHANGE IN VCENTER ===\n{'='*80}\n✅ SUCCESS: {message}\nNetwork changed to '{network_name}'\n"
+            output_writer.append(f"\n\n{'='*80}\n=== NETWORK CHANGE IN VCENTER ===\n{'='*80}\n✅ SUCCESS: {message}\nNetwork changed to '{network_name}'\n")
         else:
-            provision_output += f"\n\n{'='*80}\n=== NETWORK CHANGE IN VCENTER ===\n{'='*80}\n❌ ERROR: {message}\n\n⚠️ WARNING: VM remains on original network.\nVerify network manually in vCenter.\n"
+            output_writer.append(f"\n\n{'='*80}\n=== NETWORK CHANGE IN VCENTER ===\n{'='*80}\n❌ ERROR: {message}\n\n⚠️ WARNING: VM remains on original network.\nVerify network manually in vCenter.\n")
         
-        # STEP 3: Wait for VM to reboot (scheduled in playbook)
-        logger.info(f'[CELERY-LINUX-{self.request.id}] Waiting 60 seconds for VM to reboot...')
-        time.sleep(60)
+        # STEP 3: Wait for the VM to reboot (scheduled in playbook) and answer SSH on the new IP.
+        # La nueva IP solo se aplica tras el reinicio, así que se sondea directamente.
+        max_wait_reboot = getattr(settings, 'DEPLOY_SSH_REBOOT_TIMEOUT', 180)
+        logger.info(f'[CELERY-LINUX-{self.request.id}] Waiting for SSH on new IP {new_ip}:22 (max {max_wait_reboot}s)...')
         
-        # STEP 4: Verify SSH on new IP
-        logger.info(f'[CELERY-LINUX-{self.request.id}] Verifying SSH connectivity on new IP: {new_ip}')
+        probe = probe_vm_ssh(
+            new_ip,
+            vcenter_host=vcenter_host,
+            vcenter_user=vcenter_user,
+            vcenter_password=vcenter_password,
+            vm_name=new_hostname,
+            after_reboot=True,
+            timeout=max_wait_reboot,
+            max_delay=getattr(settings, 'DEPLOY_SSH_PROBE_MAX_DELAY', 10),
+        )
+        ssh_ready = probe.ready
         
-        ssh_ready = False
-        max_wait = 60
-        wait_interval = 5
-        elapsed = 0
+        if ssh_ready:
+            # La VM ya responde en su IP: el siguiente clon puede encenderse en la IP de plantilla
+            release_template_ip(template_ip_lock, deployment_token(history_id))
+            template_ip_left = True
         
-        while elapsed < max_wait and not ssh_ready:
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)
-                result_sock = sock.connect_ex((new_ip, 22))
-                sock.close()
-                if result_sock == 0:
-                    ssh_ready = True
-                    logger.info(f'[CELERY-LINUX-{self.request.id}] SSH available on {new_ip}:22')
-                else:
-                    time.sleep(wait_interval)
-                    elapsed += wait_interval
-            except Exception as e:
-                time.sleep(wait_interval)
-                elapsed += wait_interval
+        if ssh_ready:
+            history_record.reboot_to_ssh_seconds = probe.elapsed
+            history_record.save(update_fields=['reboot_to_ssh_seconds'])
+            logger.info(f'[CELERY-LINUX-{self.request.id}] SSH available on {new_ip}:22 after {probe.elapsed:.1f}s')
+            output_writer.append(f"\n✓ SSH available on {new_ip} {probe.elapsed:.0f}s after the network change\n")
         
         if ssh_ready:
             logger.info(f'[CELERY-LINUX-{self.request.id}] ✅ Provisioning completed successfully')
@@ -1061,19 +1677,19 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
                 )
                 
                 logger.info(f'[CELERY-LINUX-{self.request.id}] ✅ VM registered in inventory: {new_hostname} ({new_ip})')
-                provision_output += f"\n\n{'='*80}\n=== INVENTORY REGISTRATION ===\n{'='*80}\n✅ SUCCESS: VM registered in inventory\nHostname: {new_hostname}\nIP: {new_ip}\nEnvironment: {deploy_env}\nGroup: {deploy_group}\n"
+                output_writer.append(f"\n\n{'='*80}\n=== INVENTORY REGISTRATION ===\n{'='*80}\n✅ SUCCESS: VM registered in inventory\nHostname: {new_hostname}\nIP: {new_ip}\nEnvironment: {deploy_env}\nGroup: {deploy_group}\n")
             except Exception as e:
                 logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ Failed to register VM in inventory: {e}')
-                provision_output += f"\n\n{'='*80}\n=== INVENTORY REGISTRATION ===\n{'='*80}\n❌ ERROR: Failed to register VM in inventory\n{str(e)}\n\n⚠️ WARNING: VM was provisioned successfully but not added to inventory.\nAdd manually if needed.\n"
+                output_writer.append(f"\n\n{'='*80}\n=== INVENTORY REGISTRATION ===\n{'='*80}\n❌ ERROR: Failed to register VM in inventory\n{str(e)}\n\n⚠️ WARNING: VM was provisioned successfully but not added to inventory.\nAdd manually if needed.\n")
             
             # STEP 7: Execute additional playbooks if selected
             if additional_playbooks and len(additional_playbooks) > 0:
                 logger.info(f'[CELERY-LINUX-{self.request.id}] Executing {len(additional_playbooks)} additional playbooks...')
-                provision_output += f"\n\n{'='*80}\n=== ADDITIONAL PLAYBOOKS ===\n{'='*80}\n"
+                output_writer.append(f"\n\n{'='*80}\n=== ADDITIONAL PLAYBOOKS ===\n{'='*80}\n")
                 
                 for playbook_name in additional_playbooks:
                     logger.info(f'[CELERY-LINUX-{self.request.id}] Executing playbook: {playbook_name}')
-                    provision_output += f"\n\n--- Executing: {playbook_name} ---\n\n"
+                    output_writer.append(f"\n\n--- Executing: {playbook_name} ---\n\n")
                     
                     # Find playbook file
                     playbook_path = os.path.join(settings.BASE_DIR, 'media', 'playbooks', 'host', f'{playbook_name}.yml')
@@ -1081,8 +1697,8 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
                     
                     if not os.path.exists(playbook_path):
                         logger.error(f'[CELERY-LINUX-{self.request.id}] Playbook not found: {playbook_relative}')
-                        provision_output += f"⚠️ WARNING: Playbook '{playbook_name}' not found at {playbook_relative}\n"
-                        provision_output += f"   Create the playbook file or remove it from the deployment configuration.\n"
+                        output_writer.append(f"⚠️ WARNING: Playbook '{playbook_name}' not found at {playbook_relative}\n")
+                        output_writer.append(f"   Create the playbook file or remove it from the deployment configuration.\n")
                         continue
                     
                     # Execute playbook
@@ -1136,16 +1752,16 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
                             timeout=600  # 10 minutes per playbook
                         )
                         
-                        provision_output += f"STDOUT:\n{result.stdout}\n\n"
+                        output_writer.append(f"STDOUT:\n{result.stdout}\n\n")
                         if result.stderr:
-                            provision_output += f"STDERR:\n{result.stderr}\n\n"
+                            output_writer.append(f"STDERR:\n{result.stderr}\n\n")
                         
                         if result.returncode == 0:
                             logger.info(f'[CELERY-LINUX-{self.request.id}] ✅ Playbook {playbook_name} completed successfully')
-                            provision_output += f"✅ SUCCESS: {playbook_name} completed\n"
+                            output_writer.append(f"✅ SUCCESS: {playbook_name} completed\n")
                         else:
                             logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ Playbook {playbook_name} failed with return code {result.returncode}')
-                            provision_output += f"❌ ERROR: {playbook_name} failed (return code {result.returncode})\n"
+                            output_writer.append(f"❌ ERROR: {playbook_name} failed (return code {result.returncode})\n")
                         
                         # Clean up temporary inventory file
                         try:
@@ -1156,7 +1772,7 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
                     
                     except subprocess.TimeoutExpired:
                         logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ Playbook {playbook_name} timeout')
-                        provision_output += f"❌ ERROR: {playbook_name} timeout (>10 minutes)\n"
+                        output_writer.append(f"❌ ERROR: {playbook_name} timeout (>10 minutes)\n")
                         # Clean up inventory file on timeout
                         try:
                             os.remove(inventory_path)
@@ -1164,7 +1780,7 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
                             pass
                     except Exception as e:
                         logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ Playbook {playbook_name} exception: {e}')
-                        provision_output += f"❌ ERROR: {playbook_name} exception: {str(e)}\n"
+                        output_writer.append(f"❌ ERROR: {playbook_name} exception: {str(e)}\n")
                         # Clean up inventory file on exception
                         try:
                             if 'inventory_path' in locals():
@@ -1172,7 +1788,6 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
                         except:
                             pass
             
-            history_record.ansible_output = provision_output
             history_record.completed_at = timezone.now()
             history_record.status = 'success'
             history_record.save()
@@ -1186,8 +1801,8 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
             
             return {'status': 'success', 'history_id': history_id, 'return_code': 0}
         else:
-            logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ SSH verification failed on new IP: {new_ip}')
-            history_record.ansible_output = provision_output + f"\n\n❌ ERROR: Could not establish SSH connection to {new_ip} after reboot.\nVM may not be on the correct network or IP was not applied correctly."
+            logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ SSH verification failed on new IP: {new_ip} ({probe.error})')
+            output_writer.append(f"\n\n❌ ERROR: Could not establish SSH connection to {new_ip} {max_wait_reboot}s after reboot ({probe.error}).\nVM may not be on the correct network or IP was not applied correctly.")
             history_record.completed_at = timezone.now()
             history_record.status = 'failed'
             history_record.save()
@@ -1204,7 +1819,7 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
     except subprocess.TimeoutExpired:
         logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ Ansible playbook timeout (>600s)')
         history_record = DeploymentHistory.objects.get(pk=history_id)
-        history_record.ansible_output = "ERROR: Ansible playbook execution timeout (>10 minutes)"
+        history_record.append_output("\nERROR: Ansible playbook execution timeout (>10 minutes)\n")
         history_record.completed_at = timezone.now()
         history_record.status = 'failed'
         history_record.save()
@@ -1222,7 +1837,7 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
         logger.error(f'[CELERY-LINUX-{self.request.id}] ❌ Exception: {str(e)}')
         try:
             history_record = DeploymentHistory.objects.get(pk=history_id)
-            history_record.ansible_output = f"Exception: {str(e)}"
+            history_record.append_output(f"\nException: {str(e)}\n")
             history_record.completed_at = timezone.now()
             history_record.status = 'failed'
             history_record.save()
@@ -1237,3 +1852,49 @@ def provision_linux_vm_async(self, history_id, template_ip, new_ip, new_hostname
             pass
         
         return {'status': 'error', 'message': str(e)}
+    
+    finally:
+        if not template_ip_left:
+            note = leave_template_ip(template_ip_lock, history_id, vcenter_host, vcenter_user, vcenter_password,
+                                     new_hostname, f'[CELERY-LINUX-{self.request.id}]')
+            if note:
+                try:
+                    DeploymentHistory.objects.get(pk=history_id).append_output(note)
+                except Exception:
+                    pass
+
+
+@shared_task(name='deploy.tasks.refresh_vcenter_catalog', ignore_result=True)
+def refresh_vcenter_catalog(vcenter_id):
+    """
+    Rebuild the cached inventory catalog of one vCenter.
+    
+    Args:
+        vcenter_id: VCenterCredential ID
+    """
+    from settings.models import VCenterCredential
+    from deploy.vcenter_catalog import refresh_catalog
+    
+    cred = VCenterCredential.objects.filter(pk=vcenter_id).first()
+    if not cred:
+        logger.warning(f'[CELERY-CATALOG] vCenter credential {vcenter_id} not found')
+        return
+    
+    try:
+        catalog = refresh_catalog(cred)
+        logger.info(f'[CELERY-CATALOG] Catalog for {cred.host} refreshed: '
+                    f'{len(catalog["datacenters"])} datacenters, {len(catalog["templates"])} templates')
+    except Exception as e:
+        logger.error(f'[CELERY-CATALOG] Failed to refresh catalog for {cred.host}: {e}')
+
+
+@shared_task(name='deploy.tasks.refresh_vcenter_catalogs', ignore_result=True)
+def refresh_vcenter_catalogs():
+    """
+    Periodic (celery beat) refresh of every vCenter catalog, so the deploy
+    form dropdowns are served from cache.
+    """
+    from settings.models import VCenterCredential
+    
+    for vcenter_id in VCenterCredential.objects.values_list('pk', flat=True):
+        refresh_vcenter_catalog.delay(vcenter_id)
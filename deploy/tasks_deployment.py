@@ -179,7 +179,7 @@ def deploy_vm_async(self, history_id, deployment_params):
         
         history_record.status = 'failed'
         history_record.completed_at = timezone.now()
-        history_record.ansible_output = f"Error: {str(e)}"
+        history_record.append_output(f"\nError: {str(e)}\n")
         history_record.save()
         
         self.update_state(
@@ -7,10 +7,11 @@ from django.conf import settings
 import logging
 import time
 import socket
-import ssl
 import winrm
-from pyVim.connect import SmartConnect, Disconnect
-from pyVmomi import vim
+from deploy.vcenter_pool import vcenter_session
+from deploy.vcenter_index import find_vm_by_name
+from deploy.vcenter_network import change_vm_network_pooled
+from deploy.vcenter_waiter import wait_for_task
 
 logger = logging.getLogger('deploy.tasks')
 
@@ -50,6 +51,7 @@ def provision_windows_vm_async(
     This allows the frontend to show real-time progress while the deployment runs in background.
     """
     from history.models import DeploymentHistory
+    from history.output_store import OutputChunkWriter
     from inventory.models import Host, Environment, Group
     from settings.models import WindowsCredential
     
@@ -63,13 +65,11 @@ def provision_windows_vm_async(
         logger.info(f'[CELERY-WINDOWS-{self.request.id}] Starting Windows VM provisioning')
         logger.info(f'[CELERY-WINDOWS-{self.request.id}] Target: {new_hostname} ({new_ip})')
         
-        output_buffer = []
+        output_writer = OutputChunkWriter(history_record, flush_every=5)
         
         def update_output(message):
-            """Helper to update output incrementally"""
-            output_buffer.append(message)
-            history_record.ansible_output = '\n'.join(output_buffer)
-            history_record.save(update_fields=['ansible_output'])
+            """Helper to append output incrementally"""
+            output_writer.append(f'{message}\n')
             logger.info(f'[CELERY-WINDOWS-{self.request.id}] {message}')
         
         update_output(f'=== WINDOWS VM PROVISIONING ===')
@@ -169,21 +169,14 @@ ansible_port={windows_port}
             bufsize=1
         )
         
-        line_count = 0
+        # Store only new lines, every 5 lines
         for line in process.stdout:
-            output_buffer.append(line.rstrip())
-            line_count += 1
-            
-            # Update DB every 5 lines
-            if line_count % 5 == 0:
-                history_record.ansible_output = '\n'.join(output_buffer)
-                history_record.save(update_fields=['ansible_output'])
+            output_writer.write(f'{line.rstrip()}\n')
         
         return_code = process.wait(timeout=600)
         
         # Final update
-        history_record.ansible_output = '\n'.join(output_buffer)
-        history_record.save(update_fields=['ansible_output'])
+        output_writer.flush()
         
         update_output('')
         update_output(f'Ansible playbook completed with return code: {return_code}')
@@ -213,92 +206,31 @@ ansible_port={windows_port}
         
         # Step 5: Change network in vCenter
         update_output(f'Step 5/8: Changing network to {network_name} in vCenter...')
-        network_changed = False
-        
-        try:
-            context = ssl._create_unverified_context()
-            si = SmartConnect(
-                host=vcenter_host,
-                user=vcenter_user,
-                pwd=vcenter_password,
-                sslContext=context
-            )
-            content = si.RetrieveContent()
-            
-            # Find VM
-            vm_to_update = next((vm for vm in content.viewManager.CreateContainerView(
-                content.rootFolder, [vim.VirtualMachine], True).view 
-                if vm.name == new_hostname), None)
-            
-            if vm_to_update:
-                update_output(f'  ✓ VM found: {vm_to_update.name}')
-                
-                # Find network
-                target_net = next((n for n in content.viewManager.CreateContainerView(
-                    content.rootFolder, [vim.Network], True).view 
-                    if n.name == network_name), None)
-                
-                if target_net:
-                    update_output(f'  ✓ Network found: {target_net.name}')
-                    
-                    # Change network for first NIC
-                    for device in vm_to_update.config.hardware.device:
-                        if isinstance(device, vim.vm.device.VirtualEthernetCard):
-                            nic_spec = vim.vm.device.VirtualDeviceSpec()
-                            nic_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.edit
-                            nic_spec.device = device
-                            
-                            if isinstance(target_net, vim.dvs.DistributedVirtualPortgroup):
-                                dvs_port_connection = vim.dvs.PortConnection()
-                                dvs_port_connection.portgroupKey = target_net.key
-                                dvs_port_connection.switchUuid = target_net.config.distributedVirtualSwitch.uuid
-                                nic_spec.device.backing = vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo()
-                                nic_spec.device.backing.port = dvs_port_connection
-                            else:
-                                nic_spec.device.backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo()
-                                nic_spec.device.backing.network = target_net
-                                nic_spec.device.backing.deviceName = network_name
-                            
-                            config_spec = vim.vm.ConfigSpec()
-                            config_spec.deviceChange = [nic_spec]
-                            
-                            reconfig_task = vm_to_update.ReconfigVM_Task(spec=config_spec)
-                            while reconfig_task.info.state not in ["success", "error"]:
-                                time.sleep(1)
-                            
-                            if reconfig_task.info.state == "success":
-                                network_changed = True
-                                update_output(f'  ✓ Network changed successfully')
-                                break
-                            else:
-                                update_output(f'  ❌ Network change failed: {reconfig_task.info.error}')
-                else:
-                    update_output(f'  ❌ Network not found: {network_name}')
-            else:
-                update_output(f'  ❌ VM not found: {new_hostname}')
-            
-            Disconnect(si)
-        except Exception as e:
-            update_output(f'  ❌ Error changing network: {str(e)[:200]}')
+        network_changed, message = change_vm_network_pooled(
+            vcenter_host, vcenter_user, vcenter_password,
+            vm_name=new_hostname,
+            network_name=network_name
+        )
+        if network_changed:
+            update_output(f'  ✓ {message}')
+        else:
+            update_output(f'  ❌ Network change failed: {message[:200]}')
         
         update_output('')
         
         # Step 6: Power on VM
         update_output('Step 6/8: Powering on VM...')
         try:
-            si = SmartConnect(host=vcenter_host, user=vcenter_user, pwd=vcenter_password, sslContext=context)
-            content = si.RetrieveContent()
-            vm_to_power = next((vm for vm in content.viewManager.CreateContainerView(
-                content.rootFolder, [vim.VirtualMachine], True).view 
-                if vm.name == new_hostname), None)
+            with vcenter_session(vcenter_host, vcenter_user, vcenter_password) as si:
+                vm_to_power = find_vm_by_name(si, new_hostname)
             
-            if vm_to_power and vm_to_power.runtime.powerState == 'poweredOff':
-                power_task = vm_to_power.PowerOn()
-                while power_task.info.state not in ["success", "error"]:
-                    time.sleep(1)
-                update_output('  ✓ VM powered on successfully')
+                if vm_to_power and vm_to_power.runtime.powerState == 'poweredOff':
+                    info = wait_for_task(si, vm_to_power.PowerOn(), timeout=600)
+                    if info.state == 'success':
+                        update_output('  ✓ VM powered on successfully')
+                    else:
+                        update_output(f'  ❌ Power on failed: {info.error.msg if info.error else "unknown error"}')
             
-            Disconnect(si)
         except Exception as e:
             update_output(f'  ❌ Error powering on: {str(e)[:200]}')
         
@@ -398,7 +330,7 @@ ansible_port={windows_port}
             history_record = DeploymentHistory.objects.get(pk=history_id)
             history_record.status = 'failed'
             history_record.completed_at = timezone.now()
-            history_record.ansible_output += f'\n\n❌ CRITICAL ERROR: {str(e)}'
+            history_record.append_output(f'\n\n❌ CRITICAL ERROR: {str(e)}\n')
             history_record.save()
             
             # Send notification
@@ -1,3 +1,156 @@
-from django.test import TestCase
+import contextlib
+import json
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from pyVmomi import vim
+
+from history.models import DeploymentHistory, ExecutionBatch
+from settings.models import VCenterCredential
+
+from .rolling import advance_rollout, queue_batch
+from .vcenter_catalog import InventoryTracker
+from .vcenter_group_snapshot import create_snapshots
+from .views_bulk import validate_rows
+
+
+class InventoryTrackerSnapshotTests(SimpleTestCase):
+    """The container view never includes rootFolder itself"""
+
+    def make_tracker(self):
+        root = vim.Folder('group-d1')
+        dc = vim.Datacenter('datacenter-1')
+        vm_folder = vim.Folder('group-v1')
+        host_folder = vim.Folder('group-h1')
+        apps_folder = vim.Folder('group-v2')
+        cluster = vim.ClusterComputeResource('domain-c1')
+        pool = vim.ResourcePool('resgroup-1')
+        child_pool = vim.ResourcePool('resgroup-2')
+        template = vim.VirtualMachine('vm-1')
+
+        tracker = InventoryTracker(si=None)
+        tracker.root_id = root._moId
+        for obj, props in [
+            (dc, {'name': 'DC1', 'parent': root, 'vmFolder': vm_folder, 'hostFolder': host_folder}),
+            (vm_folder, {'name': 'vm', 'parent': dc}),
+            (host_folder, {'name': 'host', 'parent': dc}),
+            (apps_folder, {'name': 'Apps', 'parent': vm_folder}),
+            (cluster, {'name': 'Cluster1', 'parent': host_folder, 'resourcePool': pool}),
+            (pool, {'name': 'Resources', 'parent': cluster}),
+            (child_pool, {'name': 'Web', 'parent': pool}),
+            (template, {'name': 'rhel9-template', 'config.template': True}),
+        ]:
+            tracker.objects[obj._moId] = {'obj': obj, **props}
+        return tracker
+
+    def test_snapshot_without_root_folder_object(self):
+        catalog = self.make_tracker().snapshot()
+        self.assertEqual(catalog['datacenters'], ['DC1'])
+        self.assertEqual(catalog['clusters'], {'DC1': ['Cluster1']})
+        self.assertEqual(catalog['resource_pools'], {'DC1': {'Cluster1': ['Resources', 'Web']}})
+        self.assertEqual(catalog['folders'], {'DC1': [{'name': 'Apps', 'path': 'Apps'}]})
+        self.assertEqual(catalog['templates'], ['rhel9-template'])
+
+    def test_nested_datacenters_are_skipped(self):
+        tracker = self.make_tracker()
+        tracker.root_id = 'group-other'
+        self.assertEqual(tracker.snapshot()['datacenters'], [])
+
+
+class BulkDeployValidationTests(TestCase):
+    """Malformed bulk requests are answered with 400, not a server error"""
+
+    def test_rows_with_bad_types_get_row_errors(self):
+        rows, errors = validate_rows([
+            {'hostname': 'web01', 'ip': None},
+            {'hostname': 'web02', 'ip': 10},
+            'web03',
+        ], 'VLAN10')
+        self.assertEqual(rows, [{'hostname': 'web01', 'ip': None, 'network': 'VLAN10'}])
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(errors[0].startswith('Row 2:'))
+        self.assertTrue(errors[1].startswith('Row 3:'))
+
+    def test_body_that_is_not_an_object(self):
+        user = User.objects.create_user('bulk', password='bulk-pass')
+        self.client.force_login(user)
+        for body in (['web01'], {'vms': 'web01'}):
+            response = self.client.post(reverse('deploy:bulk_deploy'), json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+
+
+@mock.patch('history.stream.publish_output')
+class AdvanceRolloutTests(TestCase):
+    """max_fail_percentage applies to the batch that just finished, like Ansible's"""
+
+    spec = {'max_fail_percentage': 10, 'os_type': 'linux', 'target': {'type': 'group', 'name': 'web'}}
+
+    def make_rollout(self, batches=4, size=5):
+        history = DeploymentHistory.objects.create(target='web', target_type='Group', playbook='site.yml', status='running')
+        for index in range(batches):
+            ids = list(range(index * size, (index + 1) * size))
+            ExecutionBatch.objects.create(deployment=history, index=index, host_ids=ids,
+                                          host_names=[f'web{i:02d}' for i in ids])
+        return history
+
+    def finish_batch(self, history, index, failed):
+        batch = history.execution_batches.get(index=index)
+        batch.status = 'failed' if failed else 'success'
+        batch.failed_hosts = batch.host_names[:failed]
+        batch.save()
+        return batch
+
+    def test_failed_batch_stops_rollout(self, publish_output):
+        history = self.make_rollout()
+        with mock.patch('deploy.rolling.queue_batch') as queue_batch:
+            advance_rollout(self.finish_batch(history, 0, failed=5), self.spec)
+        queue_batch.assert_not_called()
+        self.assertEqual(list(history.execution_batches.values_list('status', flat=True)),
+                         ['failed', 'skipped', 'skipped', 'skipped'])
+        history.refresh_from_db()
+        self.assertEqual(history.status, 'failed')
+
+    def test_batch_under_threshold_continues(self, publish_output):
+        history = self.make_rollout(batches=2, size=20)
+        with mock.patch('deploy.rolling.queue_batch') as queue_batch:
+            advance_rollout(self.finish_batch(history, 0, failed=2), self.spec)
+        queue_batch.assert_called_once()
+        self.assertEqual(queue_batch.call_args[0][0].index, 1)
+
+    @override_settings(ROLLING_BATCH_TIMEOUT=6 * 3600)
+    def test_batch_time_limits_follow_the_batch_timeout(self, publish_output):
+        history = self.make_rollout(batches=1)
+        with mock.patch('deploy.tasks.execute_rollout_batch.apply_async', return_value=mock.Mock(id='task-1')) as apply_async:
+            queue_batch(history.execution_batches.get(index=0), self.spec)
+        options = apply_async.call_args.kwargs
+        self.assertGreater(options['soft_time_limit'], 6 * 3600)
+        self.assertGreater(options['time_limit'], options['soft_time_limit'])
+
+
+class GroupSnapshotTimeoutTests(TestCase):
+    """Snapshot tasks still running at the deadline are cancelled and kept for the reaper"""
+
+    def test_in_flight_task_is_cancelled_and_unconfirmed(self):
+        VCenterCredential.objects.create(name='vc', host='vc.local', user='admin', password='secret')
+        host = SimpleNamespace(id=1, name='web01', ip='10.0.0.11', vcenter_server='vc.local')
+        vm = mock.Mock()
+        index = mock.Mock()
+        index.find_many.return_value = {host.id: vm}
+        index.datastores.return_value = []
+
+        @contextlib.contextmanager
+        def session(*args):
+            yield mock.Mock()
+
+        with mock.patch('deploy.vcenter_group_snapshot.vcenter_session', session), \
+                mock.patch('deploy.vcenter_group_snapshot.get_vm_index', return_value=index), \
+                mock.patch('deploy.vcenter_group_snapshot.TaskWatcher'):
+            [result] = create_snapshots([host], 'Before executing site.yml', timeout=1e-9)
+
+        vm.CreateSnapshot_Task.return_value.CancelTask.assert_called_once()
+        self.assertFalse(result.success)
+        self.assertTrue(result.unconfirmed)
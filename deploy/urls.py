@@ -2,6 +2,7 @@ from django.urls import path
 from . import views
 from . import views_group
 from . import views_windows
+from . import views_bulk
 from . import views_playbook
 from . import views_playbook_windows
 from . import views_task_status
@@ -17,6 +18,9 @@ urlpatterns = [
     path('vm/', views.deploy_vm, name='deploy_vm'),
     path('clear-auto-open/', views.clear_auto_open, name='clear_auto_open'),
     
+    # Bulk deploy (JSON or CSV)
+    path('bulk/', views_bulk.bulk_deploy, name='bulk_deploy'),
+    
     # Deploy Windows VM
     path('windows/', views_windows.deploy_windows_vm, name='deploy_windows_vm'),
     path('windows/run/', views_windows.deploy_windows_vm_run, name='deploy_windows_vm_run'),
@@ -52,5 +56,6 @@ urlpatterns = [
     path('ajax/get_folders/', ajax.get_folders, name='ajax_get_folders'),
     path('ajax/get_groups/', ajax.get_groups, name='ajax_get_groups'),
     path('ajax/get_hosts/', ajax.get_hosts, name='ajax_get_hosts'),
+    path('ajax/refresh_catalog/', ajax.refresh_catalog, name='ajax_refresh_catalog'),
     path('ajax/task-progress/<str:task_id>/', ajax.get_task_progress, name='ajax_get_task_progress'),
 ]
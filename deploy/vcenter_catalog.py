@@ -0,0 +1,212 @@
+"""
+Cached vCenter inventory catalog for the deploy form and its AJAX dropdowns.
+
+The catalog holds, per VCenterCredential, the names the deploy form offers:
+datacenters, clusters, resource pools, VM folders, templates, datastores
+and networks. It is built from an InventoryTracker (see vcenter_index) so
+refreshes only transfer what changed in vCenter, and is stored in the
+Django cache (Redis in production) so web requests never walk the tree:
+
+    from deploy.vcenter_catalog import get_catalog, catalog_clusters
+
+    catalog = get_catalog(cred)
+    clusters = catalog_clusters(catalog, 'DC1')
+
+Entries expire after VCENTER_CATALOG_TTL seconds and are refreshed by the
+refresh_vcenter_catalogs Celery beat task. invalidate_catalog() bumps the
+per-vCenter generation used as cache version, so a manual "refresh now"
+drops the cached entry at once.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from pyVmomi import vim
+
+from .vcenter_index import PropertyTracker, get_session_tracker
+from .vcenter_pool import credential_session
+
+logger = logging.getLogger(__name__)
+
+CATALOG_KEY = 'vcenter_catalog:{pk}'
+GENERATION_KEY = 'vcenter_catalog:{pk}:generation'
+
+
+class InventoryTracker(PropertyTracker):
+    """
+    Names and parent links of the inventory objects used by the deploy form
+    """
+
+    properties = {
+        vim.Datacenter: ['name', 'parent', 'vmFolder', 'hostFolder'],
+        vim.Folder: ['name', 'parent'],
+        vim.ComputeResource: ['name', 'parent', 'resourcePool'],
+        vim.ResourcePool: ['name', 'parent'],
+        vim.Datastore: ['name'],
+        vim.Network: ['name'],
+        vim.VirtualMachine: ['name', 'config.template'],
+    }
+    log_prefix = '[VCENTER-CATALOG]'
+
+    # rootFolder no está en la vista (solo sus descendientes): se guarda su moid al construir
+    root_id = None
+
+    def build(self):
+        self.root_id = self.si.RetrieveContent().rootFolder._moId
+        return super().build()
+
+    def snapshot(self):
+        """Return the catalog as plain, JSON-serializable data"""
+        def moid(obj):
+            return obj._moId if obj is not None else None
+
+        by_type = {}
+        children = {}
+        for object_id, props in self.objects.items():
+            obj = props['obj']
+            for obj_type in self.properties:
+                if isinstance(obj, obj_type):
+                    by_type.setdefault(obj_type, []).append(props)
+                    break
+            children.setdefault(moid(props.get('parent')), []).append(props)
+
+        def child_names(parent_id, obj_type):
+            return [p['name'] for p in children.get(parent_id, []) if isinstance(p['obj'], obj_type)]
+
+        def folder_tree(folder_id, path=''):
+            folders = []
+            for child in children.get(folder_id, []):
+                if isinstance(child['obj'], vim.Folder):
+                    folder_path = f"{path}/{child['name']}" if path else child['name']
+                    folders.append({'name': child['name'], 'path': folder_path})
+                    folders.extend(folder_tree(moid(child['obj']), folder_path))
+            return folders
+
+        datacenters = []
+        clusters = {}
+        resource_pools = {}
+        folders = {}
+        for dc in by_type.get(vim.Datacenter, []):
+            # Only top-level datacenters, like rootFolder.childEntity
+            if moid(dc.get('parent')) != self.root_id:
+                continue
+            name = dc['name']
+            datacenters.append(name)
+            compute = [p for p in children.get(moid(dc.get('hostFolder')), [])
+                       if isinstance(p['obj'], vim.ComputeResource)]
+            clusters[name] = sorted(p['name'] for p in compute)
+            resource_pools[name] = {}
+            for cluster in compute:
+                root_pool = self.objects.get(moid(cluster.get('resourcePool')))
+                if root_pool is None:
+                    continue
+                pools = [root_pool['name']] + child_names(moid(root_pool['obj']), vim.ResourcePool)
+                resource_pools[name][cluster['name']] = sorted(set(pools))
+            folders[name] = sorted(folder_tree(moid(dc.get('vmFolder'))), key=lambda f: f['path'].lower())
+
+        return {
+            'datacenters': sorted(datacenters),
+            'clusters': clusters,
+            'resource_pools': resource_pools,
+            'folders': folders,
+            'templates': sorted(p['name'] for p in by_type.get(vim.VirtualMachine, []) if p.get('config.template')),
+            'datastores': sorted({p['name'] for p in by_type.get(vim.Datastore, [])}),
+            'networks': sorted({p['name'] for p in by_type.get(vim.Network, [])}),
+        }
+
+
+def _generation(pk):
+    return cache.get(GENERATION_KEY.format(pk=pk), 1)
+
+
+def invalidate_catalog(vcenter_id):
+    """Drop the cached catalog of a vCenter (the next read rebuilds it)"""
+    key = GENERATION_KEY.format(pk=vcenter_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+    logger.info(f"[VCENTER-CATALOG] Catalog for vCenter {vcenter_id} invalidated")
+
+
+def refresh_catalog(cred):
+    """
+    Apply vCenter changes to the inventory tracker and store a new catalog
+
+    Args:
+        cred: VCenterCredential
+
+    Returns:
+        dict: the catalog
+    """
+    with credential_session(cred) as si:
+        tracker = get_session_tracker(si, 'inventory', InventoryTracker)
+        if tracker is None:
+            tracker = InventoryTracker(si).build()
+            try:
+                catalog = tracker.snapshot()
+            finally:
+                tracker.close()
+        else:
+            tracker.refresh(force=True)
+            catalog = tracker.snapshot()
+
+    catalog['vcenter_id'] = cred.pk
+    catalog['built_at'] = timezone.now().isoformat()
+    try:
+        cache.set(
+            CATALOG_KEY.format(pk=cred.pk),
+            catalog,
+            getattr(settings, 'VCENTER_CATALOG_TTL', 600),
+            version=_generation(cred.pk),
+        )
+    except Exception as e:
+        logger.warning(f"[VCENTER-CATALOG] Could not cache catalog for {cred.host}: {e}")
+    return catalog
+
+
+def get_catalog(cred):
+    """
+    Return the cached catalog of a vCenter, building it on a cache miss
+
+    Args:
+        cred: VCenterCredential
+
+    Returns:
+        dict: catalog (see InventoryTracker.snapshot)
+    """
+    try:
+        catalog = cache.get(CATALOG_KEY.format(pk=cred.pk), version=_generation(cred.pk))
+    except Exception as e:
+        logger.warning(f"[VCENTER-CATALOG] Cache unavailable, reading vCenter directly: {e}")
+        catalog = None
+    if catalog is None:
+        catalog = refresh_catalog(cred)
+    return catalog
+
+
+def _lookup(mapping, name):
+    """Case-insensitive dictionary lookup (the form sends names as typed)"""
+    if name is None:
+        return None
+    if name in mapping:
+        return mapping[name]
+    name_norm = name.strip().lower()
+    return next((value for key, value in mapping.items() if key.strip().lower() == name_norm), None)
+
+
+def catalog_clusters(catalog, datacenter):
+    """Cluster names of a datacenter, or None if the datacenter is unknown"""
+    return _lookup(catalog['clusters'], datacenter)
+
+
+def catalog_resource_pools(catalog, datacenter, cluster):
+    """Resource pool names of a cluster (root pool included)"""
+    pools = _lookup(catalog['resource_pools'], datacenter) or {}
+    return _lookup(pools, cluster) or []
+
+
+def catalog_folders(catalog, datacenter):
+    """VM folders of a datacenter as [{'name': ..., 'path': ...}]"""
+    return _lookup(catalog['folders'], datacenter) or []
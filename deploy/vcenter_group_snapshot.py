@@ -0,0 +1,324 @@
+"""
+Pre-execution snapshots for many hosts at once.
+
+Snapshotting a group host by host (VM lookup -> CreateSnapshot_Task -> wait
+-> lookup again) takes minutes for a large group. Here:
+
+- every vCenter of the group is handled in its own thread, on one pooled session
+- all members are resolved together through the session's VMIndex
+- CreateSnapshot_Task is submitted for many VMs at a time, with at most
+  SNAPSHOT_MAX_CONCURRENT_PER_VCENTER tasks in flight per vCenter and
+  SNAPSHOT_MAX_CONCURRENT_PER_DATASTORE per datastore
+- the tasks are waited on together (TaskWatcher) and the new snapshot ids
+  are read for all VMs with one RetrievePropertiesEx call
+- SnapshotHistory rows are written with a single bulk_create
+- tasks still running at the deadline are cancelled and, since vCenter may
+  finish them anyway, recorded too so the snapshot reaper removes them
+
+    results = snapshot_hosts(hosts, playbook.name, f'Safety snapshot before {playbook.name}',
+                             group=group, playbook=playbook, user=request.user)
+    created = [r for r in results if r.success]
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from pyVmomi import vim, vmodl
+
+from .vcenter_index import get_vm_index
+from .vcenter_pool import vcenter_session
+from .vcenter_waiter import TaskWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotResult:
+    """Outcome of the snapshot of one host"""
+
+    def __init__(self, host, snapshot_name, success=False, message='', snapshot_id=None, unconfirmed=False):
+        self.host = host
+        self.snapshot_name = snapshot_name
+        self.success = success
+        self.message = message
+        self.snapshot_id = snapshot_id
+        # Tarea aún en curso al vencer el plazo: el snapshot puede existir igualmente
+        self.unconfirmed = unconfirmed
+
+    def __repr__(self):
+        state = 'ok' if self.success else 'failed'
+        return f'<SnapshotResult {self.host.name} {state}: {self.message}>'
+
+
+def pre_execution_snapshot_name(execution_name):
+    """'Before executing <name> - <local time>', the prefix cleanup_old_snapshots looks for"""
+    local_time = timezone.localtime(timezone.now())
+    return f"Before executing {execution_name} - {local_time.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def get_retention_hours():
+    from settings.models import GlobalSetting
+
+    retention_setting = GlobalSetting.objects.filter(key='snapshot_retention_hours').first()
+    return int(retention_setting.value) if retention_setting and retention_setting.value else 24
+
+
+def create_snapshots(hosts, snapshot_name, description='', on_progress=None, timeout=None):
+    """
+    Snapshot the VMs of several hosts concurrently (memory=False, quiesce=False)
+
+    Args:
+        hosts: Host objects (any mix of vCenters)
+        snapshot_name: Name of the snapshot on every VM
+        description: Snapshot description
+        on_progress: Optional callable(done, total, result) called as each
+            host finishes (from worker threads, one call at a time)
+        timeout: Seconds to wait for all tasks (default: SNAPSHOT_GROUP_TIMEOUT)
+
+    Returns:
+        list of SnapshotResult, in the order of `hosts`
+    """
+    from settings.models import VCenterCredential
+
+    hosts = list(hosts)
+    total = len(hosts)
+    timeout = timeout or getattr(settings, 'SNAPSHOT_GROUP_TIMEOUT', 900)
+    deadline = time.monotonic() + timeout
+    results = {}
+    lock = threading.Lock()
+
+    def report(result):
+        with lock:
+            if result.host.id in results:
+                return
+            results[result.host.id] = result
+            if on_progress:
+                try:
+                    on_progress(len(results), total, result)
+                except Exception as e:
+                    logger.warning(f'[GROUP-SNAPSHOT] Progress callback failed: {e}')
+
+    by_vcenter = defaultdict(list)
+    for host in hosts:
+        if host.vcenter_server:
+            by_vcenter[host.vcenter_server].append(host)
+        else:
+            report(SnapshotResult(host, snapshot_name, message=f'No vCenter server configured for {host.name}'))
+
+    # Primera credencial por vCenter, como VCenterCredential.objects.filter(host=...).first()
+    credentials = {}
+    for cred in VCenterCredential.objects.filter(host__in=list(by_vcenter)).order_by('id'):
+        credentials.setdefault(cred.host, cred)
+
+    jobs = []
+    for vcenter_server, vcenter_hosts in by_vcenter.items():
+        cred = credentials.get(vcenter_server)
+        if cred is None:
+            logger.warning(f'[GROUP-SNAPSHOT] vCenter credential not found for {vcenter_server}. Skipping {len(vcenter_hosts)} host(s)')
+            for host in vcenter_hosts:
+                report(SnapshotResult(host, snapshot_name, message=f'vCenter credential not found for {vcenter_server}'))
+            continue
+        # Descifrar aquí: los hilos no tocan la base de datos
+        jobs.append((vcenter_server, cred.user, cred.get_password(), vcenter_hosts))
+
+    if jobs:
+        logger.info(f"[GROUP-SNAPSHOT] Creating '{snapshot_name}' on {total} host(s) across {len(jobs)} vCenter(s)")
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='group-snapshot') as executor:
+            futures = {
+                executor.submit(_snapshot_on_vcenter, vcenter_server, user, password, vcenter_hosts,
+                                snapshot_name, description, report, deadline, timeout): (vcenter_server, vcenter_hosts)
+                for vcenter_server, user, password, vcenter_hosts in jobs
+            }
+            for future in as_completed(futures):
+                vcenter_server, vcenter_hosts = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f'[GROUP-SNAPSHOT] Exception creating snapshots on vCenter {vcenter_server}: {e}')
+                    for host in vcenter_hosts:
+                        report(SnapshotResult(host, snapshot_name, message=f'Exception creating snapshot: {e}'))
+
+    ordered = [results[host.id] for host in hosts]
+    created = sum(1 for result in ordered if result.success)
+    logger.info(f"[GROUP-SNAPSHOT] '{snapshot_name}': {created}/{total} snapshot(s) created")
+    return ordered
+
+
+def _snapshot_on_vcenter(vcenter_server, user, password, hosts, snapshot_name, description, report, deadline, timeout):
+    """Snapshot the hosts of one vCenter on one pooled session"""
+    per_vcenter = max(1, getattr(settings, 'SNAPSHOT_MAX_CONCURRENT_PER_VCENTER', 8))
+    per_datastore = max(1, getattr(settings, 'SNAPSHOT_MAX_CONCURRENT_PER_DATASTORE', 2))
+
+    with vcenter_session(vcenter_server, user, password) as si:
+        index = get_vm_index(si)
+        vms = index.find_many({host.id: [host.ip, host.name] for host in hosts})
+
+        queue = deque()
+        for host in hosts:
+            vm = vms[host.id]
+            if vm is None:
+                logger.error(f'[GROUP-SNAPSHOT] ✗ VM not found for {host.name} ({host.ip}) in {vcenter_server}')
+                report(SnapshotResult(host, snapshot_name, message=f'VM with IP {host.ip} not found'))
+                continue
+            queue.append((host, vm, [ds._moId for ds in index.datastores(vm)]))
+
+        watcher = TaskWatcher(si)
+        in_flight = {}              # host id -> (host, vm, datastores, task)
+        load = Counter()            # datastore moref id -> tasks in flight
+        created = []                # (result, vm, snapshot moref)
+        try:
+            while queue or in_flight:
+                waiting = deque()
+                while queue and len(in_flight) < per_vcenter:
+                    job = queue.popleft()
+                    host, vm, datastores = job
+                    if any(load[ds] >= per_datastore for ds in datastores):
+                        waiting.append(job)
+                        continue
+                    try:
+                        task = vm.CreateSnapshot_Task(
+                            name=snapshot_name,
+                            description=description,
+                            memory=False,   # NO memory capture
+                            quiesce=False   # NO filesystem quiesce
+                        )
+                    except Exception as e:
+                        report(SnapshotResult(host, snapshot_name, message=f'Exception creating snapshot: {e}'))
+                        continue
+                    watcher.add(task, key=host.id)
+                    in_flight[host.id] = (host, vm, datastores, task)
+                    load.update(datastores)
+                waiting.extend(queue)
+                queue = waiting
+
+                if not in_flight:
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for key, state, task_result, error in watcher.wait(timeout=remaining):
+                    host, vm, datastores, _task = in_flight.pop(key)
+                    load.subtract(datastores)
+                    if state == vim.TaskInfo.State.success:
+                        result = SnapshotResult(host, snapshot_name, success=True,
+                                                message=f"Snapshot '{snapshot_name}' created successfully")
+                        created.append((result, vm, task_result))
+                        report(result)
+                    else:
+                        error_msg = getattr(error, 'msg', None) or 'Unknown error'
+                        logger.error(f'[GROUP-SNAPSHOT] ✗ Snapshot of {host.name} failed: {error_msg}')
+                        report(SnapshotResult(host, snapshot_name, message=f'Failed to create snapshot: {error_msg}'))
+        finally:
+            watcher.close()
+
+        for host, _vm, _datastores, task in in_flight.values():
+            try:
+                task.CancelTask()
+                message = f'Snapshot task did not finish within {timeout}s (cancel requested)'
+            except Exception as e:
+                logger.warning(f'[GROUP-SNAPSHOT] Could not cancel the snapshot task of {host.name}: {e}')
+                message = f'Snapshot task did not finish within {timeout}s'
+            report(SnapshotResult(host, snapshot_name, message=message, unconfirmed=True))
+        for host, _vm, _datastores in queue:
+            report(SnapshotResult(host, snapshot_name, message=f'Snapshot not started within {timeout}s'))
+
+        _fill_snapshot_ids(si, created)
+
+
+def _fill_snapshot_ids(si, created):
+    """Set snapshot_id on the results reading the snapshot tree of all VMs at once"""
+    if not created:
+        return
+    wanted = {snapshot._moId: result for result, _vm, snapshot in created if snapshot is not None}
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+        objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=vm, skip=False) for _result, vm, _snapshot in created],
+        propSet=[vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine, pathSet=['snapshot'], all=False)]
+    )
+    collector = si.content.propertyCollector
+    options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=500)
+    try:
+        page = collector.RetrievePropertiesEx([filter_spec], options)
+        while page:
+            for obj_content in page.objects:
+                for prop in obj_content.propSet or []:
+                    trees = list(prop.val.rootSnapshotList or []) if prop.val else []
+                    while trees:
+                        tree = trees.pop()
+                        result = wanted.get(tree.snapshot._moId)
+                        if result is not None:
+                            result.snapshot_id = str(tree.id)
+                        trees.extend(tree.childSnapshotList or [])
+            page = collector.ContinueRetrievePropertiesEx(page.token) if page.token else None
+    except Exception as e:
+        # Los snapshots existen (la tarea terminó bien); solo falta el id
+        logger.warning(f'[GROUP-SNAPSHOT] Could not read snapshot ids: {e}')
+
+
+def record_snapshots(results, description='', retention_hours=None, **fields):
+    """
+    Save the created snapshots to SnapshotHistory with one bulk_create
+
+    Timed-out snapshots (unconfirmed) are saved too, without a vCenter id:
+    if the cancelled task still created the snapshot the reaper finds it by
+    name when it expires, and otherwise marks the row as gone.
+
+    Args:
+        results: SnapshotResult list from create_snapshots()
+        description: SnapshotHistory description
+        retention_hours: Default: GlobalSetting snapshot_retention_hours
+        **fields: Other SnapshotHistory fields (group, playbook, script_name, user)
+
+    Returns:
+        list of the created SnapshotHistory
+    """
+    from snapshots.models import SnapshotHistory
+
+    if retention_hours is None:
+        retention_hours = get_retention_hours()
+    now = timezone.now()
+    rows = [
+        SnapshotHistory(
+            snapshot_name=result.snapshot_name,
+            vcenter_snapshot_id=result.snapshot_id,
+            host=result.host,
+            description=description,
+            retention_hours=retention_hours,
+            # bulk_create no llama a save(), que es quien calcula expires_at
+            expires_at=now + timedelta(hours=retention_hours),
+            status='active',
+            **fields
+        )
+        for result in results if result.success or result.unconfirmed
+    ]
+    if not rows:
+        return []
+    created = SnapshotHistory.objects.bulk_create(rows)
+    logger.info(f'[GROUP-SNAPSHOT] {len(created)} snapshot(s) recorded in history with {retention_hours}h retention')
+    return created
+
+
+def snapshot_hosts(hosts, execution_name, description='', on_progress=None, **fields):
+    """
+    Create the pre-execution snapshots of several hosts and record them
+
+    Args:
+        hosts: Host objects
+        execution_name: Playbook/script name used in the snapshot name
+        description: Snapshot description
+        on_progress: See create_snapshots()
+        **fields: Extra SnapshotHistory fields (group, playbook, script_name, user)
+
+    Returns:
+        list of SnapshotResult, in the order of `hosts`
+    """
+    snapshot_name = pre_execution_snapshot_name(execution_name)
+    results = create_snapshots(hosts, snapshot_name, description, on_progress=on_progress)
+    try:
+        record_snapshots(results, description=description, **fields)
+    except Exception as e:
+        logger.error(f'[GROUP-SNAPSHOT] Failed to record snapshots in history: {e}')
+    return results
@@ -0,0 +1,356 @@
+"""
+In-memory indexes of vCenter inventory kept current with the PropertyCollector.
+
+Looking a VM up by walking a ContainerView costs several lazy SOAP
+round-trips per VM (config.template, guest.ipAddress, guest.net,
+guest.hostName). PropertyTracker fetches just the properties it needs for
+every object with a single paged RetrievePropertiesEx call and then asks a
+dedicated PropertyCollector for changes since the last version
+(WaitForUpdatesEx). VMIndex builds on it with dictionaries keyed by IP,
+name and short hostname:
+
+    from deploy.vcenter_index import find_vm
+
+    vm, indexed = find_vm(si, '10.0.0.15')
+
+Trackers built for pooled sessions live as long as the session, so lookups
+after the first one only pay for the (usually empty) update call.
+"""
+import logging
+import time
+
+from pyVmomi import vim, vmodl
+
+logger = logging.getLogger(__name__)
+
+VM_PROPERTIES = ['name', 'config.template', 'guest.ipAddress', 'guest.net', 'guest.hostName', 'datastore']
+
+
+class PropertyTracker:
+    """
+    Mirror of selected properties for every object of some types.
+
+    Subclasses set `properties` ({managed object type: [property paths]})
+    and may override on_change()/on_remove() to maintain derived tables.
+    Not thread-safe: a pooled session is only used by one thread at a time.
+    """
+
+    properties = {}
+    log_prefix = '[VCENTER-TRACKER]'
+
+    def __init__(self, si, page_size=500, refresh_interval=5):
+        self.si = si
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self._view = None
+        self._collector = None
+        self._filter = None
+        self._last_refresh = 0
+        self.reset()
+
+    def __len__(self):
+        return len(self.objects)
+
+    def _filter_spec(self):
+        traversal = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseEntities',
+            path='view',
+            skip=False,
+            type=vim.view.ContainerView
+        )
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(
+            obj=self._view,
+            skip=True,
+            selectSet=[traversal]
+        )
+        property_specs = [
+            vmodl.query.PropertyCollector.PropertySpec(type=obj_type, pathSet=paths, all=False)
+            for obj_type, paths in self.properties.items()
+        ]
+        return vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[object_spec],
+            propSet=property_specs
+        )
+
+    def reset(self):
+        """Clear the mirrored objects (and derived tables) before a full build"""
+        self.objects = {}       # moref id -> {'obj': managed object, property: value}
+
+    def build(self):
+        """Load every object with paged RetrievePropertiesEx and start tracking updates"""
+        self.close()
+        start = time.monotonic()
+        content = self.si.RetrieveContent()
+        self._view = content.viewManager.CreateContainerView(content.rootFolder, list(self.properties), True)
+        filter_spec = self._filter_spec()
+        self.reset()
+
+        collector = content.propertyCollector
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=self.page_size)
+        result = collector.RetrievePropertiesEx([filter_spec], options)
+        pages = 0
+        while result:
+            pages += 1
+            for obj_content in result.objects:
+                self._set_properties(obj_content.obj, {prop.name: prop.val for prop in obj_content.propSet or []})
+            result = collector.ContinueRetrievePropertiesEx(result.token) if result.token else None
+
+        # Dedicated collector so the update version isn't shared with other callers
+        self._collector = collector.CreatePropertyCollector()
+        self._filter = self._collector.CreateFilter(filter_spec, partialUpdates=False)
+        self.version = ''
+        self._drain_updates()
+
+        logger.info(f"{self.log_prefix} Loaded {len(self.objects)} objects in {pages} page(s) in {time.monotonic() - start:.1f}s")
+        return self
+
+    def refresh(self, force=False):
+        """
+        Apply changes reported by vCenter since the last version
+
+        Returns:
+            bool: True when anything changed
+        """
+        if self._filter is None:
+            self.build()
+            return True
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return False
+        try:
+            return self._drain_updates() > 0
+        except vmodl.fault.InvalidCollectorVersion:
+            logger.info(f"{self.log_prefix} Collector version expired, rebuilding")
+            self.build()
+            return True
+
+    def _drain_updates(self):
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=self.page_size)
+        applied = 0
+        while True:
+            update_set = self._collector.WaitForUpdatesEx(self.version, options)
+            if update_set is None:
+                break
+            self.version = update_set.version
+            for filter_update in update_set.filterSet or []:
+                for object_update in filter_update.objectSet or []:
+                    self._apply_update(object_update)
+                    applied += 1
+            if not update_set.truncated:
+                break
+        self._last_refresh = time.monotonic()
+        return applied
+
+    def _apply_update(self, object_update):
+        if object_update.kind == 'leave':
+            self._remove(object_update.obj)
+            return
+        changes = {}
+        for change in object_update.changeSet or []:
+            changes[change.name] = None if change.op in ('remove', 'indirectRemove') else change.val
+        self._set_properties(object_update.obj, changes)
+
+    def _set_properties(self, obj, changes):
+        moid = obj._moId
+        props = self.objects.setdefault(moid, {'obj': obj})
+        props.update(changes)
+        self.on_change(moid, props)
+
+    def _remove(self, obj):
+        moid = obj._moId
+        props = self.objects.pop(moid, None)
+        if props is not None:
+            self.on_remove(moid, props)
+
+    def find_by_name(self, obj_type, name, predicate=None):
+        """Return the first tracked object of `obj_type` called `name` (optionally matching predicate(props))"""
+        for props in self.objects.values():
+            if props.get('name') == name and isinstance(props['obj'], obj_type):
+                if predicate is None or predicate(props):
+                    return props['obj']
+        return None
+
+    def on_change(self, moid, props):
+        """Hook called after an object was added or modified"""
+
+    def on_remove(self, moid, props):
+        """Hook called after an object left the inventory"""
+
+    def close(self):
+        """Destroy the server-side view, filter and collector"""
+        for destroy in (
+            lambda: self._filter.Destroy(),
+            lambda: self._collector.DestroyPropertyCollector(),
+            lambda: self._view.Destroy(),
+        ):
+            try:
+                destroy()
+            except Exception:
+                pass
+        self._view = self._collector = self._filter = None
+        self.version = None
+
+
+class VMIndex(PropertyTracker):
+    """
+    VM lookup tables (IP, name, hostname) for one vCenter session.
+    """
+
+    properties = {vim.VirtualMachine: VM_PROPERTIES}
+    log_prefix = '[VM-INDEX]'
+
+    def reset(self):
+        super().reset()
+        self._keys = {}         # moref id -> [(table, key)]
+        self.by_ip = {}
+        self.by_name = {}
+        self.by_hostname = {}
+        self.by_short_hostname = {}
+
+    def _unindex(self, moid, vm):
+        for table, key in self._keys.pop(moid, []):
+            if table.get(key) is vm:
+                del table[key]
+
+    def on_remove(self, moid, props):
+        self._unindex(moid, props['obj'])
+
+    def on_change(self, moid, props):
+        vm = props['obj']
+        self._unindex(moid, vm)
+        if props.get('config.template'):
+            return
+        keys = []
+
+        ips = set()
+        if props.get('guest.ipAddress'):
+            ips.add(props['guest.ipAddress'])
+        for nic in props.get('guest.net') or []:
+            ips.update(nic.ipAddress or [])
+        keys.extend((self.by_ip, ip) for ip in ips)
+
+        if props.get('name'):
+            keys.append((self.by_name, props['name']))
+
+        hostname = props.get('guest.hostName')
+        if hostname:
+            keys.append((self.by_hostname, hostname))
+            keys.append((self.by_short_hostname, hostname.split('.')[0]))
+
+        for table, key in keys:
+            table[key] = vm
+        self._keys[moid] = keys
+
+    def find(self, value):
+        """
+        Find a VM (templates excluded) by IP address, VM name or hostname
+
+        Search order:
+        1. Guest IP addresses (VMware Tools), primary and all NICs
+        2. VM name
+        3. Guest hostname, then short hostname
+        """
+        self.refresh()
+        vm = self._lookup(value)
+        if vm is None:
+            # The VM may have appeared (or got its IP) within the refresh interval
+            self.refresh(force=True)
+            vm = self._lookup(value)
+        return vm
+
+    def find_many(self, candidates):
+        """
+        Resolve several VMs with at most one forced refresh
+
+        Args:
+            candidates: {key: [value, ...]} identifiers tried in order for each key
+                (e.g. IP, then host name)
+
+        Returns:
+            dict key -> VM (None when not found)
+        """
+        self.refresh()
+        found = {key: self._lookup_first(values) for key, values in candidates.items()}
+        missing = [key for key, vm in found.items() if vm is None]
+        if missing:
+            self.refresh(force=True)
+            for key in missing:
+                found[key] = self._lookup_first(candidates[key])
+        return found
+
+    def datastores(self, vm):
+        """Datastores backing a tracked VM (from the indexed 'datastore' property)"""
+        props = self.objects.get(vm._moId) or {}
+        return list(props.get('datastore') or [])
+
+    def _lookup_first(self, values):
+        for value in values:
+            if value:
+                vm = self._lookup(value)
+                if vm is not None:
+                    return vm
+        return None
+
+    def _lookup(self, value):
+        for label, table in (('IP', self.by_ip), ('name', self.by_name),
+                             ('hostname', self.by_hostname), ('short hostname', self.by_short_hostname)):
+            vm = table.get(value)
+            if vm is not None:
+                logger.info(f"[VM-INDEX] ✓ Found VM by {label}: {value}")
+                return vm
+        return None
+
+
+def get_session_tracker(si, name, factory):
+    """
+    Return the tracker `name` stored on a pooled session, building it with
+    factory(si) on first use. Returns None when `si` is not pooled.
+    """
+    from .vcenter_pool import vcenter_pool
+
+    session = vcenter_pool.get_session(si)
+    if session is None:
+        return None
+    if name not in session.trackers:
+        session.trackers[name] = factory(si).build()
+    return session.trackers[name]
+
+
+def get_vm_index(si):
+    """
+    Return the VMIndex kept on a pooled session, or None when `si` does
+    not come from the pool.
+    """
+    return get_session_tracker(si, 'vm_index', VMIndex)
+
+
+def find_vm(si, value):
+    """Find a VM by IP, name or hostname using the session's VMIndex"""
+    index = get_vm_index(si)
+    if index is not None:
+        return index.find(value), len(index)
+
+    # Unpooled session: one-off index, destroyed right away
+    index = VMIndex(si).build()
+    try:
+        return index.find(value), len(index)
+    finally:
+        index.close()
+
+
+def find_vm_by_name(si, name):
+    """Find a VM (templates excluded) by its exact vCenter name"""
+    index = get_vm_index(si)
+    owned = index is None
+    if owned:
+        index = VMIndex(si).build()
+    try:
+        index.refresh()
+        vm = index.by_name.get(name)
+        if vm is None and not owned:
+            index.refresh(force=True)
+            vm = index.by_name.get(name)
+        return vm
+    finally:
+        if owned:
+            index.close()
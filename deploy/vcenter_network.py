@@ -0,0 +1,251 @@
+"""
+Native VM network reconfiguration (replaces the govc CLI).
+
+change_vm_network_govc() forked govc four or five times per deployment and
+every fork logged in to vCenter again. This module does the same work on a
+pooled session: the VM and the target portgroup are resolved through
+name -> moref indexes kept on the session (VMIndex and NetworkIndex), and
+the NIC backing is swapped with a single ReconfigVM_Task:
+
+    from deploy.vcenter_network import change_vm_network_pooled
+
+    success, message = change_vm_network_pooled(
+        vcenter_host, vcenter_user, vcenter_password,
+        vm_name='web01', network_name='VLAN-120'
+    )
+
+Standard portgroups, distributed portgroups (DVS) and NSX opaque networks
+are supported.
+"""
+import logging
+
+from pyVmomi import vim, vmodl
+
+from security_fixes.sanitization_helpers import InputSanitizer
+from .vcenter_index import PropertyTracker, get_session_tracker, find_vm_by_name
+from .vcenter_pool import vcenter_session
+from .vcenter_waiter import wait_for_task
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkIndex(PropertyTracker):
+    """
+    Network lookup table (name -> network) plus the DVS uuids needed to
+    connect a NIC to a distributed portgroup.
+    """
+
+    properties = {
+        vim.Network: ['name'],
+        vim.dvs.DistributedVirtualPortgroup: ['name', 'key', 'config.distributedVirtualSwitch'],
+        vim.OpaqueNetwork: ['name', 'summary'],
+        vim.DistributedVirtualSwitch: ['uuid'],
+    }
+    log_prefix = '[NETWORK-INDEX]'
+
+    def reset(self):
+        super().reset()
+        self._names = {}        # moref id -> indexed name
+        self.by_name = {}
+
+    def _unindex(self, moid, props):
+        name = self._names.pop(moid, None)
+        if name is not None and self.by_name.get(name) is props:
+            del self.by_name[name]
+
+    def on_remove(self, moid, props):
+        self._unindex(moid, props)
+
+    def on_change(self, moid, props):
+        if isinstance(props['obj'], vim.DistributedVirtualSwitch):
+            return
+        self._unindex(moid, props)
+        if props.get('name'):
+            self.by_name[props['name']] = props
+            self._names[moid] = props['name']
+
+    def find(self, name):
+        """
+        Return the tracked properties of the network called `name`, or None
+
+        The dict holds 'obj' plus the properties listed in `properties`.
+        """
+        self.refresh()
+        props = self.by_name.get(name)
+        if props is None:
+            self.refresh(force=True)
+            props = self.by_name.get(name)
+        return props
+
+    def switch_uuid(self, portgroup_props):
+        """uuid of the distributed switch a portgroup belongs to"""
+        dvs = portgroup_props.get('config.distributedVirtualSwitch')
+        if dvs is None:
+            return None
+        switch = self.objects.get(dvs._moId)
+        if switch and switch.get('uuid'):
+            return switch['uuid']
+        return dvs.uuid
+
+
+def find_network(si, name):
+    """
+    Find a network by name using the session's NetworkIndex
+
+    Returns:
+        tuple: (network properties dict or None, NetworkIndex)
+    """
+    index = get_session_tracker(si, 'network_index', NetworkIndex)
+    if index is None:
+        # Unpooled session: one-off index, the caller does not keep it
+        index = NetworkIndex(si).build()
+        try:
+            return index.find(name), index
+        finally:
+            index.close()
+    return index.find(name), index
+
+
+def nic_backing(network_props, index):
+    """Build the VirtualEthernetCard backing that connects a NIC to a network"""
+    network = network_props['obj']
+
+    if isinstance(network, vim.dvs.DistributedVirtualPortgroup):
+        backing = vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo()
+        backing.port = vim.dvs.PortConnection(
+            portgroupKey=network_props.get('key') or network.key,
+            switchUuid=index.switch_uuid(network_props)
+        )
+        return backing
+
+    if isinstance(network, vim.OpaqueNetwork):
+        summary = network_props.get('summary') or network.summary
+        backing = vim.vm.device.VirtualEthernetCard.OpaqueNetworkBackingInfo()
+        backing.opaqueNetworkId = summary.opaqueNetworkId
+        backing.opaqueNetworkType = summary.opaqueNetworkType
+        return backing
+
+    backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo()
+    backing.network = network
+    backing.deviceName = network_props['name']
+    return backing
+
+
+def _vm_devices(si, vm):
+    """Read only config.hardware.device of a VM (instead of the whole config)"""
+    collector = si.content.propertyCollector
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+        objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=vm, skip=False)],
+        propSet=[vmodl.query.PropertyCollector.PropertySpec(
+            type=vim.VirtualMachine,
+            pathSet=['config.hardware.device'],
+            all=False
+        )]
+    )
+    result = collector.RetrievePropertiesEx([filter_spec], vmodl.query.PropertyCollector.RetrieveOptions())
+    for obj_content in (result.objects if result else []):
+        for prop in obj_content.propSet or []:
+            return list(prop.val or [])
+    return []
+
+
+def _connected_to(device, network_props):
+    """True when the NIC is already backed by the target network"""
+    backing = device.backing
+    network = network_props['obj']
+    if isinstance(backing, vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo):
+        return (isinstance(network, vim.dvs.DistributedVirtualPortgroup)
+                and backing.port is not None
+                and backing.port.portgroupKey == network_props.get('key'))
+    if isinstance(backing, vim.vm.device.VirtualEthernetCard.OpaqueNetworkBackingInfo):
+        summary = network_props.get('summary')
+        return summary is not None and backing.opaqueNetworkId == summary.opaqueNetworkId
+    if isinstance(backing, vim.vm.device.VirtualEthernetCard.NetworkBackingInfo):
+        return backing.network is not None and backing.network._moId == network._moId
+    return False
+
+
+def change_vm_network(si, vm_name, network_name, nic_index=0, timeout=300):
+    """
+    Connect a NIC of a VM to another network with one ReconfigVM_Task
+
+    Args:
+        si: ServiceInstance (pooled sessions reuse their cached indexes)
+        vm_name: Name of the VM (will be sanitized)
+        network_name: Name of the target network (will be sanitized)
+        nic_index: Which network adapter to change (0 = first NIC)
+        timeout: Seconds to wait for the reconfigure task
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    try:
+        vm_name = InputSanitizer.sanitize_vm_name(vm_name)
+        network_name = InputSanitizer.sanitize_network_name(network_name)
+    except ValueError as e:
+        error_msg = f'Input validation failed: {e}'
+        logger.error(f'[VCENTER-NETWORK] {error_msg}')
+        return False, error_msg
+
+    logger.info(f'[VCENTER-NETWORK] Changing NIC {nic_index} of {vm_name} to network {network_name}')
+
+    vm = find_vm_by_name(si, vm_name)
+    if vm is None:
+        error_msg = f'VM "{vm_name}" no encontrada en vCenter'
+        logger.error(f'[VCENTER-NETWORK] ❌ {error_msg}')
+        return False, error_msg
+
+    network_props, index = find_network(si, network_name)
+    if network_props is None:
+        error_msg = f'Red "{network_name}" no encontrada en vCenter'
+        logger.error(f'[VCENTER-NETWORK] ❌ {error_msg}')
+        return False, error_msg
+
+    nics = [d for d in _vm_devices(si, vm) if isinstance(d, vim.vm.device.VirtualEthernetCard)]
+    if nic_index >= len(nics):
+        error_msg = f'VM "{vm_name}" has {len(nics)} network adapter(s), NIC {nic_index} does not exist'
+        logger.error(f'[VCENTER-NETWORK] ❌ {error_msg}')
+        return False, error_msg
+
+    nic = nics[nic_index]
+    current = nic.deviceInfo.summary if nic.deviceInfo else ''
+    logger.info(f'[VCENTER-NETWORK] Current backing of {nic.deviceInfo.label if nic.deviceInfo else nic.key}: {current}')
+
+    if _connected_to(nic, network_props):
+        logger.info(f'[VCENTER-NETWORK] ✅ {vm_name} is already on {network_name}')
+        return True, f'La VM ya está en la red: {network_name}'
+
+    nic.backing = nic_backing(network_props, index)
+    if nic.connectable is not None:
+        nic.connectable.startConnected = True
+
+    nic_spec = vim.vm.device.VirtualDeviceSpec()
+    nic_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.edit
+    nic_spec.device = nic
+    config_spec = vim.vm.ConfigSpec(deviceChange=[nic_spec])
+
+    info = wait_for_task(si, vm.ReconfigVM_Task(spec=config_spec), timeout=timeout)
+    if info.state != vim.TaskInfo.State.success:
+        error = info.error.msg if info.error else 'unknown error'
+        error_msg = f'Error al cambiar la red: {error}'
+        logger.error(f'[VCENTER-NETWORK] ❌ {error_msg}')
+        return False, error_msg
+
+    logger.info(f'[VCENTER-NETWORK] ✅ Red cambiada exitosamente a: {network_name}')
+    return True, f'Red cambiada exitosamente a: {network_name}'
+
+
+def change_vm_network_pooled(vcenter_host, vcenter_user, vcenter_password, vm_name, network_name, **kwargs):
+    """
+    change_vm_network() on a pooled session; drop-in for change_vm_network_govc()
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    try:
+        with vcenter_session(vcenter_host, vcenter_user, vcenter_password) as si:
+            return change_vm_network(si, vm_name, network_name, **kwargs)
+    except Exception as e:
+        error_msg = f'Error al cambiar la red: {e}'
+        logger.error(f'[VCENTER-NETWORK] ❌ {error_msg}')
+        return False, error_msg
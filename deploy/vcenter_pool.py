@@ -0,0 +1,266 @@
+"""
+Pooled vCenter ServiceInstance sessions.
+
+Opening a vCenter session costs a TLS handshake plus a SOAP login. The pool
+keeps authenticated sessions alive per vCenter (host, user, port) so views,
+Celery tasks and the scheduler can reuse them:
+
+    from deploy.vcenter_pool import vcenter_session
+
+    with vcenter_session(cred.host, cred.user, cred.get_password()) as si:
+        content = si.RetrieveContent()
+
+Idle sessions are validated with a cheap CurrentTime() call before reuse and
+re-logged in when vCenter reports NotAuthenticated. Each process owns its
+own pool (gunicorn/celery workers are forked), and the number of sessions
+per vCenter is capped.
+"""
+import logging
+import os
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from pyVim.connect import SmartConnect, Disconnect
+from pyVmomi import vim
+
+logger = logging.getLogger(__name__)
+
+
+class VCenterPoolExhausted(Exception):
+    """Raised when no session becomes available within the acquire timeout"""
+
+
+class _PooledSession:
+    """A ServiceInstance plus the data needed to validate and re-login it"""
+
+    def __init__(self, key, si, password):
+        self.key = key
+        self.si = si
+        self.password = password
+        self.last_used = time.monotonic()
+        self.trackers = {}  # deploy.vcenter_index trackers bound to this session
+
+
+class VCenterSessionPool:
+    """
+    Thread-safe pool of authenticated vCenter sessions keyed by (host, user, port).
+    """
+
+    def __init__(self, max_sessions=4, idle_timeout=900, validate_after=30, acquire_timeout=120):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.validate_after = validate_after
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = {}       # key -> [_PooledSession]
+        self._open = {}       # key -> number of open sessions (idle + in use)
+        self._in_use = {}     # id(si) -> _PooledSession
+        self.stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'evictions': 0}
+
+    def _check_fork(self):
+        # Sessions must never be shared between forked worker processes
+        if self._pid != os.getpid():
+            self._reset()
+
+    @staticmethod
+    def make_key(host, user, port=443):
+        return (host, user, int(port))
+
+    def _connect(self, host, user, password, port):
+        context = ssl._create_unverified_context()
+        return SmartConnect(host=host, user=user, pwd=password, port=int(port), sslContext=context)
+
+    def _is_alive(self, session):
+        """Validate an idle session, logging it in again if it expired"""
+        try:
+            session.si.CurrentTime()
+            if session.si.content.sessionManager.currentSession is None:
+                raise vim.fault.NotAuthenticated()
+            return True
+        except vim.fault.NotAuthenticated:
+            host, user, port = session.key
+            try:
+                session.si.content.sessionManager.Login(user, session.password)
+                # Server-side views/collectors died with the old session
+                session.trackers = {}
+                with self._lock:
+                    self.stats['reconnects'] += 1
+                logger.info(f"[VCENTER-POOL] Re-logged in to {host} as {user}")
+                return True
+            except Exception as e:
+                logger.warning(f"[VCENTER-POOL] Re-login to {host} failed: {e}")
+                return False
+        except Exception as e:
+            logger.info(f"[VCENTER-POOL] Dropping dead session to {session.key[0]}: {e}")
+            return False
+
+    def _close(self, session):
+        try:
+            Disconnect(session.si)
+        except Exception:
+            pass
+
+    def acquire(self, host, user, password, port=443):
+        """Return an authenticated ServiceInstance; pair with release()"""
+        key = self.make_key(host, user, port)
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._lock:
+                self._check_fork()
+                idle = self._idle.setdefault(key, [])
+                session = None
+                if idle:
+                    session = idle.pop()
+                elif self._open.get(key, 0) < self.max_sessions:
+                    self._open[key] = self._open.get(key, 0) + 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise VCenterPoolExhausted(f"No vCenter session available for {host} after {self.acquire_timeout}s")
+                    self._lock.wait(remaining)
+                    continue
+
+            if session is None:
+                # New session: connect outside the lock
+                try:
+                    si = self._connect(host, user, password, port)
+                except Exception:
+                    with self._lock:
+                        self._open[key] -= 1
+                        self._lock.notify()
+                    raise
+                session = _PooledSession(key, si, password)
+                with self._lock:
+                    self.stats['misses'] += 1
+                    self._in_use[id(si)] = session
+                return si
+
+            if password != session.password:
+                # Credential changed since the session was opened
+                self._discard(session)
+                continue
+
+            if time.monotonic() - session.last_used > self.validate_after and not self._is_alive(session):
+                self._discard(session)
+                continue
+
+            with self._lock:
+                self.stats['hits'] += 1
+                self._in_use[id(session.si)] = session
+            return session.si
+
+    def get_session(self, si):
+        """Return the _PooledSession for an acquired ServiceInstance, or None"""
+        with self._lock:
+            return self._in_use.get(id(si))
+
+    def release(self, si, discard=False):
+        """Return a session to the pool (or close it when discard=True)"""
+        with self._lock:
+            session = self._in_use.pop(id(si), None)
+        if session is None:
+            # Not a pooled session (or released after a fork): just close it
+            try:
+                Disconnect(si)
+            except Exception:
+                pass
+            return
+        if discard:
+            self._discard(session)
+            return
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(session.key, []).append(session)
+            self._lock.notify()
+
+    def _discard(self, session):
+        self._close(session)
+        with self._lock:
+            self._open[session.key] = max(self._open.get(session.key, 1) - 1, 0)
+            self.stats['evictions'] += 1
+            self._lock.notify()
+
+    def prune(self):
+        """Close sessions idle for longer than idle_timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            self._check_fork()
+            for key, idle in self._idle.items():
+                keep = []
+                for session in idle:
+                    (expired if now - session.last_used > self.idle_timeout else keep).append(session)
+                self._idle[key] = keep
+        for session in expired:
+            self._discard(session)
+        return len(expired)
+
+    def close_all(self):
+        """Close every idle session"""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle = {}
+        for session in sessions:
+            self._discard(session)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['open'] = sum(self._open.values())
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+            stats['in_use'] = len(self._in_use)
+        return stats
+
+    @contextmanager
+    def session(self, host, user, password, port=443):
+        si = self.acquire(host, user, password, port)
+        discard = False
+        try:
+            yield si
+        except vim.fault.NotAuthenticated:
+            # Session was invalidated server side while in use
+            discard = True
+            with self._lock:
+                self.stats['reconnects'] += 1
+            raise
+        finally:
+            self.release(si, discard=discard)
+
+
+vcenter_pool = VCenterSessionPool(
+    max_sessions=getattr(settings, 'VCENTER_POOL_MAX_SESSIONS', 4),
+    idle_timeout=getattr(settings, 'VCENTER_POOL_IDLE_TIMEOUT', 900),
+)
+
+
+def vcenter_session(host, user, password, port=443):
+    """Context manager yielding a pooled ServiceInstance"""
+    vcenter_pool.prune()
+    return vcenter_pool.session(host, user, password, port)
+
+
+def credential_session(cred):
+    """Context manager yielding a pooled ServiceInstance for a VCenterCredential"""
+    return vcenter_session(cred.host, cred.user, cred.get_password())
+
+
+def list_objects(si, vim_types, root=None):
+    """
+    Return all managed objects of the given types below `root`.
+    The ContainerView is destroyed right away so long-lived pooled sessions
+    don't accumulate server-side views.
+    """
+    content = si.RetrieveContent()
+    view = content.viewManager.CreateContainerView(root or content.rootFolder, vim_types, True)
+    try:
+        return list(view.view)
+    finally:
+        view.Destroy()
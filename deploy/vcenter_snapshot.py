@@ -2,46 +2,36 @@
 vCenter Snapshot Management Utilities
 """
 import logging
-from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim
-import ssl
 from datetime import datetime, timedelta
 from django.utils import timezone
 from settings.models import GlobalSetting
+from .vcenter_pool import vcenter_pool
+from .vcenter_index import find_vm
 
 logger = logging.getLogger(__name__)
 
 
 def get_vcenter_connection(vcenter_host, vcenter_user, vcenter_password):
     """
-    Connect to vCenter server
+    Get a pooled vCenter session; return it with release_vcenter_connection()
     """
     try:
-        logger.info(f"[VCENTER] Connecting to {vcenter_host} as {vcenter_user}...")
-        context = ssl._create_unverified_context()
-        si = SmartConnect(
-            host=vcenter_host,
-            user=vcenter_user,
-            pwd=vcenter_password,
-            port=443,
-            sslContext=context
-        )
-        logger.info(f"[VCENTER] ✓ Connected successfully to {vcenter_host}")
-        
-        # Verify we can access vCenter content
-        try:
-            content = si.RetrieveContent()
-            logger.info(f"[VCENTER] ✓ Retrieved vCenter content, API version: {content.about.version}")
-        except Exception as e:
-            logger.error(f"[VCENTER] ✗ Failed to retrieve vCenter content: {e}")
-            raise
-        
+        si = vcenter_pool.acquire(vcenter_host, vcenter_user, vcenter_password)
+        logger.info(f"[VCENTER] ✓ Session ready for {vcenter_host} as {vcenter_user} (pool: {vcenter_pool.get_stats()})")
         return si
     except Exception as e:
         logger.error(f"[VCENTER] ✗ Failed to connect to vCenter {vcenter_host}: {e}")
         raise
 
 
+def release_vcenter_connection(si):
+    """
+    Return a session obtained with get_vcenter_connection() to the pool
+    """
+    vcenter_pool.release(si)
+
+
 def find_vm_by_ip(si, vm_ip):
     """
     Find VM by IP address or hostname
@@ -50,71 +40,17 @@ def find_vm_by_ip(si, vm_ip):
     1. VM guest IP address (from VMware Tools)
     2. VM name (exact match with IP or hostname)
     3. VM hostname (from VMware Tools)
-    """
-    content = si.RetrieveContent()
-    container = content.rootFolder
-    viewType = [vim.VirtualMachine]
-    recursive = True
-    
-    containerView = content.viewManager.CreateContainerView(
-        container, viewType, recursive
-    )
     
-    vms = containerView.view
-    containerView.Destroy()
-    
-    logger.info(f"[VM-SEARCH] Searching for VM with IP/name: {vm_ip} among {len(vms)} VMs")
-    
-    # Log first few VMs for debugging
-    if len(vms) > 0:
-        logger.info(f"[VM-SEARCH] Sample VMs in vCenter:")
-        for i, vm in enumerate(vms[:5]):
-            vm_name = vm.name if vm else "Unknown"
-            vm_ip_addr = vm.guest.ipAddress if vm and vm.guest else "No IP"
-            logger.info(f"[VM-SEARCH]   {i+1}. {vm_name} (IP: {vm_ip_addr})")
-        if len(vms) > 5:
-            logger.info(f"[VM-SEARCH]   ... and {len(vms) - 5} more VMs")
-    
-    for vm in vms:
-        # Skip templates
-        if vm.config and vm.config.template:
-            continue
-            
-        # Method 1: Check VM guest IP (from VMware Tools)
-        if vm.guest and vm.guest.ipAddress:
-            if vm.guest.ipAddress == vm_ip:
-                logger.info(f"[VM-SEARCH] ✓ Found VM by guest IP: {vm.name}")
-                return vm
-            
-            # Check all NICs for matching IP
-            if vm.guest.net:
-                for nic in vm.guest.net:
-                    if nic.ipAddress:
-                        for ip in nic.ipAddress:
-                            if ip == vm_ip:
-                                logger.info(f"[VM-SEARCH] ✓ Found VM by NIC IP: {vm.name}")
-                                return vm
-        
-        # Method 2: Check VM name (might be hostname or IP)
-        if vm.name == vm_ip:
-            logger.info(f"[VM-SEARCH] ✓ Found VM by name: {vm.name}")
-            return vm
-        
-        # Method 3: Check VM hostname (from VMware Tools)
-        if vm.guest and vm.guest.hostName:
-            # Try exact match
-            if vm.guest.hostName == vm_ip:
-                logger.info(f"[VM-SEARCH] ✓ Found VM by hostname: {vm.name}")
-                return vm
-            # Try hostname without domain
-            hostname_short = vm.guest.hostName.split('.')[0]
-            if hostname_short == vm_ip:
-                logger.info(f"[VM-SEARCH] ✓ Found VM by short hostname: {vm.name}")
-                return vm
+    Lookups go through the session's VMIndex (deploy/vcenter_index.py), which
+    loads the needed properties for all VMs in one paged PropertyCollector
+    call and then only fetches changes.
+    """
+    vm, indexed = find_vm(si, vm_ip)
     
-    logger.error(f"[VM-SEARCH] ✗ VM not found with IP/name: {vm_ip}")
-    logger.error(f"[VM-SEARCH] Searched {len(vms)} VMs in vCenter. VM may not exist, VMware Tools may not be running, or IP address may be incorrect.")
-    return None
+    if vm is None:
+        logger.error(f"[VM-SEARCH] ✗ VM not found with IP/name: {vm_ip}")
+        logger.error(f"[VM-SEARCH] Searched {indexed} VMs in vCenter. VM may not exist, VMware Tools may not be running, or IP address may be incorrect.")
+    return vm
 
 
 def create_snapshot(si, vm_ip, snapshot_name, description=""):
@@ -0,0 +1,135 @@
+"""
+Snapshot trees and their on-disk size, read for many VMs at once.
+
+vm.snapshot and vm.layoutEx are large properties; reading them through the
+managed object costs one round-trip per VM and property. Here they are
+fetched for a whole list of VMs with one paged RetrievePropertiesEx call:
+
+    props = retrieve_vm_properties(si, vms, SNAPSHOT_LAYOUT_PROPERTIES)
+    sizes = snapshot_sizes(props[vm._moId])     # snapshot moref id -> bytes
+"""
+import logging
+
+from pyVmomi import vim, vmodl
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_LAYOUT_PROPERTIES = ['snapshot', 'layoutEx.file', 'layoutEx.disk', 'layoutEx.snapshot']
+
+MB = 1024 * 1024
+
+
+def retrieve_vm_properties(si, vms, paths, page_size=500):
+    """
+    Read `paths` of several VMs with one paged RetrievePropertiesEx call
+
+    Returns:
+        dict VM moref id -> {path: value}
+    """
+    vms = list(vms)
+    if not vms:
+        return {}
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+        objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=vm, skip=False) for vm in vms],
+        propSet=[vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine, pathSet=paths, all=False)]
+    )
+    collector = si.content.propertyCollector
+    options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=page_size)
+    found = {}
+    page = collector.RetrievePropertiesEx([filter_spec], options)
+    while page:
+        for obj_content in page.objects:
+            found[obj_content.obj._moId] = {prop.name: prop.val for prop in obj_content.propSet or []}
+        page = collector.ContinueRetrievePropertiesEx(page.token) if page.token else None
+    return found
+
+
+def walk_snapshots(snapshot_info):
+    """
+    Yield (tree, depth) for every snapshot of a VM, roots first
+
+    Args:
+        snapshot_info: vim.vm.SnapshotInfo (the VM's 'snapshot' property) or None
+    """
+    if snapshot_info is None:
+        return
+    stack = [(tree, 1) for tree in reversed(snapshot_info.rootSnapshotList or [])]
+    while stack:
+        tree, depth = stack.pop()
+        yield tree, depth
+        stack.extend((child, depth + 1) for child in reversed(tree.childSnapshotList or []))
+
+
+def find_snapshot(snapshot_info, snapshot_id=None, snapshot_name=None):
+    """Snapshot tree node by vCenter id (preferred) or name, or None"""
+    by_name = None
+    for tree, _depth in walk_snapshots(snapshot_info):
+        if snapshot_id and str(tree.id) == str(snapshot_id):
+            return tree
+        if by_name is None and snapshot_name and tree.name == snapshot_name:
+            by_name = tree
+    return by_name
+
+
+def datastore_of(file_name):
+    """'[ds01] vm/vm-000001.vmdk' -> 'ds01' ('' when the name has no datastore)"""
+    if file_name and file_name.startswith('[') and ']' in file_name:
+        return file_name[1:file_name.index(']')]
+    return ''
+
+
+def snapshot_usage(props):
+    """
+    Estimated disk space held by each snapshot of a VM, per datastore
+
+    A snapshot holds its memory/state file (.vmsn) plus, for each disk, the
+    delta that started when it was taken: the unit following the snapshot's
+    own chain in a child snapshot or in the current disk chain. That is
+    what vCenter consolidates when the snapshot is removed.
+
+    Args:
+        props: Properties of one VM including SNAPSHOT_LAYOUT_PROPERTIES
+
+    Returns:
+        dict snapshot moref id -> {datastore name: bytes}
+    """
+    files = {f.key: f for f in props.get('layoutEx.file') or []}
+
+    def units(chain):
+        return [tuple(unit.fileKey or []) for unit in chain or []]
+
+    # Todas las cadenas conocidas por disco: las de cada snapshot y la actual
+    chains = {}
+    for disk in props.get('layoutEx.disk') or []:
+        chains.setdefault(disk.key, []).append(units(disk.chain))
+    for layout in props.get('layoutEx.snapshot') or []:
+        for disk in layout.disk or []:
+            chains.setdefault(disk.key, []).append(units(disk.chain))
+
+    usage = {}
+    for layout in props.get('layoutEx.snapshot') or []:
+        keys = [layout.dataKey] if layout.dataKey is not None else []
+        for disk in layout.disk or []:
+            own = units(disk.chain)
+            for chain in chains.get(disk.key, []):
+                if len(chain) > len(own) and chain[:len(own)] == own:
+                    keys.extend(chain[len(own)])
+                    break
+        per_datastore = {}
+        for key in keys:
+            layout_file = files.get(key)
+            if layout_file is not None:
+                datastore = datastore_of(layout_file.name)
+                per_datastore[datastore] = per_datastore.get(datastore, 0) + (layout_file.size or 0)
+        usage[layout.key._moId] = per_datastore
+    return usage
+
+
+def snapshot_sizes(props):
+    """
+    Estimated disk space held by each snapshot of a VM (see snapshot_usage())
+
+    Returns:
+        dict snapshot moref id -> bytes
+    """
+    return {moid: sum(per_datastore.values()) for moid, per_datastore in snapshot_usage(props).items()}
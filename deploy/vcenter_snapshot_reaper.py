@@ -0,0 +1,306 @@
+"""
+Removal of expired snapshots (SnapshotHistory rows past expires_at).
+
+Instead of opening a vCenter connection and scanning every VM for each
+expired row, the reaper:
+
+- groups the rows by vCenter and works on one pooled session per server,
+  each server in its own thread
+- resolves all VMs through the session's VMIndex and reads their snapshot
+  trees and file layouts with one RetrievePropertiesEx call
+- keeps up to SNAPSHOT_REAPER_CONCURRENCY RemoveSnapshot_Task in flight per
+  vCenter (one per VM, since vCenter serialises tasks on a VM) and waits on
+  them together
+- marks the rows with bulk updates
+
+    results = reap_expired_snapshots(dry_run=True)
+    print(ReapReport(results).summary())
+
+Rows whose snapshot (or VM) no longer exists are marked deleted as well;
+rows whose removal failed stay active with error_message set and are
+retried on the next run.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.utils import timezone
+from pyVmomi import vim
+
+from .vcenter_index import get_vm_index
+from .vcenter_pool import vcenter_session
+from .vcenter_snapshot_layout import (
+    MB, SNAPSHOT_LAYOUT_PROPERTIES, find_snapshot, retrieve_vm_properties, snapshot_sizes
+)
+from .vcenter_waiter import TaskWatcher
+
+logger = logging.getLogger(__name__)
+
+# Acciones de ReapResult
+REMOVED = 'removed'         # RemoveSnapshot_Task succeeded
+MISSING = 'missing'         # VM or snapshot already gone
+PLANNED = 'planned'         # dry run: would be removed
+SKIPPED = 'skipped'         # not handled in vCenter (no vCenter / credential / --no vCenter)
+FAILED = 'failed'           # removal failed, row stays active
+
+MARK_DELETED = (REMOVED, MISSING, SKIPPED)
+
+
+class ReapResult:
+    """What happened (or would happen) to one expired SnapshotHistory row"""
+
+    def __init__(self, snapshot, action, message='', size_bytes=None):
+        self.snapshot = snapshot
+        self.action = action
+        self.message = message
+        self.size_bytes = size_bytes
+
+    @property
+    def size_mb(self):
+        """Measured size in MB, or the recorded size_mb when it could not be measured"""
+        if self.size_bytes is not None:
+            return self.size_bytes / MB
+        return self.snapshot.size_mb or 0
+
+    def __repr__(self):
+        return f'<ReapResult {self.snapshot.snapshot_name} ({self.snapshot.host.name}) {self.action}: {self.message}>'
+
+
+class ReapReport:
+    """Totals of a reaper run, per action and per vCenter"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.by_action = defaultdict(list)
+        self.by_vcenter = defaultdict(list)
+        for result in self.results:
+            self.by_action[result.action].append(result)
+            self.by_vcenter[result.snapshot.host.vcenter_server or '(no vCenter)'].append(result)
+
+    def count(self, *actions):
+        return sum(len(self.by_action[action]) for action in actions)
+
+    def reclaimed_mb(self, *actions):
+        """Space held by the snapshots with the given actions (default: removed + planned)"""
+        actions = actions or (REMOVED, PLANNED)
+        return sum(result.size_mb for action in actions for result in self.by_action[action])
+
+    def unmeasured(self, *actions):
+        """Snapshots counted in reclaimed_mb() whose size is unknown"""
+        actions = actions or (REMOVED, PLANNED)
+        return sum(
+            1 for action in actions for result in self.by_action[action]
+            if result.size_bytes is None and not result.snapshot.size_mb
+        )
+
+    def summary(self):
+        lines = []
+        for vcenter_server, results in sorted(self.by_vcenter.items()):
+            counts = defaultdict(int)
+            for result in results:
+                counts[result.action] += 1
+            size_mb = sum(result.size_mb for result in results if result.action in (REMOVED, PLANNED))
+            detail = ', '.join(f'{action}={count}' for action, count in sorted(counts.items()))
+            lines.append(f'{vcenter_server}: {len(results)} snapshot(s) [{detail}] ~{size_mb / 1024:.2f} GB')
+        reclaimed = self.reclaimed_mb()
+        line = f'Estimated reclaimed space: {reclaimed / 1024:.2f} GB ({reclaimed:.0f} MB)'
+        if self.unmeasured():
+            line += f', {self.unmeasured()} snapshot(s) of unknown size'
+        lines.append(line)
+        return '\n'.join(lines)
+
+
+def reap_expired_snapshots(dry_run=False, delete_from_vcenter=True, now=None, timeout=None):
+    """
+    Remove expired snapshots from vCenter and mark their rows as deleted
+
+    Args:
+        dry_run: Only inspect vCenter and report what would be removed
+        delete_from_vcenter: False marks the rows deleted without touching vCenter
+        now: Expiration reference (default: timezone.now())
+        timeout: Seconds to wait for the removals (default: SNAPSHOT_REAPER_TIMEOUT)
+
+    Returns:
+        list of ReapResult, oldest expiration first
+    """
+    from snapshots.models import SnapshotHistory
+    from settings.models import VCenterCredential
+
+    now = now or timezone.now()
+    timeout = timeout or getattr(settings, 'SNAPSHOT_REAPER_TIMEOUT', 1200)
+    deadline = time.monotonic() + timeout
+    rows = list(
+        SnapshotHistory.objects.filter(status='active', expires_at__lte=now)
+        .select_related('host').order_by('expires_at')
+    )
+    if not rows:
+        return []
+
+    results = {}
+    lock = threading.Lock()
+
+    def report(result):
+        with lock:
+            results.setdefault(result.snapshot.id, result)
+
+    by_vcenter = defaultdict(list)
+    for row in rows:
+        if not delete_from_vcenter:
+            report(ReapResult(row, SKIPPED, 'Marked as deleted in database only'))
+        elif not row.host.vcenter_server:
+            report(ReapResult(row, SKIPPED, f'No vCenter server configured for {row.host.name}'))
+        else:
+            by_vcenter[row.host.vcenter_server].append(row)
+
+    credentials = {}
+    for cred in VCenterCredential.objects.filter(host__in=list(by_vcenter)).order_by('id'):
+        credentials.setdefault(cred.host, cred)
+
+    jobs = []
+    for vcenter_server, vcenter_rows in by_vcenter.items():
+        cred = credentials.get(vcenter_server)
+        if cred is None:
+            logger.warning(f'[SNAPSHOT-CLEANUP] No vCenter credentials for {vcenter_server}')
+            for row in vcenter_rows:
+                report(ReapResult(row, SKIPPED, f'No vCenter credentials for {vcenter_server}'))
+            continue
+        jobs.append((vcenter_server, cred.user, cred.get_password(), vcenter_rows))
+
+    if jobs:
+        logger.info(f'[SNAPSHOT-CLEANUP] {"Inspecting" if dry_run else "Removing"} {sum(len(j[3]) for j in jobs)} expired snapshot(s) on {len(jobs)} vCenter(s)')
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='snapshot-reaper') as executor:
+            futures = {
+                executor.submit(_reap_on_vcenter, vcenter_server, user, password, vcenter_rows,
+                                dry_run, report, deadline, timeout): (vcenter_server, vcenter_rows)
+                for vcenter_server, user, password, vcenter_rows in jobs
+            }
+            for future in as_completed(futures):
+                vcenter_server, vcenter_rows = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    # vCenter caído: se reintenta en la próxima ejecución
+                    logger.error(f'[SNAPSHOT-CLEANUP] Error on vCenter {vcenter_server}: {e}')
+                    for row in vcenter_rows:
+                        report(ReapResult(row, FAILED, f'Error deleting from vCenter: {e}'))
+
+    ordered = [results[row.id] for row in rows]
+    if not dry_run:
+        _record_results(ordered, now)
+    return ordered
+
+
+def _reap_on_vcenter(vcenter_server, user, password, rows, dry_run, report, deadline, timeout):
+    """Remove (or inspect) the expired snapshots of one vCenter on one pooled session"""
+    concurrency = max(1, getattr(settings, 'SNAPSHOT_REAPER_CONCURRENCY', 4))
+
+    with vcenter_session(vcenter_server, user, password) as si:
+        index = get_vm_index(si)
+        vms = index.find_many({row.id: [row.host.ip, row.host.name] for row in rows})
+        found = {vm._moId: vm for vm in vms.values() if vm is not None}
+        layouts = retrieve_vm_properties(si, found.values(), SNAPSHOT_LAYOUT_PROPERTIES)
+        sizes = {moid: snapshot_sizes(props) for moid, props in layouts.items()}
+
+        queue = deque()
+        queued = set()
+        for row in rows:
+            vm = vms[row.id]
+            if vm is None:
+                report(ReapResult(row, MISSING, f'VM with IP {row.host.ip} not found'))
+                continue
+            tree = find_snapshot(layouts.get(vm._moId, {}).get('snapshot'), row.vcenter_snapshot_id, row.snapshot_name)
+            if tree is None:
+                report(ReapResult(row, MISSING, f"Snapshot '{row.snapshot_name}' no longer exists in vCenter"))
+                continue
+            if tree.snapshot._moId in queued:
+                report(ReapResult(row, MISSING, 'Same vCenter snapshot as another expired record'))
+                continue
+            queued.add(tree.snapshot._moId)
+            size = sizes.get(vm._moId, {}).get(tree.snapshot._moId)
+            if dry_run:
+                report(ReapResult(row, PLANNED, f'Would remove from {vm.name}', size))
+                continue
+            queue.append((row, vm, tree, size))
+
+        if not queue:
+            return
+
+        watcher = TaskWatcher(si)
+        in_flight = {}          # row id -> (row, vm, tree, size)
+        busy_vms = set()
+        try:
+            while queue or in_flight:
+                waiting = deque()
+                while queue and len(in_flight) < concurrency:
+                    job = queue.popleft()
+                    row, vm, tree, size = job
+                    if vm._moId in busy_vms:
+                        waiting.append(job)
+                        continue
+                    try:
+                        task = tree.snapshot.RemoveSnapshot_Task(removeChildren=False)
+                    except vim.fault.NotFound:
+                        report(ReapResult(row, MISSING, f"Snapshot '{row.snapshot_name}' no longer exists in vCenter"))
+                        continue
+                    except Exception as e:
+                        report(ReapResult(row, FAILED, f'Error deleting from vCenter: {e}'))
+                        continue
+                    watcher.add(task, key=row.id)
+                    in_flight[row.id] = job
+                    busy_vms.add(vm._moId)
+                waiting.extend(queue)
+                queue = waiting
+
+                if not in_flight:
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for key, state, _result, error in watcher.wait(timeout=remaining):
+                    row, vm, tree, size = in_flight.pop(key)
+                    busy_vms.discard(vm._moId)
+                    if state == vim.TaskInfo.State.success:
+                        logger.info(f'[SNAPSHOT-CLEANUP] Deleted from vCenter: {row.snapshot_name} ({vm.name})')
+                        report(ReapResult(row, REMOVED, f'Removed from {vm.name}', size))
+                    else:
+                        error_msg = getattr(error, 'msg', None) or 'Unknown error'
+                        logger.warning(f'[SNAPSHOT-CLEANUP] Could not delete from vCenter: {row.snapshot_name} - {error_msg}')
+                        report(ReapResult(row, FAILED, f'Failed to delete snapshot: {error_msg}', size))
+        finally:
+            watcher.close()
+
+        for row, _vm, _tree, size in in_flight.values():
+            report(ReapResult(row, FAILED, f'Removal did not finish within {timeout}s', size))
+        for row, _vm, _tree, size in queue:
+            report(ReapResult(row, FAILED, f'Removal not started within {timeout}s', size))
+
+
+def _record_results(results, now):
+    """Mark deleted rows with one UPDATE and store the errors of the failed ones"""
+    from snapshots.models import SnapshotHistory
+
+    deleted_ids = [result.snapshot.id for result in results if result.action in MARK_DELETED]
+    if deleted_ids:
+        SnapshotHistory.objects.filter(id__in=deleted_ids, status='active').update(status='deleted', deleted_at=now)
+
+    failed = []
+    for result in results:
+        if result.action == FAILED:
+            result.snapshot.error_message = result.message
+            failed.append(result.snapshot)
+    if failed:
+        SnapshotHistory.objects.bulk_update(failed, ['error_message'])
+
+    # Tamaño medido al borrar: queda en el historial
+    measured = []
+    for result in results:
+        if result.action == REMOVED and result.size_bytes is not None:
+            result.snapshot.size_mb = int(round(result.size_bytes / MB))
+            measured.append(result.snapshot)
+    if measured:
+        SnapshotHistory.objects.bulk_update(measured, ['size_mb'])
+
+    logger.info(f'[SNAPSHOT-CLEANUP] Marked {len(deleted_ids)}/{len(results)} snapshots as deleted in DB, {len(failed)} failed')
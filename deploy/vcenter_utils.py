@@ -1,17 +1,16 @@
 """
 vCenter utility functions for folder management and VM operations
 """
-from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim
-import ssl
 import logging
+from .vcenter_pool import vcenter_pool
 
 logger = logging.getLogger(__name__)
 
 
 def get_vcenter_connection(host, user, password):
     """
-    Connect to vCenter server
+    Get a pooled vCenter session
     
     Args:
         host: vCenter hostname or IP
@@ -19,16 +18,16 @@ def get_vcenter_connection(host, user, password):
         password: Password
     
     Returns:
-        ServiceInstance connection
+        ServiceInstance connection (return it with release_vcenter_connection)
     """
-    context = ssl._create_unverified_context()
-    si = SmartConnect(
-        host=host,
-        user=user,
-        pwd=password,
-        sslContext=context
-    )
-    return si
+    return vcenter_pool.acquire(host, user, password)
+
+
+def release_vcenter_connection(si):
+    """
+    Return a session obtained with get_vcenter_connection() to the pool
+    """
+    vcenter_pool.release(si)
 
 
 def get_all_folders(si):
@@ -0,0 +1,187 @@
+"""
+Event-driven waiting for vCenter tasks.
+
+Instead of re-reading task.info.state every couple of seconds, a private
+PropertyCollector filter on the task's info.state/info.progress is blocked
+on with WaitForUpdatesEx, so the call returns as soon as vCenter reports a
+change:
+
+    task = template_vm.Clone(folder=folder, name=hostname, spec=clonespec)
+    info = wait_for_task(si, task, timeout=3600)
+    if info.state == 'error':
+        ...
+
+TaskWatcher does the same for many tasks on one collector, returning each
+task as soon as it finishes.
+"""
+import logging
+import time
+
+from pyVmomi import vim, vmodl
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATES = (vim.TaskInfo.State.success, vim.TaskInfo.State.error)
+
+
+class VCenterTaskTimeout(Exception):
+    """Raised when a vCenter task does not finish within the timeout"""
+
+
+def wait_for_task(si, task, timeout=None, on_progress=None, max_wait=60):
+    """
+    Block until a vCenter task reaches success or error
+
+    Args:
+        si: ServiceInstance the task was created with
+        task: vim.Task
+        timeout: Seconds to wait before raising VCenterTaskTimeout (None = no limit)
+        on_progress: Optional callable(percent) called when info.progress changes
+        max_wait: Longest single WaitForUpdatesEx call, in seconds
+
+    Returns:
+        vim.TaskInfo of the finished task
+    """
+    collector = si.content.propertyCollector.CreatePropertyCollector()
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+        objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=task, skip=False)],
+        propSet=[vmodl.query.PropertyCollector.PropertySpec(
+            type=vim.Task,
+            pathSet=['info.state', 'info.progress'],
+            all=False
+        )]
+    )
+    property_filter = collector.CreateFilter(filter_spec, partialUpdates=True)
+    deadline = time.monotonic() + timeout if timeout else None
+    version = ''
+    state = None
+
+    try:
+        while state not in FINAL_STATES:
+            wait_seconds = max_wait
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise VCenterTaskTimeout(f"vCenter task {task._moId} did not finish within {timeout}s")
+                wait_seconds = max(1, min(max_wait, int(remaining)))
+
+            options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=wait_seconds)
+            update_set = collector.WaitForUpdatesEx(version, options)
+            if update_set is None:
+                continue
+            version = update_set.version
+
+            for filter_update in update_set.filterSet or []:
+                for object_update in filter_update.objectSet or []:
+                    for change in object_update.changeSet or []:
+                        if change.name == 'info.state':
+                            state = change.val
+                        elif change.name == 'info.progress' and on_progress and change.val is not None:
+                            on_progress(change.val)
+    finally:
+        try:
+            property_filter.Destroy()
+            collector.DestroyPropertyCollector()
+        except Exception:
+            pass
+
+    return task.info
+
+
+class TaskWatcher:
+    """
+    Wait on many vCenter tasks at once with a single PropertyCollector
+
+        watcher = TaskWatcher(si)
+        watcher.add(vm.CreateSnapshot_Task(...), key=host.id)
+        while watcher:
+            for key, state, result, error in watcher.wait(timeout=60):
+                ...
+
+    Tasks can be added while others are still running, so callers can keep
+    a bounded number of tasks in flight.
+    """
+
+    PROPERTIES = ['info.state', 'info.result', 'info.error']
+
+    def __init__(self, si, max_wait=60):
+        self.si = si
+        self.max_wait = max_wait
+        self._collector = si.content.propertyCollector.CreatePropertyCollector()
+        self._version = ''
+        self._pending = {}      # task moref id -> (key, filter, {property: value})
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, task, key=None):
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=task, skip=False)],
+            propSet=[vmodl.query.PropertyCollector.PropertySpec(
+                type=vim.Task,
+                pathSet=self.PROPERTIES,
+                all=False
+            )]
+        )
+        property_filter = self._collector.CreateFilter(filter_spec, partialUpdates=True)
+        self._pending[task._moId] = (task if key is None else key, property_filter, {})
+
+    def wait(self, timeout=None):
+        """
+        Block until at least one task finishes
+
+        Args:
+            timeout: Seconds to wait (None = until something finishes)
+
+        Returns:
+            list of (key, state, result, error) for the finished tasks;
+            empty when the timeout expired first
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._pending:
+            wait_seconds = self.max_wait
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                wait_seconds = max(1, min(self.max_wait, int(remaining)))
+
+            options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=wait_seconds)
+            update_set = self._collector.WaitForUpdatesEx(self._version, options)
+            if update_set is None:
+                continue
+            self._version = update_set.version
+
+            for filter_update in update_set.filterSet or []:
+                for object_update in filter_update.objectSet or []:
+                    entry = self._pending.get(object_update.obj._moId)
+                    if entry is not None:
+                        for change in object_update.changeSet or []:
+                            entry[2][change.name] = change.val
+
+            finished = []
+            for moid, (key, property_filter, values) in list(self._pending.items()):
+                state = values.get('info.state')
+                if state in FINAL_STATES:
+                    del self._pending[moid]
+                    self._destroy(property_filter)
+                    finished.append((key, state, values.get('info.result'), values.get('info.error')))
+            if finished:
+                return finished
+        return []
+
+    @staticmethod
+    def _destroy(property_filter):
+        try:
+            property_filter.Destroy()
+        except Exception:
+            pass
+
+    def close(self):
+        for _key, property_filter, _values in self._pending.values():
+            self._destroy(property_filter)
+        self._pending = {}
+        try:
+            self._collector.DestroyPropertyCollector()
+        except Exception:
+            pass
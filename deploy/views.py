@@ -11,7 +11,8 @@ import logging
 
 from inventory.models import Host, Environment, Group
 from history.models import DeploymentHistory
-from .govc_helper import change_vm_network_govc
+from .vcenter_catalog import get_catalog, catalog_clusters, catalog_resource_pools
+from .linux_deploy import get_template_ip, start_linux_deployment
 from security_fixes.sanitization_helpers import InputSanitizer
 
 # Configure logger for deployment operations
@@ -32,12 +33,6 @@ def deploy_vm(request):
     # Crear choices para el selector de vCenter
     vcenter_choices = [('', '------------')] + [(str(vc.pk), vc.name) for vc in vcenters]
     
-    # Por defecto usar el primer vCenter
-    cred = vcenters.first()
-    vcenter_host = cred.host
-    vcenter_user = cred.user
-    vcenter_password = cred.get_password()
-    
     # Obtener configuraciones globales con valores por defecto
     deploy_env_obj = GlobalSetting.objects.filter(key='deploy_env').first()
     deploy_group_obj = GlobalSetting.objects.filter(key='deploy_group').first()
@@ -63,28 +58,20 @@ def deploy_vm(request):
         # Obtener vCenter seleccionado
         vcenter_id = request.POST.get('vcenter')
         from settings.models import VCenterCredential
-        import ssl
-        from pyVim.connect import SmartConnect, Disconnect
-        from pyVmomi import vim
         
         if vcenter_id:
             cred = VCenterCredential.objects.get(pk=vcenter_id)
         else:
             cred = vcenters.first()
         
+        catalog = None
         if cred:
             try:
-                context = ssl._create_unverified_context()
-                si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-                content = si.RetrieveContent()
-                for entity in content.rootFolder.childEntity:
-                    if hasattr(entity, 'vmFolder'):
-                        datacenters.append(entity.name)
-                for vm in content.viewManager.CreateContainerView(content.rootFolder, [vim.VirtualMachine], True).view:
-                    if vm.config.template:
-                        templates.append(vm.name)
-                Disconnect(si)
+                catalog = get_catalog(cred)
+                datacenters = catalog['datacenters']
+                templates = catalog['templates']
             except Exception as e:
+                catalog = None
                 datacenters = []
                 templates = []
         form.fields['template'].choices = [(t, t) for t in templates]
@@ -98,31 +85,13 @@ def deploy_vm(request):
         networks = []
         dc_selected = request.POST.get('datacenter')
         cl_selected = request.POST.get('cluster')
-        if cred and dc_selected:
-            try:
-                context = ssl._create_unverified_context()
-                si = SmartConnect(host=cred.host, user=cred.user, pwd=cred.get_password(), sslContext=context)
-                content = si.RetrieveContent()
-                # Buscar datacenter
-                dc = next((entity for entity in content.rootFolder.childEntity if hasattr(entity, 'vmFolder') and entity.name == dc_selected), None)
-                if dc:
-                    # Clusters
-                    clusters = [c.name for c in dc.hostFolder.childEntity if hasattr(c, 'resourcePool')]
-                    # Resource pools
-                    if cl_selected:
-                        cl = next((c for c in dc.hostFolder.childEntity if hasattr(c, 'resourcePool') and c.name == cl_selected), None)
-                        if cl:
-                            resource_pools = [cl.resourcePool.name] + [rp.name for rp in cl.resourcePool.resourcePool]
-                # Datastores
-                datastores = [ds.name for ds in content.viewManager.CreateContainerView(content.rootFolder, [vim.Datastore], True).view]
-                # Networks
-                networks = [net.name for net in content.viewManager.CreateContainerView(content.rootFolder, [vim.Network], True).view]
-                Disconnect(si)
-            except Exception as e:
-                clusters = []
-                resource_pools = []
-                datastores = []
-                networks = []
+        if catalog and dc_selected:
+            # Choices from the cached catalog (see vcenter_catalog)
+            clusters = catalog_clusters(catalog, dc_selected) or []
+            if cl_selected:
+                resource_pools = catalog_resource_pools(catalog, dc_selected, cl_selected)
+            datastores = catalog['datastores']
+            networks = catalog['networks']
         form.fields['cluster'].choices = [(cl, cl) for cl in clusters]
         form.fields['resource_pool'].choices = [(rp, rp) for rp in resource_pools]
         form.fields['datastore'].choices = [(ds, ds) for ds in datastores]
@@ -176,13 +145,18 @@ def deploy_vm(request):
                 messages.error(request, mark_safe(f'<b>❌ IP address already exists!</b><br>The IP <b>{escape(ip)}</b> is already assigned to host <b>{escape(existing_host.name)}</b>.<br>Please choose a different IP address.'))
                 return redirect('deploy:deploy_vm')
             
-            # --- INTEGRACIÓN REAL vCENTER (pyVmomi) ---
+            # Validar contra el catálogo de vCenter y los despliegues en curso
+            from addressing.ip_allocator import AllocationError, confirm_ips, find_conflict, hold_ip, release_ips
+            conflict = find_conflict(ip)
+            if conflict:
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return JsonResponse({'success': False, 'error': conflict})
+                messages.error(request, mark_safe(f'<b>❌ IP address in use!</b><br>{escape(conflict)}.<br>Please choose a different IP address.'))
+                return redirect('deploy:deploy_vm')
+            
+            # --- INTEGRACIÓN REAL vCENTER (pyVmomi, en Celery) ---
+            subnet = None
             try:
-                import socket
-                from pyVim.connect import SmartConnect, Disconnect
-                from pyVmomi import vim
-                import ssl
-                
                 # IMPORTANTE: Obtener credenciales del vCenter SELECCIONADO en el formulario
                 vcenter_id = request.POST.get('vcenter')
                 if vcenter_id:
@@ -190,209 +164,8 @@ def deploy_vm(request):
                 else:
                     selected_vcenter = vcenters.first()
                 
-                # Usar credenciales del vCenter seleccionado
-                vcenter_host = selected_vcenter.host
-                vcenter_user = selected_vcenter.user
-                vcenter_password = selected_vcenter.get_password()
-                
-                logger.info(f"DEPLOY: Using vCenter: {selected_vcenter.name} ({vcenter_host})")
+                logger.info(f"DEPLOY: Using vCenter: {selected_vcenter.name} ({selected_vcenter.host})")
                 
-                context = ssl._create_unverified_context()
-                si = SmartConnect(host=vcenter_host, user=vcenter_user, pwd=vcenter_password, sslContext=context)
-                content = si.RetrieveContent()
-
-                # Buscar datacenter
-                dc = next((entity for entity in content.rootFolder.childEntity if hasattr(entity, 'vmFolder') and entity.name == datacenter), None)
-                if not dc:
-                    raise Exception(f"Datacenter '{datacenter}' no encontrado.")
-                # Buscar cluster
-                cl = next((c for c in dc.hostFolder.childEntity if hasattr(c, 'resourcePool') and c.name == cluster), None)
-                if not cl:
-                    available_clusters = [c.name for c in dc.hostFolder.childEntity if hasattr(c, 'resourcePool')]
-                    raise Exception(f"Cluster '{cluster}' no encontrado en vCenter '{selected_vcenter.name}'. Clusters disponibles: {', '.join(available_clusters)}")
-                # Buscar resource pool
-                rp = None
-                for r in [cl.resourcePool] + list(cl.resourcePool.resourcePool):
-                    if r.name == resource_pool:
-                        rp = r
-                        break
-                if not rp:
-                    raise Exception(f"Resource Pool '{resource_pool}' no encontrado.")
-                # Buscar datastore
-                ds = next((d for d in content.viewManager.CreateContainerView(content.rootFolder, [vim.Datastore], True).view if d.name == datastore), None)
-                if not ds:
-                    raise Exception(f"Datastore '{datastore}' no encontrado.")
-                # Buscar red
-                net = next((n for n in content.viewManager.CreateContainerView(content.rootFolder, [vim.Network], True).view if n.name == network), None)
-                if not net:
-                    raise Exception(f"Network '{network}' no encontrada.")
-                # Verificar si ya existe una VM con el mismo nombre en vCenter (excluir templates)
-                existing_vm = next((vm for vm in content.viewManager.CreateContainerView(content.rootFolder, [vim.VirtualMachine], True).view 
-                                   if vm.name == hostname and not vm.config.template), None)
-                if existing_vm:
-                    Disconnect(si)
-                    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                        return JsonResponse({'success': False, 'error': f'VM {hostname} already exists in vCenter'})
-                    messages.error(request, mark_safe(f'<b>❌ VM already exists in vCenter!</b><br>A VM with the name <b>{escape(hostname)}</b> already exists in vCenter.<br>Datacenter: {escape(datacenter)}<br>Power State: {existing_vm.runtime.powerState}<br>Please choose a different hostname.'))
-                    return redirect('deploy:deploy_vm')
-                
-                # Buscar plantilla
-                template_vm = next((t for t in content.viewManager.CreateContainerView(content.rootFolder, [vim.VirtualMachine], True).view if t.name == template and t.config.template), None)
-                if not template_vm:
-                    raise Exception(f"Plantilla '{template}' no encontrada.")
-                
-                # Get target folder (use selected folder or default to vmFolder)
-                folder = dc.vmFolder
-                if folder_path:
-                    # Navigate to the specified folder
-                    def find_folder_by_path(root_folder, path):
-                        parts = path.split('/')
-                        current = root_folder
-                        for part in parts:
-                            found = False
-                            if hasattr(current, 'childEntity'):
-                                for child in current.childEntity:
-                                    if isinstance(child, vim.Folder) and child.name == part:
-                                        current = child
-                                        found = True
-                                        break
-                            if not found:
-                                return None
-                        return current
-                    
-                    target_folder = find_folder_by_path(dc.vmFolder, folder_path)
-                    if target_folder:
-                        folder = target_folder
-                    else:
-                        logger.info(f"DEPLOY: Warning: Folder '{folder_path}' not found, using default vmFolder")
-                # CustomizationSpec para hostname, IP y red
-                # IMPORTANTE: NO usar customization spec porque puede causar problemas
-                # con plantillas Debian/Ubuntu que no tienen open-vm-tools o perl
-                # La configuración de IP/hostname se hará con Ansible después del boot
-                custom_spec = None
-                # RelocateSpec y CloneSpec con customization
-                # Configure thin provisioning for disk
-                relospec = vim.vm.RelocateSpec(
-                    pool=rp, 
-                    datastore=ds,
-                    transform=vim.vm.RelocateSpec.Transformation.sparse  # Thin provisioning
-                )
-                clonespec = vim.vm.CloneSpec(location=relospec, powerOn=False, template=False, customization=custom_spec)
-                task = template_vm.Clone(folder=folder, name=hostname, spec=clonespec)
-                from time import sleep
-                while task.info.state not in ["success", "error"]:
-                    sleep(2)
-                if task.info.state == "error":
-                    error_msg = str(task.info.error)
-                    
-                    # Mensajes de error más claros
-                    if 'CannotAccessVmConfig' in error_msg or 'CannotAccessFile' in error_msg:
-                        if '.vmtx' in error_msg:
-                            raise Exception(
-                                f"❌ Template Error: Cannot access template file.\n\n"
-                                f"The template '{template}' cannot be accessed in vCenter.\n\n"
-                                f"Possible causes:\n"
-                                f"• Template was deleted or moved\n"
-                                f"• Datastore is not accessible\n"
-                                f"• Insufficient permissions on datastore\n"
-                                f"• Template is corrupted\n\n"
-                                f"Solution:\n"
-                                f"1. Verify template exists in vCenter\n"
-                                f"2. Check datastore accessibility\n"
-                                f"3. Verify user permissions\n"
-                                f"4. Try using a different template\n\n"
-                                f"Technical details: {error_msg}"
-                            )
-                        else:
-                            raise Exception(
-                                f"❌ VM Configuration Error: Cannot access VM configuration file.\n\n"
-                                f"vCenter cannot access the VM configuration.\n\n"
-                                f"Possible causes:\n"
-                                f"• Datastore is offline or inaccessible\n"
-                                f"• Network connectivity issues\n"
-                                f"• Insufficient permissions\n\n"
-                                f"Technical details: {error_msg}"
-                            )
-                    elif 'InsufficientResourcesFault' in error_msg:
-                        raise Exception(
-                            f"❌ Insufficient Resources: Not enough resources to deploy VM.\n\n"
-                            f"The cluster/host does not have enough resources.\n\n"
-                            f"Check:\n"
-                            f"• Available CPU\n"
-                            f"• Available RAM\n"
-                            f"• Datastore space\n\n"
-                            f"Technical details: {error_msg}"
-                        )
-                    elif 'DuplicateName' in error_msg:
-                        raise Exception(
-                            f"❌ Duplicate Name: A VM with name '{hostname}' already exists.\n\n"
-                            f"Please use a different hostname.\n\n"
-                            f"Technical details: {error_msg}"
-                        )
-                    else:
-                        raise Exception(f"❌ Clone Error: {error_msg}")
-                
-                # Reconfigurar la VM clonada para conectar la interfaz de red
-                cloned_vm = task.info.result
-                vm_mac_address = None
-                nic_spec = vim.vm.device.VirtualDeviceSpec()
-                nic_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.edit
-                # Buscar la primera NIC de la VM clonada y obtener MAC address
-                for device in cloned_vm.config.hardware.device:
-                    if isinstance(device, vim.vm.device.VirtualEthernetCard):
-                        vm_mac_address = device.macAddress
-                        logger.info(f'DEPLOY: MAC Address de la VM: {vm_mac_address}')
-                        nic_spec.device = device
-                        # NO cambiar la red - mantener la red de la plantilla
-                        # La VM debe estar en la misma red que la plantilla para SSH inicial
-                        # nic_spec.device.backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo()
-                        # nic_spec.device.backing.network = net
-                        # nic_spec.device.backing.deviceName = network
-                        # Configurar conectividad
-                        nic_spec.device.connectable = vim.vm.device.VirtualDevice.ConnectInfo()
-                        nic_spec.device.connectable.startConnected = True
-                        nic_spec.device.connectable.allowGuestControl = True
-                        nic_spec.device.connectable.connected = True
-                        logger.info(f'DEPLOY: Configurando NIC para auto-conectar al encender')
-                        break
-                
-                # Aplicar la reconfiguración
-                config_spec = vim.vm.ConfigSpec()
-                config_spec.deviceChange = [nic_spec]
-                reconfig_task = cloned_vm.ReconfigVM_Task(spec=config_spec)
-                while reconfig_task.info.state not in ["success", "error"]:
-                    sleep(2)
-                if reconfig_task.info.state == "error":
-                    raise Exception(f"Error reconfigurando NIC: {reconfig_task.info.error}")
-                
-                # Encender la VM
-                logger.info(f'DEPLOY: Encendiendo VM {hostname}...')
-                logger.info(f'DEPLOY: VM State before PowerOn: {cloned_vm.runtime.powerState}')
-                try:
-                    power_task = cloned_vm.PowerOn()
-                    while power_task.info.state not in ["success", "error"]:
-                        sleep(2)
-                    if power_task.info.state == "error":
-                        error_msg = str(power_task.info.error)
-                        logger.error(f'DEPLOY: Error encendiendo VM {hostname}: {error_msg}')
-                        raise Exception(f"Error encendiendo VM: {error_msg}")
-                    logger.info(f'DEPLOY: PowerOn task completed successfully')
-                    # Esperar 5 segundos para que la VM inicie el boot
-                    sleep(5)
-                    # Refrescar estado de la VM
-                    cloned_vm_refreshed = next((v for v in content.viewManager.CreateContainerView(content.rootFolder, [vim.VirtualMachine], True).view if v.name == hostname), None)
-                    if cloned_vm_refreshed:
-                        logger.info(f'DEPLOY: VM State after PowerOn: {cloned_vm_refreshed.runtime.powerState}')
-                        logger.info(f'DEPLOY: VM Connection State: {cloned_vm_refreshed.runtime.connectionState}')
-                        logger.info(f'DEPLOY: VM Guest State: {cloned_vm_refreshed.guest.guestState}')
-                    else:
-                        logger.warning(f'DEPLOY: Could not refresh VM state after PowerOn')
-                except Exception as e:
-                    logger.error(f'DEPLOY: Exception during PowerOn: {str(e)}')
-                    raise
-                
-                Disconnect(si)
-
                 # Post-provision con Ansible (ASÍNCRONO con Celery)
                 import os
                 
@@ -412,77 +185,65 @@ def deploy_vm(request):
                 os_family = form.cleaned_data['operating_system']
                 
                 # Obtener la IP de la plantilla desde GlobalSettings
-                if os_family == 'debian':
-                    template_ip_key = 'ubuntu_template_ip'
-                else:
-                    template_ip_key = 'ip_template'
-                
-                template_ip_setting = GlobalSetting.objects.filter(key=template_ip_key).first()
-                if not template_ip_setting:
+                template_ip_key, template_ip = get_template_ip(os_family)
+                if not template_ip:
                     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                         return JsonResponse({'success': False, 'error': f'GlobalSetting {template_ip_key} not found'})
                     messages.error(request, f'No se encontró la variable {template_ip_key} en GlobalSettings.')
                     return redirect('deploy:deploy_vm')
                 
-                template_ip = template_ip_setting.value
+                # Reservar la IP en el pool de su subred (si hay una definida)
+                try:
+                    subnet = hold_ip(ip, network, owner=f'user-{request.user.pk}')
+                except AllocationError as e:
+                    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                        return JsonResponse({'success': False, 'error': str(e)})
+                    messages.error(request, f'{e}. Please choose a different IP address.')
+                    return redirect('deploy:deploy_vm')
                 
                 # Calcular gateway
-                gateway = ip.rsplit('.', 1)[0] + '.1'
+                gateway = subnet.gateway_ip() if subnet else ip.rsplit('.', 1)[0] + '.1'
                 interface = 'ens192'
                 python_interpreter = form.cleaned_data.get('ansible_python_interpreter', '/usr/bin/python3') or '/usr/bin/python3'
                 
-                # Crear registro de historial
-                playbook_name = 'Basic Setup'
-                history_record = DeploymentHistory.objects.create(
+                # Crear registro de historial y lanzar el clon en Celery
+                history_record, celery_task = start_linux_deployment(
                     user=request.user,
+                    vcenter=selected_vcenter,
+                    clone_params={
+                        'datacenter': datacenter,
+                        'cluster': cluster,
+                        'resource_pool': resource_pool,
+                        'datastore': datastore,
+                        'network': network,
+                        'template': template,
+                        'hostname': hostname,
+                        'folder_path': folder_path,
+                    },
+                    provision_params={
+                        'template_ip': template_ip,
+                        'new_ip': ip,
+                        'new_hostname': hostname,
+                        'gateway': gateway,
+                        'interface': interface,
+                        'os_family': os_family,
+                        'ssh_user': ssh_user,
+                        'ssh_key_path': ssh_key_path,
+                        'python_interpreter': python_interpreter,
+                        'network_name': network,
+                        # Inventory parameters
+                        'deploy_env': deploy_env,
+                        'deploy_group': deploy_group,
+                        'template': template,
+                        'datacenter': datacenter,
+                        'cluster': cluster,
+                        # Optional playbooks
+                        'additional_playbooks': additional_playbooks,
+                    },
                     environment=deploy_env,
-                    target=hostname,
-                    target_type='VM',
-                    playbook=playbook_name,
-                    status='pending',
-                    hostname=hostname,
-                    ip_address=ip,
-                    mac_address=vm_mac_address,
-                    datacenter=datacenter,
-                    cluster=cluster,
-                    template=template
                 )
-                
-                logger.info(f'DEPLOY: Dispatching async provisioning task for VM: {hostname} on vCenter: {selected_vcenter.name}')
-                
-                # Dispatch async Celery task
-                from deploy.tasks import provision_linux_vm_async
-                celery_task = provision_linux_vm_async.delay(
-                    history_id=history_record.pk,
-                    template_ip=template_ip,
-                    new_ip=ip,
-                    new_hostname=hostname,
-                    gateway=gateway,
-                    interface=interface,
-                    os_family=os_family,
-                    ssh_user=ssh_user,
-                    ssh_key_path=ssh_key_path,
-                    python_interpreter=python_interpreter,
-                    vcenter_host=vcenter_host,
-                    vcenter_user=vcenter_user,
-                    vcenter_password=vcenter_password,
-                    network_name=network,
-                    # Inventory parameters
-                    deploy_env=deploy_env,
-                    deploy_group=deploy_group,
-                    template=template,
-                    datacenter=datacenter,
-                    cluster=cluster,
-                    # Optional playbooks
-                    additional_playbooks=additional_playbooks
-                )
-                
-                logger.info(f'DEPLOY: Celery task dispatched: {celery_task.id}')
-                
-                # Actualizar historial con task ID
-                history_record.celery_task_id = celery_task.id
-                history_record.status = 'running'
-                history_record.save()
+                if subnet:
+                    confirm_ips(subnet, [ip])
                 
                 # Mensaje de éxito con link al historial
                 messages.success(
@@ -511,6 +272,8 @@ def deploy_vm(request):
 
             except Exception as e:
                 import traceback
+                if subnet:
+                    release_ips(subnet, [ip])
                 error_msg = str(e)
                 error_trace = traceback.format_exc()
                 logger.error(f'DEPLOY: Exception during deployment: {error_msg}')
@@ -560,12 +323,14 @@ from playbooks.models import Playbook
 from history.models import DeploymentHistory
 from settings.models import DeploymentCredential, GlobalSetting
 from scheduler.models import ScheduledTask
+from scheduler.recurrence import recurrence_fields
+from .rolling import rolling_fields
 import subprocess
 import json
 import logging
 import traceback
 from django.utils import timezone
-from .vcenter_snapshot import get_vcenter_connection, create_snapshot, Disconnect
+from .vcenter_snapshot import get_vcenter_connection, create_snapshot, release_vcenter_connection
 
 logger = logging.getLogger(__name__)
 
@@ -661,7 +426,9 @@ def execute_playbook(request):
                 playbook=playbook,
                 create_snapshot=create_snapshot_flag,
                 scheduled_datetime=scheduled_dt,
-                status='pending'
+                status='pending',
+                **recurrence_fields(request.POST),
+                **(rolling_fields(request.POST) if target_type == 'group' else {})
             )
             
             logger.info(f"Scheduled task created: {task.id} for {scheduled_dt}")
@@ -732,7 +499,7 @@ def execute_playbook(request):
                     
                     logger.info(f"Snapshot creation result - Success: {success}, Message: {message}")
                     
-                    Disconnect(si)
+                    release_vcenter_connection(si)
                     
                     if success:
                         snapshot_created = True
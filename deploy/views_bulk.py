@@ -0,0 +1,340 @@
+"""
+Bulk Linux VM deployment API.
+
+POST a list of hostname/IP/network rows plus the placement shared by all of
+them, either as JSON:
+
+    {
+        "vcenter": 1, "datacenter": "DC1", "cluster": "CL1",
+        "resource_pool": "Resources", "datastore": "DS1",
+        "template": "rhel9-tpl", "operating_system": "redhat",
+        "ssh_credential": 2, "folder": "Linux/App", "playbooks": [],
+        "network": "VLAN10",
+        "vms": [{"hostname": "app01", "ip": "10.0.10.21"},
+                {"hostname": "app02", "ip": "10.0.10.22", "network": "VLAN11"}]
+    }
+
+or as form fields with the rows in a CSV upload (`vms` file, or `vms_csv`
+text) with a hostname,ip[,network] header. Rows with an empty (or "auto")
+ip get the next free address of the subnet defined for their network (see
+addressing.ip_allocator); explicit IPs are reserved in that pool too, so
+concurrent batches never hand out the same address. Every row gets its own
+DeploymentHistory and clone task; clones are throttled per datastore and
+cluster (see clone_slots) and progress is aggregated on a DeploymentBatch.
+"""
+import csv
+import io
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from addressing.ip_allocator import AllocationError, allocate_ips, confirm_ips, hold_ip, release_ips, subnet_for
+from addressing.models import VMAddressEntry
+from history.models import DeploymentBatch, DeploymentHistory
+from inventory.models import Host
+from security_fixes.sanitization_helpers import InputSanitizer
+from settings.models import VCenterCredential, DeploymentCredential, GlobalSetting
+from .linux_deploy import get_template_ip, start_linux_deployment
+from .vcenter_catalog import get_catalog, catalog_clusters, catalog_resource_pools
+
+logger = logging.getLogger('deploy.views_bulk')
+
+COMMON_FIELDS = ['vcenter', 'datacenter', 'cluster', 'resource_pool', 'datastore', 'template',
+                 'operating_system', 'ssh_credential']
+
+
+def parse_bulk_request(request):
+    """
+    Read the shared parameters and the VM rows from a JSON or form/CSV request
+
+    Returns:
+        tuple: (params dict, list of rows; validate_rows() rejects the ones that are not dicts)
+
+    Raises:
+        ValueError: malformed JSON, or a body that is not an object
+    """
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise ValueError('the JSON body must be an object')
+        rows = data.get('vms') or []
+        if not isinstance(rows, list):
+            raise ValueError('"vms" must be a list of objects')
+        return data, rows
+
+    params = request.POST.dict()
+    params['playbooks'] = request.POST.getlist('playbooks[]') or request.POST.getlist('playbooks')
+    if 'vms' in request.FILES:
+        csv_text = request.FILES['vms'].read().decode('utf-8-sig')
+    else:
+        csv_text = request.POST.get('vms_csv', '')
+    reader = csv.DictReader(io.StringIO(csv_text.strip()))
+    rows = [{(k or '').strip().lower(): (v or '').strip() for k, v in row.items()} for row in reader]
+    return params, rows
+
+
+def validate_rows(rows, default_network):
+    """
+    Sanitize every row and reject duplicates within the batch, in the inventory,
+    in the vCenter address catalog or in deployments in progress. Rows without
+    an IP (empty or "auto") keep ip=None, to be allocated by assign_addresses().
+
+    Returns:
+        tuple: (clean rows, list of error strings)
+    """
+    clean, errors = [], []
+    seen_hostnames, seen_ips = set(), set()
+
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f'Row {index}: expected an object with hostname, ip and network')
+            continue
+        try:
+            hostname = InputSanitizer.sanitize_hostname(str(row.get('hostname') or ''))
+            ip = str(row.get('ip') or '').strip()
+            ip = None if ip.lower() in ('', 'auto') else InputSanitizer.sanitize_ip_address(ip)
+            network = InputSanitizer.sanitize_network_name(str(row.get('network') or default_network or ''))
+        except ValueError as e:
+            errors.append(f'Row {index}: {e}')
+            continue
+
+        if hostname in seen_hostnames:
+            errors.append(f'Row {index}: hostname {hostname} is repeated in the batch')
+        if ip and ip in seen_ips:
+            errors.append(f'Row {index}: IP {ip} is repeated in the batch')
+        seen_hostnames.add(hostname)
+        if ip:
+            seen_ips.add(ip)
+        clean.append({'hostname': hostname, 'ip': ip, 'network': network})
+
+    # Una sola consulta por campo para todo el lote
+    existing = Host.objects.filter(active=True).filter(name__in=seen_hostnames).values_list('name', flat=True)
+    errors.extend(f'Hostname {name} already exists in inventory' for name in existing)
+    existing = Host.objects.filter(active=True).filter(ip__in=seen_ips).values_list('ip', 'name')
+    errors.extend(f'IP {ip} already assigned to {name}' for ip, name in existing)
+    existing = (VMAddressEntry.objects.filter(kind=VMAddressEntry.KIND_IP, value__in=seen_ips)
+                .values_list('value', 'address__vm_name'))
+    errors.extend(f'IP {ip} is in use by VM {name} in vCenter' for ip, name in existing)
+    existing = (DeploymentHistory.objects.filter(status__in=['pending', 'running'], ip_address__in=seen_ips)
+                .values_list('ip_address', 'hostname'))
+    errors.extend(f'IP {ip} is being deployed for {name}' for ip, name in existing)
+
+    return clean, errors
+
+
+def assign_addresses(rows, owner):
+    """
+    Reserve the IP of every row in the pool of its subnet, allocating the
+    missing ones; all reservations are released if any row fails
+
+    Returns:
+        tuple: (dict ip -> Subnet of the reserved addresses, list of error strings)
+    """
+    held, errors = {}, []
+    pending = {}
+    for row in rows:
+        if row['ip']:
+            try:
+                subnet = hold_ip(row['ip'], row['network'], owner=owner)
+            except AllocationError as e:
+                errors.append(str(e))
+                continue
+            if subnet:
+                held[row['ip']] = subnet
+        else:
+            pending.setdefault(row['network'], []).append(row)
+
+    # Una reserva por red para todas las filas sin IP
+    for network, network_rows in pending.items():
+        subnet = subnet_for(network)
+        if not subnet:
+            errors.append(f'No subnet defined for network {network}, an IP is required')
+            continue
+        try:
+            ips = allocate_ips(subnet, len(network_rows), owner=owner)
+        except AllocationError as e:
+            errors.append(str(e))
+            continue
+        except Exception as e:
+            errors.append(f'IP pool of {subnet.cidr} unavailable: {e}')
+            continue
+        for row, ip in zip(network_rows, ips):
+            row['ip'] = ip
+            held[ip] = subnet
+
+    if errors:
+        for ip, subnet in held.items():
+            release_ips(subnet, [ip])
+        return {}, errors
+    return held, []
+
+
+def validate_placement(vcenter, params, rows):
+    """Check names against the cached vCenter catalog; skipped if vCenter can't be read"""
+    try:
+        catalog = get_catalog(vcenter)
+    except Exception as e:
+        logger.warning(f'BULK: Catalog unavailable, placement checked by the clone tasks: {e}')
+        return []
+
+    errors = []
+    if params['template'] not in catalog['templates']:
+        errors.append(f"Template '{params['template']}' not found")
+    if params['datastore'] not in catalog['datastores']:
+        errors.append(f"Datastore '{params['datastore']}' not found")
+    clusters = catalog_clusters(catalog, params['datacenter'])
+    if clusters is None:
+        errors.append(f"Datacenter '{params['datacenter']}' not found")
+    elif params['cluster'] not in clusters:
+        errors.append(f"Cluster '{params['cluster']}' not found")
+    elif params['resource_pool'] not in catalog_resource_pools(catalog, params['datacenter'], params['cluster']):
+        errors.append(f"Resource Pool '{params['resource_pool']}' not found")
+    for network in sorted({row['network'] for row in rows}):
+        if network not in catalog['networks']:
+            errors.append(f"Network '{network}' not found")
+    return errors
+
+
+@login_required
+@require_POST
+def bulk_deploy(request):
+    """
+    Start a batch of Linux VM deployments
+
+    Returns:
+        JSON with the batch id and one history id per VM, or the validation errors
+    """
+    try:
+        params, rows = parse_bulk_request(request)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({'success': False, 'errors': [f'Invalid request: {e}']}, status=400)
+
+    missing = [field for field in COMMON_FIELDS if not params.get(field)]
+    if missing:
+        return JsonResponse({'success': False, 'errors': [f'Missing field: {field}' for field in missing]}, status=400)
+    if not rows:
+        return JsonResponse({'success': False, 'errors': ['No VMs provided']}, status=400)
+    max_vms = getattr(settings, 'DEPLOY_BULK_MAX_VMS', 100)
+    if len(rows) > max_vms:
+        return JsonResponse({'success': False, 'errors': [f'Too many VMs: {len(rows)} (max {max_vms})']}, status=400)
+
+    vcenter = VCenterCredential.objects.filter(pk=params['vcenter']).first()
+    ssh_cred = DeploymentCredential.objects.filter(pk=params['ssh_credential']).first()
+    os_family = params['operating_system']
+    errors = []
+    if not vcenter:
+        errors.append(f"vCenter {params['vcenter']} not found")
+    if not ssh_cred:
+        errors.append(f"SSH credential {params['ssh_credential']} not found")
+    elif not ssh_cred.ssh_key_file_path or not os.path.exists(ssh_cred.ssh_key_file_path):
+        errors.append(f'SSH key file not found for credential {ssh_cred.name}')
+    if os_family not in ('redhat', 'debian'):
+        errors.append(f'Invalid operating_system: {os_family}')
+    template_ip_key, template_ip = get_template_ip(os_family)
+    if not template_ip:
+        errors.append(f'GlobalSetting {template_ip_key} not found')
+
+    rows, row_errors = validate_rows(rows, params.get('network'))
+    errors.extend(row_errors)
+    if vcenter and not errors:
+        errors.extend(validate_placement(vcenter, params, rows))
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    held, errors = assign_addresses(rows, owner=f'user-{request.user.pk}')
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=409)
+
+    deploy_env_setting = GlobalSetting.objects.filter(key='deploy_env').first()
+    deploy_group_setting = GlobalSetting.objects.filter(key='deploy_group').first()
+    deploy_env = deploy_env_setting.value if deploy_env_setting else None
+    deploy_group = deploy_group_setting.value if deploy_group_setting else None
+    python_interpreter = params.get('ansible_python_interpreter') or '/usr/bin/python3'
+
+    batch = DeploymentBatch.objects.create(
+        user=request.user,
+        name=params.get('name') or f"{params['template']} x{len(rows)}",
+        vcenter=vcenter.name,
+        datacenter=params['datacenter'],
+        cluster=params['cluster'],
+        datastore=params['datastore'],
+        template=params['template'],
+        total=len(rows),
+    )
+    logger.info(f'BULK: Batch {batch.pk} with {len(rows)} VMs started by {request.user.username}')
+
+    deployments = []
+    for position, row in enumerate(rows):
+        subnet = held.get(row['ip'])
+        try:
+            history_record, celery_task = start_linux_deployment(
+                user=request.user,
+                vcenter=vcenter,
+                clone_params={
+                    'datacenter': params['datacenter'],
+                    'cluster': params['cluster'],
+                    'resource_pool': params['resource_pool'],
+                    'datastore': params['datastore'],
+                    'network': row['network'],
+                    'template': params['template'],
+                    'hostname': row['hostname'],
+                    'folder_path': params.get('folder', ''),
+                },
+                provision_params={
+                    'template_ip': template_ip,
+                    'new_ip': row['ip'],
+                    'new_hostname': row['hostname'],
+                    'gateway': subnet.gateway_ip() if subnet else row['ip'].rsplit('.', 1)[0] + '.1',
+                    'interface': 'ens192',
+                    'os_family': os_family,
+                    'ssh_user': ssh_cred.user,
+                    'ssh_key_path': ssh_cred.ssh_key_file_path,
+                    'python_interpreter': python_interpreter,
+                    'network_name': row['network'],
+                    'deploy_env': deploy_env,
+                    'deploy_group': deploy_group,
+                    'template': params['template'],
+                    'datacenter': params['datacenter'],
+                    'cluster': params['cluster'],
+                    'additional_playbooks': params.get('playbooks') or [],
+                },
+                environment=deploy_env,
+                batch=batch,
+            )
+        except Exception as e:
+            # Cola no disponible: liberar las IPs de las filas no lanzadas y cerrar el lote con las que sí
+            logger.error(f"BULK: Batch {batch.pk} stopped at {row['hostname']}: {e}")
+            for pending_row in rows[position:]:
+                pending_subnet = held.get(pending_row['ip'])
+                if pending_subnet:
+                    release_ips(pending_subnet, [pending_row['ip']])
+            batch.total = batch.deployments.count()
+            batch.save(update_fields=['total'])
+            return JsonResponse({
+                'success': False,
+                'errors': [f"Could not queue {row['hostname']}: {e}",
+                           f'{len(rows) - position} VMs were not started'],
+                'batch_id': batch.pk,
+                'batch_url': reverse('history:batch_detail', args=[batch.pk]),
+                'deployments': deployments,
+            }, status=503)
+        if subnet:
+            confirm_ips(subnet, [row['ip']])
+        deployments.append({
+            'hostname': row['hostname'],
+            'ip': row['ip'],
+            'history_id': history_record.pk,
+            'task_id': celery_task.id,
+        })
+
+    return JsonResponse({
+        'success': True,
+        'batch_id': batch.pk,
+        'batch_url': reverse('history:batch_detail', args=[batch.pk]),
+        'deployments': deployments,
+    })
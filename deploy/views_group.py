@@ -13,7 +13,8 @@ import json
 import os
 import logging
 import traceback
-from .vcenter_snapshot import get_vcenter_connection, create_snapshot, Disconnect
+from .rolling import rolling_options, start_rollout
+from .vcenter_group_snapshot import snapshot_hosts
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +48,12 @@ def execute_group_playbook_run(request):
     logger.info(f"[Group] Snapshot checkbox value received: '{create_snapshot_value}' (type: {type(create_snapshot_value).__name__})")
     logger.info(f"[Group] Snapshot flag evaluated to: {create_snapshot_flag}")
     
+    # Rolling mode: the group runs in batches, each one its own Celery task (deploy/rolling.py)
+    try:
+        rolling = rolling_options(request.POST)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
     try:
         group = Group.objects.get(pk=group_id)
         playbook = Playbook.objects.get(pk=playbook_id)
@@ -64,82 +71,21 @@ def execute_group_playbook_run(request):
     if not ssh_cred:
         return JsonResponse({'success': False, 'error': 'No SSH credentials configured'})
     
-    # Create snapshots for all hosts if requested
+    # Create snapshots for all hosts if requested (concurrently, see vcenter_group_snapshot.py)
     snapshots_created = []
     if create_snapshot_flag:
         try:
-            # Get vCenter credentials from VCenterCredential model
-            from settings.models import VCenterCredential
-            
-            # Always try to get credentials (we'll check per vCenter below)
-            if True:
-                # Group hosts by vCenter server
-                vcenter_hosts = {}
-                for host in hosts:
-                    if host.vcenter_server:
-                        if host.vcenter_server not in vcenter_hosts:
-                            vcenter_hosts[host.vcenter_server] = []
-                        vcenter_hosts[host.vcenter_server].append(host)
-                
-                # Create snapshots for each vCenter
-                for vcenter_server, vcenter_host_list in vcenter_hosts.items():
-                    try:
-                        # Get credentials for this specific vCenter
-                        vcenter_cred = VCenterCredential.objects.filter(host=vcenter_server).first()
-                        
-                        if not vcenter_cred:
-                            logger.warning(f"vCenter credential not found for {vcenter_server}. Skipping snapshots for this vCenter.")
-                            continue
-                        
-                        logger.info(f"Creating snapshots on vCenter: {vcenter_cred.name} ({vcenter_server})")
-                        
-                        si = get_vcenter_connection(
-                            vcenter_server,
-                            vcenter_cred.user,
-                            vcenter_cred.get_password()
-                        )
-                        
-                        for host in vcenter_host_list:
-                            # Use local timezone for snapshot name
-                            local_time = timezone.localtime(timezone.now())
-                            snapshot_name = f"Before executing {playbook.name} - {local_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                            success, message, snap_id = create_snapshot(
-                                si, host.ip, snapshot_name,
-                                f"Safety snapshot before {playbook.name} on group {group.name}"
-                            )
-                            
-                            if success:
-                                snapshots_created.append(f"{host.name}: {snapshot_name}")
-                                logger.info(f"Snapshot created for {host.name}: {snapshot_name}")
-                                
-                                # Record snapshot in history
-                                try:
-                                    from snapshots.models import SnapshotHistory
-                                    
-                                    # Get retention hours
-                                    retention_setting = GlobalSetting.objects.filter(key='snapshot_retention_hours').first()
-                                    retention_hours = int(retention_setting.value) if retention_setting else 24
-                                    
-                                    SnapshotHistory.objects.create(
-                                        snapshot_name=snapshot_name,
-                                        vcenter_snapshot_id=snap_id,
-                                        host=host,
-                                        group=group,
-                                        playbook=playbook,
-                                        user=request.user,
-                                        description=f"Safety snapshot before {playbook.name} on group {group.name}",
-                                        retention_hours=retention_hours,
-                                        status='active'
-                                    )
-                                    logger.info(f"Snapshot for {host.name} recorded in history with {retention_hours}h retention")
-                                except Exception as hist_error:
-                                    logger.error(f"Failed to record snapshot in history for {host.name}: {hist_error}")
-                            else:
-                                logger.warning(f"Failed to create snapshot for {host.name}: {message}")
-                        
-                        Disconnect(si)
-                    except Exception as e:
-                        logger.error(f"Exception creating snapshots on vCenter {vcenter_server}: {e}")
+            results = snapshot_hosts(
+                hosts, playbook.name,
+                f"Safety snapshot before {playbook.name} on group {group.name}",
+                group=group, playbook=playbook, user=request.user
+            )
+            for result in results:
+                if result.success:
+                    snapshots_created.append(f"{result.host.name}: {result.snapshot_name}")
+                else:
+                    logger.warning(f"Failed to create snapshot for {result.host.name}: {result.message}")
+            logger.info(f"[Group] {len(snapshots_created)}/{len(results)} snapshots created for group {group.name}")
         except Exception as e:
             logger.error(f"Exception creating group snapshots: {e}")
             # Continue with playbook execution even if snapshots fail
@@ -160,6 +106,7 @@ def execute_group_playbook_run(request):
         # Create Ansible inventory file with all hosts in the group
         # Use 'target_group' as the group name so playbooks can reference it consistently
         inventory_lines = ['[target_group]']
+        host_lines = {}
         
         for host in hosts:
             inventory_vars = [
@@ -173,7 +120,8 @@ def execute_group_playbook_run(request):
             if host.ansible_python_interpreter:
                 inventory_vars.append(f"ansible_python_interpreter={host.ansible_python_interpreter}")
             
-            inventory_lines.append(f"{host.name} {' '.join(inventory_vars)}")
+            host_lines[str(host.id)] = f"{host.name} {' '.join(inventory_vars)}"
+            inventory_lines.append(host_lines[str(host.id)])
         
         # Add group variables section
         inventory_lines.append('')
@@ -209,6 +157,27 @@ def execute_group_playbook_run(request):
         # Convert extra_vars to JSON string
         extra_vars_json = json.dumps(extra_vars)
         
+        if rolling:
+            # Cada lote escribe su propio inventario
+            os.remove(inventory_path)
+            batch_count = start_rollout(history, list(hosts.order_by('name')), rolling, {
+                'group': 'target_group',
+                'hosts': host_lines,
+                'group_vars': inventory_lines[inventory_lines.index('[target_group:vars]') + 1:],
+                'playbook': playbook.file.path,
+                'args': ['--extra-vars', extra_vars_json, '-v'],
+                'os_type': 'linux',
+                'target': {'type': 'group', 'name': group.name},
+            })
+            return JsonResponse({
+                'success': True,
+                'async': True,
+                'status': 'running',
+                'history_id': history.id,
+                'batches': batch_count,
+                'output': f'Rolling execution started: {hosts.count()} hosts in {batch_count} batches'
+            })
+        
         # Execute playbook
         cmd = [
             settings.ANSIBLE_PLAYBOOK_PATH,
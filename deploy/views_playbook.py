@@ -13,7 +13,8 @@ from django.conf import settings
 #import traceback
 import traceback as tb
 from django.utils import timezone
-from .vcenter_snapshot import get_vcenter_connection, create_snapshot, Disconnect
+from .vcenter_snapshot import get_vcenter_connection, create_snapshot, release_vcenter_connection
+from .rolling import rolling_options, rolling_fields, start_rollout
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +73,14 @@ def execute_playbook(request):
     logger.info(f"[LINUX-EXECUTION] Snapshot checkbox value: '{create_snapshot_value}'")
     logger.info(f"[LINUX-EXECUTION] Snapshot flag evaluated to: {create_snapshot_flag}")
     
+    # Rolling execution in batches (groups and playbooks only, see deploy/rolling.py)
+    try:
+        rolling = rolling_options(request.POST) if target_type == 'group' else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    if rolling and execution_type != 'playbook':
+        return JsonResponse({'success': False, 'error': 'Rolling execution is only available for playbooks'})
+    
     # Validate target
     if target_type == 'host':
         if not host_id:
@@ -173,7 +182,7 @@ def execute_playbook(request):
                     
                     logger.info(f"Snapshot creation result - Success: {success}, Message: {message}")
                     
-                    Disconnect(si)
+                    release_vcenter_connection(si)
                     
                     if success:
                         snapshot_created = True
@@ -222,6 +231,7 @@ def execute_playbook(request):
         try:
             from datetime import datetime
             from scheduler.models import ScheduledTask
+            from scheduler.recurrence import recurrence_fields
             
             # Parse scheduled time (format: YYYY-MM-DDTHH:MM)
             scheduled_dt = datetime.strptime(scheduled_time, '%Y-%m-%dT%H:%M')
@@ -242,7 +252,9 @@ def execute_playbook(request):
                 os_family=os_family,
                 create_snapshot=create_snapshot_flag,
                 scheduled_datetime=scheduled_dt,
-                status='pending'
+                status='pending',
+                **recurrence_fields(request.POST),
+                **(rolling_fields(request.POST) if rolling else {})
             )
             
             logger.info(f"[LINUX-EXECUTION] Scheduled task created: {task.id} for {scheduled_dt}")
@@ -301,6 +313,7 @@ def execute_playbook(request):
             else:  # group
                 # Create inventory with all hosts in group
                 inventory_lines = ['[target_group]']
+                host_lines = {}
                 for group_host in hosts_in_group:
                     # Use each host's specific settings
                     host_ansible_user = group_host.ansible_user if group_host.ansible_user else ansible_user
@@ -313,7 +326,8 @@ def execute_playbook(request):
                     # Add Python interpreter (use host config or default to /usr/bin/python3)
                     host_python_interp = group_host.ansible_python_interpreter if group_host.ansible_python_interpreter else '/usr/bin/python3'
                     host_vars.append(f"ansible_python_interpreter={host_python_interp}")
-                    inventory_lines.append(f"{group_host.ip} {' '.join(host_vars)}")
+                    host_lines[str(group_host.id)] = f"{group_host.ip} {' '.join(host_vars)}"
+                    inventory_lines.append(host_lines[str(group_host.id)])
                 inventory_content = '\n'.join(inventory_lines) + '\n'
             
             inventory_path = f'/tmp/ansible_inventory_{history.id}.ini'
@@ -334,6 +348,31 @@ def execute_playbook(request):
             # Convert extra_vars to JSON string
             extra_vars_json = json.dumps(extra_vars)
             
+            if rolling:
+                # Un inventario por lote; el historial representa al grupo
+                os.remove(inventory_path)
+                history.target = group.name
+                history.target_type = 'Group'
+                history.hostname = f'{group.name} ({hosts_in_group.count()} hosts)'
+                history.save()
+                batch_count = start_rollout(history, list(hosts_in_group.order_by('name')), rolling, {
+                    'group': 'target_group',
+                    'hosts': host_lines,
+                    'playbook': execution_file,
+                    'args': ['--extra-vars', extra_vars_json, '-v'],
+                    'os_type': 'linux',
+                    'target': {'type': 'group', 'name': group.name},
+                })
+                history.refresh_from_db(fields=['celery_task_id'])
+                return JsonResponse({
+                    'success': True,
+                    'message': f'Rolling execution started: {batch_count} batches',
+                    'task_id': history.celery_task_id,
+                    'history_id': history.id,
+                    'batches': batch_count,
+                    'async': True
+                })
+            
             # Execute playbook asynchronously with Celery
             from deploy.tasks import execute_playbook_async
             
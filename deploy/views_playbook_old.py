@@ -10,7 +10,7 @@ import json
 import logging
 import traceback
 from django.utils import timezone
-from .vcenter_snapshot import get_vcenter_connection, create_snapshot, Disconnect
+from .vcenter_snapshot import get_vcenter_connection, create_snapshot, release_vcenter_connection
 
 logger = logging.getLogger(__name__)
 
@@ -104,7 +104,7 @@ def execute_playbook(request):
                     
                     logger.info(f"Snapshot creation result - Success: {success}, Message: {message}")
                     
-                    Disconnect(si)
+                    release_vcenter_connection(si)
                     
                     if success:
                         snapshot_created = True
@@ -17,7 +17,9 @@ from django.conf import settings
 import os
 from django.utils import timezone
 from datetime import timedelta
-from .vcenter_snapshot import get_vcenter_connection, create_snapshot, Disconnect
+from .vcenter_snapshot import get_vcenter_connection, create_snapshot, release_vcenter_connection
+from .vcenter_group_snapshot import snapshot_hosts
+from .rolling import rolling_options, rolling_fields, start_rollout
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +67,14 @@ def execute_playbook_windows(request):
     scheduled = request.POST.get('scheduled') == '1'
     scheduled_time = request.POST.get('scheduled_time') if scheduled else None
     
+    # Rolling execution in batches (groups and playbooks only, see deploy/rolling.py)
+    try:
+        rolling = rolling_options(request.POST) if target_type == 'group' else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    if rolling and execution_type != 'playbook':
+        return JsonResponse({'success': False, 'error': 'Rolling execution is only available for playbooks'})
+    
     try:
         # Get playbook or script based on execution type
         if execution_type == 'script':
@@ -143,76 +153,25 @@ def execute_playbook_windows(request):
             else:
                 return JsonResponse({'success': False, 'error': 'No Windows credentials configured for group hosts'})
         
-        # Create snapshots for all hosts in group if requested
+        # Create snapshots for all hosts in group if requested (concurrently, see vcenter_group_snapshot.py)
+        # Scheduled tasks get their snapshots from the scheduler right before running
         snapshots_created = []
-        if create_snapshot_flag and target_type == 'group':
+        if create_snapshot_flag and target_type == 'group' and not scheduled:
             try:
                 logger.info(f'[WINDOWS-GROUP] Creating snapshots for group {group.name}...')
-                
-                # Group hosts by vCenter server
-                from collections import defaultdict
-                hosts_by_vcenter = defaultdict(list)
-                for h in hosts_in_group:
-                    if h.vcenter_server:
-                        hosts_by_vcenter[h.vcenter_server].append(h)
-                
-                # Create snapshots for each vCenter
-                for vcenter_server, vcenter_hosts in hosts_by_vcenter.items():
-                    try:
-                        vcenter_cred = VCenterCredential.objects.filter(host=vcenter_server).first()
-                        if not vcenter_cred:
-                            logger.warning(f"vCenter credential not found for {vcenter_server}. Skipping snapshots for this vCenter.")
-                            continue
-                        
-                        logger.info(f"Creating snapshots on vCenter: {vcenter_cred.name} ({vcenter_server})")
-                        si = get_vcenter_connection(vcenter_server, vcenter_cred.user, vcenter_cred.get_password())
-                        
-                        if si:
-                            for host in vcenter_hosts:
-                                try:
-                                    # Use local timezone for snapshot name
-                                    local_time = timezone.localtime(timezone.now())
-                                    snapshot_name = f"Before executing {execution_name} - {local_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                                    success, message, snap_id = create_snapshot(
-                                        si, host.ip, snapshot_name,
-                                        f"Safety snapshot before {execution_name} on group {group.name}"
-                                    )
-                                    
-                                    if success:
-                                        snapshots_created.append(f"{host.name}: {snapshot_name}")
-                                        logger.info(f"Snapshot created for {host.name}: {snapshot_name}")
-                                        
-                                        # Record snapshot in history
-                                        try:
-                                            from snapshots.models import SnapshotHistory
-                                            from settings.models import GlobalSetting
-                                            
-                                            retention_setting = GlobalSetting.objects.filter(key='snapshot_retention_hours').first()
-                                            retention_hours = int(retention_setting.value) if retention_setting else 24
-                                            
-                                            SnapshotHistory.objects.create(
-                                                snapshot_name=snapshot_name,
-                                                vcenter_snapshot_id=snap_id,
-                                                host=host,
-                                                vcenter_server=vcenter_server,
-                                                created_by=request.user,
-                                                retention_hours=retention_hours,
-                                                description=f"Safety snapshot before {execution_name} on group {group.name}",
-                                                auto_delete=True
-                                            )
-                                            
-                                            logger.info(f"Snapshot for {host.name} recorded in history with {retention_hours}h retention")
-                                        except Exception as hist_error:
-                                            logger.error(f"Failed to record snapshot in history for {host.name}: {hist_error}")
-                                    else:
-                                        logger.warning(f"Failed to create snapshot for {host.name}: {message}")
-                                        
-                                except Exception as e:
-                                    logger.error(f"Exception creating snapshot for {host.name}: {e}")
-                            
-                            Disconnect(si)
-                    except Exception as e:
-                        logger.error(f"Exception creating snapshots on vCenter {vcenter_server}: {e}")
+                results = snapshot_hosts(
+                    hosts_in_group, execution_name,
+                    f"Safety snapshot before {execution_name} on group {group.name}",
+                    group=group, playbook=playbook,
+                    script_name=script.name if script else None,
+                    user=request.user
+                )
+                for result in results:
+                    if result.success:
+                        snapshots_created.append(f"{result.host.name}: {result.snapshot_name}")
+                    else:
+                        logger.warning(f"Failed to create snapshot for {result.host.name}: {result.message}")
+                logger.info(f'[WINDOWS-GROUP] {len(snapshots_created)}/{len(results)} snapshots created for group {group.name}')
             except Exception as e:
                 logger.error(f"Exception creating group snapshots: {e}")
                 # Continue with playbook execution even if snapshots fail
@@ -221,6 +180,7 @@ def execute_playbook_windows(request):
             try:
                 from datetime import datetime
                 from scheduler.models import ScheduledTask
+                from scheduler.recurrence import recurrence_fields
                 
                 # Parse scheduled time (format: YYYY-MM-DDTHH:MM)
                 scheduled_dt = datetime.strptime(scheduled_time, '%Y-%m-%dT%H:%M')
@@ -241,7 +201,9 @@ def execute_playbook_windows(request):
                     os_family='windows',
                     create_snapshot=create_snapshot_flag,
                     scheduled_datetime=scheduled_dt,
-                    status='pending'
+                    status='pending',
+                    **recurrence_fields(request.POST),
+                    **(rolling_fields(request.POST) if rolling else {})
                 )
                 
                 logger.info(f"[WINDOWS-{execution_type.upper()}] Scheduled task created: {task.id} for {scheduled_dt}")
@@ -311,7 +273,7 @@ def execute_playbook_windows(request):
                                 f"Safety snapshot before {execution_name}"
                             )
                         
-                        Disconnect(si)
+                        release_vcenter_connection(si)
                         
                         if success:
                             snapshot_created = True
@@ -377,12 +339,11 @@ ansible_winrm_operation_timeout_sec=240
         else:  # group
             # For groups, list all IPs with hostname as alias for better visual identification
             inventory_content = '[windows_group]\n'
+            host_lines = {}
             for h in hosts_in_group:
                 # Use hostname as alias if available, otherwise just use IP
-                if h.name:
-                    inventory_content += f'{h.name} ansible_host={h.ip}\n'
-                else:
-                    inventory_content += f'{h.ip}\n'
+                host_lines[str(h.id)] = f'{h.name} ansible_host={h.ip}' if h.name else h.ip
+                inventory_content += host_lines[str(h.id)] + '\n'
             
             # Use first host's credentials for group vars
             inventory_content += f'''\n[windows_group:vars]
@@ -438,6 +399,30 @@ ansible_winrm_operation_timeout_sec=240
             playbook_path = playbook.file.path
             logger.info(f'[WINDOWS-PLAYBOOK] Using playbook file: {playbook_path}')
         
+        if rolling:
+            # Un inventario por lote: [windows_group] con los hosts del lote y las mismas vars WinRM
+            from deploy.tasks import windows_update_args
+            os.remove(inventory_path)
+            group_vars = inventory_content.split('[windows_group:vars]\n', 1)[1].strip().split('\n')
+            batch_count = start_rollout(history_record, list(hosts_in_group.order_by('name')), rolling, {
+                'group': 'windows_group',
+                'hosts': host_lines,
+                'group_vars': group_vars,
+                'playbook': playbook_path,
+                'args': ['-vv', *windows_update_args()],
+                'os_type': 'windows',
+                'target': {'type': target_type, 'name': target_name},
+            })
+            history_record.refresh_from_db(fields=['celery_task_id'])
+            return JsonResponse({
+                'success': True,
+                'message': f'Rolling execution started: {batch_count} batches',
+                'task_id': history_record.celery_task_id,
+                'history_id': history_record.id,
+                'batches': batch_count,
+                'async': True
+            })
+        
         # Execute asynchronously with Celery
         from deploy.tasks import execute_windows_playbook_async
         
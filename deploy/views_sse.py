@@ -6,46 +6,137 @@ import time
 from django.http import StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from history.models import DeploymentHistory
+from history.stream import subscribe, decode_message
 from celery.result import AsyncResult
 import logging
 
 logger = logging.getLogger(__name__)
 
+FINAL_STATUSES = ('success', 'failed')
+STREAM_TIMEOUT = 20 * 60  # 20 minutes
+KEEPALIVE_INTERVAL = 15  # seconds without messages before a keepalive/status check
 
-def sse_message(data, event=None):
+
+def sse_message(data, event=None, event_id=None):
     """
     Format a message for SSE
-    
+
     Args:
         data: Dictionary with message data
         event: Optional event type
-    
+        event_id: Optional event id (sent back by the browser as Last-Event-ID)
+
     Returns:
         Formatted SSE message string
     """
     message = ""
+    if event_id is not None:
+        message += f"id: {event_id}\n"
     if event:
         message += f"event: {event}\n"
     message += f"data: {json.dumps(data)}\n\n"
     return message
 
 
+def get_last_event_id(request):
+    """Return the last output chunk sequence seen by the client, or -1"""
+    value = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id', '')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def completion_message(history):
+    """Build the 'complete' event for a finished deployment"""
+    return sse_message({
+        'status': history.status,
+        'history_id': history.id,
+        'message': f'Deployment {history.status}',
+        'completed_at': history.completed_at.isoformat() if history.completed_at else None,
+        'duration': history.duration() if history.completed_at else None,
+    }, event='complete')
+
+
+def output_backlog(history, last_sequence):
+    """
+    Yield (sequence, message) for every stored chunk after `last_sequence`.
+    Used on connect/reconnect and to fill gaps in the pub/sub stream.
+    """
+    chunks = history.output_chunks_after(last_sequence).values_list('sequence', 'content')
+    for sequence, content in chunks.iterator():
+        yield sequence, sse_message({
+            'status': history.status,
+            'history_id': history.id,
+            'output': content,
+        }, event='update', event_id=sequence)
+
+
+def poll_stream(history, last_sequence):
+    """
+    Database polling fallback used when Redis pub/sub is unavailable
+    """
+    poll_count = 0
+    max_polls = STREAM_TIMEOUT  # 1 second intervals
+
+    while poll_count < max_polls:
+        history.refresh_from_db(fields=['status', 'completed_at', 'celery_task_id'])
+
+        update_data = {
+            'status': history.status,
+            'history_id': history.id,
+            'poll_count': poll_count,
+        }
+
+        # Only chunks written since the last poll are read
+        for sequence, message in output_backlog(history, last_sequence):
+            last_sequence = sequence
+            yield message
+
+        if history.celery_task_id:
+            task_result = AsyncResult(history.celery_task_id)
+            update_data['task_state'] = task_result.state
+            update_data['task_ready'] = task_result.ready()
+
+        yield sse_message(update_data, event='update')
+
+        if history.status in FINAL_STATUSES:
+            yield completion_message(history)
+            return
+
+        poll_count += 1
+        time.sleep(1)
+
+    yield sse_message({
+        'status': 'timeout',
+        'message': 'Deployment stream timeout (20 minutes)'
+    }, event='timeout')
+
+
 @login_required
 def deployment_stream(request, history_id):
     """
     SSE endpoint for streaming deployment updates
-    
+
+    Output deltas and status transitions are pushed by the Celery tasks to a
+    per-history Redis channel; this view blocks on that channel instead of
+    polling the database. Stored chunks are read from the database only on
+    connect, on reconnect (Last-Event-ID) or to fill a gap.
+
     Args:
         history_id: DeploymentHistory ID
-    
+
     Returns:
         StreamingHttpResponse with SSE updates
     """
+    last_event_id = get_last_event_id(request)
+
     def event_stream():
         """Generator that yields SSE messages"""
+        pubsub = None
         try:
             history = DeploymentHistory.objects.get(pk=history_id)
-            
+
             # Send initial status
             yield sse_message({
                 'status': history.status,
@@ -53,65 +144,90 @@ def deployment_stream(request, history_id):
                 'target': history.target,
                 'message': 'Connected to deployment stream'
             }, event='connected')
-            
-            last_output_length = 0
-            poll_count = 0
-            max_polls = 1200  # 20 minutes (1 second intervals)
-            
-            while poll_count < max_polls:
-                # Refresh from database
-                history.refresh_from_db()
-                
-                # Prepare update data
-                update_data = {
+
+            # Subscribe before reading the backlog so nothing published in between is lost
+            try:
+                pubsub = subscribe(history)
+            except Exception as e:
+                logger.warning(f'SSE stream {history_id}: Redis unavailable, falling back to polling: {e}')
+
+            # One-shot output is only sent on the first connection
+            last_sequence = last_event_id
+            if last_sequence < 0 and history.ansible_output:
+                yield sse_message({
                     'status': history.status,
                     'history_id': history.id,
-                    'poll_count': poll_count,
-                }
-                
-                # Check if there's new output
-                current_output = history.ansible_output or ''
-                current_length = len(current_output)
-                
-                if current_length > last_output_length:
-                    # Send only the new output (incremental)
-                    new_output = current_output[last_output_length:]
-                    update_data['output'] = new_output
-                    update_data['output_length'] = current_length
-                    last_output_length = current_length
-                
-                # Check Celery task status
-                if history.celery_task_id:
-                    task_result = AsyncResult(history.celery_task_id)
-                    update_data['task_state'] = task_result.state
-                    update_data['task_ready'] = task_result.ready()
-                
-                # Send update
-                yield sse_message(update_data, event='update')
-                
-                # Check if deployment is complete
-                if history.status in ['success', 'failed']:
-                    # Send completion message
-                    completion_data = {
+                    'output': history.ansible_output,
+                }, event='update')
+
+            for sequence, message in output_backlog(history, last_sequence):
+                last_sequence = sequence
+                yield message
+
+            if history.status in FINAL_STATUSES:
+                yield completion_message(history)
+                return
+
+            if pubsub is None:
+                yield from poll_stream(history, last_sequence)
+                return
+
+            deadline = time.monotonic() + STREAM_TIMEOUT
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=KEEPALIVE_INTERVAL)
+
+                if message is None:
+                    # Quiet period: cheap status check in case a notification was missed
+                    history.refresh_from_db(fields=['status', 'completed_at'])
+                    if history.status in FINAL_STATUSES:
+                        for sequence, backlog_message in output_backlog(history, last_sequence):
+                            last_sequence = sequence
+                            yield backlog_message
+                        yield completion_message(history)
+                        return
+                    yield ': keepalive\n\n'
+                    continue
+
+                event, data = decode_message(message)
+
+                if event == 'output':
+                    sequence = data['sequence']
+                    if sequence <= last_sequence:
+                        continue
+                    if sequence > last_sequence + 1:
+                        # Missed messages: catch up from the database
+                        for sequence, backlog_message in output_backlog(history, last_sequence):
+                            last_sequence = sequence
+                            yield backlog_message
+                        continue
+                    last_sequence = sequence
+                    yield sse_message({
+                        'status': history.status,
+                        'history_id': history.id,
+                        'output': data['output'],
+                    }, event='update', event_id=sequence)
+
+                elif event == 'status':
+                    history.status = data['status']
+                    yield sse_message({
                         'status': history.status,
                         'history_id': history.id,
-                        'message': f'Deployment {history.status}',
-                        'completed_at': history.completed_at.isoformat() if history.completed_at else None,
-                        'duration': history.duration() if history.completed_at else None,
-                    }
-                    yield sse_message(completion_data, event='complete')
-                    break
-                
-                poll_count += 1
-                time.sleep(1)  # Wait 1 second before next update
-            
+                    }, event='update')
+
+                    if history.status in FINAL_STATUSES:
+                        history.refresh_from_db(fields=['status', 'completed_at'])
+                        for sequence, backlog_message in output_backlog(history, last_sequence):
+                            last_sequence = sequence
+                            yield backlog_message
+                        yield completion_message(history)
+                        return
+
             # Timeout
-            if poll_count >= max_polls:
-                yield sse_message({
-                    'status': 'timeout',
-                    'message': 'Deployment stream timeout (20 minutes)'
-                }, event='timeout')
-                
+            yield sse_message({
+                'status': 'timeout',
+                'message': 'Deployment stream timeout (20 minutes)'
+            }, event='timeout')
+
         except DeploymentHistory.DoesNotExist:
             yield sse_message({
                 'error': 'Deployment not found',
@@ -123,7 +239,13 @@ def deployment_stream(request, history_id):
                 'error': str(e),
                 'history_id': history_id
             }, event='error')
-    
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
     response = StreamingHttpResponse(
         event_stream(),
         content_type='text/event-stream'
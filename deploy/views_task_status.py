@@ -5,6 +5,7 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from celery.result import AsyncResult
 from history.models import DeploymentHistory
+from history.ansible_events import get_recap, get_status_counts
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,9 +47,10 @@ def task_status(request, task_id):
                 response['completed_at'] = history.completed_at.isoformat()
                 response['duration'] = history.duration()
             
-            # Use ansible_output field (works for both playbooks and deployments)
-            if history.ansible_output:
-                response['output'] = history.ansible_output
+            # Assemble output from the chunk store (works for both playbooks and deployments)
+            output = history.get_output()
+            if output:
+                response['output'] = output
         
         # Add task result if available
         if task_result.ready():
@@ -103,9 +105,27 @@ def history_status(request, history_id):
             response['completed_at'] = history.completed_at.isoformat()
             response['duration'] = history.duration()
         
-        # Use ansible_output field (works for both playbooks and deployments)
-        if history.ansible_output:
-            response['output'] = history.ansible_output
+        # Assemble output from the chunk store (works for both playbooks and deployments).
+        # ?output=0 skips it (history detail loads the output by line range)
+        if request.GET.get('output') != '0':
+            output = history.get_output()
+            if output:
+                response['output'] = output
+        
+        # Per-host results of multi-host script executions
+        host_results = list(history.host_results.values(
+            'host_name', 'host_ip', 'status', 'exit_code', 'duration_seconds'
+        ))
+        if host_results:
+            response['host_results'] = host_results
+        
+        # Structured Ansible results (diaken_events callback)
+        recap = get_recap(history)
+        if recap:
+            response['recap'] = recap
+        task_counts = get_status_counts(history)
+        if task_counts:
+            response['task_counts'] = task_counts
         
         return JsonResponse(response)
         
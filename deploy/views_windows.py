@@ -6,9 +6,8 @@ from django.utils import timezone
 from settings.models import VCenterCredential, WindowsCredential, GlobalSetting
 from history.models import DeploymentHistory
 from inventory.models import Host, Environment, Group
-from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim
-import ssl
+from .vcenter_pool import vcenter_pool
 import time
 import subprocess
 import tempfile
@@ -59,6 +58,7 @@ def deploy_windows_vm_run(request):
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Invalid request method'})
     
+    si = None
     try:
         # Get form data
         vcenter_id = request.POST.get('vcenter')
@@ -95,13 +95,7 @@ def deploy_windows_vm_run(request):
         template_ip = template_ip.value
         
         # Step 1: Connect to vCenter
-        context = ssl._create_unverified_context() if not vcenter_cred.ssl_verify else None
-        si = SmartConnect(
-            host=vcenter_cred.host,
-            user=vcenter_cred.user,
-            pwd=vcenter_cred.get_password(),
-            sslContext=context
-        )
+        si = vcenter_pool.acquire(vcenter_cred.host, vcenter_cred.user, vcenter_cred.get_password())
         
         content = si.RetrieveContent()
         
@@ -113,7 +107,7 @@ def deploy_windows_vm_run(request):
                 break
         
         if not dc:
-            Disconnect(si)
+            vcenter_pool.release(si)
             return JsonResponse({'success': False, 'error': f'Datacenter {datacenter} not found'})
         
         # Step 3: Find cluster
@@ -124,7 +118,7 @@ def deploy_windows_vm_run(request):
                 break
         
         if not cluster_obj:
-            Disconnect(si)
+            vcenter_pool.release(si)
             return JsonResponse({'success': False, 'error': f'Cluster {cluster} not found'})
         
         # Step 4: Find datastore
@@ -135,7 +129,7 @@ def deploy_windows_vm_run(request):
                 break
         
         if not ds:
-            Disconnect(si)
+            vcenter_pool.release(si)
             return JsonResponse({'success': False, 'error': f'Datastore {datastore} not found'})
         
         # Step 5: Find network
@@ -146,13 +140,13 @@ def deploy_windows_vm_run(request):
                 break
         
         if not net:
-            Disconnect(si)
+            vcenter_pool.release(si)
             return JsonResponse({'success': False, 'error': f'Network {network} not found'})
         
         # Step 6: Find template
         template_vm = find_vm_by_name(si, template_name)
         if not template_vm:
-            Disconnect(si)
+            vcenter_pool.release(si)
             return JsonResponse({'success': False, 'error': f'Template {template_name} not found'})
         
         # Step 7: Get target folder
@@ -192,7 +186,7 @@ def deploy_windows_vm_run(request):
         task = template_vm.Clone(folder=folder, name=hostname, spec=clonespec)
         
         if not wait_for_task(task):
-            Disconnect(si)
+            vcenter_pool.release(si)
             return JsonResponse({'success': False, 'error': 'Failed to clone VM'})
         
         logger.info(f'[WINDOWS] VM {hostname} cloned successfully')
@@ -267,8 +261,9 @@ def deploy_windows_vm_run(request):
         power_task = cloned_vm.PowerOn()
         wait_for_task(power_task)
         
-        # Disconnect from vCenter
-        Disconnect(si)
+        # Return the session to the pool
+        vcenter_pool.release(si)
+        si = None
         logger.info(f'[WINDOWS] VM powered on, dispatching async Celery task...')
         
         # Dispatch Celery task for async provisioning
@@ -315,6 +310,8 @@ def deploy_windows_vm_run(request):
         
     except Exception as e:
         logger.error(f'[WINDOWS] Deployment error: {str(e)}')
+        if si is not None:
+            vcenter_pool.release(si, discard=True)
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -208,6 +208,118 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
 
+# vCenter session pool (deploy/vcenter_pool.py)
+VCENTER_POOL_MAX_SESSIONS = int(os.environ.get('VCENTER_POOL_MAX_SESSIONS', '4'))  # per vCenter/user, per process
+VCENTER_POOL_IDLE_TIMEOUT = int(os.environ.get('VCENTER_POOL_IDLE_TIMEOUT', '900'))  # seconds
+
+# vCenter inventory catalog for the deploy form (deploy/vcenter_catalog.py)
+VCENTER_CATALOG_TTL = int(os.environ.get('VCENTER_CATALOG_TTL', '600'))  # seconds
+VCENTER_CATALOG_REFRESH_INTERVAL = int(os.environ.get('VCENTER_CATALOG_REFRESH_INTERVAL', '300'))  # seconds
+
+# Bulk deploy: concurrent clones per datastore / cluster (deploy/clone_slots.py)
+DEPLOY_MAX_CLONES_PER_DATASTORE = int(os.environ.get('DEPLOY_MAX_CLONES_PER_DATASTORE', '2'))
+DEPLOY_MAX_CLONES_PER_CLUSTER = int(os.environ.get('DEPLOY_MAX_CLONES_PER_CLUSTER', '4'))
+DEPLOY_CLONE_SLOT_RETRY = 30  # seconds between attempts to get a clone slot
+DEPLOY_TEMPLATE_IP_RETRY = 10  # seconds between attempts to power on while another clone holds the template IP
+DEPLOY_TEMPLATE_IP_LEASE = 1800  # seconds before an unreleased template IP lock expires
+DEPLOY_BULK_MAX_VMS = 100
+
+# Group pre-execution snapshots (deploy/vcenter_group_snapshot.py)
+SNAPSHOT_MAX_CONCURRENT_PER_VCENTER = int(os.environ.get('SNAPSHOT_MAX_CONCURRENT_PER_VCENTER', '8'))
+SNAPSHOT_MAX_CONCURRENT_PER_DATASTORE = int(os.environ.get('SNAPSHOT_MAX_CONCURRENT_PER_DATASTORE', '2'))
+SNAPSHOT_GROUP_TIMEOUT = 900  # seconds to wait for all snapshot tasks of a group
+SNAPSHOT_REAPER_CONCURRENCY = int(os.environ.get('SNAPSHOT_REAPER_CONCURRENCY', '4'))  # removals in flight per vCenter
+SNAPSHOT_REAPER_TIMEOUT = 1200  # seconds; below CELERY_TASK_SOFT_TIME_LIMIT
+
+# Snapshot storage report (snapshots/storage.py)
+SNAPSHOT_USAGE_REFRESH_INTERVAL = 900  # seconds (celery beat)
+SNAPSHOT_ALERT_SIZE_MB = int(os.environ.get('SNAPSHOT_ALERT_SIZE_MB', '20480'))  # one snapshot
+SNAPSHOT_ALERT_CHAIN_DEPTH = int(os.environ.get('SNAPSHOT_ALERT_CHAIN_DEPTH', '3'))
+SNAPSHOT_ALERT_DATASTORE_MB = int(os.environ.get('SNAPSHOT_ALERT_DATASTORE_MB', '204800'))  # all snapshots on a datastore
+
+# VM address catalog for the addressing app (addressing/catalog.py)
+VM_ADDRESS_SYNC_INTERVAL = int(os.environ.get('VM_ADDRESS_SYNC_INTERVAL', '300'))  # seconds (celery beat)
+
+# Free-IP allocation per subnet (addressing/ip_allocator.py)
+IP_RESERVATION_TTL = int(os.environ.get('IP_RESERVATION_TTL', '900'))  # seconds before an unused reservation is freed
+IP_POOL_REFRESH_INTERVAL = int(os.environ.get('IP_POOL_REFRESH_INTERVAL', '600'))  # seconds (celery beat)
+IP_SWEEP_WORKERS = 64
+IP_SWEEP_TIMEOUT = 1.0  # seconds per probe
+IP_SWEEP_MAX_HOSTS = 1024  # addresses probed per subnet and refresh
+IP_SWEEP_PORTS = [22, 3389, 5985, 443, 80]
+
+# SSH readiness probing after power-on / reboot (deploy/readiness.py)
+DEPLOY_SSH_BOOT_TIMEOUT = 120  # seconds
+DEPLOY_SSH_REBOOT_TIMEOUT = 180  # seconds
+DEPLOY_SSH_PROBE_MAX_DELAY = 10  # backoff cap, seconds
+
+# Parallel script execution (deploy/script_runner.py)
+SCRIPT_EXECUTION_FORKS = 10  # concurrent hosts, like ansible --forks
+SCRIPT_HOST_TIMEOUT = 600  # seconds per host
+SSH_CONTROL_PATH_DIR = '/tmp/diaken-ssh'  # ControlMaster sockets
+
+# Deployment history listing
+HISTORY_PAGE_SIZE = 50  # rows per page (keyset pagination, history/pagination.py)
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per query by the streaming CSV exports (history/export.py)
+OUTPUT_PAGE_LINES = 1000  # output lines per page on the history detail pages (history/output_render.py)
+OUTPUT_RENDER_CACHE_TTL = 7 * 24 * 3600  # seconds the highlighted output stays cached
+
+# Rolling group executions (deploy/rolling.py)
+ROLLING_BATCH_TIMEOUT = int(os.environ.get('ROLLING_BATCH_TIMEOUT', 3600))  # seconds before a batch's ansible-playbook is killed (the task's Celery limits follow it)
+ROLLING_DEFAULT_FORKS = 5  # hosts run in parallel within a batch when the form leaves it empty
+ROLLING_MAX_FORKS = int(os.environ.get('ROLLING_MAX_FORKS', 50))  # upper bound accepted from the forms
+
+# Dashboard statistics (dashboard/stats.py)
+DASHBOARD_CACHE_TTL = 60  # seconds the rendered context is cached
+DASHBOARD_STATS_REFRESH_DAYS = 3  # closed days recomputed on every rollup refresh
+DASHBOARD_STATS_BACKFILL_DAYS = 365
+DASHBOARD_STATS_REFRESH_INTERVAL = 300  # seconds (celery beat)
+
+# Coalesced /etc/hosts regeneration (inventory/hosts_manager.py)
+ETC_HOSTS_UPDATE_DELAY = 5  # seconds a burst of Host saves is collected before one rewrite
+ETC_HOSTS_LOCK_TIMEOUT = 60  # seconds
+
+# Event-driven scheduler engine (scheduler/engine.py)
+SCHEDULER_HORIZON = 3600  # seconds of upcoming tasks kept in memory
+SCHEDULER_RESYNC_INTERVAL = 300  # seconds between full reloads (safety net)
+SCHEDULER_CLEANUP_INTERVAL = 300  # seconds between expired snapshot cleanups
+SCHEDULER_LEASE_TIMEOUT = 120  # seconds an execution lease survives without heartbeat
+SCHEDULER_HANDOFF_TIMEOUT = 1800  # seconds a claimed task may wait in the Celery queue
+SCHEDULER_CLAIM_BATCH = 20  # due tasks claimed per SKIP LOCKED query
+SCHEDULER_MISFIRE_GRACE = 120  # seconds late before a recurring run counts as missed (catch-up policy)
+
+# Shared cache (web + celery workers) on Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+        'KEY_PREFIX': 'diaken',
+    }
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-vcenter-catalogs': {
+        'task': 'deploy.tasks.refresh_vcenter_catalogs',
+        'schedule': VCENTER_CATALOG_REFRESH_INTERVAL,
+    },
+    'refresh-daily-execution-stats': {
+        'task': 'dashboard.refresh_daily_execution_stats',
+        'schedule': DASHBOARD_STATS_REFRESH_INTERVAL,
+    },
+    'collect-snapshot-usage': {
+        'task': 'snapshots.collect_snapshot_usage',
+        'schedule': SNAPSHOT_USAGE_REFRESH_INTERVAL,
+    },
+    'sync-vm-addresses': {
+        'task': 'addressing.sync_all_vm_addresses',
+        'schedule': VM_ADDRESS_SYNC_INTERVAL,
+    },
+    'refresh-ip-pools': {
+        'task': 'addressing.refresh_ip_pools',
+        'schedule': IP_POOL_REFRESH_INTERVAL,
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
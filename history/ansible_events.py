@@ -0,0 +1,227 @@
+"""
+Structured Ansible results from the bundled `diaken_events` callback plugin.
+
+ansible-playbook runs started by the Celery tasks and the scheduler enable
+ansible/callback_plugins/diaken_events.py, which appends JSON-lines events
+(task start, per-host result with status/changed/duration, final stats) to
+a file. AnsibleEventRecorder tails that file while the playbook runs and
+stores the events as AnsibleTaskResult / AnsibleHostSummary rows, so status
+checks and the UI query an indexed table instead of re-parsing the output:
+
+    recorder = AnsibleEventRecorder(history_record)
+    env = ansible_events_env(env, recorder.path)
+    process = subprocess.Popen(cmd, env=env, ...)
+    for line in process.stdout:
+        output_writer.write(line)
+        recorder.poll()
+    recorder.finish()
+    recorder.recap   # {host: {'ok': .., 'failures': .., ...}}
+"""
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_NAME = 'diaken_events'
+RECAP_FIELDS = ['ok', 'changed', 'failures', 'unreachable', 'skipped', 'rescued', 'ignored']
+
+
+def callback_plugin_dir():
+    return str(settings.BASE_DIR / 'ansible' / 'callback_plugins')
+
+
+def ansible_events_env(env, events_path):
+    """
+    Return a copy of `env` with the diaken_events callback enabled
+
+    Args:
+        env: Environment for ansible-playbook
+        events_path: File the plugin appends events to
+    """
+    env = dict(env)
+    plugin_paths = [callback_plugin_dir()]
+    if env.get('ANSIBLE_CALLBACK_PLUGINS'):
+        plugin_paths.append(env['ANSIBLE_CALLBACK_PLUGINS'])
+    env['ANSIBLE_CALLBACK_PLUGINS'] = os.pathsep.join(plugin_paths)
+
+    for variable in ('ANSIBLE_CALLBACKS_ENABLED', 'ANSIBLE_CALLBACK_WHITELIST'):
+        enabled = [name for name in env.get(variable, '').split(',') if name]
+        if CALLBACK_NAME not in enabled:
+            enabled.append(CALLBACK_NAME)
+        env[variable] = ','.join(enabled)
+
+    env['DIAKEN_EVENTS_FILE'] = events_path
+    return env
+
+
+def new_events_file():
+    """Create an empty events file and return its path"""
+    fd, path = tempfile.mkstemp(prefix='diaken-events-', suffix='.jsonl', dir='/tmp')
+    os.close(fd)
+    return path
+
+
+class AnsibleEventReader:
+    """Incremental reader of a JSON-lines events file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self._partial = b''
+
+    def read(self):
+        """Return the events appended since the last call"""
+        try:
+            if os.path.getsize(self.path) <= self.offset:
+                return []
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except OSError:
+            return []
+        self.offset += len(data)
+
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()     # incomplete last line, if any
+        events = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logger.warning(f'[ANSIBLE-EVENTS] Skipping malformed event line in {self.path}')
+        return events
+
+
+def read_events(path):
+    """Read every event of a finished run"""
+    return AnsibleEventReader(path).read()
+
+
+def recap_from_events(events):
+    """Return the per-host PLAY RECAP of the last stats event, or None"""
+    recap = None
+    for event in events:
+        if event.get('event') == 'stats':
+            recap = event.get('hosts') or {}
+    return recap
+
+
+def recap_success(recap):
+    """True when no host failed or was unreachable"""
+    return all(not counts.get('failures') and not counts.get('unreachable') for counts in recap.values())
+
+
+def store_events(history, events):
+    """
+    Store result and stats events on a DeploymentHistory/ScheduledTaskHistory
+
+    Returns:
+        dict: Per-host recap from the stats event (None if the run had none)
+    """
+    from history.models import AnsibleTaskResult, AnsibleHostSummary
+
+    owner = {history.output_chunk_field: history}
+    results = []
+    summaries = []
+    recap = None
+
+    for event in events:
+        kind = event.get('event')
+        if kind == 'result':
+            results.append(AnsibleTaskResult(
+                play=(event.get('play') or '')[:255],
+                task=(event.get('task') or '')[:255],
+                action=(event.get('action') or '')[:100],
+                host=event.get('host') or '',
+                status=event.get('status') or 'ok',
+                changed=bool(event.get('changed')),
+                duration_seconds=event.get('duration'),
+                message=event.get('msg') or '',
+                **owner
+            ))
+        elif kind == 'stats':
+            recap = event.get('hosts') or {}
+            summaries.extend(
+                AnsibleHostSummary(host=host, **{field: counts.get(field, 0) for field in RECAP_FIELDS}, **owner)
+                for host, counts in recap.items()
+            )
+
+    if results:
+        AnsibleTaskResult.objects.bulk_create(results)
+    if summaries:
+        AnsibleHostSummary.objects.bulk_create(summaries)
+    return recap
+
+
+class AnsibleEventRecorder:
+    """
+    Tail the events file of a running playbook into the results tables.
+
+    Call poll() as output arrives (cheap when nothing was appended) and
+    finish() once the process exited; finish() removes the file.
+    """
+
+    def __init__(self, history, path=None):
+        self.history = history
+        self.path = path or new_events_file()
+        self.reader = AnsibleEventReader(self.path)
+        self.recap = None
+        self.results = 0
+
+    def poll(self):
+        events = self.reader.read()
+        if not events:
+            return 0
+        recap = store_events(self.history, events)
+        if recap is not None:
+            self.recap = recap
+        stored = sum(1 for event in events if event.get('event') == 'result')
+        self.results += stored
+        return stored
+
+    def finish(self):
+        """Store the remaining events and delete the file"""
+        try:
+            self.poll()
+        finally:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        return self.recap
+
+
+def get_recap(history):
+    """
+    Aggregate the stored PLAY RECAP counters per host
+
+    Returns:
+        list of dicts (host + RECAP_FIELDS), ordered by host
+    """
+    rows = (
+        history.ansible_summaries.values('host')
+        .annotate(**{f'total_{field}': Sum(field) for field in RECAP_FIELDS})
+        .order_by('host')
+    )
+    return [
+        {'host': row['host'], **{field: row[f'total_{field}'] for field in RECAP_FIELDS}}
+        for row in rows
+    ]
+
+
+def get_status_counts(history):
+    """Number of task results per status, from the indexed results table"""
+    rows = history.ansible_results.values('status').annotate(count=Count('id'))
+    return {row['status']: row['count'] for row in rows}
+
+
+def get_failed_results(history, limit=100):
+    """Failed and unreachable task results (most useful part of a long run)"""
+    return history.ansible_results.filter(status__in=['failed', 'unreachable']).order_by('id')[:limit]
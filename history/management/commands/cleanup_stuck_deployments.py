@@ -78,10 +78,7 @@ class Command(BaseCommand):
                 if not dry_run:
                     dep.status = 'failed'
                     dep.completed_at = timezone.now()
-                    if not dep.ansible_output:
-                        dep.ansible_output = f'Deployment automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
-                    else:
-                        dep.ansible_output += f'\n\n[SYSTEM] Deployment automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
+                    dep.append_output(f'\n\n[SYSTEM] Deployment automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)')
                     dep.save()
             
             if dry_run:
@@ -94,9 +91,12 @@ class Command(BaseCommand):
                 ))
         
         # Find stuck scheduled tasks
+        # Executions holding a scheduler lease are recovered automatically by the
+        # scheduler leader when the lease expires (scheduler/leases.py)
         stuck_tasks = ScheduledTaskHistory.objects.filter(
             status='running',
-            executed_at__lt=cutoff_time
+            executed_at__lt=cutoff_time,
+            scheduled_task__lease_expires_at__isnull=True
         ).order_by('executed_at')
         
         task_count = stuck_tasks.count()
@@ -127,10 +127,7 @@ class Command(BaseCommand):
                 if not dry_run:
                     task.status = 'failed'
                     task.completed_at = timezone.now()
-                    if not task.ansible_output:
-                        task.ansible_output = f'Task automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
-                    else:
-                        task.ansible_output += f'\n\n[SYSTEM] Task automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
+                    task.append_output(f'\n\n[SYSTEM] Task automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)')
                     task.save()
             
             if dry_run:
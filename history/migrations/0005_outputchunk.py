@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0004_deploymenthistory_celery_task_id_and_more'),
+        ('scheduler', '0008_scheduledtask_snapshot_created_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutputChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField(help_text='Position of this chunk within the output')),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deployment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='output_chunks', to='history.deploymenthistory')),
+                ('scheduled_history', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='output_chunks', to='scheduler.scheduledtaskhistory')),
+            ],
+            options={
+                'verbose_name': 'Output Chunk',
+                'verbose_name_plural': 'Output Chunks',
+                'ordering': ['sequence'],
+                'constraints': [models.UniqueConstraint(fields=('deployment', 'sequence'), name='unique_deployment_output_sequence'), models.UniqueConstraint(fields=('scheduled_history', 'sequence'), name='unique_scheduled_output_sequence')],
+            },
+        ),
+    ]
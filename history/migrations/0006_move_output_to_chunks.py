@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+
+def move_output_to_chunks(apps, schema_editor):
+    """Move existing ansible_output blobs into a first OutputChunk per record"""
+    OutputChunk = apps.get_model('history', 'OutputChunk')
+    sources = [
+        (apps.get_model('history', 'DeploymentHistory'), 'deployment', None),
+        (apps.get_model('scheduler', 'ScheduledTaskHistory'), 'scheduled_history', ''),
+    ]
+    for model, field, empty_value in sources:
+        records = model.objects.exclude(ansible_output__isnull=True).exclude(ansible_output='')
+        batch = []
+        moved_ids = []
+        for pk, output in records.values_list('pk', 'ansible_output').iterator(chunk_size=BATCH_SIZE):
+            batch.append(OutputChunk(sequence=0, content=output, **{f'{field}_id': pk}))
+            moved_ids.append(pk)
+            if len(batch) >= BATCH_SIZE:
+                OutputChunk.objects.bulk_create(batch)
+                model.objects.filter(pk__in=moved_ids).update(ansible_output=empty_value)
+                batch, moved_ids = [], []
+        if batch:
+            OutputChunk.objects.bulk_create(batch)
+            model.objects.filter(pk__in=moved_ids).update(ansible_output=empty_value)
+
+
+def restore_output_from_chunks(apps, schema_editor):
+    """Assemble chunks back into the ansible_output column"""
+    OutputChunk = apps.get_model('history', 'OutputChunk')
+    sources = [
+        (apps.get_model('history', 'DeploymentHistory'), 'deployment'),
+        (apps.get_model('scheduler', 'ScheduledTaskHistory'), 'scheduled_history'),
+    ]
+    for model, field in sources:
+        owner_ids = OutputChunk.objects.filter(**{f'{field}__isnull': False}).values_list(f'{field}_id', flat=True).distinct()
+        for owner_id in owner_ids.iterator():
+            chunks = OutputChunk.objects.filter(**{f'{field}_id': owner_id}).order_by('sequence')
+            record = model.objects.get(pk=owner_id)
+            record.ansible_output = (record.ansible_output or '') + ''.join(chunks.values_list('content', flat=True))
+            record.save(update_fields=['ansible_output'])
+            chunks.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0005_outputchunk'),
+        ('scheduler', '0008_scheduledtask_snapshot_created_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_output_to_chunks, restore_output_from_chunks),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0006_move_output_to_chunks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeploymentBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('vcenter', models.CharField(blank=True, max_length=200, null=True)),
+                ('datacenter', models.CharField(blank=True, max_length=100, null=True)),
+                ('cluster', models.CharField(blank=True, max_length=100, null=True)),
+                ('datastore', models.CharField(blank=True, max_length=100, null=True)),
+                ('template', models.CharField(blank=True, max_length=100, null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Deployment Batch',
+                'verbose_name_plural': 'Deployment Batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='deploymenthistory',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Despliegue masivo al que pertenece', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deployments', to='history.deploymentbatch'),
+        ),
+    ]
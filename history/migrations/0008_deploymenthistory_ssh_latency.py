@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0007_deploymentbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deploymenthistory',
+            name='boot_to_ssh_seconds',
+            field=models.FloatField(blank=True, help_text='Segundos desde el encendido hasta que SSH respondió', null=True),
+        ),
+        migrations.AddField(
+            model_name='deploymenthistory',
+            name='powered_on_at',
+            field=models.DateTimeField(blank=True, help_text='Momento en que la VM clonada fue encendida', null=True),
+        ),
+        migrations.AddField(
+            model_name='deploymenthistory',
+            name='reboot_to_ssh_seconds',
+            field=models.FloatField(blank=True, help_text='Segundos hasta que SSH respondió en la nueva IP tras el reinicio', null=True),
+        ),
+    ]
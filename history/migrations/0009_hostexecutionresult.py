@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0008_deploymenthistory_ssh_latency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostExecutionResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host_name', models.CharField(max_length=200)),
+                ('host_ip', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('success', 'Success'), ('failed', 'Failed'), ('timeout', 'Timeout')], default='pending', max_length=20)),
+                ('exit_code', models.IntegerField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('deployment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='host_results', to='history.deploymenthistory')),
+            ],
+            options={
+                'verbose_name': 'Host Execution Result',
+                'verbose_name_plural': 'Host Execution Results',
+                'ordering': ['host_name'],
+                'indexes': [models.Index(fields=['deployment', 'status'], name='host_result_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0009_hostexecutionresult'),
+        ('scheduler', '0008_scheduledtask_snapshot_created_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnsibleHostSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=200)),
+                ('ok', models.PositiveIntegerField(default=0)),
+                ('changed', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('unreachable', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('rescued', models.PositiveIntegerField(default=0)),
+                ('ignored', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deployment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ansible_summaries', to='history.deploymenthistory')),
+                ('scheduled_history', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ansible_summaries', to='scheduler.scheduledtaskhistory')),
+            ],
+            options={
+                'verbose_name': 'Ansible Host Summary',
+                'verbose_name_plural': 'Ansible Host Summaries',
+                'ordering': ['host'],
+                'indexes': [models.Index(fields=['deployment', 'host'], name='ansible_summary_dep_host_idx'), models.Index(fields=['scheduled_history', 'host'], name='ansible_summary_sch_host_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnsibleTaskResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('play', models.CharField(blank=True, max_length=255)),
+                ('task', models.CharField(max_length=255)),
+                ('action', models.CharField(blank=True, max_length=100)),
+                ('host', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('ok', 'OK'), ('changed', 'Changed'), ('failed', 'Failed'), ('unreachable', 'Unreachable'), ('skipped', 'Skipped'), ('ignored', 'Ignored')], max_length=20)),
+                ('changed', models.BooleanField(default=False)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deployment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ansible_results', to='history.deploymenthistory')),
+                ('scheduled_history', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ansible_results', to='scheduler.scheduledtaskhistory')),
+            ],
+            options={
+                'verbose_name': 'Ansible Task Result',
+                'verbose_name_plural': 'Ansible Task Results',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['deployment', 'status'], name='ansible_result_dep_status_idx'), models.Index(fields=['deployment', 'host'], name='ansible_result_dep_host_idx'), models.Index(fields=['scheduled_history', 'status'], name='ansible_result_sch_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0010_ansible_results'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deploymenthistory',
+            index=models.Index(fields=['-created_at', '-id'], name='deploy_hist_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deploymenthistory',
+            index=models.Index(fields=['status', 'created_at'], name='deploy_hist_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deploymenthistory',
+            index=models.Index(fields=['target_type', 'created_at'], name='deploy_hist_type_created_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:54
+
+import django.db.models.deletion
+import history.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0011_deploymenthistory_list_indexes'),
+        ('scheduler', '0012_scheduledtask_rolling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(help_text='Position of the batch in the rollout (0-based)')),
+                ('host_ids', models.JSONField(default=list)),
+                ('host_names', models.JSONField(default=list)),
+                ('failed_hosts', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('success', 'Success'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20)),
+                ('return_code', models.IntegerField(blank=True, null=True)),
+                ('celery_task_id', models.CharField(blank=True, max_length=255)),
+                ('ansible_output', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('deployment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='execution_batches', to='history.deploymenthistory')),
+                ('scheduled_history', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='execution_batches', to='scheduler.scheduledtaskhistory')),
+            ],
+            options={
+                'verbose_name': 'Execution Batch',
+                'verbose_name_plural': 'Execution Batches',
+                'ordering': ['index'],
+            },
+            bases=(history.models.ChunkedOutputMixin, models.Model),
+        ),
+        migrations.AddField(
+            model_name='outputchunk',
+            name='execution_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='output_chunks', to='history.executionbatch'),
+        ),
+        migrations.AddConstraint(
+            model_name='outputchunk',
+            constraint=models.UniqueConstraint(fields=('execution_batch', 'sequence'), name='unique_batch_output_sequence'),
+        ),
+        migrations.AddConstraint(
+            model_name='executionbatch',
+            constraint=models.UniqueConstraint(fields=('deployment', 'index'), name='unique_deployment_batch_index'),
+        ),
+        migrations.AddConstraint(
+            model_name='executionbatch',
+            constraint=models.UniqueConstraint(fields=('scheduled_history', 'index'), name='unique_scheduled_batch_index'),
+        ),
+    ]
@@ -1,7 +1,111 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 
-class DeploymentHistory(models.Model):
+
+class ChunkedOutputMixin:
+    """
+    Shared output accessors for history records whose streamed output is
+    stored as append-only OutputChunk rows.
+
+    `ansible_output` keeps one-shot text (legacy blobs, synchronous runs and
+    system notes); streamed output lives in the related `output_chunks`.
+    """
+
+    def output_chunks_after(self, sequence=-1):
+        """Return chunks with a sequence number greater than `sequence`"""
+        return self.output_chunks.filter(sequence__gt=sequence).order_by('sequence')
+
+    def get_output(self):
+        """Assemble the full output from the legacy column and the chunks"""
+        chunks = self.output_chunks.order_by('sequence').values_list('content', flat=True)
+        return (self.ansible_output or '') + ''.join(chunks)
+
+    def next_output_sequence(self):
+        last = self.output_chunks.aggregate(last=models.Max('sequence'))['last']
+        return 0 if last is None else last + 1
+
+    def append_output(self, text):
+        """
+        Append a single chunk of text to the output
+
+        Every chunk (OutputChunkWriter flushes included) is numbered here, from
+        the stored maximum, so writers of the same record never reuse a
+        sequence; if another process takes it first the chunk is renumbered.
+        """
+        if not text:
+            return None
+        from history.stream import publish_output
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    chunk = OutputChunk.objects.create(
+                        sequence=self.next_output_sequence(),
+                        content=text,
+                        **{self.output_chunk_field: self},
+                    )
+                break
+            except IntegrityError:
+                if attempt == 2:
+                    raise
+        publish_output(self, chunk.sequence, text)
+        return chunk
+
+
+class DeploymentBatch(models.Model):
+    """
+    Group of VM deployments submitted together through the bulk deploy API.
+    Progress is aggregated from the member DeploymentHistory records.
+    """
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    name = models.CharField(max_length=200)
+    vcenter = models.CharField(max_length=200, blank=True, null=True)
+    datacenter = models.CharField(max_length=100, blank=True, null=True)
+    cluster = models.CharField(max_length=100, blank=True, null=True)
+    datastore = models.CharField(max_length=100, blank=True, null=True)
+    template = models.CharField(max_length=100, blank=True, null=True)
+    total = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Deployment Batch'
+        verbose_name_plural = 'Deployment Batches'
+    
+    def __str__(self):
+        return f"{self.name} ({self.total} VMs)"
+    
+    def summary(self):
+        """
+        Aggregate member statuses in one query
+        
+        Returns:
+            dict with per-status counts, percent done, overall status and completed_at
+        """
+        counts = {status: 0 for status, _ in DeploymentHistory.STATUS_CHOICES}
+        rows = self.deployments.values('status').annotate(count=models.Count('id'))
+        for row in rows:
+            counts[row['status']] = row['count']
+        finished = counts['success'] + counts['failed']
+        total = self.total or sum(counts.values())
+        
+        if finished < total:
+            status = 'running' if counts['running'] or finished else 'pending'
+            completed_at = None
+        else:
+            status = 'failed' if counts['failed'] else 'success'
+            completed_at = self.deployments.aggregate(last=models.Max('completed_at'))['last']
+        
+        return {
+            'counts': counts,
+            'total': total,
+            'finished': finished,
+            'percent': int(finished * 100 / total) if total else 100,
+            'status': status,
+            'completed_at': completed_at,
+        }
+
+
+class DeploymentHistory(ChunkedOutputMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('running', 'Running'),
@@ -9,6 +113,8 @@ class DeploymentHistory(models.Model):
         ('failed', 'Failed'),
     ]
     
+    output_chunk_field = 'deployment'
+    
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     environment = models.CharField(max_length=100)
     target = models.CharField(max_length=200)  # Hostname o nombre del objetivo
@@ -28,11 +134,21 @@ class DeploymentHistory(models.Model):
     template = models.CharField(max_length=100, blank=True, null=True)
     snapshot_name = models.CharField(max_length=255, blank=True, null=True, help_text='Nombre del snapshot creado antes de ejecutar el playbook')
     celery_task_id = models.CharField(max_length=255, blank=True, null=True, help_text='ID de la tarea Celery para tareas asíncronas')
+    batch = models.ForeignKey(DeploymentBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='deployments', help_text='Despliegue masivo al que pertenece')
+    powered_on_at = models.DateTimeField(null=True, blank=True, help_text='Momento en que la VM clonada fue encendida')
+    boot_to_ssh_seconds = models.FloatField(null=True, blank=True, help_text='Segundos desde el encendido hasta que SSH respondió')
+    reboot_to_ssh_seconds = models.FloatField(null=True, blank=True, help_text='Segundos hasta que SSH respondió en la nueva IP tras el reinicio')
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Deployment History'
         verbose_name_plural = 'Deployment Histories'
+        indexes = [
+            # Listado paginado por keyset (history/pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='deploy_hist_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='deploy_hist_status_created_idx'),
+            models.Index(fields=['target_type', 'created_at'], name='deploy_hist_type_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username if self.user else 'Unknown'} - {self.target} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -42,3 +158,197 @@ class DeploymentHistory(models.Model):
             delta = self.completed_at - self.created_at
             return str(delta).split('.')[0]  # Remove microseconds
         return 'In progress'
+
+
+
+class HostExecutionResult(models.Model):
+    """
+    Outcome of a multi-host execution (scripts) on one host: status, exit
+    code and timing, so results can be listed without parsing the output.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+        ('timeout', 'Timeout'),
+    ]
+    
+    deployment = models.ForeignKey(DeploymentHistory, on_delete=models.CASCADE, related_name='host_results')
+    host_name = models.CharField(max_length=200)
+    host_ip = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    exit_code = models.IntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['host_name']
+        verbose_name = 'Host Execution Result'
+        verbose_name_plural = 'Host Execution Results'
+        indexes = [
+            models.Index(fields=['deployment', 'status'], name='host_result_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.host_name} - {self.status}"
+
+
+class ExecutionBatch(ChunkedOutputMixin, models.Model):
+    """
+    One batch of a rolling group execution (see deploy/rolling.py): its
+    hosts, outcome and own output stream. The parent history record keeps
+    the rollout summary and the per-host Ansible results of every batch.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    
+    output_chunk_field = 'execution_batch'
+    
+    deployment = models.ForeignKey(DeploymentHistory, on_delete=models.CASCADE, null=True, blank=True, related_name='execution_batches')
+    scheduled_history = models.ForeignKey('scheduler.ScheduledTaskHistory', on_delete=models.CASCADE, null=True, blank=True, related_name='execution_batches')
+    index = models.PositiveIntegerField(help_text='Position of the batch in the rollout (0-based)')
+    host_ids = models.JSONField(default=list)
+    host_names = models.JSONField(default=list)
+    failed_hosts = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    return_code = models.IntegerField(null=True, blank=True)
+    celery_task_id = models.CharField(max_length=255, blank=True)
+    ansible_output = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['index']
+        verbose_name = 'Execution Batch'
+        verbose_name_plural = 'Execution Batches'
+        constraints = [
+            models.UniqueConstraint(fields=['deployment', 'index'], name='unique_deployment_batch_index'),
+            models.UniqueConstraint(fields=['scheduled_history', 'index'], name='unique_scheduled_batch_index'),
+        ]
+    
+    def __str__(self):
+        return f"{self.parent} - batch {self.index + 1} - {self.status}"
+    
+    @property
+    def parent(self):
+        """DeploymentHistory or ScheduledTaskHistory of the rollout"""
+        return self.deployment or self.scheduled_history
+    
+    def duration(self):
+        if self.started_at and self.completed_at:
+            return self.completed_at - self.started_at
+        return None
+
+
+class OutputChunk(models.Model):
+    """
+    Append-only segment of execution output.
+
+    Each flush from a running task writes only the lines produced since the
+    previous flush, so streaming output costs O(n) writes instead of
+    rewriting the whole text column every few lines.
+    """
+    deployment = models.ForeignKey(DeploymentHistory, on_delete=models.CASCADE, null=True, blank=True, related_name='output_chunks')
+    scheduled_history = models.ForeignKey('scheduler.ScheduledTaskHistory', on_delete=models.CASCADE, null=True, blank=True, related_name='output_chunks')
+    execution_batch = models.ForeignKey(ExecutionBatch, on_delete=models.CASCADE, null=True, blank=True, related_name='output_chunks')
+    sequence = models.PositiveIntegerField(help_text='Position of this chunk within the output')
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['sequence']
+        verbose_name = 'Output Chunk'
+        verbose_name_plural = 'Output Chunks'
+        constraints = [
+            models.UniqueConstraint(fields=['deployment', 'sequence'], name='unique_deployment_output_sequence'),
+            models.UniqueConstraint(fields=['scheduled_history', 'sequence'], name='unique_scheduled_output_sequence'),
+            models.UniqueConstraint(fields=['execution_batch', 'sequence'], name='unique_batch_output_sequence'),
+        ]
+    
+    def __str__(self):
+        if self.execution_batch_id:
+            owner = f"batch {self.execution_batch_id}"
+        else:
+            owner = f"deployment {self.deployment_id}" if self.deployment_id else f"scheduled {self.scheduled_history_id}"
+        return f"{owner} - chunk {self.sequence}"
+
+
+class AnsibleTaskResult(models.Model):
+    """
+    Result of one Ansible task on one host, recorded from the diaken_events
+    callback plugin (see history.ansible_events).
+    """
+    STATUS_CHOICES = [
+        ('ok', 'OK'),
+        ('changed', 'Changed'),
+        ('failed', 'Failed'),
+        ('unreachable', 'Unreachable'),
+        ('skipped', 'Skipped'),
+        ('ignored', 'Ignored'),
+    ]
+    
+    deployment = models.ForeignKey(DeploymentHistory, on_delete=models.CASCADE, null=True, blank=True, related_name='ansible_results')
+    scheduled_history = models.ForeignKey('scheduler.ScheduledTaskHistory', on_delete=models.CASCADE, null=True, blank=True, related_name='ansible_results')
+    play = models.CharField(max_length=255, blank=True)
+    task = models.CharField(max_length=255)
+    action = models.CharField(max_length=100, blank=True)
+    host = models.CharField(max_length=200)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    changed = models.BooleanField(default=False)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Ansible Task Result'
+        verbose_name_plural = 'Ansible Task Results'
+        indexes = [
+            models.Index(fields=['deployment', 'status'], name='ansible_result_dep_status_idx'),
+            models.Index(fields=['deployment', 'host'], name='ansible_result_dep_host_idx'),
+            models.Index(fields=['scheduled_history', 'status'], name='ansible_result_sch_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.host} - {self.task} - {self.status}"
+
+
+class AnsibleHostSummary(models.Model):
+    """
+    PLAY RECAP counters of one host for one ansible-playbook run.
+    """
+    deployment = models.ForeignKey(DeploymentHistory, on_delete=models.CASCADE, null=True, blank=True, related_name='ansible_summaries')
+    scheduled_history = models.ForeignKey('scheduler.ScheduledTaskHistory', on_delete=models.CASCADE, null=True, blank=True, related_name='ansible_summaries')
+    host = models.CharField(max_length=200)
+    ok = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    unreachable = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    rescued = models.PositiveIntegerField(default=0)
+    ignored = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['host']
+        verbose_name = 'Ansible Host Summary'
+        verbose_name_plural = 'Ansible Host Summaries'
+        indexes = [
+            models.Index(fields=['deployment', 'host'], name='ansible_summary_dep_host_idx'),
+            models.Index(fields=['scheduled_history', 'host'], name='ansible_summary_sch_host_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.host} - ok={self.ok} changed={self.changed} failed={self.failures} unreachable={self.unreachable}"
+    
+    @property
+    def is_success(self):
+        return self.failures == 0 and self.unreachable == 0
@@ -0,0 +1,330 @@
+"""
+Server-side highlighting of Ansible output for the history detail pages.
+
+Every line is highlighted on its own with one regex pass (one alternation
+of all the tokens, escaped as it goes), so a run is rendered in O(n) once
+instead of re-scanning the whole text per token. Rendered lines are cached
+in pages of OUTPUT_PAGE_LINES lines keyed by the SHA-1 of the output, and
+the detail pages load them by line range (see output_page()):
+
+    GET /history/<pk>/output/?start=0
+    {"html": "<span class=\"output-line\" ...", "start": 0, "next": 1000,
+     "total": 84211, "counts": {...}, "complete": true}
+
+Finished runs are rendered by the history.render_output task when their
+status changes (see history/signals.py), so the first page view is a cache
+read. Runs still in progress are rendered incrementally, uncached: each
+response carries a cursor (last chunk sequence sent) and the next poll reads
+only the chunks stored after it:
+
+    GET /history/<pk>/output/?start=120&after=37
+    {"html": "...", "start": 120, "next": 131, "cursor": 41, "more": false, ...}
+"""
+import hashlib
+import html
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+DIGEST_KEY = 'ansible-output:version:{label}:{pk}:{version}'
+META_KEY = 'ansible-output:{digest}'
+PAGE_KEY = 'ansible-output:{digest}:{page}'
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+TOKEN_RE = re.compile(
+    r'(?P<section>=== .*? ===)'
+    r'|(?P<recap>PLAY RECAP \*+)'
+    r'|(?P<play>PLAY \[.*?\](?: \*+)?)'
+    r'|(?P<task>TASK \[.*?\](?: \*+)?)'
+    r'|\b(?P<host>(?P<host_state>ok|changed|fatal|failed|skipping|unreachable): \[.*?\])'
+    r'|\b(?P<stat>(?P<stat_name>ok|changed|failed|unreachable|skipped|rescued|ignored)=\d+)'
+    r'|(?P<failed>FAILED!)'
+    r'|^(?P<label>STDOUT:|STDERR:)'
+    r'|^(?P<warning>\[WARNING\]:.*)'
+    r'|(?<=task path: )(?P<path>.+)'
+    r'|(?<=  )(?P<cmd>(?:cmd|msg|rc): .+)'
+    r'|(?<=\[)(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?=\])'
+    r'|^(?P<check>✓ )'
+)
+
+# Grupo -> clase CSS (los estados/estadísticas dependen del valor)
+TOKEN_CLASSES = {
+    'section': 'ansible-section-header',
+    'recap': 'ansible-recap',
+    'play': 'ansible-play',
+    'task': 'ansible-task',
+    'failed': 'ansible-failed',
+    'label': 'ansible-output-label',
+    'warning': 'ansible-warning',
+    'path': 'ansible-path',
+    'cmd': 'ansible-cmd',
+    'timestamp': 'ansible-timestamp',
+    'check': 'ansible-success-icon',
+}
+STATE_CLASSES = {
+    'ok': 'ansible-ok',
+    'changed': 'ansible-changed',
+    'fatal': 'ansible-failed',
+    'failed': 'ansible-failed',
+    'unreachable': 'ansible-failed',
+    'skipping': 'ansible-skipped',
+    'skipped': 'ansible-skipped',
+    'rescued': 'ansible-changed',
+    'ignored': 'ansible-skipped',
+}
+# Tipo de línea para los filtros de la página, por prioridad
+STATE_TYPES = {
+    'ok': 'success',
+    'changed': 'changed',
+    'fatal': 'error',
+    'failed': 'error',
+    'unreachable': 'error',
+    'skipping': 'skipped',
+}
+TYPE_PRIORITY = ['task', 'play', 'recap', 'changed', 'success', 'error', 'skipped']
+COUNTED_TYPES = {'success': 'success', 'changed': 'changed', 'skipped': 'skipped', 'error': 'errors'}
+
+
+def render_line(line):
+    """
+    Escape and highlight one output line
+
+    Returns:
+        tuple: (HTML, line type for the filters or '')
+    """
+    parts = []
+    types = set()
+    position = 0
+    for match in TOKEN_RE.finditer(line):
+        group = match.lastgroup
+        if group == 'host_state' or group == 'stat_name':
+            group = 'host' if group == 'host_state' else 'stat'
+        if group == 'host':
+            state = match.group('host_state')
+            css = STATE_CLASSES[state]
+            types.add(STATE_TYPES[state])
+        elif group == 'stat':
+            css = STATE_CLASSES[match.group('stat_name')]
+        else:
+            css = TOKEN_CLASSES[group]
+            if group in ('task', 'play', 'recap'):
+                types.add(group)
+            elif group == 'failed':
+                types.add('error')
+        parts.append(html.escape(line[position:match.start()]))
+        parts.append(f'<span class="{css}">{html.escape(match.group())}</span>')
+        position = match.end()
+    parts.append(html.escape(line[position:]))
+    line_type = next((kind for kind in TYPE_PRIORITY if kind in types), '')
+    return ''.join(parts), line_type
+
+
+def render_lines(lines):
+    """
+    Highlight lines as `output-line` spans
+
+    Returns:
+        tuple: (list of HTML lines, counts per filter)
+    """
+    counts = dict.fromkeys(COUNTED_TYPES.values(), 0)
+    rendered = []
+    for line in lines:
+        body, line_type = render_line(line)
+        if line_type in COUNTED_TYPES:
+            counts[COUNTED_TYPES[line_type]] += 1
+        rendered.append(f'<span class="output-line" data-type="{line_type}">{body}</span>')
+    return rendered, counts
+
+
+def split_lines(text):
+    lines = text.split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def format_output(text):
+    """Whole output as highlighted HTML (small outputs; pages use output_page())"""
+    return '\n'.join(render_lines(split_lines(text))[0])
+
+
+def _page_lines():
+    return getattr(settings, 'OUTPUT_PAGE_LINES', 1000)
+
+
+def _output_version(history):
+    """Cheap identifier of the current output (legacy column length + last chunk)"""
+    last = history.output_chunks.aggregate(last=Max('sequence'))['last']
+    return f"{len(history.ansible_output or '')}-{-1 if last is None else last}"
+
+
+def render_output(history):
+    """
+    Render the whole output of a history record into cached pages
+
+    Returns:
+        dict: {'digest', 'total', 'pages', 'counts'}
+    """
+    label = history._meta.label_lower
+    version_key = DIGEST_KEY.format(label=label, pk=history.pk, version=_output_version(history))
+    text = history.get_output()
+    digest = hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    meta = cache.get(META_KEY.format(digest=digest))
+    if meta is None:
+        page_lines = _page_lines()
+        rendered, counts = render_lines(split_lines(text))
+        del text
+        pages = {
+            PAGE_KEY.format(digest=digest, page=index): '\n'.join(rendered[offset:offset + page_lines])
+            for index, offset in enumerate(range(0, len(rendered), page_lines))
+        }
+        meta = {'digest': digest, 'total': len(rendered), 'pages': len(pages),
+                'page_lines': page_lines, 'counts': counts}
+        ttl = getattr(settings, 'OUTPUT_RENDER_CACHE_TTL', 7 * 24 * 3600)
+        cache.set_many(pages, ttl)
+        cache.set(META_KEY.format(digest=digest), meta, ttl)
+        logger.info(f'[OUTPUT-RENDER] {label} {history.pk}: {meta["total"]} lines rendered in {meta["pages"]} pages')
+    cache.set(version_key, digest, getattr(settings, 'OUTPUT_RENDER_CACHE_TTL', 7 * 24 * 3600))
+    return meta
+
+
+def _cached_meta(history):
+    label = history._meta.label_lower
+    digest = cache.get(DIGEST_KEY.format(label=label, pk=history.pk, version=_output_version(history)))
+    return cache.get(META_KEY.format(digest=digest)) if digest else None
+
+
+def _new_output(history, after):
+    """
+    Output stored after chunk `after` (None: from the legacy column on), up
+    to about OUTPUT_PAGE_LINES lines
+
+    Only whole sources are taken, and while the run is active only up to the
+    last one ending in a newline, so a line split across chunks is sent
+    once it is complete and line numbers match split_lines(get_output()).
+
+    Returns:
+        tuple: (text, sequence of the last chunk taken (or `after`), more waiting)
+    """
+    active = history.status in ACTIVE_STATUSES
+    budget = _page_lines()
+    taken, held = [], []
+    cursor = after
+    lines = 0
+
+    def sources():
+        if after is None:
+            yield -1, history.ansible_output or ''
+        chunks = history.output_chunks_after(-1 if after is None else after)
+        yield from chunks.values_list('sequence', 'content').iterator(chunk_size=100)
+
+    more = False
+    for sequence, content in sources():
+        if lines >= budget:
+            more = True
+            break
+        held.append(content)
+        if not active or content.endswith('\n'):
+            taken.extend(held)
+            held = []
+            cursor = sequence
+            lines += content.count('\n')
+    if not active:
+        taken.extend(held)
+    return ''.join(taken), cursor, more
+
+
+def _live_page(history, start, after=None):
+    """
+    Render a line range of a run in progress (or with the cache down)
+
+    With `after` (the cursor returned by the previous response) only the
+    chunks stored since then are read and rendered, starting at line
+    `start`; without it the whole output is read once.
+    """
+    if after is not None or start == 0:
+        text, cursor, more = _new_output(history, after)
+        rendered, counts = render_lines(split_lines(text))
+        end = start + len(rendered)
+        return {
+            'html': '\n'.join(rendered),
+            'start': start,
+            'next': end,
+            'total': end,
+            'more': more,
+            'cursor': cursor,
+            'counts': None,
+            'range_counts': counts,
+            'complete': history.status not in ACTIVE_STATUSES and not more,
+        }
+
+    lines = split_lines(history.get_output())
+    complete = history.status not in ACTIVE_STATUSES
+    if not complete and lines:
+        # La última línea puede estar a medias: se envía cuando termine
+        lines.pop()
+    end = min(start + _page_lines(), len(lines))
+    rendered, counts = render_lines(lines[start:end])
+    return {
+        'html': '\n'.join(rendered),
+        'start': start,
+        'next': end,
+        'total': len(lines),
+        'counts': None,
+        'range_counts': counts,
+        'complete': complete,
+    }
+
+
+def output_page(history, start=0, after=None):
+    """
+    Highlighted lines [start, start + OUTPUT_PAGE_LINES) of a history record
+
+    Args:
+        history: DeploymentHistory, ScheduledTaskHistory or ExecutionBatch
+        start: first line (0-based)
+        after: cursor of the previous response while the run is in progress
+               (only the chunks stored after it are read)
+
+    Returns:
+        dict: html, start, next (first line not returned), total (lines),
+              counts (per filter for the whole output, None while running),
+              range_counts (of the returned lines) and complete (run finished);
+              runs in progress also return cursor and more (lines waiting)
+    """
+    start = max(start, 0)
+    if history.status in ACTIVE_STATUSES:
+        return _live_page(history, start, after)
+
+    try:
+        meta = _cached_meta(history) or render_output(history)
+        page_lines = meta['page_lines']
+        index = start // page_lines
+        page = cache.get(PAGE_KEY.format(digest=meta['digest'], page=index)) if index < meta['pages'] else ''
+    except Exception as e:
+        logger.warning(f'[OUTPUT-RENDER] Cache unavailable, rendering {history.pk} live: {e}')
+        return _live_page(history, start)
+    if page is None:
+        # Página expulsada de la caché: volver a renderizar todo una vez
+        meta = render_output(history)
+        page = cache.get(PAGE_KEY.format(digest=meta['digest'], page=index)) or ''
+
+    lines = page.split('\n') if page else []
+    skip = start - index * page_lines
+    lines = lines[skip:]
+    return {
+        'html': '\n'.join(lines),
+        'start': start,
+        'next': start + len(lines),
+        'total': meta['total'],
+        'counts': meta['counts'],
+        'range_counts': None,
+        'complete': True,
+    }
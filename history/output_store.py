@@ -0,0 +1,50 @@
+"""
+Append-only output writer for long running executions.
+
+Tasks stream subprocess output through an OutputChunkWriter instead of
+re-saving the whole `ansible_output` column: every flush persists only the
+lines produced since the previous flush as a new OutputChunk row, and
+publishes it to the record's live channel (see history.stream). Chunks are
+created through the record's append_output(), the single place sequence
+numbers are assigned, so a writer and direct append_output() calls can be
+mixed on the same record.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OutputChunkWriter:
+    """
+    Buffer output lines for a history record and flush them as chunks.
+
+    Usage:
+        writer = OutputChunkWriter(history_record)
+        for line in process.stdout:
+            writer.write(line)
+        writer.flush()
+    """
+
+    def __init__(self, history, flush_every=10):
+        self.history = history
+        self.flush_every = flush_every
+        self._pending = []
+
+    def write(self, text):
+        """Queue text and flush once `flush_every` lines are pending"""
+        self._pending.append(text)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def append(self, text):
+        """Write text as its own chunk right away (section headers, errors)"""
+        self._pending.append(text)
+        self.flush()
+
+    def flush(self):
+        """Persist pending lines as a single new chunk"""
+        if not self._pending:
+            return None
+        content = ''.join(self._pending)
+        self._pending = []
+        return self.history.append_output(content)
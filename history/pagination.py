@@ -0,0 +1,81 @@
+"""
+Keyset (seek) pagination for the history listings.
+
+OFFSET pagination makes the database walk and discard every skipped row, so
+page 1000 of a 50k-row table is as slow as no pagination at all. Keyset
+pagination remembers the sort key of the last row shown and asks for rows
+strictly after it, which the (…, created_at) indexes answer directly:
+
+    page = keyset_page(queryset, request.GET.get('cursor'), page_size=50)
+    page.rows          # list of model instances
+    page.next_cursor   # opaque string for the following page, or None
+
+Rows are ordered newest first by (created_at, id); the id breaks ties
+between rows created in the same microsecond.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, rows, next_cursor):
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at, pk):
+    """Cursor of a row: '<microseconds since epoch>-<pk>'"""
+    delta = created_at - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f'{micros}-{pk}'
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (created_at, pk), or None when the cursor is missing or malformed
+    """
+    try:
+        micros, pk = cursor.split('-', 1)
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, page_size=50, date_field='created_at'):
+    """
+    Return the page of `queryset` that follows `cursor` (newest first)
+
+    Args:
+        queryset: Filtered queryset; its ordering is replaced
+        cursor: Value of a previous page's next_cursor (None = first page)
+        page_size: Rows per page
+        date_field: Datetime field the listing is ordered by
+
+    Returns:
+        KeysetPage
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lt': created_at}) | Q(**{date_field: created_at, 'pk__lt': pk})
+        )
+
+    # Una fila extra indica si hay otra página
+    rows = list(queryset.order_by(f'-{date_field}', '-pk')[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, date_field), last.pk)
+    return KeysetPage(rows, next_cursor)
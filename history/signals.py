@@ -0,0 +1,46 @@
+"""
+Django signals that publish history status transitions to live channels
+and pre-render the output of finished runs
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import DeploymentHistory, ExecutionBatch
+from scheduler.models import ScheduledTaskHistory
+from .output_render import ACTIVE_STATUSES
+from .stream import publish_status
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=DeploymentHistory)
+@receiver(post_save, sender=ScheduledTaskHistory)
+def publish_history_status(sender, instance, update_fields=None, **kwargs):
+    """Notify SSE subscribers whenever a history status may have changed"""
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    publish_status(instance)
+
+
+def _queue_render(model_label, pk):
+    from .tasks import render_history_output
+    try:
+        render_history_output.delay(model_label, pk)
+    except Exception as e:
+        # Sin broker la página renderiza la salida en la primera visita
+        logger.debug(f'[OUTPUT-RENDER] Could not queue output render of {model_label} {pk}: {e}')
+
+
+@receiver(post_save, sender=DeploymentHistory)
+@receiver(post_save, sender=ScheduledTaskHistory)
+@receiver(post_save, sender=ExecutionBatch)
+def render_finished_output(sender, instance, created=False, update_fields=None, **kwargs):
+    """Render the output of a run once, when it finishes"""
+    if created or instance.status in ACTIVE_STATUSES:
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    label = instance._meta.label_lower
+    transaction.on_commit(lambda: _queue_render(label, instance.pk))
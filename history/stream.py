@@ -0,0 +1,67 @@
+"""
+Redis pub/sub channel for live execution updates.
+
+Celery tasks publish output deltas and status transitions to a per-history
+channel on the broker Redis; SSE views subscribe to it and block until a
+message arrives instead of re-reading the history row every second.
+Publishing is best effort: the database stays the source of truth and
+consumers fall back to it on (re)connect.
+"""
+import json
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+
+
+def get_redis_client():
+    """Return a shared Redis client for the Celery broker"""
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_connect_timeout=2)
+    return _redis_client
+
+
+def channel_name(history):
+    """Per-history channel, e.g. diaken:history:deployment:42"""
+    return f'diaken:history:{history.output_chunk_field}:{history.pk}'
+
+
+def publish_event(history, event, data):
+    """Publish an event for a history record; never raises"""
+    try:
+        payload = json.dumps({'event': event, 'data': data})
+        get_redis_client().publish(channel_name(history), payload)
+    except Exception as e:
+        logger.debug(f'Could not publish {event} for {channel_name(history)}: {e}')
+
+
+def publish_output(history, sequence, content):
+    """Publish a newly stored output chunk"""
+    publish_event(history, 'output', {'sequence': sequence, 'output': content})
+
+
+def publish_status(history):
+    """Publish the current status of a history record"""
+    completed_at = getattr(history, 'completed_at', None)
+    publish_event(history, 'status', {
+        'status': history.status,
+        'completed_at': completed_at.isoformat() if completed_at else None,
+    })
+
+
+def subscribe(history):
+    """Open a pub/sub subscription for a history record"""
+    pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel_name(history))
+    return pubsub
+
+
+def decode_message(message):
+    """Decode a pub/sub message into (event, data)"""
+    payload = json.loads(message['data'])
+    return payload['event'], payload['data']
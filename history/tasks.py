@@ -0,0 +1,30 @@
+"""
+Celery tasks for execution history
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='history.render_output', ignore_result=True)
+def render_history_output(model_label, pk):
+    """
+    Highlight and cache the output of a finished run (see history/output_render.py),
+    so the detail page serves it from the cache on the first view.
+
+    Args:
+        model_label: 'history.deploymenthistory', 'scheduler.scheduledtaskhistory'
+                     or 'history.executionbatch'
+        pk: record ID
+    """
+    from django.apps import apps
+    from history.output_render import render_output
+
+    history = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if not history:
+        return
+    try:
+        render_output(history)
+    except Exception as e:
+        logger.error(f'[OUTPUT-RENDER] Failed to render output of {model_label} {pk}: {e}')
@@ -1,3 +1,50 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from .models import DeploymentHistory
+from .output_render import output_page, split_lines
+from .output_store import OutputChunkWriter
+
+
+@mock.patch('history.stream.publish_output')
+class OutputSequenceTests(TestCase):
+    """OutputChunkWriter and append_output() share one sequence per record"""
+
+    def test_writer_and_append_output_interleave(self, publish_output):
+        history = DeploymentHistory.objects.create(target='web01', target_type='VM', playbook='Basic Setup')
+        writer = OutputChunkWriter(history, flush_every=2)
+        writer.append('header\n')
+        history.append_output('note\n')
+        writer.write('line 1\n')
+        writer.write('line 2\n')
+
+        sequences = list(history.output_chunks.order_by('sequence').values_list('sequence', flat=True))
+        self.assertEqual(sequences, [0, 1, 2])
+        self.assertEqual(history.get_output(), 'header\nnote\nline 1\nline 2\n')
+        self.assertEqual(publish_output.call_count, 3)
+
+
+@mock.patch('history.stream.publish_output')
+class LiveOutputPageTests(TestCase):
+    """Polls of a run in progress only read the chunks after the client's cursor"""
+
+    def test_polls_read_new_chunks_only(self, publish_output):
+        history = DeploymentHistory.objects.create(target='web01', target_type='VM', playbook='site.yml', status='running')
+        history.append_output('PLAY [all] ***\nTASK [ping] ***\n')
+        history.append_output('ok: [web01]\npartial')
+
+        first = output_page(history, 0)
+        self.assertEqual(first['next'], 2)
+        self.assertIn('ansible-task', first['html'])
+
+        history.append_output(' line\n')
+        with mock.patch.object(DeploymentHistory, 'get_output', side_effect=AssertionError('full read')):
+            second = output_page(history, first['next'], first['cursor'])
+            third = output_page(history, second['next'], second['cursor'])
+        self.assertEqual(second['start'], 2)
+        self.assertEqual(second['next'], 4)
+        self.assertIn('partial line', second['html'])
+        self.assertEqual(third['html'], '')
+        self.assertEqual(third['next'], 4)
+        self.assertEqual(len(split_lines(history.get_output())), 4)
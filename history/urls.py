@@ -5,7 +5,13 @@ app_name = 'history'
 
 urlpatterns = [
     path('', views.history_list, name='history_list'),
+    path('api/', views.history_list_api, name='history_list_api'),
+    path('export/', views.history_export, name='history_export'),
     path('<int:pk>/', views.history_detail, name='history_detail'),
     path('<int:pk>/status/', views.check_task_status, name='check_task_status'),
+    path('<int:pk>/output/', views.history_output, name='history_output'),
+    path('execution-batches/<int:pk>/output/', views.execution_batch_output, name='execution_batch_output'),
+    path('batch/<int:pk>/', views.batch_detail, name='batch_detail'),
+    path('batch/<int:pk>/status/', views.batch_status, name='batch_status'),
     path('cleanup/', views.cleanup_stuck_deployments_view, name='cleanup_stuck_deployments'),
 ]
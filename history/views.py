@@ -1,62 +1,242 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import DeploymentHistory
+from .models import DeploymentHistory, DeploymentBatch, ExecutionBatch
 from .forms import CleanupStuckDeploymentsForm
+from django.conf import settings
 from django.db.models import Q
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+from .export import export_context, filter_date_range, format_datetime, selected_columns, stream_csv
+from .pagination import keyset_page
+
+# Running deployments older than this are shown as stuck
+STUCK_THRESHOLD = timedelta(hours=6)
+
+
+# Columnas del export CSV: (clave, cabecera, valor)
+DEPLOYMENT_EXPORT_COLUMNS = [
+    ('id', 'ID', lambda d: d.id),
+    ('created_at', 'Date', lambda d: format_datetime(d.created_at)),
+    ('completed_at', 'Completed', lambda d: format_datetime(d.completed_at)),
+    ('user', 'User', lambda d: d.user.username if d.user else ''),
+    ('environment', 'Environment', lambda d: d.environment),
+    ('target', 'Target', lambda d: d.target),
+    ('target_type', 'Type', lambda d: d.target_type),
+    ('playbook', 'Playbook', lambda d: d.playbook),
+    ('status', 'Status', lambda d: d.status),
+    ('duration', 'Duration', lambda d: d.duration()),
+    ('hostname', 'Hostname', lambda d: d.hostname),
+    ('ip_address', 'IP Address', lambda d: d.ip_address),
+    ('datacenter', 'Datacenter', lambda d: d.datacenter),
+    ('cluster', 'Cluster', lambda d: d.cluster),
+    ('template', 'Template', lambda d: d.template),
+    ('snapshot_name', 'Snapshot', lambda d: d.snapshot_name),
+]
+
+
+def _filtered_deployments(request):
+    """
+    DeploymentHistory queryset for the listing filters, without the output
+    column and with stuck/running time computed by the database.
+
+    Returns:
+        tuple: (queryset, filters dict for the template)
+    """
+    from django.db.models import BooleanField, Case, DateTimeField, DurationField, ExpressionWrapper, F, Value, When
+    
+    filters = {
+        'status_filter': request.GET.get('status', ''),
+        'type_filter': request.GET.get('type', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+    }
+    now = timezone.now()
+    
+    deployments = DeploymentHistory.objects.select_related('user').defer('ansible_output').annotate(
+        running_time=Case(
+            When(status='running', then=ExpressionWrapper(
+                Value(now, output_field=DateTimeField()) - F('created_at'), output_field=DurationField()
+            )),
+            default=Value(None),
+            output_field=DurationField(),
+        ),
+        is_stuck=Case(
+            When(status='running', created_at__lt=now - STUCK_THRESHOLD, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+    
+    # Aplicar filtros (cubiertos por los índices status/target_type + created_at)
+    if filters['status_filter']:
+        deployments = deployments.filter(status=filters['status_filter'])
+    if filters['type_filter']:
+        deployments = deployments.filter(target_type=filters['type_filter'])
+    
+    # Rango de fechas sobre created_at directamente para poder usar los índices
+    deployments = filter_date_range(deployments, 'created_at', filters['date_from'], filters['date_to'])
+    
+    return deployments, filters
+
+
+def _history_page(request):
+    """Keyset page of the filtered listing (see history/pagination.py)"""
+    deployments, filters = _filtered_deployments(request)
+    page_size = getattr(settings, 'HISTORY_PAGE_SIZE', 50)
+    page = keyset_page(deployments, request.GET.get('cursor'), page_size=page_size)
+    for deployment in page.rows:
+        running_time = deployment.running_time
+        deployment.running_hours = running_time.total_seconds() / 3600 if running_time else 0
+    return page, filters
+
 
 @login_required
 def history_list(request):
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    # Filtros
-    status_filter = request.GET.get('status', '')
-    type_filter = request.GET.get('type', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    
-    # Ordenar por fecha descendente (más recientes primero)
-    deployments = DeploymentHistory.objects.all().order_by('-created_at')
-    
-    # Aplicar filtros
-    if status_filter:
-        deployments = deployments.filter(status=status_filter)
-    if type_filter:
-        deployments = deployments.filter(target_type=type_filter)
-    if date_from:
-        deployments = deployments.filter(created_at__gte=date_from)
-    if date_to:
-        deployments = deployments.filter(created_at__lte=date_to)
-    
-    # Agregar información sobre deployments que llevan mucho tiempo corriendo
-    now = timezone.now()
-    stuck_threshold = timedelta(hours=6)  # Considerar stuck después de 6 horas
+    page, filters = _history_page(request)
     
-    for deployment in deployments:
-        if deployment.status == 'running':
-            running_time = now - deployment.created_at
-            deployment.is_stuck = running_time > stuck_threshold
-            deployment.running_hours = running_time.total_seconds() / 3600
-        else:
-            deployment.is_stuck = False
-            deployment.running_hours = 0
+    # Parámetros de filtro para la API de scroll infinito
+    query = request.GET.copy()
+    query.pop('cursor', None)
     
     context = {
-        'deployments': deployments,
-        'status_filter': status_filter,
-        'type_filter': type_filter,
-        'date_from': date_from,
-        'date_to': date_to,
+        'deployments': page.rows,
+        'next_cursor': page.next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'filter_query': query.urlencode(),
+        **filters,
+        **export_context(request, DEPLOYMENT_EXPORT_COLUMNS, reverse('history:history_export')),
     }
     return render(request, 'history/history_list.html', context)
 
+
+@login_required
+def history_export(request):
+    """
+    Stream the filtered deployment history as CSV.
+    Takes the listing filters plus `columns` (see history/export.py).
+    """
+    deployments, filters = _filtered_deployments(request)
+    columns = selected_columns(request, DEPLOYMENT_EXPORT_COLUMNS)
+    return stream_csv('deployment_history.csv', columns, deployments.order_by('-created_at', '-id'))
+
+
+@login_required
+def history_list_api(request):
+    """
+    JSON variant of history_list for infinite scroll.
+    Takes the same filters plus `cursor` (next_cursor of the previous page).
+    """
+    from django.http import JsonResponse
+    from django.template.loader import render_to_string
+    
+    page, filters = _history_page(request)
+    return JsonResponse({
+        'results': [
+            {
+                'id': d.id,
+                'created_at': d.created_at.isoformat(),
+                'user': d.user.username if d.user else None,
+                'target': d.target,
+                'target_type': d.target_type,
+                'playbook': d.playbook,
+                'status': d.status,
+                'is_stuck': d.is_stuck,
+                'running_hours': round(d.running_hours, 2),
+            }
+            for d in page.rows
+        ],
+        'html': render_to_string('history/history_rows.html', {'deployments': page.rows}, request=request),
+        'next_cursor': page.next_cursor,
+        'has_more': page.has_more,
+    })
+
 @login_required
 def history_detail(request, pk):
+    from .ansible_events import get_recap, get_failed_results
+    
     deployment = get_object_or_404(DeploymentHistory, pk=pk)
-    return render(request, 'history/history_detail.html', {'deployment': deployment})
+    return render(request, 'history/history_detail.html', {
+        'deployment': deployment,
+        'ansible_recap': get_recap(deployment),
+        'ansible_failures': get_failed_results(deployment),
+        'execution_batches': deployment.execution_batches.all(),
+    })
+
+
+@login_required
+def history_output(request, pk):
+    """
+    Vista AJAX con un rango de líneas de la salida ya resaltada (?start=N[&after=cursor]).
+    Ver history/output_render.py.
+    """
+    from django.http import JsonResponse
+    from .output_render import output_page
+    
+    deployment = get_object_or_404(DeploymentHistory, pk=pk)
+    try:
+        start = int(request.GET.get('start', 0))
+        after = int(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        start, after = 0, None
+    return JsonResponse(output_page(deployment, start, after))
+
+
+@login_required
+def execution_batch_output(request, pk):
+    """Rango de líneas de la salida de un lote de un rollout (deploy/rolling.py)"""
+    from django.http import JsonResponse
+    from .output_render import output_page
+    
+    batch = get_object_or_404(ExecutionBatch, pk=pk)
+    try:
+        start = int(request.GET.get('start', 0))
+        after = int(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        start, after = 0, None
+    return JsonResponse(output_page(batch, start, after))
+
+
+@login_required
+def batch_detail(request, pk):
+    """Aggregated progress of a bulk deployment"""
+    batch = get_object_or_404(DeploymentBatch, pk=pk)
+    deployments = batch.deployments.order_by('hostname').only(
+        'id', 'hostname', 'ip_address', 'status', 'created_at', 'completed_at'
+    )
+    return render(request, 'history/batch_detail.html', {
+        'batch': batch,
+        'summary': batch.summary(),
+        'deployments': deployments,
+    })
+
+
+@login_required
+def batch_status(request, pk):
+    """
+    Vista AJAX con el progreso agregado de un despliegue masivo.
+    """
+    from django.http import JsonResponse
+    
+    batch = get_object_or_404(DeploymentBatch, pk=pk)
+    summary = batch.summary()
+    deployments = batch.deployments.order_by('hostname').values(
+        'id', 'hostname', 'ip_address', 'status', 'completed_at'
+    )
+    return JsonResponse({
+        'batch_id': batch.pk,
+        'status': summary['status'],
+        'total': summary['total'],
+        'finished': summary['finished'],
+        'percent': summary['percent'],
+        'counts': summary['counts'],
+        'completed_at': summary['completed_at'].isoformat() if summary['completed_at'] else None,
+        'deployments': [
+            {**row, 'completed_at': row['completed_at'].isoformat() if row['completed_at'] else None}
+            for row in deployments
+        ],
+    })
 
 
 @login_required
@@ -81,10 +261,11 @@ def cleanup_stuck_deployments_view(request):
                 created_at__lt=cutoff_time
             ).order_by('created_at')
             
-            # Find stuck scheduled tasks
+            # Find stuck scheduled tasks (leased executions are recovered by the scheduler leader)
             stuck_tasks = ScheduledTaskHistory.objects.filter(
                 status='running',
-                executed_at__lt=cutoff_time
+                executed_at__lt=cutoff_time,
+                scheduled_task__lease_expires_at__isnull=True
             ).order_by('executed_at')
             
             deployment_list = []
@@ -106,10 +287,7 @@ def cleanup_stuck_deployments_view(request):
                 if not dry_run:
                     dep.status = 'failed'
                     dep.completed_at = timezone.now()
-                    if not dep.ansible_output:
-                        dep.ansible_output = f'Deployment automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
-                    else:
-                        dep.ansible_output += f'\n\n[SYSTEM] Deployment automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
+                    dep.append_output(f'\n\n[SYSTEM] Deployment automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)')
                     dep.save()
             
             # Process scheduled tasks
@@ -128,10 +306,7 @@ def cleanup_stuck_deployments_view(request):
                 if not dry_run:
                     task.status = 'failed'
                     task.completed_at = timezone.now()
-                    if not task.ansible_output:
-                        task.ansible_output = f'Task automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
-                    else:
-                        task.ansible_output += f'\n\n[SYSTEM] Task automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)'
+                    task.append_output(f'\n\n[SYSTEM] Task automatically marked as failed after running for {hours:.1f} hours (timeout: {timeout_hours}h)')
                     task.save()
             
             results = {
@@ -156,7 +331,7 @@ def cleanup_stuck_deployments_view(request):
         form = CleanupStuckDeploymentsForm()
     
     # Get current running deployments for display
-    running_deployments = DeploymentHistory.objects.filter(status='running').order_by('-created_at')
+    running_deployments = DeploymentHistory.objects.filter(status='running').defer('ansible_output').order_by('-created_at')
     now = timezone.now()
     
     for dep in running_deployments:
@@ -187,7 +362,7 @@ def check_task_status(request, pk):
         'created_at': deployment.created_at.isoformat(),
         'completed_at': deployment.completed_at.isoformat() if deployment.completed_at else None,
         'duration': deployment.duration(),
-        'output': deployment.provision_output or '',  # Output en tiempo real
+        'output': deployment.get_output(),  # Output en tiempo real
     }
     
     # Si hay un celery_task_id, verificar el estado de la tarea
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Host, Group, Environment
+from .hosts_manager import hosts_file_batch
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,19 +12,6 @@ class HostAdmin(admin.ModelAdmin):
     search_fields = ('name', 'ip', 'description')
     list_editable = ('active',)
     
-    def save_model(self, request, obj, form, change):
-        """
-        Override save_model to ensure /etc/hosts is updated.
-        """
-        super().save_model(request, obj, form, change)
-        
-        # Force update of /etc/hosts
-        try:
-            obj.update_etc_hosts()
-            logger.info(f'Admin: Updated /etc/hosts after saving {obj.name} (active={obj.active})')
-        except Exception as e:
-            logger.error(f'Admin: Error updating /etc/hosts for {obj.name}: {e}', exc_info=True)
-    
     def delete_model(self, request, obj):
         """
         Override delete_model to ensure /etc/hosts is updated.
@@ -31,7 +19,7 @@ class HostAdmin(admin.ModelAdmin):
         host_name = obj.name
         host_ip = obj.ip
         
-        # Delete will call remove_from_etc_hosts() automatically
+        # The post_delete signal requests the /etc/hosts update
         super().delete_model(request, obj)
         
         logger.info(f'Admin: Deleted {host_name} ({host_ip}) from inventory and /etc/hosts')
@@ -40,9 +28,10 @@ class HostAdmin(admin.ModelAdmin):
         """
         Override delete_queryset for bulk delete to ensure /etc/hosts is updated.
         """
-        # Delete each host individually to trigger remove_from_etc_hosts()
-        for obj in queryset:
-            obj.delete()
+        # Delete each host individually; /etc/hosts is regenerated once at the end
+        with hosts_file_batch():
+            for obj in queryset:
+                obj.delete()
         
         logger.info(f'Admin: Bulk deleted {queryset.count()} hosts')
 
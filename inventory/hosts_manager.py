@@ -1,10 +1,30 @@
 """
 Helper functions to manage /etc/hosts file for Diaken managed hosts.
+
+Host saves and deletes don't rewrite the file themselves: they call
+request_hosts_update(), which marks the managed section dirty in Redis and
+schedules a single regenerate_etc_hosts Celery task (debounced by
+ETC_HOSTS_UPDATE_DELAY seconds). A burst of saves therefore produces one
+rewrite, and the rewrite is skipped when the content did not change.
+Importers wrap their loops in hosts_file_batch() so the per-row signals
+only record that an update is needed:
+
+    from inventory.hosts_manager import hosts_file_batch
+
+    with hosts_file_batch():
+        for row in rows:
+            Host.objects.create(...)
 """
+import hashlib
 import os
 import logging
 import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+
 from django.conf import settings
+from django.db import transaction
 
 logger = logging.getLogger('inventory.hosts_manager')
 
@@ -12,6 +32,24 @@ HOSTS_FILE = '/etc/hosts'
 MARKER_START = '# --- Diaken Managed Hosts ---'
 MARKER_END = '# --- End Diaken Managed Hosts ---'
 
+DIRTY_KEY = 'diaken:etc-hosts:dirty'
+SCHEDULED_KEY = 'diaken:etc-hosts:scheduled'
+LOCK_KEY = 'diaken:etc-hosts:lock'
+
+# Delete the lock only if we still own it
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_batch = threading.local()
+
+
+def content_hash(lines):
+    return hashlib.sha256(''.join(lines).encode('utf-8')).hexdigest()
+
 
 def update_hosts_file():
     """
@@ -22,7 +60,7 @@ def update_hosts_file():
     
     try:
         # Get all active hosts from inventory
-        hosts = Host.objects.filter(active=True).order_by('name')
+        hosts = list(Host.objects.filter(active=True).order_by('name').values_list('ip', 'name'))
         
         # Read current /etc/hosts content
         with open(HOSTS_FILE, 'r') as f:
@@ -41,9 +79,9 @@ def update_hosts_file():
         
         # Build new managed section
         managed_section = [MARKER_START + '\n']
-        for host in hosts:
+        for ip, name in hosts:
             # Use IP address for connection, but include hostname for reference
-            managed_section.append(f"{host.ip}    {host.name}\n")
+            managed_section.append(f"{ip}    {name}\n")
         managed_section.append(MARKER_END + '\n')
         
         # Reconstruct file
@@ -54,6 +92,11 @@ def update_hosts_file():
             # Add managed section at the end
             new_lines = lines + ['\n'] + managed_section
         
+        # Nada que escribir si el contenido no cambió
+        if content_hash(new_lines) == content_hash(lines):
+            logger.info(f'HOSTS_FILE: /etc/hosts already up to date ({len(hosts)} hosts), skipping write')
+            return True, f'/etc/hosts already up to date with {len(hosts)} hosts'
+        
         # Write to temporary file in /tmp (writable by diaken user)
         import tempfile
         import subprocess
@@ -87,8 +130,8 @@ def update_hosts_file():
                     pass
                 return False, error_msg
             
-            logger.info(f'HOSTS_FILE: Updated /etc/hosts with {hosts.count()} hosts')
-            return True, f'Successfully updated /etc/hosts with {hosts.count()} hosts'
+            logger.info(f'HOSTS_FILE: Updated /etc/hosts with {len(hosts)} hosts')
+            return True, f'Successfully updated /etc/hosts with {len(hosts)} hosts'
             
         except subprocess.TimeoutExpired:
             error_msg = 'Timeout updating /etc/hosts'
@@ -104,6 +147,103 @@ def update_hosts_file():
         return False, f'Error updating /etc/hosts: {str(e)}'
 
 
+def _redis_lock_timeout():
+    return getattr(settings, 'ETC_HOSTS_LOCK_TIMEOUT', 60)
+
+
+@contextmanager
+def hosts_file_batch():
+    """
+    Suppress per-row /etc/hosts updates inside the block; a single
+    coalesced update is requested when the outermost block exits.
+    """
+    depth = getattr(_batch, 'depth', 0)
+    if depth == 0:
+        _batch.pending = False
+    _batch.depth = depth + 1
+    try:
+        yield
+    finally:
+        _batch.depth -= 1
+        if _batch.depth == 0 and _batch.pending:
+            _batch.pending = False
+            request_hosts_update('bulk change')
+
+
+def request_hosts_update(reason=''):
+    """
+    Ask for /etc/hosts to be regenerated once the current transaction
+    commits. Inside hosts_file_batch() the request is deferred to the end
+    of the batch.
+    """
+    if getattr(_batch, 'depth', 0):
+        _batch.pending = True
+        return
+    transaction.on_commit(lambda: schedule_hosts_update(reason))
+
+
+def schedule_hosts_update(reason=''):
+    """
+    Mark the managed section dirty and schedule one regeneration task,
+    unless one is already scheduled. Without Redis/Celery the file is
+    updated right away, as before.
+    """
+    delay = getattr(settings, 'ETC_HOSTS_UPDATE_DELAY', 5)
+    client = None
+    try:
+        from history.stream import get_redis_client
+        from inventory.tasks import regenerate_etc_hosts_task
+
+        client = get_redis_client()
+        client.set(DIRTY_KEY, 1)
+        if not client.set(SCHEDULED_KEY, reason or '1', nx=True, ex=delay + _redis_lock_timeout()):
+            logger.debug(f'HOSTS_FILE: Update already scheduled ({reason})')
+            return
+        regenerate_etc_hosts_task.apply_async(countdown=delay)
+        logger.info(f'HOSTS_FILE: /etc/hosts update scheduled in {delay}s ({reason})')
+    except Exception as e:
+        if client is not None:
+            try:
+                client.delete(SCHEDULED_KEY)
+            except Exception:
+                pass
+        logger.warning(f'HOSTS_FILE: Coalesced update unavailable ({e}), updating /etc/hosts now')
+        update_hosts_file()
+
+
+def regenerate_hosts_file():
+    """
+    Run one coalesced regeneration (called by the regenerate_etc_hosts task)
+
+    Returns:
+        tuple: (status: 'updated'|'clean'|'locked'|'error', message: str);
+        on 'error' the section stays dirty and the task retries it
+    """
+    from history.stream import get_redis_client
+
+    client = get_redis_client()
+    token = uuid.uuid4().hex
+    if not client.set(LOCK_KEY, token, nx=True, ex=_redis_lock_timeout()):
+        return 'locked', 'Another worker is writing /etc/hosts'
+
+    try:
+        # Saves from now on schedule a new task and are not lost
+        client.delete(SCHEDULED_KEY)
+        if not client.delete(DIRTY_KEY):
+            return 'clean', '/etc/hosts has no pending changes'
+
+        success, message = update_hosts_file()
+        if not success:
+            client.set(DIRTY_KEY, 1)
+            return 'error', message
+        return 'updated', message
+    finally:
+        try:
+            client.eval(RELEASE_SCRIPT, 1, LOCK_KEY, token)
+        except Exception as e:
+            logger.warning(f'HOSTS_FILE: Could not release lock: {e}')
+
+
 def add_host_to_hosts_file(hostname, ip_address):
     """
     Add a single host to /etc/hosts file.
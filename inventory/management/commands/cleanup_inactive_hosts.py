@@ -3,6 +3,7 @@ Django management command to clean up inactive hosts from the database.
 """
 from django.core.management.base import BaseCommand
 from inventory.models import Host
+from inventory.hosts_manager import hosts_file_batch
 from django.utils import timezone
 from datetime import timedelta
 
@@ -118,24 +119,20 @@ class Command(BaseCommand):
         # Delete hosts
         self.stdout.write('\nDeleting hosts...')
         deleted_count = 0
-        for host in hosts_to_delete:
-            host_name = host.name
-            host_ip = host.ip
-            try:
-                host.delete()  # This will also remove from /etc/hosts
-                deleted_count += 1
-                self.stdout.write(f'  ✓ Deleted: {host_name} ({host_ip})')
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'  ✗ Error deleting {host_name}: {e}'))
+        # One coalesced /etc/hosts update for the whole cleanup
+        with hosts_file_batch():
+            for host in hosts_to_delete:
+                host_name = host.name
+                host_ip = host.ip
+                try:
+                    host.delete()
+                    deleted_count += 1
+                    self.stdout.write(f'  ✓ Deleted: {host_name} ({host_ip})')
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'  ✗ Error deleting {host_name}: {e}'))
         
         self.stdout.write(self.style.SUCCESS(f'\n✅ Successfully deleted {deleted_count} hosts'))
-        
-        # Update /etc/hosts
-        self.stdout.write('\nUpdating /etc/hosts...')
-        remaining_host = Host.objects.filter(active=True).first()
-        if remaining_host:
-            remaining_host.update_etc_hosts()
-            self.stdout.write(self.style.SUCCESS('✅ /etc/hosts updated'))
+        self.stdout.write(self.style.SUCCESS('✅ /etc/hosts update requested'))
         
         # Show final stats
         final_total = Host.objects.count()
@@ -69,42 +69,13 @@ class Host(models.Model):
         super().delete(*args, **kwargs)
     
     def update_etc_hosts(self):
-        """Update /etc/hosts with this host's entry using Celery task"""
-        import logging
-        
-        logger = logging.getLogger(__name__)
-        logger.info(f'update_etc_hosts() called for {self.name} ({self.ip}), active={self.active}')
-        
-        try:
-            # Use Celery task to update /etc/hosts asynchronously
-            # This avoids mod_wsgi restrictions on sudo
-            from inventory.tasks import update_etc_hosts_task
-            
-            logger.info('Dispatching Celery task to update /etc/hosts')
-            task = update_etc_hosts_task.delay()
-            logger.info(f'Celery task dispatched: {task.id}')
-            
-        except Exception as e:
-            logger.error(f'💥 Exception dispatching Celery task: {e}', exc_info=True)
+        """Request a coalesced /etc/hosts regeneration (see inventory/hosts_manager.py)"""
+        from inventory.hosts_manager import request_hosts_update
+        request_hosts_update(f'update_etc_hosts() for {self.name}')
     
     def remove_from_etc_hosts(self):
-        """Remove this host from /etc/hosts using Celery task"""
-        # Simply call update_etc_hosts() which will regenerate /etc/hosts
-        # without this host (since it will be deleted or inactive)
-        import logging
-        
-        logger = logging.getLogger(__name__)
-        logger.info(f'remove_from_etc_hosts() called for {self.name} ({self.ip})')
-        
-        try:
-            # Use Celery task to update /etc/hosts asynchronously
-            from inventory.tasks import update_etc_hosts_task
-            
-            logger.info('Dispatching Celery task to remove from /etc/hosts')
-            task = update_etc_hosts_task.delay()
-            logger.info(f'Celery task dispatched: {task.id}')
-            
-        except Exception as e:
-            logger.error(f'💥 Exception dispatching Celery task: {e}', exc_info=True)
+        """Request a coalesced /etc/hosts regeneration without this host (deleted or inactive)"""
+        from inventory.hosts_manager import request_hosts_update
+        request_hosts_update(f'remove_from_etc_hosts() for {self.name}')
 
 # Create your models here.
@@ -39,3 +39,31 @@ def update_etc_hosts_task():
     except Exception as e:
         logger.error(f'💥 Celery task: Exception updating /etc/hosts: {e}', exc_info=True)
         return {'status': 'error', 'message': str(e)}
+
+
+@shared_task(bind=True, name='inventory.regenerate_etc_hosts', max_retries=5)
+def regenerate_etc_hosts_task(self):
+    """
+    Coalesced /etc/hosts regeneration (see inventory/hosts_manager.py).
+    Scheduled once per burst of Host changes by schedule_hosts_update().
+    """
+    from django.conf import settings
+    from inventory.hosts_manager import regenerate_hosts_file
+
+    delay = getattr(settings, 'ETC_HOSTS_UPDATE_DELAY', 5)
+    status, message = regenerate_hosts_file()
+    if status == 'locked':
+        # Otro worker está escribiendo; reintentar tras el debounce
+        logger.info(f'[ETC-HOSTS] {message}, retrying')
+        raise self.retry(countdown=delay)
+
+    if status == 'error':
+        # DIRTY_KEY sigue puesto: reintentar con backoff en vez de esperar al próximo cambio de Host
+        if self.request.retries < self.max_retries:
+            countdown = delay * 2 ** (self.request.retries + 1)
+            logger.error(f'❌ [ETC-HOSTS] {message}, retrying in {countdown}s')
+            raise self.retry(countdown=countdown)
+        logger.error(f'❌ [ETC-HOSTS] {message}, giving up until the next Host change')
+    else:
+        logger.info(f'[ETC-HOSTS] {status}: {message}')
+    return {'status': status, 'message': message}
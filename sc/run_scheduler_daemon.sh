@@ -1,6 +1,8 @@
 #!/bin/bash
 # Script to run scheduled tasks in daemon mode
-# This runs continuously and checks for tasks every 10 seconds
+# Event-driven: sleeps until the next task is due and dispatches it to Celery
+# (the celery worker must be running). --interval is the fallback poll used
+# only when Redis notifications are unavailable.
 # Get script directory and navigate to project root
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 PROJECT_DIR="$( cd "$SCRIPT_DIR/.." && pwd )"
@@ -3,10 +3,11 @@ from .models import ScheduledTask, ScheduledTaskHistory
 
 @admin.register(ScheduledTask)
 class ScheduledTaskAdmin(admin.ModelAdmin):
-    list_display = ['name', 'task_type', 'get_target_display', 'playbook', 'scheduled_datetime', 'status', 'created_by']
-    list_filter = ['status', 'task_type', 'scheduled_datetime']
+    list_display = ['name', 'task_type', 'get_target_display', 'playbook', 'scheduled_datetime', 'cron_expression', 'next_run_at', 'status', 'created_by']
+    list_filter = ['status', 'task_type', 'scheduled_datetime', 'catchup_policy']
     search_fields = ['name', 'host__name', 'group__name', 'playbook__name']
-    readonly_fields = ['created_at', 'updated_at', 'execution_started_at', 'execution_completed_at']
+    readonly_fields = ['created_at', 'updated_at', 'execution_started_at', 'execution_completed_at',
+                       'run_count', 'last_run_at', 'next_run_at', 'claimed_by', 'lease_expires_at']
 
 @admin.register(ScheduledTaskHistory)
 class ScheduledTaskHistoryAdmin(admin.ModelAdmin):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SchedulerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scheduler'
+    
+    def ready(self):
+        # Import signals to register them
+        import scheduler.signals
@@ -0,0 +1,164 @@
+"""
+Minimal cron expression parser for recurring scheduled tasks.
+
+Standard 5-field syntax (minute hour day-of-month month day-of-week) with
+lists, ranges, steps, month/day names and the usual macros:
+
+    expr = CronExpression('30 2 * * mon-fri')
+    expr.next_after(timezone.now(), 'America/Bogota')   # next 02:30 on a weekday
+
+As in Vixie cron, when both day-of-month and day-of-week are restricted a
+day matches if EITHER does. Times are evaluated on the wall clock of the
+given timezone: a time skipped by a DST change does not fire that day, and
+a repeated one fires only the first time.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+UTC = dt_timezone.utc
+
+MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+DAY_NAMES = {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+# (name, min, max, names)
+FIELDS = (
+    ('minute', 0, 59, {}),
+    ('hour', 0, 23, {}),
+    ('day of month', 1, 31, {}),
+    ('month', 1, 12, MONTH_NAMES),
+    ('day of week', 0, 7, DAY_NAMES),
+)
+
+MONTH_DAYS = {month: 31 for month in range(1, 13)}
+MONTH_DAYS.update({2: 29, 4: 30, 6: 30, 9: 30, 11: 30})
+
+# Longest gap between two matches of a valid expression (Feb 29 every 4-8 years)
+SEARCH_LIMIT_DAYS = 366 * 8
+
+
+def get_zone(name):
+    """ZoneInfo for `name`; raises ValueError for unknown zones"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f'Unknown timezone: {name}') from e
+
+
+def _parse_value(value, names, field):
+    value = value.lower()
+    if value in names:
+        return names[value]
+    if not value.isdigit():
+        raise ValueError(f'Invalid {field} value: {value}')
+    return int(value)
+
+
+def _parse_field(spec, field, low, high, names):
+    values = set()
+    for part in spec.split(','):
+        if not part:
+            raise ValueError(f'Empty {field} entry')
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f'Invalid {field} step: {step_text}')
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start = _parse_value(start_text, names, field)
+            end = _parse_value(end_text, names, field)
+        else:
+            start = _parse_value(part, names, field)
+            end = high if step > 1 else start
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise ValueError(f'{field.capitalize()} out of range ({low}-{high}): {part}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Parsed cron expression; raises ValueError when invalid"""
+
+    def __init__(self, expression):
+        self.expression = (expression or '').strip()
+        spec = MACROS.get(self.expression.lower(), self.expression)
+        parts = spec.split()
+        if len(parts) != 5:
+            raise ValueError('A cron expression needs 5 fields: minute hour day-of-month month day-of-week')
+
+        parsed = [_parse_field(part, *field) for part, field in zip(parts, FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 7 es domingo, como 0
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+        if self.any_weekday and not any(day <= MONTH_DAYS[month] for month in self.months for day in self.days):
+            raise ValueError(f'Cron expression never matches: {self.expression}')
+
+    def __str__(self):
+        return self.expression
+
+    def _day_matches(self, day):
+        dom = day.day in self.days
+        dow = (day.isoweekday() % 7) in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return dow
+        if self.any_weekday:
+            return dom
+        return dom or dow
+
+    def next_after(self, after, tz):
+        """
+        First matching time strictly after `after`
+
+        Args:
+            after: Aware datetime
+            tz: ZoneInfo or timezone name the expression is evaluated in
+
+        Returns:
+            Aware datetime in `tz`, or None if nothing matches within
+            SEARCH_LIMIT_DAYS
+        """
+        if isinstance(tz, str):
+            tz = get_zone(tz)
+        local = after.astimezone(tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+        minutes = sorted(self.minutes)
+        hours = sorted(self.hours)
+
+        for _ in range(SEARCH_LIMIT_DAYS):
+            if day.month in self.months and self._day_matches(day):
+                start = local.time() if day == local.date() else None
+                for hour in hours:
+                    if start and hour < start.hour:
+                        continue
+                    for minute in minutes:
+                        if start and hour == start.hour and minute < start.minute:
+                            continue
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+                        # Hora inexistente (cambio de horario): no dispara
+                        if candidate.astimezone(UTC).astimezone(tz).replace(tzinfo=None) != candidate.replace(tzinfo=None):
+                            continue
+                        # Hora repetida: solo la primera vez
+                        if candidate <= after:
+                            continue
+                        return candidate
+            day += timedelta(days=1)
+        return None
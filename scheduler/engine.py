@@ -0,0 +1,395 @@
+"""
+Event-driven scheduler engine for `run_scheduled_tasks --daemon`.
+
+Instead of querying the database every few seconds, the engine keeps the
+due times of the upcoming pending ScheduledTasks in a min-heap and sleeps
+exactly until the next one. Changes made from the UI (new task, cancel,
+reschedule) reach it through a Redis notification published by the
+ScheduledTask signals, which wakes it up to reload that single task:
+
+    engine = SchedulerEngine()
+    engine.run()        # blocks
+
+Due executions are claimed in batches (pending -> running, with a lease;
+see scheduler/leases.py) and dispatched to Celery (scheduler.run_scheduled_task),
+so a slow group task never delays other due tasks and several engines can
+run side by side. Pre-execution snapshots are dispatched SNAPSHOT_LEAD
+seconds before the task is due by the elected leader. The delay between the
+due time and the dispatch (scheduling lag) of each node is kept in the
+Django cache (see get_engine_stats()).
+"""
+import heapq
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .leases import (
+    LeaderElection, claim_due_tasks, hand_off_lease, heartbeat_interval, node_id,
+    recover_expired_leases, return_to_pending,
+)
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'diaken:scheduler:changes'
+STATS_KEY = 'scheduler:engine:stats'
+NODES_KEY = 'scheduler:engine:nodes'
+SNAPSHOT_LEAD = timedelta(minutes=1)
+
+
+def notify_task_changed(task_id):
+    """Tell running scheduler engines to reload a task; never raises"""
+    try:
+        from history.stream import get_redis_client
+        get_redis_client().publish(CHANNEL, json.dumps({'task_id': task_id}))
+    except Exception as e:
+        logger.debug(f'[SCHEDULER-ENGINE] Could not publish change of task {task_id}: {e}')
+
+
+def get_engine_stats():
+    """
+    Stats last published by each running scheduler node
+
+    Returns:
+        list of dicts (one per node, expired nodes dropped)
+    """
+    try:
+        nodes = cache.get(NODES_KEY) or []
+        found = cache.get_many([f'{STATS_KEY}:{node}' for node in nodes])
+        alive = [node for node in nodes if f'{STATS_KEY}:{node}' in found]
+        if alive != nodes:
+            cache.set(NODES_KEY, alive, None)
+        return [found[f'{STATS_KEY}:{node}'] for node in alive]
+    except Exception:
+        return []
+
+
+class LagStats:
+    """Scheduling lag (due time -> dispatch) of the recent dispatches"""
+
+    def __init__(self, window=200):
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.last = None
+        self.max = 0.0
+
+    def record(self, lag):
+        self.count += 1
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.recent.append(lag)
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        return {
+            'dispatched': self.count,
+            'last_lag': round(self.last, 3) if self.last is not None else None,
+            'max_lag': round(self.max, 3),
+            'avg_lag': round(sum(recent) / len(recent), 3) if recent else None,
+            'p95_lag': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else None,
+        }
+
+
+class SchedulerEngine:
+    """
+    Min-heap of (due time, task) for the pending ScheduledTasks due within
+    `horizon`. Heap entries are never removed in place: when a task changes,
+    a new entry is pushed and the old one is recognised as stale when popped.
+    """
+
+    def __init__(self, inline=False, horizon=None, resync_interval=None, poll_interval=10,
+                 cleanup_interval=None, stdout=None):
+        self.inline = inline
+        self.horizon = timedelta(seconds=horizon or getattr(settings, 'SCHEDULER_HORIZON', 3600))
+        self.resync_interval = resync_interval or getattr(settings, 'SCHEDULER_RESYNC_INTERVAL', 300)
+        self.poll_interval = poll_interval
+        self.cleanup_interval = cleanup_interval or getattr(settings, 'SCHEDULER_CLEANUP_INTERVAL', 300)
+        self.stdout = stdout
+        self.owner = node_id()
+        self.election = LeaderElection(self.owner)
+        self.heap = []
+        self.entries = {}       # task id -> {'due': datetime, 'snapshot': bool}
+        self.snapshots_sent = set()
+        self.lag = LagStats()
+        self._counter = itertools.count()
+        self._pubsub = None
+        self._next_resync = 0
+        self._next_cleanup = 0
+        self._next_leader = 0
+        self._poll_resync = False
+        self._running = False
+
+    # ------------------------------------------------------------------
+    # Heap maintenance
+    # ------------------------------------------------------------------
+
+    def _push(self, when, task_id, kind, due):
+        heapq.heappush(self.heap, (when, next(self._counter), task_id, kind, due))
+
+    def _add(self, task_id, due, needs_snapshot):
+        # snapshot_created se marca al terminar; no pedirlo dos veces
+        needs_snapshot = needs_snapshot and task_id not in self.snapshots_sent
+        self.entries[task_id] = {'due': due, 'snapshot': needs_snapshot}
+        if needs_snapshot:
+            self._push(due - SNAPSHOT_LEAD, task_id, 'snapshot', due)
+        self._push(due, task_id, 'execute', due)
+
+    def _pending_tasks(self):
+        from scheduler.models import ScheduledTask
+
+        # Con lease: una ejecución anterior de la serie sigue en curso
+        return ScheduledTask.objects.filter(status='pending', next_run_at__isnull=False, lease_expires_at__isnull=True)
+
+    def resync(self, keep_schedule=False):
+        """Rebuild the heap from the database (startup and safety net)"""
+        horizon_end = timezone.now() + self.horizon
+        rows = self._pending_tasks().filter(next_run_at__lte=horizon_end).values_list(
+            'id', 'next_run_at', 'create_snapshot', 'snapshot_created'
+        )
+        self.heap = []
+        self.entries = {}
+        for task_id, due, create_snapshot, snapshot_created in rows:
+            self._add(task_id, due, create_snapshot and not snapshot_created)
+        if keep_schedule:
+            return
+        self._next_resync = time.monotonic() + self.resync_interval
+        logger.info(f'[SCHEDULER-ENGINE] Loaded {len(self.entries)} pending task(s) due within {self.horizon}')
+
+    def refresh_task(self, task_id):
+        """Reload one task after a change notification"""
+        row = self._pending_tasks().filter(id=task_id).values_list(
+            'next_run_at', 'create_snapshot', 'snapshot_created'
+        ).first()
+        if row is None or row[0] > timezone.now() + self.horizon:
+            self.entries.pop(task_id, None)
+            return
+        due, create_snapshot, snapshot_created = row
+        entry = self.entries.get(task_id)
+        needs_snapshot = create_snapshot and not snapshot_created and task_id not in self.snapshots_sent
+        if entry and entry['due'] == due and entry['snapshot'] == needs_snapshot:
+            return
+        self._add(task_id, due, needs_snapshot)
+        logger.info(f'[SCHEDULER-ENGINE] Task {task_id} (re)scheduled for {due}')
+
+    def _is_current(self, task_id, kind, due):
+        entry = self.entries.get(task_id)
+        if entry is None or entry['due'] != due:
+            return False
+        return entry['snapshot'] if kind == 'snapshot' else True
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def dispatch_snapshot(self, task_id):
+        self.entries[task_id]['snapshot'] = False
+        self.snapshots_sent.add(task_id)
+        if not self.election.is_leader:
+            # Solo el líder crea snapshots (evita duplicados entre nodos)
+            return
+        if self.inline:
+            from scheduler.management.commands.run_scheduled_tasks import Command
+            from scheduler.models import ScheduledTask
+            Command(stdout=self.stdout).create_snapshot_for_task(ScheduledTask.objects.get(id=task_id))
+            return
+        from scheduler.tasks import create_task_snapshot
+        create_task_snapshot.delay(task_id)
+        logger.info(f'[SCHEDULER-ENGINE] Snapshot for task {task_id} dispatched')
+
+    def dispatch_executions(self, due):
+        """
+        Claim a batch of due tasks and run or queue them
+
+        Args:
+            due: {task id: due datetime}; tasks claimed meanwhile by another
+                node are skipped (SKIP LOCKED)
+        """
+        for task_id in due:
+            self.entries.pop(task_id, None)
+            self.snapshots_sent.discard(task_id)
+
+        claimed = claim_due_tasks(self.owner, limit=len(due), task_ids=due.keys())
+        skipped = len(due) - len(claimed)
+        if skipped:
+            logger.info(f'[SCHEDULER-ENGINE] {skipped} task(s) already claimed elsewhere or no longer pending')
+
+        from scheduler.management.commands.run_scheduled_tasks import Command
+        from scheduler.tasks import run_scheduled_task
+
+        queued = []
+        for task in claimed:
+            lag = (timezone.now() - due[task.id]).total_seconds()
+            self.lag.record(lag)
+            logger.info(f'[SCHEDULER-ENGINE] Dispatching task {task.id} ({task.name}), lag {lag:.3f}s')
+
+            if self.inline:
+                Command(stdout=self.stdout).execute_task(task)
+                continue
+            try:
+                run_scheduled_task.delay(task.id)
+                queued.append(task.id)
+            except Exception as e:
+                # Sin broker: devolver la tarea a pending para el próximo intento
+                logger.error(f'[SCHEDULER-ENGINE] Could not dispatch task {task.id}: {e}')
+                if return_to_pending(task.id, self.owner):
+                    # Reintentar tras poll_interval (no en `due`, que ya pasó)
+                    self.entries[task.id] = {'due': due[task.id], 'snapshot': False}
+                    self._push(timezone.now() + timedelta(seconds=self.poll_interval), task.id, 'execute', due[task.id])
+        if queued:
+            hand_off_lease(queued)
+
+    def leader_duties(self):
+        """Renew leadership; the leader recovers expired leases"""
+        self._next_leader = time.monotonic() + heartbeat_interval()
+        if not self.election.refresh():
+            return
+        try:
+            recovered = recover_expired_leases()
+            if recovered:
+                logger.warning(f'[SCHEDULER-ENGINE] Recovered {recovered} task(s) with expired leases')
+        except Exception as e:
+            logger.error(f'[SCHEDULER-ENGINE] Lease recovery failed: {e}')
+
+    def dispatch_cleanup(self):
+        self._next_cleanup = time.monotonic() + self.cleanup_interval
+        if not self.election.is_leader:
+            return
+        try:
+            if self.inline:
+                from scheduler.management.commands.run_scheduled_tasks import Command
+                Command(stdout=self.stdout).cleanup_expired_snapshots()
+            else:
+                from scheduler.tasks import cleanup_expired_snapshots
+                cleanup_expired_snapshots.delay()
+        except Exception as e:
+            logger.error(f'[SCHEDULER-ENGINE] Snapshot cleanup failed: {e}')
+
+    def run_due(self):
+        """
+        Dispatch everything that is due
+
+        Returns:
+            float: seconds until the next heap entry (None when empty)
+        """
+        due_executions = {}
+        wait = None
+        while self.heap:
+            when, _, task_id, kind, due = self.heap[0]
+            wait = (when - timezone.now()).total_seconds()
+            if wait > 0:
+                break
+            wait = None
+            heapq.heappop(self.heap)
+            if not self._is_current(task_id, kind, due):
+                continue
+            if kind == 'execute':
+                due_executions[task_id] = due
+                continue
+            try:
+                self.dispatch_snapshot(task_id)
+            except Exception as e:
+                logger.error(f'[SCHEDULER-ENGINE] Error dispatching snapshot of task {task_id}: {e}', exc_info=True)
+
+        if due_executions:
+            try:
+                self.dispatch_executions(due_executions)
+            except Exception as e:
+                logger.error(f'[SCHEDULER-ENGINE] Error dispatching tasks {list(due_executions)}: {e}', exc_info=True)
+            if self.heap and wait is None:
+                # Reintentos añadidos durante el despacho
+                wait = max((self.heap[0][0] - timezone.now()).total_seconds(), 0)
+        return wait
+
+    # ------------------------------------------------------------------
+    # Waiting
+    # ------------------------------------------------------------------
+
+    def _subscribe(self):
+        try:
+            from history.stream import get_redis_client
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            self._pubsub = pubsub
+            logger.info(f'[SCHEDULER-ENGINE] Listening for task changes on {CHANNEL}')
+        except Exception as e:
+            self._pubsub = None
+            logger.warning(f'[SCHEDULER-ENGINE] Redis notifications unavailable, polling every {self.poll_interval}s: {e}')
+
+    def wait(self, seconds):
+        """Sleep up to `seconds`, returning early when a task changes"""
+        if self._pubsub is None:
+            time.sleep(min(seconds, self.poll_interval))
+            # Sin notificaciones: recargar desde la base de datos
+            self._poll_resync = True
+            return
+
+        try:
+            message = self._pubsub.get_message(timeout=seconds)
+            while message is not None:
+                if message.get('type') == 'message':
+                    try:
+                        self.refresh_task(json.loads(message['data'])['task_id'])
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                message = self._pubsub.get_message(timeout=0)
+        except Exception as e:
+            logger.warning(f'[SCHEDULER-ENGINE] Lost Redis subscription: {e}')
+            self._pubsub = None
+
+    def publish_stats(self):
+        stats = {
+            **self.lag.as_dict(),
+            'queued': len(self.entries),
+            'next_due': min(e['due'] for e in self.entries.values()).isoformat() if self.entries else None,
+            'notifications': self._pubsub is not None,
+            'node': self.owner,
+            'leader': self.election.is_leader,
+            'updated_at': timezone.now().isoformat(),
+        }
+        try:
+            cache.set(f'{STATS_KEY}:{self.owner}', stats, max(self.resync_interval * 2, 60))
+            nodes = cache.get(NODES_KEY) or []
+            if self.owner not in nodes:
+                cache.set(NODES_KEY, nodes + [self.owner], None)
+        except Exception:
+            pass
+        return stats
+
+    def run(self):
+        """Main loop (blocks until stop())"""
+        self._running = True
+        self._subscribe()
+        while self._running:
+            close_old_connections()
+            now = time.monotonic()
+            if now >= self._next_resync:
+                if self._pubsub is None and self._next_resync:
+                    self._subscribe()
+                self.resync()
+            elif self._poll_resync:
+                self._poll_resync = False
+                self.resync(keep_schedule=True)
+            if now >= self._next_leader:
+                self.leader_duties()
+            if now >= self._next_cleanup:
+                self.dispatch_cleanup()
+
+            next_due = self.run_due()
+            self.publish_stats()
+
+            sleep = min(self._next_resync, self._next_cleanup, self._next_leader) - time.monotonic()
+            if next_due is not None:
+                sleep = min(sleep, next_due)
+            if sleep > 0:
+                self.wait(sleep)
+
+    def stop(self):
+        self._running = False
+        self.election.release()
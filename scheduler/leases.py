@@ -0,0 +1,327 @@
+"""
+Execution leases and leader election for running several schedulers.
+
+Every `run_scheduled_tasks` daemon (node) claims due tasks in batches with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent nodes take disjoint rows
+instead of queueing on the same lock. A claimed task carries a lease
+(claimed_by + lease_expires_at) that its current owner keeps renewing:
+
+    node -> claim_due_tasks()          lease owned by the scheduler node
+    node -> hand_off_lease()           queued on Celery (SCHEDULER_HANDOFF_TIMEOUT)
+    worker -> take_over_lease()        run_scheduled_task picked it up
+    playbook task -> LeaseHeartbeat    while the ScheduledTaskHistory runs
+
+When the owner dies (node crash, worker killed) the heartbeats stop and the
+lease expires. The elected leader then recovers the row with
+recover_expired_leases(): the task and its running history are marked as
+failed, which cleanup_stuck_deployments used to do by hand hours later.
+Expired tasks are never re-executed automatically because playbooks and
+scripts may have partially run.
+
+Only one node is leader at a time (Redis key with TTL, renewed on every
+loop). Without Redis every node acts as leader; recovery is idempotent.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .recurrence import drop_missed_runs, schedule_next_run
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = 'diaken:scheduler:leader'
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_node_id = None
+_node_pid = None
+
+
+def node_id():
+    """Identity of this process as lease owner: '<hostname>:<pid>:<random>'"""
+    global _node_id, _node_pid
+    # Recalcular tras fork (workers prefork de Celery)
+    if _node_id is None or _node_pid != os.getpid():
+        _node_pid = os.getpid()
+        _node_id = f'{socket.gethostname()}:{_node_pid}:{uuid.uuid4().hex[:6]}'
+    return _node_id
+
+
+def lease_timeout():
+    return timedelta(seconds=getattr(settings, 'SCHEDULER_LEASE_TIMEOUT', 120))
+
+
+def heartbeat_interval():
+    return lease_timeout().total_seconds() / 3
+
+
+def claim_due_tasks(owner=None, limit=None, task_ids=None):
+    """
+    Claim a batch of due pending tasks (pending -> running) for `owner`
+
+    Rows locked by another node's claim are skipped, not waited for.
+
+    Args:
+        owner: Lease owner (default: node_id())
+        limit: Maximum tasks to claim (default: SCHEDULER_CLAIM_BATCH)
+        task_ids: Only consider these tasks
+
+    Returns:
+        list of claimed ScheduledTask, oldest due first (recurring runs
+        dropped by the 'skip' catch-up policy are already rescheduled)
+    """
+    from scheduler.models import ScheduledTask
+
+    owner = owner or node_id()
+    limit = limit or getattr(settings, 'SCHEDULER_CLAIM_BATCH', 20)
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Una sola consulta por índice (status, next_run_at); con lease = ejecución previa aún viva
+        due = ScheduledTask.objects.filter(status='pending', next_run_at__lte=now, lease_expires_at__isnull=True)
+        if task_ids is not None:
+            due = due.filter(id__in=list(task_ids))
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        else:
+            due = due.select_for_update()
+        ids = list(due.order_by('next_run_at', 'id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+
+        # status='pending' de nuevo: protege a bases sin FOR UPDATE (SQLite)
+        ScheduledTask.objects.filter(id__in=ids, status='pending').update(
+            status='running',
+            execution_started_at=now,
+            claimed_by=owner,
+            lease_expires_at=now + lease_timeout(),
+            updated_at=now,
+        )
+
+    claimed = list(
+        ScheduledTask.objects.filter(id__in=ids, status='running', claimed_by=owner)
+        .order_by('next_run_at', 'id')
+    )
+    if claimed:
+        logger.info(f'[SCHEDULER-LEASE] {owner} claimed {len(claimed)} task(s): {[t.id for t in claimed]}')
+    return drop_missed_runs(claimed)
+
+
+def take_over_lease(task_id, owner=None):
+    """
+    Move the lease of a task to `owner` (the process starting to work on it)
+
+    Returns:
+        bool: False when the lease was already recovered by the leader
+    """
+    from scheduler.models import ScheduledTask
+
+    return ScheduledTask.objects.filter(id=task_id, lease_expires_at__isnull=False).update(
+        claimed_by=owner or node_id(), lease_expires_at=timezone.now() + lease_timeout()
+    ) == 1
+
+
+def hand_off_lease(task_ids):
+    """
+    Extend the leases of tasks queued on Celery to SCHEDULER_HANDOFF_TIMEOUT
+
+    Nobody heartbeats a message waiting in the broker; the worker that picks
+    it up calls take_over_lease().
+    """
+    from scheduler.models import ScheduledTask
+
+    handoff = timedelta(seconds=getattr(settings, 'SCHEDULER_HANDOFF_TIMEOUT', 1800))
+    ScheduledTask.objects.filter(id__in=list(task_ids), lease_expires_at__isnull=False).update(
+        lease_expires_at=timezone.now() + handoff
+    )
+
+
+def return_to_pending(task_id, owner=None):
+    """Undo a claim whose task could not be queued (it will be claimed again)"""
+    from scheduler.models import ScheduledTask
+
+    return ScheduledTask.objects.filter(id=task_id, status='running', claimed_by=owner or node_id()).update(
+        status='pending', execution_started_at=None, claimed_by='', lease_expires_at=None
+    ) == 1
+
+
+def release_lease(task_id):
+    """Drop the lease once the execution reached a final state"""
+    from scheduler.models import ScheduledTask
+
+    from scheduler.engine import notify_task_changed
+
+    ScheduledTask.objects.filter(id=task_id).update(lease_expires_at=None)
+    # Una tarea recurrente puede estar esperando a que termine esta ejecución
+    notify_task_changed(task_id)
+
+
+class LeaseHeartbeat:
+    """
+    Renew a task's lease in a background thread while work is in progress
+
+        with LeaseHeartbeat(task.id):
+            run_the_task()
+
+    With `history_id`, the heartbeat also stops by itself (and releases the
+    lease) as soon as that ScheduledTaskHistory leaves 'running', so
+    fire-and-forget callers do not need to stop it.
+    """
+
+    def __init__(self, task_id, owner=None, history_id=None, interval=None):
+        self.task_id = task_id
+        self.owner = owner or node_id()
+        self.history_id = history_id
+        self.interval = interval or heartbeat_interval()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _still_running(self):
+        from scheduler.models import ScheduledTaskHistory
+
+        if self.history_id is None:
+            return True
+        return ScheduledTaskHistory.objects.filter(id=self.history_id, status='running').exists()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                if not self._still_running():
+                    release_lease(self.task_id)
+                    break
+                if not take_over_lease(self.task_id, self.owner):
+                    logger.warning(f'[SCHEDULER-LEASE] Lost lease of task {self.task_id} ({self.owner})')
+                    break
+        except Exception as e:
+            logger.error(f'[SCHEDULER-LEASE] Heartbeat of task {self.task_id} failed: {e}')
+        finally:
+            # Conexión propia del hilo
+            connection.close()
+
+    def start(self):
+        if not take_over_lease(self.task_id, self.owner):
+            logger.warning(f'[SCHEDULER-LEASE] Task {self.task_id} has no active lease, not heartbeating')
+            return self
+        self._thread = threading.Thread(
+            target=self._run, name=f'lease-heartbeat-{self.task_id}', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def recover_expired_leases():
+    """
+    Fail the tasks whose owner stopped heartbeating (leader only)
+
+    Returns:
+        int: number of tasks recovered
+    """
+    from scheduler.models import ScheduledTask, ScheduledTaskHistory
+
+    now = timezone.now()
+    recovered = 0
+    with transaction.atomic():
+        expired = ScheduledTask.objects.filter(lease_expires_at__lt=now)
+        if connection.features.has_select_for_update_skip_locked:
+            expired = expired.select_for_update(skip_locked=True)
+        for task in expired[:100]:
+            owner = task.claimed_by or 'unknown node'
+            message = f'[SYSTEM] Execution lease lost: {owner} stopped heartbeating (expired {task.lease_expires_at})'
+
+            # Condicional: un heartbeat tardío puede haber renovado el lease
+            if not ScheduledTask.objects.filter(id=task.id, lease_expires_at=task.lease_expires_at).update(lease_expires_at=None):
+                continue
+            if task.status == 'running' and task.is_recurring:
+                # La serie continúa con la siguiente ejecución
+                task.error_message = message
+                task.save(update_fields=['error_message', 'updated_at'])
+                schedule_next_run(task, success=False)
+            else:
+                ScheduledTask.objects.filter(id=task.id, status='running').update(
+                    status='failed', execution_completed_at=now, error_message=message, updated_at=now
+                )
+
+            for history in ScheduledTaskHistory.objects.filter(scheduled_task=task, status='running'):
+                history.status = 'failed'
+                history.error_message = message
+                history.append_output(f'\n\n{message}')
+                history.save()
+            logger.warning(f'[SCHEDULER-LEASE] Recovered task {task.id} ({task.name}) from {owner}')
+            recovered += 1
+    return recovered
+
+
+class LeaderElection:
+    """Single leader among the scheduler nodes (Redis key with TTL)"""
+
+    def __init__(self, owner=None, ttl=None):
+        self.owner = owner or node_id()
+        self.ttl_ms = int((ttl or lease_timeout().total_seconds()) * 1000)
+        self.is_leader = False
+
+    def _client(self):
+        from history.stream import get_redis_client
+        return get_redis_client()
+
+    def refresh(self):
+        """Acquire or renew leadership; returns whether this node leads"""
+        try:
+            client = self._client()
+            if self.is_leader and client.eval(RENEW_SCRIPT, 1, LEADER_KEY, self.owner, self.ttl_ms):
+                return True
+            acquired = bool(client.set(LEADER_KEY, self.owner, nx=True, px=self.ttl_ms))
+            if acquired != self.is_leader:
+                state = 'acquired' if acquired else 'lost'
+                logger.info(f'[SCHEDULER-LEADER] {self.owner} {state} leadership')
+            self.is_leader = acquired
+        except Exception as e:
+            # Sin Redis no hay elección: todos actúan como líder
+            if not self.is_leader:
+                logger.warning(f'[SCHEDULER-LEADER] Redis unavailable, acting as leader: {e}')
+            self.is_leader = True
+        return self.is_leader
+
+    def leader(self):
+        """Owner id of the current leader (None if unknown)"""
+        try:
+            value = self._client().get(LEADER_KEY)
+            return value.decode() if isinstance(value, bytes) else value
+        except Exception:
+            return None
+
+    def release(self):
+        try:
+            if self.is_leader:
+                self._client().eval(RELEASE_SCRIPT, 1, LEADER_KEY, self.owner)
+        except Exception:
+            pass
+        self.is_leader = False
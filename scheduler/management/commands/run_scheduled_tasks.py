@@ -4,7 +4,11 @@ from django.utils import timezone
 from django.contrib.auth.models import User
 from scheduler.models import ScheduledTask, ScheduledTaskHistory
 from inventory.models import Host
-from settings.models import DeploymentCredential, GlobalSetting, WindowsCredential, VCenterCredential
+from settings.models import DeploymentCredential, GlobalSetting, WindowsCredential
+from history.ansible_events import ansible_events_env, new_events_file, read_events, recap_from_events, recap_success, store_events
+from scheduler.leases import LeaseHeartbeat, claim_due_tasks, hand_off_lease, recover_expired_leases, release_lease
+from scheduler.recurrence import schedule_next_run
+from deploy.rolling import task_rolling_options
 import subprocess
 import tempfile
 import json
@@ -28,26 +32,57 @@ class Command(BaseCommand):
             '--interval',
             type=int,
             default=10,
-            help='Interval in seconds between checks in daemon mode (default: 10)'
+            help='Fallback poll interval in seconds when Redis notifications are unavailable (default: 10)'
+        )
+        parser.add_argument(
+            '--inline',
+            action='store_true',
+            help='Execute due tasks in this process instead of dispatching them to Celery'
+        )
+        parser.add_argument(
+            '--resync',
+            type=int,
+            default=None,
+            help='Seconds between full reloads of the pending tasks in daemon mode '
+                 '(default: SCHEDULER_RESYNC_INTERVAL)'
         )
 
     def handle(self, *args, **options):
         daemon_mode = options.get('daemon', False)
         interval = options.get('interval', 10)
+        inline = options.get('inline', False)
         
         if daemon_mode:
-            self.stdout.write(self.style.SUCCESS(f'Starting scheduler in daemon mode (checking every {interval}s)'))
-            import time
-            while True:
-                self.check_and_execute_tasks()
-                time.sleep(interval)
+            from scheduler.engine import SchedulerEngine
+            
+            mode = 'inline' if inline else 'dispatching to Celery'
+            self.stdout.write(self.style.SUCCESS(f'Starting event-driven scheduler ({mode}, fallback poll {interval}s)'))
+            engine = SchedulerEngine(
+                inline=inline,
+                resync_interval=options.get('resync'),
+                poll_interval=interval,
+                stdout=self.stdout,
+            )
+            try:
+                engine.run()
+            except KeyboardInterrupt:
+                engine.stop()
+                self.stdout.write(self.style.WARNING('Scheduler stopped'))
         else:
-            self.check_and_execute_tasks()
+            self.check_and_execute_tasks(inline=inline)
     
-    def check_and_execute_tasks(self):
-        """Check for due tasks and execute them"""
+    def check_and_execute_tasks(self, inline=False):
+        """
+        Check for due tasks once (cron / manual runs)
+        
+        Args:
+            inline: Execute in this process instead of dispatching to Celery
+        """
         now = timezone.now()
         
+        # Fail tasks whose scheduler node / worker died (see scheduler/leases.py)
+        recover_expired_leases()
+        
         # STEP 1: Create snapshots for tasks that need them (1 minute before execution)
         from datetime import timedelta
         snapshot_window = now + timedelta(minutes=1)
@@ -56,59 +91,59 @@ class Command(BaseCommand):
             status='pending',
             create_snapshot=True,
             snapshot_created=False,
-            scheduled_datetime__lte=snapshot_window,
-            scheduled_datetime__gt=now  # Not yet due for execution
+            next_run_at__lte=snapshot_window,
+            next_run_at__gt=now  # Not yet due for execution
         )
         
         for task in tasks_needing_snapshot:
-            self.stdout.write(f'Creating snapshot for task: {task.name} (ID: {task.id}) - Scheduled for {task.scheduled_datetime}')
+            self.stdout.write(f'Creating snapshot for task: {task.name} (ID: {task.id}) - Scheduled for {task.next_run_at}')
             self.create_snapshot_for_task(task)
         
-        # STEP 2: Get all pending tasks that are due for execution
-        due_tasks = ScheduledTask.objects.filter(
-            status='pending',
-            scheduled_datetime__lte=now
-        )
+        # STEP 2: Claim due tasks in batches (SKIP LOCKED: other scheduler nodes take the rest)
+        claimed_total = 0
+        while True:
+            batch = claim_due_tasks()
+            if not batch:
+                break
+            claimed_total += len(batch)
+            self.stdout.write(self.style.SUCCESS(f'[{now}] Claimed {len(batch)} task(s) to execute'))
+            
+            for task in batch:
+                if inline:
+                    self.stdout.write(f'Executing task: {task.name} (ID: {task.id})')
+                    self.execute_task(task)
+                else:
+                    self.stdout.write(f'Dispatching task: {task.name} (ID: {task.id})')
+                    self.dispatch_task(task)
         
-        if not due_tasks.exists():
+        if not claimed_total:
             if not tasks_needing_snapshot.exists():
                 self.stdout.write(self.style.SUCCESS(f'[{now}] No tasks due for execution'))
             return
         
-        self.stdout.write(self.style.SUCCESS(f'[{now}] Found {due_tasks.count()} task(s) to execute'))
-        
-        for task in due_tasks:
-            self.stdout.write(f'Executing task: {task.name} (ID: {task.id})')
-            self.execute_task(task)
-        
         # Cleanup expired snapshots automatically
         self.cleanup_expired_snapshots()
     
     def execute_task(self, task):
-        """Execute a scheduled task"""
-        from django.db import transaction
+        """Execute a claimed task in this process, heartbeating its lease"""
+        with LeaseHeartbeat(task.id):
+            self.run_claimed_task(task)
+    
+    def dispatch_task(self, task):
+        """Queue a claimed task on Celery (falls back to inline)"""
+        from scheduler.tasks import run_scheduled_task
         
+        try:
+            run_scheduled_task.delay(task.id)
+            hand_off_lease([task.id])
+        except Exception as e:
+            logger.warning(f'[SCHEDULER] Celery unavailable ({e}), executing task {task.id} inline')
+            self.execute_task(task)
+    
+    def run_claimed_task(self, task):
+        """Execute a task already claimed (status running, see scheduler/leases.py)"""
         start_time = timezone.now()
-        
-        # Use atomic transaction to prevent race conditions
-        # Multiple cron jobs could try to execute the same task
-        with transaction.atomic():
-            # Lock the task row and re-fetch to get latest status
-            task = ScheduledTask.objects.select_for_update().get(id=task.id)
-            
-            # Check if task is still pending (not already being executed)
-            if task.status != 'pending':
-                logger.warning(f'Task {task.name} (ID: {task.id}) is already {task.status}, skipping execution')
-                return
-            
-            # Update task status to running
-            task.status = 'running'
-            task.execution_started_at = start_time
-            task.save()
-        
-        # Small delay to allow UI to show running state
-        import time
-        time.sleep(2)
+        async_dispatch = False
         
         try:
             if task.task_type == 'host':
@@ -132,6 +167,7 @@ class Command(BaseCommand):
                 task.execution_completed_at = end_time
                 task.scheduled_task_history_id = result.get('history_id')
                 task.save()
+                async_dispatch = True
                 logger.info(f'[SCHEDULED-TASK] Async task dispatched, history_id: {result.get("history_id")}')
                 
                 # Get history for notification (Celery will update it later)
@@ -150,7 +186,7 @@ class Command(BaseCommand):
                 # Create history record
                 history = ScheduledTaskHistory.objects.create(
                     scheduled_task=task,
-                    scheduled_for=task.scheduled_datetime,
+                    scheduled_for=task.next_run_at or task.scheduled_datetime,
                     status='success' if result['success'] else 'failed',
                     task_type=task.task_type,
                     target_name=result['target_name'],
@@ -161,6 +197,8 @@ class Command(BaseCommand):
                     error_message=result.get('error', ''),
                     execution_duration=duration
                 )
+                if result.get('ansible_events'):
+                    store_events(history, result['ansible_events'])
                 
                 # Update task status
                 task.status = 'completed'
@@ -196,7 +234,7 @@ class Command(BaseCommand):
             
             history = ScheduledTaskHistory.objects.create(
                 scheduled_task=task,
-                scheduled_for=task.scheduled_datetime,
+                scheduled_for=task.next_run_at or task.scheduled_datetime,
                 status='failed',
                 task_type=task.task_type,
                 target_name=task.host.name if task.host else (task.group.name if task.group else 'Unknown'),
@@ -223,9 +261,24 @@ class Command(BaseCommand):
                 logger.warning(f'Failed to send notification: {notif_error}')
             
             self.stdout.write(self.style.ERROR(f'✗ Task failed: {task.name} - {str(e)}'))
+        
+        if task.is_recurring:
+            # Same row runs again: back to pending with the next occurrence
+            schedule_next_run(task, success=task.status != 'failed')
+        
+        if async_dispatch:
+            # El playbook sigue en Celery: su LeaseHeartbeat toma el lease
+            hand_off_lease([task.id])
+        else:
+            release_lease(task.id)
     
-    def create_snapshot_for_task(self, task):
-        """Create snapshot(s) for a task 1 minute before execution"""
+    def create_snapshot_for_task(self, task, on_progress=None):
+        """Create snapshot(s) for a task 1 minute before execution
+        
+        Args:
+            task: ScheduledTask
+            on_progress: Optional callable(done, total, result) for group snapshots
+        """
         try:
             if task.task_type == 'host':
                 # Single host snapshot
@@ -243,19 +296,10 @@ class Command(BaseCommand):
                     logger.error(f'[PRE-SNAPSHOT] Failed to create snapshot for task {task.id}: {snapshot_info}')
                     
             elif task.task_type == 'group':
-                # Multiple host snapshots
+                # All group members at once (deploy/vcenter_group_snapshot.py)
                 group = task.group
                 hosts = Host.objects.filter(group=group, active=True)
-                execution_item = task.playbook
-                snapshot_names = []
-                
-                for host in hosts:
-                    snapshot_name, snapshot_info = self.create_host_snapshot(host, execution_item, task)
-                    if snapshot_name:
-                        snapshot_names.append(f"{host.name}: {snapshot_name}")
-                        logger.info(f'[PRE-SNAPSHOT] Created snapshot for {host.name}: {snapshot_name}')
-                    else:
-                        logger.error(f'[PRE-SNAPSHOT] Failed to create snapshot for {host.name}: {snapshot_info}')
+                snapshot_names = self.create_group_snapshots(task, hosts, on_progress=on_progress)
                 
                 if snapshot_names:
                     task.snapshot_created = True
@@ -345,7 +389,7 @@ class Command(BaseCommand):
         # Create ScheduledTaskHistory record (NOT DeploymentHistory)
         scheduled_history = ScheduledTaskHistory.objects.create(
             scheduled_task=task,
-            scheduled_for=task.scheduled_datetime,
+            scheduled_for=task.next_run_at or task.scheduled_datetime,
             status='running',
             task_type='host',
             target_name=host.name,
@@ -541,12 +585,18 @@ ansible_winrm_operation_timeout_sec=50
                 playbook_path,
             ]
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600  # 10 minutes timeout
-            )
+            events_path = new_events_file()
+            try:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=600,  # 10 minutes timeout
+                    env=ansible_events_env(os.environ, events_path)
+                )
+                events = read_events(events_path)
+            finally:
+                os.remove(events_path)
             
             # Format output
             full_output = f"Script: {script.name}\n"
@@ -558,15 +608,16 @@ ansible_winrm_operation_timeout_sec=50
                 full_output += "\nSTDERR:\n" + result.stderr + "\n"
             full_output += "\n" + "="*60 + "\n"
             
-            # Check for success in Ansible output
-            is_success = self.check_ansible_success(full_output, result.returncode)
+            # Check for success in the recorded PLAY RECAP
+            is_success = self.check_ansible_success(full_output, result.returncode, recap_from_events(events))
             
             return {
                 'success': is_success,
                 'output': full_output,
                 'target_name': host.name,
                 'target_ip': host.ip,
-                'error': '' if is_success else f'Script execution failed'
+                'error': '' if is_success else f'Script execution failed',
+                'ansible_events': events
             }
             
         except subprocess.TimeoutExpired:
@@ -609,7 +660,7 @@ ansible_winrm_operation_timeout_sec=50
         # Create ScheduledTaskHistory record (NOT DeploymentHistory)
         scheduled_history = ScheduledTaskHistory.objects.create(
             scheduled_task=task,
-            scheduled_for=task.scheduled_datetime,
+            scheduled_for=task.next_run_at or task.scheduled_datetime,
             status='running',
             task_type='host',
             target_name=host.name,
@@ -663,11 +714,7 @@ ansible_winrm_operation_timeout_sec=50
         elif task.create_snapshot and not task.snapshot_created:
             # Shouldn't happen with new logic, but create them now as fallback
             logger.warning(f'Snapshots were requested but not created beforehand for task {task.id}. Creating now...')
-            for host in hosts:
-                snapshot_name, snapshot_info = self.create_host_snapshot(host, playbook, task)
-                if snapshot_name:
-                    snapshot_names.append(f"{host.name}: {snapshot_name}")
-                logger.info(snapshot_info)
+            snapshot_names = self.create_group_snapshots(task, hosts)
         
         # Get SSH credentials
         ssh_cred = DeploymentCredential.objects.first()
@@ -676,6 +723,7 @@ ansible_winrm_operation_timeout_sec=50
         
         # Create inventory
         inventory_lines = ['[target_group]']
+        host_lines = {}
         
         for host in hosts:
             inventory_vars = [
@@ -688,7 +736,8 @@ ansible_winrm_operation_timeout_sec=50
             if host.ansible_python_interpreter:
                 inventory_vars.append(f"ansible_python_interpreter={host.ansible_python_interpreter}")
             
-            inventory_lines.append(f"{host.name} {' '.join(inventory_vars)}")
+            host_lines[str(host.id)] = f"{host.name} {' '.join(inventory_vars)}"
+            inventory_lines.append(host_lines[str(host.id)])
         
         # Add group variables
         inventory_lines.append('')
@@ -718,6 +767,10 @@ ansible_winrm_operation_timeout_sec=50
         
         extra_vars_json = json.dumps(extra_vars)
         
+        rolling = task_rolling_options(task)
+        if rolling:
+            return self.start_group_rollout(task, hosts, rolling, host_lines, inventory_lines, inventory_path, extra_vars_json)
+        
         # Execute playbook
         cmd = [
             settings.ANSIBLE_PLAYBOOK_PATH,
@@ -727,7 +780,13 @@ ansible_winrm_operation_timeout_sec=50
             '-v'
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        events_path = new_events_file()
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600,
+                                    env=ansible_events_env(os.environ, events_path))
+            events = read_events(events_path)
+        finally:
+            os.remove(events_path)
         
         # Clean up
         try:
@@ -737,7 +796,7 @@ ansible_winrm_operation_timeout_sec=50
         
         # Determine success
         full_output = result.stdout + '\n' + result.stderr
-        is_success = self.check_ansible_success(full_output, result.returncode)
+        is_success = self.check_ansible_success(full_output, result.returncode, recap_from_events(events))
         
         # Get IPs for history
         host_ips = ', '.join([h.ip for h in hosts[:3]])
@@ -750,11 +809,59 @@ ansible_winrm_operation_timeout_sec=50
             'target_name': f'{group.name} ({hosts.count()} hosts)',
             'target_ip': host_ips,
             'error': '' if is_success else 'Playbook execution failed',
-            'snapshot_names': ', '.join(snapshot_names) if snapshot_names else None
+            'snapshot_names': ', '.join(snapshot_names) if snapshot_names else None,
+            'ansible_events': events
+        }
+    
+    def start_group_rollout(self, task, hosts, rolling, host_lines, inventory_lines, inventory_path, extra_vars_json):
+        """Run a group task in batches via Celery (deploy/rolling.py)"""
+        from deploy.rolling import start_rollout
+        
+        os.remove(inventory_path)
+        host_ips = ', '.join([h.ip for h in hosts[:3]]) + ('...' if hosts.count() > 3 else '')
+        scheduled_history = ScheduledTaskHistory.objects.create(
+            scheduled_task=task,
+            scheduled_for=task.next_run_at or task.scheduled_datetime,
+            status='running',
+            task_type='group',
+            target_name=f'{task.group.name} ({hosts.count()} hosts)',
+            target_ip=host_ips,
+            playbook_name=task.playbook.name,
+            environment_name=task.environment.name if task.environment else 'N/A'
+        )
+        try:
+            batch_count = start_rollout(scheduled_history, list(hosts.order_by('name')), rolling, {
+                'group': 'target_group',
+                'hosts': host_lines,
+                'group_vars': inventory_lines[inventory_lines.index('[target_group:vars]') + 1:],
+                'playbook': task.playbook.file.path,
+                'args': ['--extra-vars', extra_vars_json, '-v'],
+                'os_type': 'linux',
+                'target': {'type': 'group', 'name': task.group.name},
+            })
+        except Exception:
+            # El historial fallido lo crea run_claimed_task
+            scheduled_history.delete()
+            raise
+        
+        logger.info(f'[SCHEDULED-TASK] Rolling execution of task {task.id}: {batch_count} batches, scheduled_history_id={scheduled_history.id}')
+        return {
+            'success': True,
+            'target_name': scheduled_history.target_name,
+            'target_ip': host_ips,
+            'output': f'Rolling execution dispatched to Celery ({batch_count} batches)',
+            'async': True,
+            'history_id': scheduled_history.id
         }
     
-    def check_ansible_success(self, output, returncode):
-        """Check if Ansible playbook succeeded"""
+    def check_ansible_success(self, output, returncode, recap=None):
+        """Check if Ansible playbook succeeded
+        
+        Uses the per-host recap recorded by the diaken_events callback when
+        available; falls back to scanning the PLAY RECAP text otherwise.
+        """
+        if recap:
+            return recap_success(recap)
         if 'PLAY RECAP' in output:
             import re
             failed_match = re.findall(r'failed=(\d+)', output)
@@ -767,6 +874,35 @@ ansible_winrm_operation_timeout_sec=50
         else:
             return (returncode == 0)
     
+    def create_group_snapshots(self, task, hosts, on_progress=None):
+        """Snapshot all hosts of a group task concurrently and save them to SnapshotHistory
+        
+        Returns:
+            list of "host: snapshot name" for the snapshots created
+        """
+        from deploy.vcenter_group_snapshot import snapshot_hosts
+        
+        execution_item = task.playbook if task.execution_type == 'playbook' else task.script
+        execution_name = execution_item.name if execution_item else 'Unknown'
+        results = snapshot_hosts(
+            hosts, execution_name,
+            f"Safety snapshot before {execution_name} on group {task.group.name} (scheduled task)",
+            on_progress=on_progress,
+            group=task.group,
+            playbook=task.playbook,
+            script_name=task.script.name if task.script else None,
+            user=task.created_by
+        )
+        
+        snapshot_names = []
+        for result in results:
+            if result.success:
+                snapshot_names.append(f"{result.host.name}: {result.snapshot_name}")
+                logger.info(f'[PRE-SNAPSHOT] Created snapshot for {result.host.name}: {result.snapshot_name}')
+            else:
+                logger.error(f'[PRE-SNAPSHOT] Failed to create snapshot for {result.host.name}: {result.message}')
+        return snapshot_names
+    
     def create_host_snapshot(self, host, execution_item, task=None):
         """Create snapshot for a host before playbook/script execution and save to SnapshotHistory
         
@@ -775,7 +911,7 @@ ansible_winrm_operation_timeout_sec=50
             execution_item: Playbook or Script object
             task: ScheduledTask object (optional, for getting user info)
         """
-        from deploy.vcenter_snapshot import get_vcenter_connection, create_snapshot, Disconnect
+        from deploy.vcenter_snapshot import get_vcenter_connection, create_snapshot, release_vcenter_connection
         from settings.models import VCenterCredential
         from snapshots.models import SnapshotHistory
         
@@ -833,7 +969,7 @@ ansible_winrm_operation_timeout_sec=50
                 else:
                     logger.error(f'[SCHEDULED-SNAPSHOT] ✗ First attempt failed but not a "not found" error: {message}')
             
-            Disconnect(si)
+            release_vcenter_connection(si)
             
             if success:
                 # Get retention hours from settings
@@ -868,66 +1004,12 @@ ansible_winrm_operation_timeout_sec=50
             return None, f"Exception creating snapshot: {str(e)}"
     
     def cleanup_expired_snapshots(self):
-        """Cleanup expired snapshots from database and vCenter"""
-        from snapshots.models import SnapshotHistory
-        from deploy.vcenter_snapshot import get_vcenter_connection, delete_snapshot, Disconnect
+        """Cleanup expired snapshots from database and vCenter (deploy/vcenter_snapshot_reaper.py)"""
+        from deploy.vcenter_snapshot_reaper import ReapReport, reap_expired_snapshots
         
-        now = timezone.now()
-        expired_snapshots = SnapshotHistory.objects.filter(
-            status='active',
-            expires_at__lte=now
-        )
-        
-        count = expired_snapshots.count()
-        if count == 0:
+        results = reap_expired_snapshots()
+        if not results:
             return
         
-        logger.info(f'[SNAPSHOT-CLEANUP] Found {count} expired snapshots to cleanup')
-        
-        deleted_count = 0
-        vcenter_deleted_count = 0
-        
-        for snapshot in expired_snapshots:
-            try:
-                # Try to delete from vCenter first
-                if snapshot.host.vcenter_server:
-                    try:
-                        vcenter_cred = VCenterCredential.objects.filter(
-                            host=snapshot.host.vcenter_server
-                        ).first()
-                        
-                        if vcenter_cred:
-                            si = get_vcenter_connection(
-                                snapshot.host.vcenter_server,
-                                vcenter_cred.user,
-                                vcenter_cred.get_password()  # Use decrypted password
-                            )
-                            
-                            success = delete_snapshot(
-                                si,
-                                snapshot.host.ip,
-                                snapshot.snapshot_name
-                            )
-                            
-                            Disconnect(si)
-                            
-                            if success:
-                                vcenter_deleted_count += 1
-                                logger.info(f'[SNAPSHOT-CLEANUP] Deleted from vCenter: {snapshot.snapshot_name}')
-                            else:
-                                logger.warning(f'[SNAPSHOT-CLEANUP] Could not delete from vCenter: {snapshot.snapshot_name}')
-                    except Exception as e:
-                        logger.error(f'[SNAPSHOT-CLEANUP] Error deleting from vCenter: {snapshot.snapshot_name} - {e}')
-                
-                # Mark as deleted in database
-                snapshot.status = 'deleted'
-                snapshot.deleted_at = now
-                snapshot.save()
-                deleted_count += 1
-                logger.info(f'[SNAPSHOT-CLEANUP] Marked as deleted in DB: {snapshot.snapshot_name} ({snapshot.host.name})')
-                
-            except Exception as e:
-                logger.error(f'[SNAPSHOT-CLEANUP] Error deleting snapshot {snapshot.snapshot_name}: {e}')
-        
-        logger.info(f'[SNAPSHOT-CLEANUP] Successfully marked {deleted_count}/{count} snapshots as deleted in DB')
-        logger.info(f'[SNAPSHOT-CLEANUP] Successfully deleted {vcenter_deleted_count}/{count} snapshots from vCenter')
+        report = ReapReport(results)
+        logger.info(f'[SNAPSHOT-CLEANUP] Cleaned up {len(results)} expired snapshots:\n{report.summary()}')
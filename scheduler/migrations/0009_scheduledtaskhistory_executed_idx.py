@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0008_scheduledtask_snapshot_created_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scheduledtaskhistory',
+            index=models.Index(fields=['executed_at'], name='sched_hist_executed_idx'),
+        ),
+    ]
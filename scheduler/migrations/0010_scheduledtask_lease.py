@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0009_scheduledtaskhistory_executed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', help_text='Node holding the execution lease', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text='Lease is lost if not renewed before this time', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledtask',
+            index=models.Index(fields=['lease_expires_at'], name='sched_task_lease_idx'),
+        ),
+    ]
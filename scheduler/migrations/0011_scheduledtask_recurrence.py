@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:28
+
+from django.db import migrations, models
+
+
+def fill_next_run_at(apps, schema_editor):
+    """Existing tasks are one-off: next_run_at = scheduled_datetime"""
+    ScheduledTask = apps.get_model('scheduler', 'ScheduledTask')
+    ScheduledTask.objects.update(next_run_at=models.F('scheduled_datetime'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_scheduledtask_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='catchup_policy',
+            field=models.CharField(choices=[('skip', 'Skip missed runs'), ('once', 'Run once for all missed runs'), ('all', 'Run every missed run')], default='once', help_text='What to do with runs missed while the scheduler was down', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='cron_expression',
+            field=models.CharField(blank=True, default='', help_text='Cron expression (minute hour day month weekday) for recurring tasks', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='cron_timezone',
+            field=models.CharField(blank=True, default='', help_text='Timezone the cron expression is evaluated in (default: TIME_ZONE)', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='last_run_at',
+            field=models.DateTimeField(blank=True, help_text='Occurrence of the last run', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='max_runs',
+            field=models.PositiveIntegerField(blank=True, help_text='Stop after this many runs', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, help_text='Next due time (the only column the scheduler queries)', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='recurrence_end',
+            field=models.DateTimeField(blank=True, help_text='No runs after this time', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='run_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='scheduledtask',
+            name='scheduled_datetime',
+            field=models.DateTimeField(help_text='When to execute this task (first run for recurring tasks)'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledtask',
+            index=models.Index(fields=['status', 'next_run_at'], name='sched_task_due_idx'),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0011_scheduledtask_recurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='rolling_batch_size',
+            field=models.CharField(blank=True, default='', help_text='Hosts per batch: a number or a percentage of the group (e.g. 5 or 20%)', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='rolling_forks',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Parallel hosts within a batch (ansible --forks)', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='rolling_max_fail_percentage',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Stop the rollout when more than this % of the hosts failed'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0012_scheduledtask_rolling'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scheduledtask',
+            name='rolling_max_fail_percentage',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Stop the rollout when more than this % of the hosts of a batch failed'),
+        ),
+    ]
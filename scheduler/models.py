@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from inventory.models import Environment, Group, Host
 from playbooks.models import Playbook
+from history.models import ChunkedOutputMixin
 
 class ScheduledTask(models.Model):
     STATUS_CHOICES = [
@@ -43,14 +44,39 @@ class ScheduledTask(models.Model):
     snapshot_created = models.BooleanField(default=False, help_text='Whether snapshot has been created (for scheduled tasks)')
     snapshot_name = models.CharField(max_length=500, null=True, blank=True, help_text='Name of the created snapshot')
     
+    # Rolling execution of group tasks (deploy/rolling.py); empty batch size = whole group at once
+    rolling_batch_size = models.CharField(max_length=10, blank=True, default='', help_text='Hosts per batch: a number or a percentage of the group (e.g. 5 or 20%)')
+    rolling_max_fail_percentage = models.PositiveSmallIntegerField(default=0, help_text='Stop the rollout when more than this % of the hosts of a batch failed')
+    rolling_forks = models.PositiveSmallIntegerField(null=True, blank=True, help_text='Parallel hosts within a batch (ansible --forks)')
+    
+    CATCHUP_CHOICES = [
+        ('skip', 'Skip missed runs'),
+        ('once', 'Run once for all missed runs'),
+        ('all', 'Run every missed run'),
+    ]
+    
     # Scheduling information
-    scheduled_datetime = models.DateTimeField(help_text='When to execute this task')
+    scheduled_datetime = models.DateTimeField(help_text='When to execute this task (first run for recurring tasks)')
+    
+    # Recurrence (scheduler/recurrence.py); empty cron_expression = run once
+    cron_expression = models.CharField(max_length=100, blank=True, default='', help_text='Cron expression (minute hour day month weekday) for recurring tasks')
+    cron_timezone = models.CharField(max_length=64, blank=True, default='', help_text='Timezone the cron expression is evaluated in (default: TIME_ZONE)')
+    recurrence_end = models.DateTimeField(null=True, blank=True, help_text='No runs after this time')
+    max_runs = models.PositiveIntegerField(null=True, blank=True, help_text='Stop after this many runs')
+    run_count = models.PositiveIntegerField(default=0)
+    last_run_at = models.DateTimeField(null=True, blank=True, help_text='Occurrence of the last run')
+    catchup_policy = models.CharField(max_length=10, choices=CATCHUP_CHOICES, default='once', help_text='What to do with runs missed while the scheduler was down')
+    next_run_at = models.DateTimeField(null=True, blank=True, help_text='Next due time (the only column the scheduler queries)')
     
     # Status and execution
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     execution_started_at = models.DateTimeField(null=True, blank=True)
     execution_completed_at = models.DateTimeField(null=True, blank=True)
     
+    # Lease of the scheduler node / worker executing the task (scheduler/leases.py)
+    claimed_by = models.CharField(max_length=200, blank=True, default='', help_text='Node holding the execution lease')
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text='Lease is lost if not renewed before this time')
+    
     # Results
     deployment_history_id = models.IntegerField(null=True, blank=True, help_text='ID of DeploymentHistory record (deprecated, use scheduled_task_history_id)')
     scheduled_task_history_id = models.IntegerField(null=True, blank=True, help_text='ID of ScheduledTaskHistory record')
@@ -65,12 +91,37 @@ class ScheduledTask(models.Model):
         indexes = [
             models.Index(fields=['status', 'scheduled_datetime']),
             models.Index(fields=['task_type']),
+            models.Index(fields=['lease_expires_at'], name='sched_task_lease_idx'),
+            models.Index(fields=['status', 'next_run_at'], name='sched_task_due_idx'),
         ]
     
     def __str__(self):
         target = self.host.name if self.host else (self.group.name if self.group else 'Unknown')
         return f"{self.name} - {target} - {self.scheduled_datetime}"
     
+    @property
+    def is_recurring(self):
+        return bool(self.cron_expression)
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .recurrence import validate_recurrence
+        
+        try:
+            validate_recurrence(self.cron_expression, self.cron_timezone)
+        except ValueError as e:
+            raise ValidationError({'cron_expression': str(e)})
+    
+    def save(self, *args, **kwargs):
+        # Keep next_run_at (the scheduler's due column) in sync for pending tasks
+        if self.status == 'pending' and (not self.is_recurring or self.next_run_at is None):
+            from .recurrence import first_run
+            self.next_run_at = first_run(self)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'next_run_at' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['next_run_at']
+        super().save(*args, **kwargs)
+    
     def get_target_display(self):
         """Return human-readable target"""
         if self.task_type == 'host' and self.host:
@@ -80,13 +131,15 @@ class ScheduledTask(models.Model):
         return "Unknown"
 
 
-class ScheduledTaskHistory(models.Model):
+class ScheduledTaskHistory(ChunkedOutputMixin, models.Model):
     """History of scheduled task executions"""
     STATUS_CHOICES = [
         ('success', 'Success'),
         ('failed', 'Failed'),
     ]
     
+    output_chunk_field = 'scheduled_history'
+    
     # Link to scheduled task
     scheduled_task = models.ForeignKey(ScheduledTask, on_delete=models.CASCADE, related_name='executions')
     
@@ -113,6 +166,9 @@ class ScheduledTaskHistory(models.Model):
         ordering = ['-executed_at']
         verbose_name = 'Scheduled Task History'
         verbose_name_plural = 'Scheduled Task Histories'
+        indexes = [
+            models.Index(fields=['executed_at'], name='sched_hist_executed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.scheduled_task.name} - {self.target_name} - {self.executed_at}"
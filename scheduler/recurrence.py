@@ -0,0 +1,178 @@
+"""
+Recurring scheduled tasks.
+
+A ScheduledTask with a cron_expression is a series: the same row runs again
+and again instead of being re-created for every run. The scheduler only
+looks at the indexed next_run_at column (status='pending', next_run_at <=
+now), so the cost of a tick does not depend on how many series exist. For
+one-off tasks next_run_at is simply scheduled_datetime.
+
+After each run schedule_next_run() advances next_run_at, honouring
+recurrence_end and max_runs, and applies the catch-up policy for runs
+missed while no scheduler was up:
+
+    skip  runs later than SCHEDULER_MISFIRE_GRACE are not executed
+    once  one run for any number of missed runs, then the next future one
+    all   every missed run is executed, one after another
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cron import CronExpression, get_zone
+
+logger = logging.getLogger(__name__)
+
+
+def validate_recurrence(cron_expression, cron_timezone=''):
+    """Raise ValueError when the expression or the timezone is invalid"""
+    if cron_expression:
+        CronExpression(cron_expression)
+    if cron_timezone:
+        get_zone(cron_timezone)
+
+
+def task_zone(task):
+    return get_zone(task.cron_timezone or settings.TIME_ZONE)
+
+
+def misfire_grace():
+    return timedelta(seconds=getattr(settings, 'SCHEDULER_MISFIRE_GRACE', 120))
+
+
+def _within_limits(task, when):
+    if when is None:
+        return None
+    if task.recurrence_end and when > task.recurrence_end:
+        return None
+    if task.max_runs is not None and task.run_count >= task.max_runs:
+        return None
+    return when
+
+
+def first_run(task):
+    """Due time of the first run: scheduled_datetime, or the first cron match at/after it"""
+    if not task.is_recurring:
+        return task.scheduled_datetime
+    start = task.scheduled_datetime or timezone.now()
+    try:
+        expression = CronExpression(task.cron_expression)
+        when = expression.next_after(start - timedelta(seconds=1), task_zone(task))
+    except ValueError as e:
+        logger.error(f'[SCHEDULER-RECURRENCE] Task {task.id}: {e}')
+        return None
+    return _within_limits(task, when)
+
+
+def next_run(task, after):
+    """Next cron match strictly after `after` (None when the series is over)"""
+    try:
+        when = CronExpression(task.cron_expression).next_after(after, task_zone(task))
+    except ValueError as e:
+        logger.error(f'[SCHEDULER-RECURRENCE] Task {task.id}: {e}')
+        return None
+    return _within_limits(task, when)
+
+
+def schedule_next_run(task, ran=True, success=True):
+    """
+    Move a recurring task to its next occurrence and save it
+
+    Args:
+        task: ScheduledTask whose occurrence `task.next_run_at` just ran
+            (or was skipped)
+        ran: False when the occurrence was skipped by the catch-up policy
+        success: Result of the run, used as final status when the series ends
+
+    Returns:
+        datetime of the next run, or None when the series finished
+    """
+    now = timezone.now()
+    occurrence = task.next_run_at or now
+    if ran:
+        task.run_count += 1
+        task.last_run_at = occurrence
+
+    if task.catchup_policy == 'all':
+        upcoming = next_run(task, occurrence)
+    else:
+        upcoming = next_run(task, max(occurrence, now))
+
+    task.next_run_at = upcoming
+    task.claimed_by = ''
+    if upcoming is None:
+        if task.status in ('pending', 'running'):
+            task.status = 'completed' if success else 'failed'
+        task.execution_completed_at = task.execution_completed_at or now
+    else:
+        task.status = 'pending'
+        # Cada ejecución toma su propio snapshot
+        task.snapshot_created = False
+        task.snapshot_name = None
+
+    task.save(update_fields=[
+        'run_count', 'last_run_at', 'next_run_at', 'status', 'claimed_by',
+        'snapshot_created', 'snapshot_name', 'execution_completed_at', 'updated_at',
+    ])
+    if upcoming is None:
+        logger.info(f'[SCHEDULER-RECURRENCE] Task {task.id} ({task.name}) finished after {task.run_count} run(s)')
+    else:
+        logger.info(f'[SCHEDULER-RECURRENCE] Task {task.id} ({task.name}) next run at {upcoming}')
+    return upcoming
+
+
+def drop_missed_runs(tasks):
+    """
+    Apply the 'skip' policy to freshly claimed tasks
+
+    Returns:
+        the tasks that should run now (skipped ones are rescheduled)
+    """
+    late = timezone.now() - misfire_grace()
+    runnable = []
+    for task in tasks:
+        if task.is_recurring and task.catchup_policy == 'skip' and task.next_run_at < late:
+            logger.info(f'[SCHEDULER-RECURRENCE] Task {task.id} missed its run at {task.next_run_at}, skipping')
+            task.lease_expires_at = None
+            task.save(update_fields=['lease_expires_at'])
+            schedule_next_run(task, ran=False)
+            continue
+        runnable.append(task)
+    return runnable
+
+
+def recurrence_fields(data):
+    """
+    Recurrence fields for ScheduledTask.objects.create() from a form POST
+
+    Reads `cron_expression`, `cron_timezone`, `recurrence_end`
+    (YYYY-MM-DDTHH:MM), `max_runs` and `catchup_policy`.
+
+    Returns:
+        dict (empty for one-off tasks); raises ValueError on invalid input
+    """
+    cron_expression = (data.get('cron_expression') or '').strip()
+    if not cron_expression:
+        return {}
+
+    cron_timezone = (data.get('cron_timezone') or '').strip()
+    validate_recurrence(cron_expression, cron_timezone)
+
+    fields = {'cron_expression': cron_expression, 'cron_timezone': cron_timezone}
+
+    policy = data.get('catchup_policy') or 'once'
+    if policy not in ('skip', 'once', 'all'):
+        raise ValueError(f'Invalid catch-up policy: {policy}')
+    fields['catchup_policy'] = policy
+
+    if data.get('recurrence_end'):
+        from datetime import datetime
+        fields['recurrence_end'] = timezone.make_aware(datetime.strptime(data['recurrence_end'], '%Y-%m-%dT%H:%M'))
+    if data.get('max_runs'):
+        max_runs = int(data['max_runs'])
+        if max_runs < 1:
+            raise ValueError('Max runs must be at least 1')
+        fields['max_runs'] = max_runs
+    return fields
@@ -0,0 +1,26 @@
+"""
+Signals for ScheduledTask: wake up the scheduler engine when a task is
+created, rescheduled or cancelled, instead of waiting for its next resync.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ScheduledTask
+
+
+@receiver(post_save, sender=ScheduledTask)
+def scheduled_task_saved(sender, instance, **kwargs):
+    """Notify the engine once the change is committed"""
+    from scheduler.engine import notify_task_changed
+
+    task_id = instance.id
+    transaction.on_commit(lambda: notify_task_changed(task_id))
+
+
+@receiver(post_delete, sender=ScheduledTask)
+def scheduled_task_deleted(sender, instance, **kwargs):
+    from scheduler.engine import notify_task_changed
+
+    task_id = instance.id
+    transaction.on_commit(lambda: notify_task_changed(task_id))
@@ -0,0 +1,77 @@
+"""
+Celery tasks for the scheduler.
+Due ScheduledTasks are claimed by the scheduler engine (scheduler/engine.py)
+and executed here, so several due tasks run in parallel on the workers.
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='scheduler.run_scheduled_task')
+def run_scheduled_task(task_id):
+    """
+    Execute a ScheduledTask already claimed (status 'running') by a scheduler
+    node; the worker takes over the task's lease and heartbeats it
+
+    Args:
+        task_id: ScheduledTask id
+    """
+    from scheduler.models import ScheduledTask
+    from scheduler.management.commands.run_scheduled_tasks import Command
+
+    # Sin lease: el líder ya la dio por perdida (recover_expired_leases)
+    task = ScheduledTask.objects.filter(id=task_id, status='running', lease_expires_at__isnull=False).first()
+    if task is None:
+        logger.warning(f'[CELERY-SCHEDULER] Task {task_id} is not claimed (running with a lease), skipping')
+        return {'status': 'skipped', 'task_id': task_id}
+
+    logger.info(f'[CELERY-SCHEDULER] Executing scheduled task {task.name} (ID: {task_id})')
+    Command().execute_task(task)
+    task.refresh_from_db(fields=['status'])
+    return {'status': task.status, 'task_id': task_id}
+
+
+@shared_task(bind=True, name='scheduler.create_task_snapshot')
+def create_task_snapshot(self, task_id):
+    """
+    Create the pre-execution snapshot(s) of a pending ScheduledTask
+
+    Group snapshots report PROGRESS (hosts done / total) while the VMs are
+    snapshotted concurrently (deploy/vcenter_group_snapshot.py).
+    """
+    from scheduler.models import ScheduledTask
+    from scheduler.management.commands.run_scheduled_tasks import Command
+
+    task = ScheduledTask.objects.filter(
+        id=task_id, status='pending', create_snapshot=True, snapshot_created=False
+    ).first()
+    if task is None:
+        return {'status': 'skipped', 'task_id': task_id}
+
+    def on_progress(done, total, result):
+        state = 'created' if result.success else f'failed ({result.message})'
+        self.update_state(
+            state='PROGRESS',
+            meta={
+                'current_step': done,
+                'total_steps': total,
+                'percent': int((done / total) * 100) if total else 100,
+                'message': f'Snapshot of {result.host.name} {state}',
+                'status': 'running',
+                'task_id': task_id,
+            }
+        )
+
+    logger.info(f'[CELERY-SCHEDULER] Creating pre-execution snapshot for task {task.name} (ID: {task_id})')
+    Command().create_snapshot_for_task(task, on_progress=on_progress)
+    return {'status': 'done', 'task_id': task_id}
+
+
+@shared_task(name='scheduler.cleanup_expired_snapshots')
+def cleanup_expired_snapshots():
+    """Delete expired snapshots from vCenter and mark them in the database"""
+    from scheduler.management.commands.run_scheduled_tasks import Command
+
+    Command().cleanup_expired_snapshots()
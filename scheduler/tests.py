@@ -0,0 +1,278 @@
+from datetime import date, datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .cron import UTC, CronExpression
+from .leases import (
+    LEADER_KEY, LeaderElection, claim_due_tasks, hand_off_lease, recover_expired_leases, take_over_lease,
+)
+from .models import ScheduledTask, ScheduledTaskHistory
+from .recurrence import drop_missed_runs, schedule_next_run
+
+
+def make_task(name, due, **fields):
+    return ScheduledTask.objects.create(task_type='host', name=name, scheduled_datetime=due, **fields)
+
+
+class FakeLeaderRedis:
+    """Just enough of Redis for LeaderElection (SET NX PX, GET and its two scripts)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def eval(self, script, numkeys, key, owner, *args):
+        if self.data.get(key) != owner:
+            return 0
+        if 'DEL' in script:
+            del self.data[key]
+        return 1
+
+
+@mock.patch('history.stream.publish_output')
+@override_settings(SCHEDULER_LEASE_TIMEOUT=120, SCHEDULER_HANDOFF_TIMEOUT=1800)
+class ExecutionLeaseTests(TestCase):
+    """Leases of due tasks shared by several scheduler nodes"""
+
+    def setUp(self):
+        now = timezone.now()
+        self.older = make_task('older', now - timedelta(minutes=10))
+        self.newer = make_task('newer', now - timedelta(minutes=5))
+        self.future = make_task('future', now + timedelta(hours=1))
+
+    def test_nodes_claim_disjoint_tasks_oldest_first(self, publish_output):
+        first = claim_due_tasks(owner='node-a', limit=1)
+        second = claim_due_tasks(owner='node-b')
+
+        self.assertEqual([task.id for task in first], [self.older.id])
+        self.assertEqual([task.id for task in second], [self.newer.id])
+        self.assertEqual(claim_due_tasks(owner='node-c'), [])
+
+        self.older.refresh_from_db()
+        self.assertEqual(self.older.status, 'running')
+        self.assertEqual(self.older.claimed_by, 'node-a')
+        self.assertGreater(self.older.lease_expires_at, timezone.now() + timedelta(seconds=100))
+        self.future.refresh_from_db()
+        self.assertEqual(self.future.status, 'pending')
+
+    def test_task_with_live_lease_is_not_claimed_again(self, publish_output):
+        ScheduledTask.objects.filter(id=self.older.id).update(lease_expires_at=timezone.now() + timedelta(minutes=2))
+
+        claimed = claim_due_tasks(owner='node-a')
+
+        self.assertEqual([task.id for task in claimed], [self.newer.id])
+
+    def test_hand_off_and_take_over_between_nodes(self, publish_output):
+        claim_due_tasks(owner='node-a', task_ids=[self.older.id])
+
+        hand_off_lease([self.older.id])
+        self.older.refresh_from_db()
+        self.assertGreater(self.older.lease_expires_at, timezone.now() + timedelta(minutes=29))
+        self.assertEqual(self.older.claimed_by, 'node-a')
+
+        self.assertTrue(take_over_lease(self.older.id, owner='worker-1'))
+        self.older.refresh_from_db()
+        self.assertEqual(self.older.claimed_by, 'worker-1')
+        self.assertLess(self.older.lease_expires_at, timezone.now() + timedelta(minutes=3))
+
+        # Sin lease (tarea no reclamada) no hay nada que tomar
+        self.assertFalse(take_over_lease(self.newer.id, owner='worker-1'))
+
+    def test_recover_fails_expired_task_and_its_history(self, publish_output):
+        claim_due_tasks(owner='node-a', task_ids=[self.older.id, self.newer.id])
+        history = ScheduledTaskHistory.objects.create(
+            scheduled_task=self.older, status='running', task_type='host', target_name='web01', playbook_name='site.yml'
+        )
+        ScheduledTask.objects.filter(id=self.older.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(recover_expired_leases(), 1)
+        self.assertEqual(recover_expired_leases(), 0)
+
+        self.older.refresh_from_db()
+        self.assertEqual(self.older.status, 'failed')
+        self.assertIsNone(self.older.lease_expires_at)
+        self.assertIn('node-a stopped heartbeating', self.older.error_message)
+        history.refresh_from_db()
+        self.assertEqual(history.status, 'failed')
+        self.assertIn('Execution lease lost', history.get_output())
+        # El lease vigente no se toca
+        self.newer.refresh_from_db()
+        self.assertEqual(self.newer.status, 'running')
+        self.assertIsNotNone(self.newer.lease_expires_at)
+
+    def test_recover_moves_recurring_series_to_next_run(self, publish_output):
+        recurring = make_task('hourly', timezone.now() - timedelta(minutes=30), cron_expression='0 * * * *', cron_timezone='UTC')
+        ScheduledTask.objects.filter(id=recurring.id).update(next_run_at=timezone.now() - timedelta(minutes=30))
+        claim_due_tasks(owner='node-a', task_ids=[recurring.id])
+        ScheduledTask.objects.filter(id=recurring.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(recover_expired_leases(), 1)
+
+        recurring.refresh_from_db()
+        self.assertEqual(recurring.status, 'pending')
+        self.assertEqual(recurring.run_count, 1)
+        self.assertGreater(recurring.next_run_at, timezone.now())
+        self.assertIsNone(recurring.lease_expires_at)
+
+
+class LeaderElectionTests(TestCase):
+    """Only one scheduler node leads; leadership moves when released"""
+
+    def test_single_leader_and_hand_over(self):
+        redis = FakeLeaderRedis()
+        with mock.patch.object(LeaderElection, '_client', return_value=redis):
+            node_a = LeaderElection(owner='node-a')
+            node_b = LeaderElection(owner='node-b')
+
+            self.assertTrue(node_a.refresh())
+            self.assertFalse(node_b.refresh())
+            self.assertTrue(node_a.refresh())
+            self.assertEqual(node_b.leader(), 'node-a')
+
+            node_a.release()
+            self.assertNotIn(LEADER_KEY, redis.data)
+            self.assertTrue(node_b.refresh())
+            self.assertFalse(node_a.refresh())
+
+    def test_every_node_leads_without_redis(self):
+        with mock.patch.object(LeaderElection, '_client', side_effect=ConnectionError('redis down')):
+            self.assertTrue(LeaderElection(owner='node-a').refresh())
+            self.assertTrue(LeaderElection(owner='node-b').refresh())
+
+
+MADRID = 'Europe/Madrid'
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=UTC)
+
+
+class CronExpressionTests(SimpleTestCase):
+    """CronExpression.next_after on the wall clock of a timezone"""
+
+    def test_time_skipped_by_dst_does_not_fire(self):
+        # 2026-03-29 02:00 -> 03:00 en Madrid: las 02:30 no existen ese día
+        expression = CronExpression('30 2 * * *')
+        after = datetime(2026, 3, 28, 12, 0, tzinfo=ZoneInfo(MADRID))
+
+        when = expression.next_after(after, MADRID)
+
+        self.assertEqual(when.replace(tzinfo=None), datetime(2026, 3, 30, 2, 30))
+        self.assertEqual(when.astimezone(UTC), utc(2026, 3, 30, 0, 30))
+
+    def test_repeated_hour_fires_once(self):
+        # 2026-10-25 03:00 -> 02:00 en Madrid: las 02:30 ocurren dos veces
+        expression = CronExpression('30 2 * * *')
+        first = expression.next_after(datetime(2026, 10, 24, 12, 0, tzinfo=ZoneInfo(MADRID)), MADRID)
+        self.assertEqual(first.astimezone(UTC), utc(2026, 10, 25, 0, 30))
+
+        # Ya en la segunda pasada de las 02:xx (UTC+1) no vuelve a disparar
+        self.assertEqual(expression.next_after(first, MADRID).astimezone(UTC), utc(2026, 10, 26, 1, 30))
+        second_pass = utc(2026, 10, 25, 1, 10)
+        self.assertEqual(expression.next_after(second_pass, MADRID).astimezone(UTC), utc(2026, 10, 26, 1, 30))
+
+    def test_day_of_month_or_day_of_week(self):
+        # Día 13 O viernes, como Vixie cron
+        expression = CronExpression('0 9 13 * fri')
+        after = utc(2026, 2, 1)
+
+        matches = []
+        for _ in range(4):
+            after = expression.next_after(after, 'UTC')
+            matches.append(after.date())
+
+        self.assertEqual(matches, [date(2026, 2, 6), date(2026, 2, 13), date(2026, 2, 20), date(2026, 2, 27)])
+        self.assertEqual(CronExpression('0 9 13 * *').next_after(utc(2026, 2, 14), 'UTC').date(), date(2026, 3, 13))
+        self.assertEqual(CronExpression('0 9 * * fri').next_after(utc(2026, 2, 7), 'UTC').date(), date(2026, 2, 13))
+
+    def test_february_29(self):
+        expression = CronExpression('0 0 29 2 *')
+
+        self.assertEqual(expression.next_after(utc(2026, 3, 1), 'UTC'), utc(2028, 2, 29))
+        self.assertEqual(expression.next_after(utc(2028, 2, 29), 'UTC'), utc(2032, 2, 29))
+        with self.assertRaises(ValueError):
+            CronExpression('0 0 30 2 *')
+
+
+@override_settings(SCHEDULER_MISFIRE_GRACE=120)
+class ScheduleNextRunTests(TestCase):
+    """schedule_next_run() under each catch-up policy and the series limits"""
+
+    def make_series(self, hours_late=5, **fields):
+        self.now = timezone.now()
+        occurrence = self.now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours_late)
+        fields.setdefault('catchup_policy', 'once')
+        task = make_task('hourly', occurrence, cron_expression='0 * * * *', cron_timezone='UTC', status='running', **fields)
+        ScheduledTask.objects.filter(id=task.id).update(next_run_at=occurrence)
+        task.refresh_from_db()
+        return task, occurrence
+
+    def test_all_runs_every_missed_occurrence(self):
+        task, occurrence = self.make_series(catchup_policy='all')
+
+        upcoming = schedule_next_run(task)
+
+        self.assertEqual(upcoming, occurrence + timedelta(hours=1))
+        self.assertLess(upcoming, self.now)
+        self.assertEqual(task.status, 'pending')
+        self.assertEqual(task.run_count, 1)
+        self.assertEqual(task.last_run_at, occurrence)
+
+    def test_once_jumps_to_the_next_future_occurrence(self):
+        task, occurrence = self.make_series(catchup_policy='once')
+
+        upcoming = schedule_next_run(task)
+
+        self.assertGreater(upcoming, self.now)
+        self.assertLessEqual(upcoming, self.now + timedelta(hours=1))
+        self.assertEqual(task.run_count, 1)
+
+    def test_skip_drops_late_runs_without_counting_them(self):
+        task, occurrence = self.make_series(catchup_policy='skip')
+
+        self.assertEqual(drop_missed_runs([task]), [])
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'pending')
+        self.assertEqual(task.run_count, 0)
+        self.assertGreater(task.next_run_at, self.now)
+
+    def test_skip_runs_within_grace(self):
+        task, occurrence = self.make_series(hours_late=0, catchup_policy='skip')
+        ScheduledTask.objects.filter(id=task.id).update(next_run_at=self.now - timedelta(seconds=30))
+        task.refresh_from_db()
+
+        self.assertEqual(drop_missed_runs([task]), [task])
+
+    def test_max_runs_ends_the_series(self):
+        task, occurrence = self.make_series(max_runs=2, run_count=1)
+
+        self.assertIsNone(schedule_next_run(task, success=False))
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+        self.assertEqual(task.run_count, 2)
+        self.assertIsNone(task.next_run_at)
+        self.assertIsNotNone(task.execution_completed_at)
+
+    def test_recurrence_end_ends_the_series(self):
+        task, occurrence = self.make_series(catchup_policy='all')
+        task.recurrence_end = occurrence + timedelta(minutes=30)
+        task.save(update_fields=['recurrence_end'])
+
+        self.assertIsNone(schedule_next_run(task))
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'completed')
+        self.assertIsNone(task.next_run_at)
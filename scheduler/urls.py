@@ -9,6 +9,9 @@ urlpatterns = [
     path('tasks/<int:task_id>/cancel/', views.cancel_scheduled_task, name='cancel_scheduled_task'),
     path('tasks/<int:task_id>/status/', views.get_task_status, name='get_task_status'),
     path('history/', views.scheduled_task_history, name='scheduled_task_history'),
+    path('history/export/', views.scheduled_task_history_export, name='scheduled_task_history_export'),
     path('history/<int:history_id>/', views.scheduled_task_history_detail, name='scheduled_task_history_detail'),
+    path('history/<int:history_id>/output/', views.scheduled_task_history_output, name='scheduled_task_history_output'),
     path('history/<int:history_id>/status/', views.get_history_status, name='get_history_status'),
+    path('engine/status/', views.scheduler_engine_status, name='scheduler_engine_status'),
 ]
@@ -4,6 +4,8 @@ from django.contrib import messages
 from django.utils import timezone
 from django.conf import settings
 from django.http import JsonResponse
+from django.urls import reverse
+from history.export import export_context, filter_date_range, format_datetime, selected_columns, stream_csv
 from inventory.models import Environment, Group, Host
 from playbooks.models import Playbook
 from .models import ScheduledTask, ScheduledTaskHistory
@@ -51,30 +53,57 @@ def cancel_scheduled_task(request, task_id):
     return redirect('scheduled_tasks_list')
 
 
-@login_required
-def scheduled_task_history(request):
-    """View history of scheduled task executions"""
-    history = ScheduledTaskHistory.objects.all()
+# Columnas del export CSV: (clave, cabecera, valor)
+HISTORY_EXPORT_COLUMNS = [
+    ('id', 'ID', lambda h: h.id),
+    ('task', 'Task', lambda h: h.scheduled_task.name),
+    ('user', 'User', lambda h: h.scheduled_task.created_by.username if h.scheduled_task.created_by else ''),
+    ('environment', 'Environment', lambda h: h.environment_name),
+    ('task_type', 'Type', lambda h: h.task_type),
+    ('target', 'Target', lambda h: h.target_name),
+    ('target_ip', 'Target IP', lambda h: h.target_ip),
+    ('playbook', 'Playbook', lambda h: h.playbook_name),
+    ('scheduled_for', 'Scheduled For', lambda h: format_datetime(h.scheduled_for)),
+    ('executed_at', 'Executed At', lambda h: format_datetime(h.executed_at)),
+    ('duration', 'Duration (s)', lambda h: h.execution_duration),
+    ('status', 'Status', lambda h: h.status),
+    ('error', 'Error', lambda h: h.error_message),
+]
+
+
+def _filtered_history(request):
+    """
+    ScheduledTaskHistory queryset for the listing filters
+
+    Returns:
+        tuple: (queryset, filters dict for the template)
+    """
+    filters = {
+        'status_filter': request.GET.get('status'),
+        'task_type_filter': request.GET.get('task_type'),
+        'date_from': request.GET.get('date_from'),
+        'date_to': request.GET.get('date_to'),
+    }
+    history = ScheduledTaskHistory.objects.select_related('scheduled_task__created_by')
     
     # Filter by status if provided
-    status_filter = request.GET.get('status')
-    if status_filter:
-        history = history.filter(status=status_filter)
+    if filters['status_filter']:
+        history = history.filter(status=filters['status_filter'])
     
     # Filter by task type if provided
-    task_type_filter = request.GET.get('task_type')
-    if task_type_filter:
-        history = history.filter(task_type=task_type_filter)
-    
-    # Filter by date range
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
+    if filters['task_type_filter']:
+        history = history.filter(task_type=filters['task_type_filter'])
     
-    if date_from:
-        history = history.filter(executed_at__date__gte=date_from)
+    # Filter by date range (on executed_at itself so its index is used)
+    history = filter_date_range(history, 'executed_at', filters['date_from'], filters['date_to'])
     
-    if date_to:
-        history = history.filter(executed_at__date__lte=date_to)
+    return history, filters
+
+
+@login_required
+def scheduled_task_history(request):
+    """View history of scheduled task executions"""
+    history, filters = _filtered_history(request)
     
     # Add information about tasks that have been running for too long
     now = timezone.now()
@@ -91,26 +120,58 @@ def scheduled_task_history(request):
     
     context = {
         'history': history,
-        'status_filter': status_filter,
-        'task_type_filter': task_type_filter,
-        'date_from': date_from,
-        'date_to': date_to,
+        **filters,
+        **export_context(request, HISTORY_EXPORT_COLUMNS, reverse('scheduled_task_history_export')),
     }
     return render(request, 'scheduler/scheduled_task_history.html', context)
 
 
+@login_required
+def scheduled_task_history_export(request):
+    """
+    Stream the filtered scheduled task executions as CSV.
+    Takes the listing filters plus `columns` (see history/export.py).
+    """
+    history, filters = _filtered_history(request)
+    columns = selected_columns(request, HISTORY_EXPORT_COLUMNS)
+    history = history.defer('ansible_output').order_by('-executed_at', '-id')
+    return stream_csv('scheduled_task_history.csv', columns, history)
+
+
 @login_required
 def scheduled_task_history_detail(request, history_id):
     """View detailed output of a scheduled task execution"""
     try:
+        from history.ansible_events import get_recap, get_failed_results
+        
         history = ScheduledTaskHistory.objects.get(pk=history_id)
-        context = {'history': history}
+        context = {
+            'history': history,
+            'ansible_recap': get_recap(history),
+            'ansible_failures': get_failed_results(history),
+            'execution_batches': history.execution_batches.all(),
+        }
         return render(request, 'scheduler/scheduled_task_history_detail.html', context)
     except ScheduledTaskHistory.DoesNotExist:
         messages.error(request, 'History record not found')
         return redirect('scheduled_task_history')
 
 
+@login_required
+def scheduled_task_history_output(request, history_id):
+    """Line range of the highlighted output of an execution (?start=N), as JSON"""
+    from django.shortcuts import get_object_or_404
+    from history.output_render import output_page
+    
+    history = get_object_or_404(ScheduledTaskHistory, pk=history_id)
+    try:
+        start = int(request.GET.get('start', 0))
+        after = int(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        start, after = 0, None
+    return JsonResponse(output_page(history, start, after))
+
+
 @login_required
 def get_task_status(request, task_id):
     """AJAX endpoint to get task status"""
@@ -143,3 +204,12 @@ def get_history_status(request, history_id):
         })
     except ScheduledTaskHistory.DoesNotExist:
         return JsonResponse({'error': 'History not found'}, status=404)
+
+
+@login_required
+def scheduler_engine_status(request):
+    """AJAX endpoint with the scheduler engine lag metrics (scheduler/engine.py)"""
+    from .engine import get_engine_stats
+    
+    nodes = get_engine_stats()
+    return JsonResponse({'running': bool(nodes), 'nodes': nodes})
@@ -7,12 +7,15 @@ class SnapshotHistoryAdmin(admin.ModelAdmin):
     list_display = ['snapshot_name', 'host', 'group', 'playbook', 'status', 'created_at', 'expires_at', 'time_until_deletion']
     list_filter = ['status', 'created_at', 'host__environment']
     search_fields = ['snapshot_name', 'host__name', 'description']
-    readonly_fields = ['created_at', 'deleted_at']
+    readonly_fields = ['created_at', 'deleted_at', 'size_collected_at']
     date_hierarchy = 'created_at'
     
     fieldsets = (
         ('Snapshot Information', {
-            'fields': ('snapshot_name', 'vcenter_snapshot_id', 'description', 'size_mb')
+            'fields': ('snapshot_name', 'vcenter_snapshot_id', 'description')
+        }),
+        ('Storage', {
+            'fields': ('size_mb', 'chain_depth', 'datastore', 'size_collected_at')
         }),
         ('Related Objects', {
             'fields': ('host', 'group', 'playbook', 'user')
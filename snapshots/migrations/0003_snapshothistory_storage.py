@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snapshots', '0002_snapshothistory_script_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshothistory',
+            name='chain_depth',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Depth of the snapshot in the VM snapshot tree (1 = root)'),
+        ),
+        migrations.AddField(
+            model_name='snapshothistory',
+            name='datastore',
+            field=models.CharField(blank=True, help_text='Datastore holding most of the snapshot delta', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='snapshothistory',
+            name='size_collected_at',
+            field=models.DateTimeField(blank=True, help_text='Last time size and depth were read from vCenter', null=True),
+        ),
+    ]
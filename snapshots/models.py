@@ -29,6 +29,9 @@ class SnapshotHistory(models.Model):
     # Snapshot details
     description = models.TextField(blank=True)
     size_mb = models.IntegerField(default=0, help_text='Snapshot size in MB')
+    chain_depth = models.PositiveSmallIntegerField(default=0, help_text='Depth of the snapshot in the VM snapshot tree (1 = root)')
+    datastore = models.CharField(max_length=255, blank=True, help_text='Datastore holding most of the snapshot delta')
+    size_collected_at = models.DateTimeField(null=True, blank=True, help_text='Last time size and depth were read from vCenter')
     
     # Timing information
     created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,237 @@
+"""
+Measured storage cost of the snapshots tracked in SnapshotHistory.
+
+collect_snapshot_usage() (celery beat, SNAPSHOT_USAGE_REFRESH_INTERVAL)
+reads the snapshot tree and file layout of every VM with active snapshots,
+with one RetrievePropertiesEx call per vCenter, and stores on each row:
+
+    size_mb       delta files + state file (deploy/vcenter_snapshot_layout.py)
+    chain_depth   depth in the VM snapshot tree (1 = root)
+    datastore     datastore holding most of the snapshot
+
+storage_report() aggregates the active rows per datastore, per host and per
+retention, and flags what crosses the alert thresholds:
+
+    SNAPSHOT_ALERT_SIZE_MB          one snapshot
+    SNAPSHOT_ALERT_CHAIN_DEPTH      depth of a snapshot chain
+    SNAPSHOT_ALERT_DATASTORE_MB     all tracked snapshots on one datastore
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import SnapshotHistory
+
+logger = logging.getLogger(__name__)
+
+
+def alert_thresholds():
+    return {
+        'size_mb': getattr(settings, 'SNAPSHOT_ALERT_SIZE_MB', 20480),
+        'chain_depth': getattr(settings, 'SNAPSHOT_ALERT_CHAIN_DEPTH', 3),
+        'datastore_mb': getattr(settings, 'SNAPSHOT_ALERT_DATASTORE_MB', 204800),
+    }
+
+
+def collect_snapshot_usage():
+    """
+    Fill size_mb, chain_depth and datastore of the active snapshots from vCenter
+
+    Returns:
+        dict with 'measured', 'missing' (snapshot not found) and 'failed' (vCenter errors) counts
+    """
+    from settings.models import VCenterCredential
+
+    rows = list(SnapshotHistory.objects.filter(status='active').select_related('host'))
+    by_vcenter = defaultdict(list)
+    for row in rows:
+        if row.host.vcenter_server:
+            by_vcenter[row.host.vcenter_server].append(row)
+
+    credentials = {}
+    for cred in VCenterCredential.objects.filter(host__in=list(by_vcenter)).order_by('id'):
+        credentials.setdefault(cred.host, cred)
+
+    jobs = [
+        (vcenter_server, credentials[vcenter_server].user, credentials[vcenter_server].get_password(), vcenter_rows)
+        for vcenter_server, vcenter_rows in by_vcenter.items() if vcenter_server in credentials
+    ]
+    counts = {'measured': 0, 'missing': 0, 'failed': 0}
+    if not jobs:
+        return counts
+
+    measured = {}
+    with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='snapshot-usage') as executor:
+        futures = {
+            executor.submit(_measure_on_vcenter, vcenter_server, user, password, vcenter_rows): (vcenter_server, vcenter_rows)
+            for vcenter_server, user, password, vcenter_rows in jobs
+        }
+        for future in as_completed(futures):
+            vcenter_server, vcenter_rows = futures[future]
+            try:
+                found = future.result()
+            except Exception as e:
+                logger.error(f'[SNAPSHOT-USAGE] Error reading snapshots on vCenter {vcenter_server}: {e}')
+                counts['failed'] += len(vcenter_rows)
+                continue
+            measured.update(found)
+            counts['missing'] += len(vcenter_rows) - len(found)
+
+    now = timezone.now()
+    updated = []
+    for row in rows:
+        if row.id in measured:
+            row.size_mb, row.chain_depth, row.datastore = measured[row.id]
+            row.size_collected_at = now
+            updated.append(row)
+    if updated:
+        SnapshotHistory.objects.bulk_update(updated, ['size_mb', 'chain_depth', 'datastore', 'size_collected_at'], batch_size=500)
+    counts['measured'] = len(updated)
+
+    for alert in storage_alerts():
+        logger.warning(f'[SNAPSHOT-USAGE] {alert["message"]}')
+    logger.info(f'[SNAPSHOT-USAGE] Measured {counts["measured"]} snapshot(s), {counts["missing"]} not found, {counts["failed"]} on unreachable vCenters')
+    return counts
+
+
+def _measure_on_vcenter(vcenter_server, user, password, rows):
+    """
+    Returns:
+        dict row id -> (size_mb, chain_depth, datastore) for the snapshots found
+    """
+    from deploy.vcenter_index import get_vm_index
+    from deploy.vcenter_pool import vcenter_session
+    from deploy.vcenter_snapshot_layout import (
+        MB, SNAPSHOT_LAYOUT_PROPERTIES, retrieve_vm_properties, snapshot_usage, walk_snapshots
+    )
+
+    with vcenter_session(vcenter_server, user, password) as si:
+        index = get_vm_index(si)
+        vms = index.find_many({row.id: [row.host.ip, row.host.name] for row in rows})
+        layouts = retrieve_vm_properties(
+            si, {vm._moId: vm for vm in vms.values() if vm is not None}.values(), SNAPSHOT_LAYOUT_PROPERTIES
+        )
+
+    found = {}
+    usage_cache = {}
+    for row in rows:
+        vm = vms[row.id]
+        props = layouts.get(vm._moId) if vm is not None else None
+        if props is None:
+            continue
+        if vm._moId not in usage_cache:
+            usage_cache[vm._moId] = snapshot_usage(props)
+        for tree, depth in walk_snapshots(props.get('snapshot')):
+            if (row.vcenter_snapshot_id and str(tree.id) == str(row.vcenter_snapshot_id)) or \
+                    (not row.vcenter_snapshot_id and tree.name == row.snapshot_name):
+                per_datastore = usage_cache[vm._moId].get(tree.snapshot._moId, {})
+                size = sum(per_datastore.values())
+                datastore = max(per_datastore, key=per_datastore.get) if per_datastore else ''
+                found[row.id] = (int(round(size / MB)), depth, datastore)
+                break
+    return found
+
+
+def storage_alerts(thresholds=None):
+    """Active snapshots, chains and datastores over the alert thresholds"""
+    thresholds = thresholds or alert_thresholds()
+    active = SnapshotHistory.objects.filter(status='active')
+    alerts = []
+
+    for entry in (active.exclude(datastore='').values('datastore')
+                  .annotate(size_mb=Sum('size_mb'), snapshots=Count('id'))
+                  .filter(size_mb__gte=thresholds['datastore_mb']).order_by('-size_mb')):
+        alerts.append({
+            'level': 'danger',
+            'kind': 'datastore',
+            'message': f"Datastore {entry['datastore']}: {entry['snapshots']} snapshot(s) hold {entry['size_mb'] / 1024:.1f} GB "
+                       f"(threshold {thresholds['datastore_mb'] / 1024:.0f} GB)",
+        })
+    for snapshot in active.filter(chain_depth__gte=thresholds['chain_depth']).select_related('host').order_by('-chain_depth')[:50]:
+        alerts.append({
+            'level': 'warning',
+            'kind': 'chain_depth',
+            'snapshot_id': snapshot.id,
+            'message': f"{snapshot.host.name}: snapshot chain {snapshot.chain_depth} deep at '{snapshot.snapshot_name}' "
+                       f"(threshold {thresholds['chain_depth']})",
+        })
+    for snapshot in active.filter(size_mb__gte=thresholds['size_mb']).select_related('host').order_by('-size_mb')[:50]:
+        alerts.append({
+            'level': 'warning',
+            'kind': 'size',
+            'snapshot_id': snapshot.id,
+            'message': f"{snapshot.host.name}: snapshot '{snapshot.snapshot_name}' holds {snapshot.size_mb / 1024:.1f} GB "
+                       f"(threshold {thresholds['size_mb'] / 1024:.0f} GB)",
+        })
+    return alerts
+
+
+def storage_report():
+    """
+    Storage used by the active snapshots
+
+    Returns:
+        dict with 'datastores', 'hosts' and 'retention' rows (largest first),
+        'totals', 'alerts' and 'thresholds'
+    """
+    now = timezone.now()
+    thresholds = alert_thresholds()
+    active = SnapshotHistory.objects.filter(status='active')
+
+    datastores = list(
+        active.values('datastore')
+        .annotate(snapshots=Count('id'), size_mb=Sum('size_mb'), max_depth=Max('chain_depth'))
+        .order_by('-size_mb', 'datastore')
+    )
+    for entry in datastores:
+        entry['over_threshold'] = bool(entry['datastore']) and entry['size_mb'] >= thresholds['datastore_mb']
+
+    hosts = list(
+        active.values('host_id', 'host__name', 'host__vcenter_server')
+        .annotate(snapshots=Count('id'), size_mb=Sum('size_mb'), max_depth=Max('chain_depth'))
+        .order_by('-size_mb', 'host__name')
+    )
+    for entry in hosts:
+        entry['deep_chain'] = entry['max_depth'] >= thresholds['chain_depth']
+
+    # Crecimiento medido por retención
+    retention = defaultdict(lambda: {'snapshots': 0, 'size_mb': 0, 'age_hours': 0.0})
+    for retention_hours, size_mb, created_at in active.exclude(size_collected_at=None).values_list(
+            'retention_hours', 'size_mb', 'created_at'):
+        bucket = retention[retention_hours]
+        bucket['snapshots'] += 1
+        bucket['size_mb'] += size_mb
+        bucket['age_hours'] += max((now - created_at).total_seconds() / 3600, 0)
+    retention_rows = []
+    for retention_hours, bucket in sorted(retention.items()):
+        # MB por snapshot y hora
+        mb_per_hour = bucket['size_mb'] / bucket['age_hours'] if bucket['age_hours'] else 0
+        retention_rows.append({
+            'retention_hours': retention_hours,
+            'snapshots': bucket['snapshots'],
+            'size_mb': bucket['size_mb'],
+            'avg_size_mb': bucket['size_mb'] / bucket['snapshots'],
+            'mb_per_hour': mb_per_hour,
+            # Tamaño esperado de un snapshot al expirar con el ritmo medido
+            'projected_mb': mb_per_hour * retention_hours,
+        })
+
+    totals = active.aggregate(snapshots=Count('id'), size_mb=Sum('size_mb'), max_depth=Max('chain_depth'))
+    totals['size_mb'] = totals['size_mb'] or 0
+    totals['size_gb'] = totals['size_mb'] / 1024
+    totals['max_depth'] = totals['max_depth'] or 0
+    totals['unmeasured'] = active.filter(size_collected_at=None).count()
+    totals['last_collected'] = active.aggregate(last=Max('size_collected_at'))['last']
+
+    return {
+        'datastores': datastores,
+        'hosts': hosts,
+        'retention': retention_rows,
+        'totals': totals,
+        'alerts': storage_alerts(thresholds),
+        'thresholds': thresholds,
+    }
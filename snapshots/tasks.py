@@ -0,0 +1,19 @@
+"""
+Celery tasks for snapshots
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='snapshots.collect_snapshot_usage', ignore_result=True)
+def collect_snapshot_usage():
+    """
+    Periodic (celery beat) measurement of size and chain depth of the
+    active snapshots (see snapshots/storage.py).
+    """
+    from snapshots.storage import collect_snapshot_usage as collect
+
+    counts = collect()
+    logger.info(f"[SNAPSHOT-USAGE] {counts['measured']} measured, {counts['missing']} not found, {counts['failed']} failed")
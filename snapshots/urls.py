@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('', views.snapshot_history, name='snapshot_history'),
+    path('export/', views.snapshot_export, name='snapshot_export'),
+    path('storage/', views.snapshot_storage_report, name='snapshot_storage_report'),
     path('<int:pk>/', views.snapshot_detail, name='snapshot_detail'),
     path('<int:pk>/delete/', views.delete_snapshot, name='delete_snapshot'),
 ]
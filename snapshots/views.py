@@ -3,21 +3,53 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Count
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.urls import reverse
+from history.export import export_context, filter_date_range, format_datetime, selected_columns, stream_csv
 from .models import SnapshotHistory
 from inventory.models import Host, Group
 from playbooks.models import Playbook
 
 
-@login_required
-def snapshot_history(request):
-    """Display snapshot history with filters"""
-    
+# Columnas del export CSV: (clave, cabecera, valor)
+SNAPSHOT_EXPORT_COLUMNS = [
+    ('id', 'ID', lambda s: s.id),
+    ('snapshot_name', 'Snapshot', lambda s: s.snapshot_name),
+    ('host', 'Host', lambda s: s.host.name),
+    ('vcenter_snapshot_id', 'vCenter Snapshot ID', lambda s: s.vcenter_snapshot_id),
+    ('group', 'Group', lambda s: s.group.name if s.group else ''),
+    ('playbook', 'Playbook', lambda s: s.playbook.name if s.playbook else ''),
+    ('script_name', 'Script', lambda s: s.script_name),
+    ('user', 'User', lambda s: s.user.username if s.user else ''),
+    ('status', 'Status', lambda s: s.status),
+    ('created_at', 'Created', lambda s: format_datetime(s.created_at)),
+    ('retention_hours', 'Retention (h)', lambda s: s.retention_hours),
+    ('expires_at', 'Expires', lambda s: format_datetime(s.expires_at)),
+    ('deleted_at', 'Deleted', lambda s: format_datetime(s.deleted_at)),
+    ('size_mb', 'Size (MB)', lambda s: s.size_mb),
+    ('chain_depth', 'Chain Depth', lambda s: s.chain_depth),
+    ('datastore', 'Datastore', lambda s: s.datastore),
+    ('description', 'Description', lambda s: s.description),
+    ('error_message', 'Error', lambda s: s.error_message),
+]
+
+
+def _filtered_snapshots(request):
+    """
+    SnapshotHistory queryset for the listing filters
+
+    Returns:
+        tuple: (queryset, filters dict for the template)
+    """
     # Get filter parameters
-    status_filter = request.GET.get('status', '')
-    host_filter = request.GET.get('host', '')
-    group_filter = request.GET.get('group', '')
-    playbook_filter = request.GET.get('playbook', '')
-    search = request.GET.get('search', '')
+    filters = {
+        'status_filter': request.GET.get('status', ''),
+        'host_filter': request.GET.get('host', ''),
+        'group_filter': request.GET.get('group', ''),
+        'playbook_filter': request.GET.get('playbook', ''),
+        'search': request.GET.get('search', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+    }
     
     # Base queryset
     snapshots = SnapshotHistory.objects.select_related(
@@ -25,25 +57,36 @@ def snapshot_history(request):
     ).all()
     
     # Apply filters
-    if status_filter:
-        snapshots = snapshots.filter(status=status_filter)
+    if filters['status_filter']:
+        snapshots = snapshots.filter(status=filters['status_filter'])
     
-    if host_filter:
-        snapshots = snapshots.filter(host_id=host_filter)
+    if filters['host_filter']:
+        snapshots = snapshots.filter(host_id=filters['host_filter'])
     
-    if group_filter:
-        snapshots = snapshots.filter(group_id=group_filter)
+    if filters['group_filter']:
+        snapshots = snapshots.filter(group_id=filters['group_filter'])
     
-    if playbook_filter:
-        snapshots = snapshots.filter(playbook_id=playbook_filter)
+    if filters['playbook_filter']:
+        snapshots = snapshots.filter(playbook_id=filters['playbook_filter'])
     
-    if search:
+    if filters['search']:
+        search = filters['search']
         snapshots = snapshots.filter(
             Q(snapshot_name__icontains=search) |
             Q(host__name__icontains=search) |
             Q(description__icontains=search)
         )
     
+    snapshots = filter_date_range(snapshots, 'created_at', filters['date_from'], filters['date_to'])
+    
+    return snapshots, filters
+
+
+@login_required
+def snapshot_history(request):
+    """Display snapshot history with filters"""
+    snapshots, filters = _filtered_snapshots(request)
+    
     # Get statistics
     stats = {
         'total': SnapshotHistory.objects.count(),
@@ -79,16 +122,33 @@ def snapshot_history(request):
         'hosts': hosts,
         'groups': groups,
         'playbooks': playbooks,
-        'status_filter': status_filter,
-        'host_filter': host_filter,
-        'group_filter': group_filter,
-        'playbook_filter': playbook_filter,
-        'search': search,
+        **filters,
+        **export_context(request, SNAPSHOT_EXPORT_COLUMNS, reverse('snapshot_export')),
     }
     
     return render(request, 'snapshots/history.html', context)
 
 
+@login_required
+def snapshot_export(request):
+    """
+    Stream the filtered snapshot history as CSV.
+    Takes the listing filters plus `columns` (see history/export.py).
+    """
+    snapshots, filters = _filtered_snapshots(request)
+    columns = selected_columns(request, SNAPSHOT_EXPORT_COLUMNS)
+    return stream_csv('snapshot_history.csv', columns, snapshots.order_by('-created_at', '-id'))
+
+
+@login_required
+def snapshot_storage_report(request):
+    """Measured snapshot storage per datastore / host / retention, with alerts"""
+    from .storage import storage_report
+    
+    context = storage_report()
+    return render(request, 'snapshots/storage.html', context)
+
+
 @login_required
 def snapshot_detail(request, pk):
     """Display detailed information about a snapshot"""
@@ -108,9 +168,8 @@ def delete_snapshot(request, pk):
     """Manually delete a snapshot from vCenter"""
     from django.shortcuts import get_object_or_404, redirect
     from django.contrib import messages
-    from deploy.vcenter_snapshot import get_vcenter_connection, delete_snapshot
+    from deploy.vcenter_snapshot import get_vcenter_connection, delete_snapshot, release_vcenter_connection
     from settings.models import VCenterCredential
-    from pyVim.connect import Disconnect
     import logging
     
     logger = logging.getLogger('snapshots')
@@ -161,7 +220,7 @@ def delete_snapshot(request, pk):
                     logger.error(f'[MANUAL-DELETE] Failed to delete snapshot {snapshot.snapshot_name}: {message}')
         
         finally:
-            Disconnect(si)
+            release_vcenter_connection(si)
     
     except Exception as e:
         messages.error(request, f'Error deleting snapshot: {str(e)}')
@@ -0,0 +1,159 @@
+/**
+ * ansible-output.js
+ * Carga por rangos la salida de Ansible ya resaltada en el servidor
+ * (history/output_render.py) en el <pre id="ansible-output" data-output-url="...">
+ * de las páginas de detalle, con filtros por tipo de línea y pantalla completa.
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+  const output = document.getElementById('ansible-output');
+  if (!output || !output.dataset.outputUrl) return;
+
+  const status = document.getElementById('output-status');
+  const moreBtn = document.getElementById('output-more');
+  let url = output.dataset.outputUrl;
+  let next = 0;
+  let total = 0;
+  let loading = false;
+  let complete = false;
+  // Ejecuciones en curso: último chunk recibido (el servidor solo lee los posteriores)
+  let cursor = null;
+  let more = false;
+  let counts = {success: 0, changed: 0, skipped: 0, errors: 0};
+  // Cambia al mostrar otra salida (lotes de un rollout): descarta respuestas viejas
+  let generation = 0;
+
+  function updateCounters() {
+    Object.keys(counts).forEach(function(key) {
+      const el = document.getElementById('count-' + key);
+      if (el) el.textContent = counts[key];
+    });
+  }
+
+  function updateStatus() {
+    if (status) {
+      status.textContent = total ? 'Showing ' + next + ' of ' + total + ' lines' : '';
+    }
+    if (moreBtn) {
+      moreBtn.style.display = (next < total || more) ? '' : 'none';
+    }
+  }
+
+  // Carga las siguientes líneas; con `follow` sigue hasta el final (ejecuciones en curso)
+  function load(follow) {
+    if (loading) return;
+    loading = true;
+    const current = generation;
+    const query = '?start=' + next + (cursor !== null ? '&after=' + cursor : '');
+    fetch(url + query, {credentials: 'same-origin'})
+      .then(function(response) { return response.json(); })
+      .then(function(data) {
+        if (current !== generation) return;
+        if (next === 0) {
+          output.innerHTML = (data.total || data.more) ? '' : (data.complete ? 'No output available' : 'Waiting for output...');
+        }
+        if (data.html) {
+          output.insertAdjacentHTML('beforeend', (next > 0 ? '\n' : '') + data.html);
+        }
+        next = data.next;
+        total = data.total;
+        complete = data.complete;
+        more = !!data.more;
+        if (data.cursor !== undefined) cursor = data.cursor;
+        if (data.counts) {
+          counts = data.counts;
+        } else if (data.range_counts) {
+          Object.keys(counts).forEach(function(key) { counts[key] += data.range_counts[key]; });
+        }
+        updateCounters();
+        updateStatus();
+        loading = false;
+        if (follow && (next < total || more)) {
+          load(follow);
+        } else if (follow) {
+          output.scrollTop = output.scrollHeight;
+        }
+      })
+      .catch(function(error) {
+        console.error('Error loading output:', error);
+        if (current === generation) loading = false;
+      });
+  }
+
+  // Siguiente página al acercarse al final del scroll
+  output.addEventListener('scroll', function() {
+    if ((next < total || more) && output.scrollTop + output.clientHeight >= output.scrollHeight - 200) {
+      load(false);
+    }
+  });
+  if (moreBtn) {
+    moreBtn.addEventListener('click', function() { load(false); });
+  }
+
+  // Filtros por tipo de línea (CSS sobre data-filter, aplica también a las líneas nuevas)
+  const filterButtons = document.querySelectorAll('.filter-btn');
+  filterButtons.forEach(function(btn) {
+    btn.addEventListener('click', function() {
+      filterButtons.forEach(function(b) { b.classList.remove('active'); });
+      this.classList.add('active');
+      output.dataset.filter = this.dataset.filter;
+    });
+  });
+
+  // Expand/Collapse functionality
+  const expandBtn = document.getElementById('expand-btn');
+  const outputCard = document.getElementById('output-card');
+  if (expandBtn && outputCard) {
+    expandBtn.addEventListener('click', function() {
+      outputCard.classList.toggle('fullscreen');
+      if (outputCard.classList.contains('fullscreen')) {
+        expandBtn.innerHTML = '<i class="bi bi-compress"></i> Collapse';
+        expandBtn.title = 'Collapse output';
+      } else {
+        expandBtn.innerHTML = '<i class="bi bi-expand"></i> Expand';
+        expandBtn.title = 'Expand output';
+      }
+    });
+
+    // ESC key to exit fullscreen
+    document.addEventListener('keydown', function(e) {
+      if (e.key === 'Escape' && outputCard.classList.contains('fullscreen')) {
+        outputCard.classList.remove('fullscreen');
+        expandBtn.innerHTML = '<i class="bi bi-expand"></i> Expand';
+        expandBtn.title = 'Expand output';
+      }
+    });
+  }
+
+  window.ansibleOutput = {
+    // Polling de ejecuciones en curso: traer solo las líneas nuevas
+    refresh: function() { if (!complete) load(true); },
+    // Mostrar otra salida en el mismo terminal (p. ej. un lote de un rollout)
+    show: function(outputUrl) {
+      generation++;
+      url = outputUrl;
+      next = 0;
+      total = 0;
+      cursor = null;
+      more = false;
+      loading = false;
+      complete = false;
+      counts = {success: 0, changed: 0, skipped: 0, errors: 0};
+      output.textContent = 'Loading output...';
+      updateCounters();
+      updateStatus();
+      load(false);
+    }
+  };
+
+  // Botones data-output-url fuera del terminal (tabla de lotes)
+  document.querySelectorAll('.output-source').forEach(function(btn) {
+    btn.addEventListener('click', function() {
+      document.querySelectorAll('.output-source').forEach(function(b) { b.classList.remove('active'); });
+      this.classList.add('active');
+      window.ansibleOutput.show(this.dataset.outputUrl);
+    });
+  });
+
+  load(false);
+});